@@ -265,6 +265,10 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 # Django 5: usa STORAGES (no definas STATICFILES_STORAGE en otra parte)
 STORAGES = {
+    # Archivos subidos y generados (comprobantes, reportes) en MEDIA_ROOT
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage'
+    },
     'staticfiles': {
         'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'
     }
@@ -274,6 +278,34 @@ STORAGES = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Escritura diferida de registros de acceso (spool local + commits agrupados)
+ACCESO_ESCRITURA_DIFERIDA = config('ACCESO_ESCRITURA_DIFERIDA', default=True, cast=bool)
+ACCESO_SPOOL_PATH = config('ACCESO_SPOOL_PATH', default=str(BASE_DIR / 'spool' / 'registros_acceso.sqlite3'))
+ACCESO_GRUPO_FILAS = config('ACCESO_GRUPO_FILAS', default=200, cast=int)
+ACCESO_GRUPO_MS = config('ACCESO_GRUPO_MS', default=250, cast=int)
+# Cada cuántos segundos el índice de placas revisa la versión compartida en la caché.
+# Con varios procesos la caché debe ser compartida (Redis); con LocMemCache no se ven los cambios de otros
+INDICE_PLACAS_SEGUNDOS_VERSION = config('INDICE_PLACAS_SEGUNDOS_VERSION', default=1.0, cast=float)
+
+# Reconocimiento de placas local (pool de procesos)
+IA_MOTOR_RECONOCIMIENTO = config('IA_MOTOR_RECONOCIMIENTO', default='usuarios.services.motores_reconocimiento.MotorClasico')
+IA_PROCESOS_RECONOCIMIENTO = config('IA_PROCESOS_RECONOCIMIENTO', default=os.cpu_count() or 1, cast=int)
+IA_MAX_COLA_RECONOCIMIENTO = config('IA_MAX_COLA_RECONOCIMIENTO', default=IA_PROCESOS_RECONOCIMIENTO * 4, cast=int)
+IA_TIMEOUT_RECONOCIMIENTO = config('IA_TIMEOUT_RECONOCIMIENTO', default=30, cast=float)
+IA_MAX_BYTES_IMAGEN = config('IA_MAX_BYTES_IMAGEN', default=10 * 1024 * 1024, cast=int)
+# Cuadros casi iguales (hash perceptual a esta distancia o menos) reutilizan el resultado durante IA_TTL_FRAMES segundos
+IA_TTL_FRAMES = config('IA_TTL_FRAMES', default=2.0, cast=float)
+IA_DISTANCIA_FRAMES = config('IA_DISTANCIA_FRAMES', default=6, cast=int)
+
+# Reportes financieros: totales y archivos PDF/Excel en un pool de procesos (False = en la misma petición)
+REPORTES_EN_SEGUNDO_PLANO = config('REPORTES_EN_SEGUNDO_PLANO', default=True, cast=bool)
+REPORTES_PROCESOS = config('REPORTES_PROCESOS', default=2, cast=int)
+# Segundos que vive en caché el resumen del dashboard financiero (se invalida al escribir)
+RESUMEN_FINANCIERO_CACHE_SEGUNDOS = config('RESUMEN_FINANCIERO_CACHE_SEGUNDOS', default=300, cast=int)
+# Confirmaciones de lectura: se guardan en la base cada N llamadas o T segundos (ver comunidad/services/lecturas.py)
+LECTURAS_GRUPO_CONFIRMACIONES = config('LECTURAS_GRUPO_CONFIRMACIONES', default=100, cast=int)
+LECTURAS_GRUPO_SEGUNDOS = config('LECTURAS_GRUPO_SEGUNDOS', default=30, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
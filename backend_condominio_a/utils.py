@@ -258,10 +258,14 @@ class DatabaseQueryOptimizer:
     @staticmethod
     def get_dashboard_data(user):
         """Obtener datos del dashboard optimizados"""
+        from django.utils import timezone
         from usuarios.models import Empleado, Residentes
-        from comunidad.models import Evento, Notificacion
+        from comunidad.models import Evento, NotificacionResidente
+        from comunidad.services.no_leidas import no_leidas
         from economia.models import Multa
-        from finanzas.models import Pago
+        from finanzas.models import CuotaUnidad
+
+        pendientes = ['pendiente', 'vencida', 'parcial']
 
         # Determinar si es administrador
         is_admin = (
@@ -273,18 +277,23 @@ class DatabaseQueryOptimizer:
         if is_admin:
             # Datos para administrador
             return {
-                'eventos_pendientes': Evento.objects.filter(fecha__gte='today').count(),
-                'notificaciones_sin_leer': Notificacion.objects.filter(leida=False).count(),
-                'multas_pendientes': Multa.objects.filter(pagada=False).count(),
-                'pagos_pendientes': Pago.objects.filter(estado_pago='pendiente').count(),
+                'eventos_pendientes': Evento.objects.filter(fecha__gte=timezone.now()).count(),
+                'notificaciones_sin_leer': NotificacionResidente.objects.filter(leido=False).count(),
+                'multas_pendientes': Multa.objects.filter(estado='pendiente').count(),
+                'pagos_pendientes': CuotaUnidad.objects.filter(estado__in=pendientes).count(),
             }
         else:
             # Datos para residente
             residente = Residentes.objects.filter(usuario=user).first()
             if residente:
                 return {
-                    'mis_multas': Multa.objects.filter(residente=residente, pagada=False).count(),
-                    'mis_pagos': Pago.objects.filter(residente=residente, estado_pago='pendiente').count(),
-                    'mis_notificaciones': Notificacion.objects.filter(usuario=user, leida=False).count(),
+                    'mis_multas': Multa.objects.filter(residente=residente, estado='pendiente').count(),
+                    'mis_pagos': CuotaUnidad.objects.filter(
+                        unidad__residentesunidad__id_residente=residente,
+                        unidad__residentesunidad__estado=True,
+                        estado__in=pendientes,
+                    ).distinct().count(),
+                    # Contador en caché (ver comunidad/services/no_leidas.py)
+                    'mis_notificaciones': no_leidas(user),
                 }
             return {}
@@ -1,31 +1,90 @@
-from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.parsers import MultiPartParser, FormParser
-from rest_framework.response import Response
-from rest_framework import status
+import asyncio
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 
-class AnalyzeImageView(APIView):
-    permission_classes = [IsAuthenticated]
-    parser_classes = [MultiPartParser, FormParser]
+from usuarios.services.autenticacion_token import usuario_del_token
+from usuarios.services.deduplicacion import cache_frames, hash_perceptual
+from usuarios.services.pool_reconocimiento import ColaLlena, pool_reconocimiento
 
-    def post(self, request):
-        image = request.data.get('image')
+
+async def _autenticado(request):
+    """Token (header Authorization) o sesión, igual que la autenticación de DRF del proyecto"""
+    if await usuario_del_token(request):
+        return True
+    usuario = await request.auser()
+    return usuario.is_authenticated
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AnalyzeImageView(View):
+    """
+    Reconocimiento de placas sobre una imagen subida (multipart, campo 'image').
+    La imagen se procesa en el pool de procesos; la vista es asíncrona, así que
+    mientras espera no ocupa un worker de Django. GET retorna las métricas del pool.
+    """
+
+    async def get(self, request):
+        if not await _autenticado(request):
+            return JsonResponse({'detail': 'Las credenciales de autenticación no se proveyeron.'}, status=401)
+        return JsonResponse({**pool_reconocimiento.metricas(), 'cache_frames': cache_frames.metricas()})
+
+    async def post(self, request):
+        if not await _autenticado(request):
+            return JsonResponse({'detail': 'Las credenciales de autenticación no se proveyeron.'}, status=401)
+
+        image = request.FILES.get('image')
         if not image:
-            return Response({"error": "Falta el archivo 'image'"}, status=status.HTTP_400_BAD_REQUEST)
+            return JsonResponse({"error": "Falta el archivo 'image'"}, status=400)
+        max_bytes = getattr(settings, 'IA_MAX_BYTES_IMAGEN', 10 * 1024 * 1024)
+        if image.size > max_bytes:
+            return JsonResponse({"error": f"La imagen supera el máximo de {max_bytes} bytes"}, status=413)
 
-        # Implementación placeholder segura: no llama a proveedores externos.
-        # Aquí podrías integrar un proveedor IA usando variables de entorno.
-        # Devolvemos un resultado de ejemplo para no bloquear el flujo en Railway.
-        result = {
-            "ok": True,
-            "model": "placeholder:v1",
-            "summary": "Imagen recibida y analizada localmente (mock)",
-            "labels": [
-                {"name": "objeto", "confidence": 0.85},
-                {"name": "escena", "confidence": 0.62}
-            ]
-        }
-        return Response(result)
+        datos = image.read()
+        camara_id = request.POST.get('camara_id', '')
+
+        # Cuadros casi iguales de la misma cámara reutilizan el último resultado.
+        # Pillow decodifica la imagen: en un hilo aparte para no frenar el event loop
+        try:
+            huella = await sync_to_async(hash_perceptual, thread_sensitive=False)(datos)
+        except Exception:
+            return JsonResponse({"error": "El archivo no es una imagen válida"}, status=422)
+        en_cache = cache_frames.buscar(camara_id, huella)
+        if en_cache:
+            return JsonResponse({**en_cache, "duplicado": True})
 
+        try:
+            futuro = pool_reconocimiento.enviar(datos)
+        except ColaLlena as e:
+            response = JsonResponse({"error": str(e), "metricas": pool_reconocimiento.metricas()}, status=503)
+            response['Retry-After'] = '1'
+            return response
 
+        timeout = getattr(settings, 'IA_TIMEOUT_RECONOCIMIENTO', 30)
+        try:
+            resultado = await asyncio.wait_for(asyncio.wrap_future(futuro), timeout=timeout)
+        except asyncio.TimeoutError:
+            return JsonResponse({"error": f"El reconocimiento superó {timeout}s"}, status=504)
+        except Exception as e:
+            return JsonResponse({"error": f"No se pudo procesar la imagen: {e}"}, status=422)
+
+        respuesta = {
+            "ok": True,
+            "model": pool_reconocimiento.motor.rsplit('.', 1)[-1],
+            "placa_detectada": resultado['placa'],
+            "color_detectado": resultado['color'],
+            "marca_detectada": resultado['marca'],
+            "modelo_detectado": resultado['modelo'],
+            "ia_confidence": resultado['confidence'],
+            "ia_placa_reconocida": resultado['placa_reconocida'],
+            "ia_vehiculo_reconocido": resultado['vehiculo_reconocido'],
+            "region_placa": resultado['region_placa'],
+            "tiempos_ms": resultado['tiempos_ms'],
+            "camara_id": camara_id,
+        }
+        cache_frames.guardar(camara_id, huella, respuesta)
+        return JsonResponse({**respuesta, "en_cola": pool_reconocimiento.metricas()['en_cola'], "duplicado": False})
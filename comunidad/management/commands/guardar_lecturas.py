@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from comunidad.services.lecturas import guardar_lecturas, pendientes
+
+
+class Command(BaseCommand):
+    help = 'Guarda en la base las confirmaciones de lectura que están en caché (para correr periódicamente)'
+
+    def handle(self, *args, **options):
+        lotes = pendientes()
+        if not lotes:
+            self.stdout.write('No hay confirmaciones de lectura pendientes')
+            return
+
+        nuevas = guardar_lecturas()
+        self.stdout.write(self.style.SUCCESS(
+            f'Se guardaron {nuevas} lecturas nuevas de {lotes} lotes pendientes'
+        ))
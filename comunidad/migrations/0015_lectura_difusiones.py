@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comunidad', '0014_add_vista_por_admin_to_reserva'),
+        ('usuarios', '0016_configuracionacceso_segundos_debounce_placa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LecturaDifusiones',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('leidas_hasta', models.IntegerField(default=0, help_text='Todas las difusiones con id menor o igual están leídas')),
+                ('leidas', models.JSONField(blank=True, default=dict, help_text='Difusiones leídas por encima de la marca: {id: fecha_lectura}')),
+                ('fecha_modificacion', models.DateTimeField(auto_now=True)),
+                ('residente', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='lectura_difusiones', to='usuarios.residentes')),
+            ],
+            options={
+                'verbose_name': 'Lectura de Difusiones',
+                'verbose_name_plural': 'Lecturas de Difusiones',
+            },
+        ),
+    ]
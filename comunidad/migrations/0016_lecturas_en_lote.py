@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:23
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def contar_lecturas(apps, schema_editor):
+    Notificacion = apps.get_model('comunidad', 'Notificacion')
+    LecturaComunicado = apps.get_model('comunidad', 'LecturaComunicado')
+    lecturas = (
+        LecturaComunicado.objects.filter(notificacion=OuterRef('pk'))
+        .order_by().values('notificacion').annotate(total=Count('id')).values('total')
+    )
+    Notificacion.objects.update(total_lecturas=Coalesce(Subquery(lecturas), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comunidad', '0015_lectura_difusiones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacion',
+            name='total_lecturas',
+            field=models.PositiveIntegerField(default=0, help_text='Lecturas confirmadas (LecturaComunicado), se actualiza al guardar las lecturas en lote'),
+        ),
+        migrations.AlterField(
+            model_name='lecturacomunicado',
+            name='fecha_lectura',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(contar_lecturas, migrations.RunPython.noop),
+    ]
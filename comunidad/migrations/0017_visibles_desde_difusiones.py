@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comunidad', '0016_lecturas_en_lote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lecturadifusiones',
+            name='visibles_desde',
+            field=models.IntegerField(default=0, help_text='Las difusiones con id menor o igual son de antes de que existiera el residente y no se muestran'),
+        ),
+    ]
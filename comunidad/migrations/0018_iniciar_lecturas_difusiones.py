@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:20
+
+from django.db import migrations
+from django.db.models import Max
+from django.db.models.functions import Greatest
+
+TAMANO_LOTE = 1000
+
+
+def iniciar_lecturas(apps, schema_editor):
+    """
+    Marca para los residentes que ya existían: las difusiones actuales se enviaron
+    con una fila por residente (modelo anterior), así que las que no tienen fila
+    son de antes de su alta o de cuando estaba inactivo y no se muestran
+    """
+    Notificacion = apps.get_model('comunidad', 'Notificacion')
+    LecturaDifusiones = apps.get_model('comunidad', 'LecturaDifusiones')
+    Residentes = apps.get_model('usuarios', 'Residentes')
+
+    ultima = Notificacion.objects.filter(enviar_a_todos=True).aggregate(ultima=Max('id'))['ultima']
+    if not ultima:
+        return
+
+    LecturaDifusiones.objects.filter(visibles_desde__lt=ultima).update(
+        visibles_desde=ultima, leidas_hasta=Greatest('leidas_hasta', ultima)
+    )
+    sin_marca = (
+        Residentes.objects.filter(lectura_difusiones__isnull=True)
+        .values_list('id', flat=True).order_by('id').iterator(chunk_size=TAMANO_LOTE)
+    )
+    lote = []
+    for residente_id in sin_marca:
+        lote.append(LecturaDifusiones(residente_id=residente_id, leidas_hasta=ultima, visibles_desde=ultima))
+        if len(lote) >= TAMANO_LOTE:
+            LecturaDifusiones.objects.bulk_create(lote, ignore_conflicts=True)
+            lote = []
+    if lote:
+        LecturaDifusiones.objects.bulk_create(lote, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comunidad', '0017_visibles_desde_difusiones'),
+    ]
+
+    operations = [
+        migrations.RunPython(iniciar_lecturas, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 from usuarios.models import Persona, Residentes
 from mantenimiento.models import AreaComun
 
@@ -86,6 +87,7 @@ class Notificacion(models.Model):
     enviar_a_todos = models.BooleanField(default=False)
     destinatarios = models.JSONField(default=dict, blank=True, help_text="Destinatarios específicos: {residentes: true, empleados: false, seguridad: true}")
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    total_lecturas = models.PositiveIntegerField(default=0, help_text="Lecturas confirmadas (LecturaComunicado), se actualiza al guardar las lecturas en lote")
     
     class Meta:
         ordering = ['-fecha']
@@ -107,13 +109,30 @@ class NotificacionResidente(models.Model):
         verbose_name = 'Notificación por Residente'
         verbose_name_plural = 'Notificaciones por Residente'
 
+class LecturaDifusiones(models.Model):
+    """Lecturas de las notificaciones para todos (enviar_a_todos) de un residente, ver services/bandeja.py"""
+    id = models.AutoField(primary_key=True)
+    residente = models.OneToOneField(Residentes, on_delete=models.CASCADE, related_name='lectura_difusiones')
+    leidas_hasta = models.IntegerField(default=0, help_text="Todas las difusiones con id menor o igual están leídas")
+    leidas = models.JSONField(default=dict, blank=True, help_text="Difusiones leídas por encima de la marca: {id: fecha_lectura}")
+    visibles_desde = models.IntegerField(default=0, help_text="Las difusiones con id menor o igual son de antes de que existiera el residente y no se muestran")
+    fecha_modificacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Lectura de Difusiones'
+        verbose_name_plural = 'Lecturas de Difusiones'
+
+    def __str__(self):
+        return f"Residente {self.residente_id} - leídas hasta {self.leidas_hasta}"
+
 class LecturaComunicado(models.Model):
     """Modelo para registrar lecturas de comunicados por cualquier tipo de usuario"""
     id = models.AutoField(primary_key=True)
     notificacion = models.ForeignKey(Notificacion, on_delete=models.CASCADE)
     usuario = models.ForeignKey('usuarios.Usuario', on_delete=models.CASCADE)
     rol = models.CharField(max_length=50, help_text="Rol del usuario al momento de la lectura")
-    fecha_lectura = models.DateTimeField(auto_now_add=True)
+    # La lectura se guarda en lote después de confirmada: la fecha viene de la confirmación
+    fecha_lectura = models.DateTimeField(default=timezone.now)
     
     class Meta:
         unique_together = ['notificacion', 'usuario']
@@ -226,3 +245,43 @@ def marcar_reserva_no_vista(sender, instance, created, **kwargs):
     if created:
         # La nueva reserva ya tiene vista_por_admin=False por defecto
         pass
+
+
+# Signal para refrescar la unidad de las placas de un residente en el índice de accesos
+@receiver(post_save, sender=ResidentesUnidad)
+@receiver(post_delete, sender=ResidentesUnidad)
+def refrescar_unidad_en_indice_placas(sender, instance, **kwargs):
+    """Cuando cambia la relación residente-unidad, actualizar sus placas en el índice"""
+    from usuarios.services.indice_placas import indice_placas
+    indice_placas.actualizar_residente(instance.id_residente_id)
+
+
+# Signal para mantener el total de difusiones de los contadores de no leídas
+@receiver(post_save, sender=Notificacion)
+def contar_difusion(sender, instance, created, **kwargs):
+    """Una notificación para todos suma 1 al total compartido; un cambio lo hace recontar"""
+    from comunidad.services import no_leidas
+    if created:
+        if instance.enviar_a_todos:
+            no_leidas.al_crear_difusion()
+    else:
+        no_leidas.recontar_difusiones()
+
+
+@receiver(post_delete, sender=Notificacion)
+def descontar_difusion(sender, instance, **kwargs):
+    """Al borrar una notificación para todos se resta del total compartido"""
+    from comunidad.services import no_leidas
+    if instance.enviar_a_todos:
+        no_leidas.al_crear_difusion(-1)
+
+
+# Signal para que un residente nuevo no reciba las difusiones enviadas antes de existir
+@receiver(post_save, sender=Residentes)
+def crear_lectura_difusiones(sender, instance, created, **kwargs):
+    """La bandeja del residente nuevo empieza después de la última difusión, que cuenta como leída"""
+    if created:
+        from comunidad.services import no_leidas
+        from comunidad.services.bandeja import iniciar_marca
+        iniciar_marca(instance)
+        no_leidas.recontar_usuario(instance.usuario_id)
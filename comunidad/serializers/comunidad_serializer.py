@@ -1,3 +1,4 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from comunidad.models import Unidad, ResidentesUnidad, Evento, Notificacion, NotificacionResidente, LecturaComunicado, Acta, Mascota, Reglamento, Reserva
 from mantenimiento.models import AreaComun
@@ -15,10 +16,69 @@ class UnidadSerializer(serializers.ModelSerializer):
     class Meta:
         model = Unidad
         fields = '__all__'
+
+    @staticmethod
+    def preparar_queryset(queryset):
+        """
+        Carga en lote lo que usan los campos calculados: relaciones activas (con
+        residente, persona, usuario y rol), sus vehículos activos y las mascotas
+        activas. Son tres consultas para toda la página además de la de unidades;
+        sin esto cada unidad hace sus propias consultas.
+        """
+        relaciones = (
+            ResidentesUnidad.objects.filter(estado=True)
+            .select_related('id_residente__persona', 'id_residente__usuario_asociado__rol')
+            .prefetch_related(Prefetch(
+                'id_residente__placas_vehiculo',
+                queryset=PlacaVehiculo.objects.filter(activo=True).order_by('id'),
+                to_attr='placas_activas',
+            ))
+            .order_by('id')
+        )
+        mascotas = Mascota.objects.filter(activo=True).select_related('residente__persona').order_by('id')
+        return queryset.prefetch_related(
+            Prefetch('residentesunidad_set', queryset=relaciones, to_attr='relaciones_activas'),
+            Prefetch('mascota_set', queryset=mascotas, to_attr='mascotas_activas'),
+        )
+
+    # Sin preparar_queryset (alta, edición) se cargan una vez por unidad y quedan en el objeto
+    def _relaciones(self, obj):
+        if not hasattr(obj, 'relaciones_activas'):
+            obj.relaciones_activas = list(
+                obj.residentesunidad_set.filter(estado=True)
+                .select_related('id_residente__persona', 'id_residente__usuario_asociado__rol')
+                .order_by('id')
+            )
+        return obj.relaciones_activas
+
+    def _mascotas(self, obj):
+        if not hasattr(obj, 'mascotas_activas'):
+            obj.mascotas_activas = list(
+                obj.mascota_set.filter(activo=True).select_related('residente__persona').order_by('id')
+            )
+        return obj.mascotas_activas
+
+    def _vehiculos(self, obj):
+        """Vehículos activos de los residentes activos de la unidad, sin repetir"""
+        if not hasattr(obj, 'vehiculos_activos'):
+            relaciones = self._relaciones(obj)
+            if all(hasattr(rel.id_residente, 'placas_activas') for rel in relaciones):
+                vehiculos = {
+                    vehiculo.id: vehiculo for rel in relaciones for vehiculo in rel.id_residente.placas_activas
+                }
+                obj.vehiculos_activos = [vehiculos[vehiculo_id] for vehiculo_id in sorted(vehiculos)]
+            else:
+                obj.vehiculos_activos = list(
+                    PlacaVehiculo.objects.filter(
+                        residente__residentesunidad__id_unidad=obj,
+                        residente__residentesunidad__estado=True,
+                        activo=True
+                    ).select_related('residente__persona').distinct().order_by('id')
+                )
+        return obj.vehiculos_activos
     
     def get_residentes_info(self, obj):
         """Obtener información detallada de residentes asociados"""
-        relaciones = obj.residentesunidad_set.filter(estado=True)
         return [
             {
                 'id': rel.id,
@@ -32,16 +92,15 @@ class UnidadSerializer(serializers.ModelSerializer):
                 'fecha_fin': rel.fecha_fin,
                 'estado': rel.estado
             }
-            for rel in relaciones
+            for rel in self._relaciones(obj)
         ]
     
     def get_propietario_info(self, obj):
         """Obtener información del propietario de la unidad"""
         try:
-            propietario_rel = obj.residentesunidad_set.filter(
-                estado=True, 
-                rol_en_unidad='propietario'
-            ).first()
+            propietario_rel = next(
+                (rel for rel in self._relaciones(obj) if rel.rol_en_unidad == 'propietario'), None
+            )
             
             if propietario_rel and propietario_rel.id_residente:
                 residente = propietario_rel.id_residente
@@ -79,7 +138,6 @@ class UnidadSerializer(serializers.ModelSerializer):
     
     def get_mascotas_info(self, obj):
         """Obtener información detallada de mascotas asociadas"""
-        mascotas = obj.mascota_set.filter(activo=True)
         return [
             {
                 'id': mascota.id,
@@ -94,18 +152,12 @@ class UnidadSerializer(serializers.ModelSerializer):
                 'fecha_registro': mascota.fecha_registro,
                 'activo': mascota.activo
             }
-            for mascota in mascotas
+            for mascota in self._mascotas(obj)
         ]
     
     def get_vehiculos_info(self, obj):
         """Obtener información de vehículos asociados a través de residentes"""
         try:
-            vehiculos = PlacaVehiculo.objects.filter(
-                residente__residentesunidad__id_unidad=obj,
-                residente__residentesunidad__estado=True,
-                activo=True
-            ).distinct()
-            
             return [
                 {
                     'id': vehiculo.id,
@@ -118,7 +170,7 @@ class UnidadSerializer(serializers.ModelSerializer):
                     'fecha_registro': vehiculo.fecha_registro,
                     'activo': vehiculo.activo
                 }
-                for vehiculo in vehiculos
+                for vehiculo in self._vehiculos(obj)
             ]
         except Exception as e:
             # Si hay algún error, retornar lista vacía
@@ -126,20 +178,16 @@ class UnidadSerializer(serializers.ModelSerializer):
     
     def get_total_residentes_real(self, obj):
         """Obtener el número real de residentes activos"""
-        return obj.residentesunidad_set.filter(estado=True).count()
+        return len(self._relaciones(obj))
     
     def get_total_mascotas_real(self, obj):
         """Obtener el número real de mascotas activas"""
-        return obj.mascota_set.filter(activo=True).count()
+        return len(self._mascotas(obj))
     
     def get_total_vehiculos_real(self, obj):
         """Obtener el número real de vehículos activos"""
         try:
-            return PlacaVehiculo.objects.filter(
-                residente__residentesunidad__id_unidad=obj,
-                residente__residentesunidad__estado=True,
-                activo=True
-            ).distinct().count()
+            return len(self._vehiculos(obj))
         except Exception as e:
             return 0
 
@@ -285,6 +333,7 @@ class NotificacionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notificacion
         fields = '__all__'
+        read_only_fields = ['total_lecturas']
         extra_kwargs = {
             'fecha': {'required': False},
             'prioridad': {'required': False},
@@ -0,0 +1,7 @@
+"""
+Servicios de comunidad - CU10
+"""
+
+from .notificaciones import NotificacionService
+
+__all__ = ['NotificacionService']
@@ -0,0 +1,163 @@
+"""
+Bandeja de notificaciones del residente - CU10
+Las notificaciones para todos (enviar_a_todos) se guardan una sola vez, sin un
+NotificacionResidente por residente: la bandeja las une al leer con las
+dirigidas al residente en una sola consulta (UNION) que se pagina en la base.
+Lo leído de esas difusiones se guarda por residente en LecturaDifusiones: una
+marca (toda difusión con id <= leidas_hasta está leída) más las leídas fuera de
+orden por encima de ella, que se compactan cada vez que la marca puede avanzar.
+Un residente nuevo no ve las difusiones anteriores a su alta (visibles_desde),
+igual que antes, cuando solo recibían fila los residentes que ya existían.
+En la bandeja una difusión aparece con el id de la notificación en negativo,
+así el cliente la lee y la marca con los mismos endpoints de siempre.
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import BooleanField, Case, DateTimeField, F, Max, Q, QuerySet, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from comunidad.models import LecturaDifusiones, Notificacion, NotificacionResidente
+from usuarios.models import Residentes
+
+logger = logging.getLogger(__name__)
+
+
+def difusiones() -> QuerySet:
+    """Notificaciones para todos los residentes"""
+    return Notificacion.objects.filter(enviar_a_todos=True)
+
+
+def es_difusion(entrada_id) -> bool:
+    """Los ids negativos de la bandeja corresponden a difusiones"""
+    try:
+        return int(entrada_id) < 0
+    except (TypeError, ValueError):
+        return False
+
+
+def marca_de(residente: Residentes) -> LecturaDifusiones:
+    """Marca de lectura del residente (sin guardar si todavía no leyó ninguna difusión)"""
+    marca = LecturaDifusiones.objects.filter(residente=residente).first()
+    return marca or LecturaDifusiones(residente=residente)
+
+
+def iniciar_marca(residente: Residentes) -> LecturaDifusiones:
+    """Marca de un residente nuevo: las difusiones que ya existen no se le muestran y cuentan como leídas"""
+    ultima = difusiones().aggregate(ultima=Max('id'))['ultima'] or 0
+    marca, _ = LecturaDifusiones.objects.get_or_create(
+        residente=residente, defaults={'leidas_hasta': ultima, 'visibles_desde': ultima}
+    )
+    return marca
+
+
+def condicion_leida(marca: LecturaDifusiones) -> Q:
+    """Filtro de las difusiones (Notificacion) que la marca da por leídas"""
+    condicion = Q(id__lte=marca.leidas_hasta)
+    if marca.leidas:
+        condicion |= Q(id__in=[int(notificacion_id) for notificacion_id in marca.leidas])
+    return condicion
+
+
+def bandeja(residente: Residentes, marca: Optional[LecturaDifusiones] = None) -> QuerySet:
+    """
+    Filas (id, notificacion_id, leido, fecha_lectura, fecha_notificacion) de las
+    notificaciones dirigidas al residente y de las difusiones, más recientes primero.
+    Una difusión que además tiene fila propia (envíos anteriores) aparece una sola vez.
+    """
+    marca = marca or marca_de(residente)
+    dirigidas = NotificacionResidente.objects.filter(residente=residente)
+    propias = dirigidas.annotate(fecha_notificacion=F('notificacion__fecha')).values_list(
+        'id', 'notificacion_id', 'leido', 'fecha_lectura', 'fecha_notificacion'
+    ).order_by()
+    generales = (
+        difusiones()
+        .filter(id__gt=marca.visibles_desde)
+        .exclude(id__in=dirigidas.values('notificacion_id'))
+        .annotate(
+            entrada=-F('id'),
+            entrada_notificacion=F('id'),
+            entrada_leido=Case(When(condicion_leida(marca), then=Value(True)), default=Value(False), output_field=BooleanField()),
+            entrada_fecha_lectura=Value(None, output_field=DateTimeField()),
+            fecha_notificacion=F('fecha'),
+        )
+        .values_list('entrada', 'entrada_notificacion', 'entrada_leido', 'entrada_fecha_lectura', 'fecha_notificacion')
+        .order_by()
+    )
+    return propias.union(generales, all=True).order_by('-fecha_notificacion', '-id')
+
+
+def entradas(filas: Iterable, residente: Residentes, marca: LecturaDifusiones) -> List[NotificacionResidente]:
+    """Filas de bandeja() como NotificacionResidente sin guardar, para el serializer de siempre"""
+    resultado = []
+    for entrada_id, notificacion_id, leido, fecha_lectura, _ in filas:
+        if entrada_id < 0:
+            fecha_lectura = _fecha_lectura(marca, notificacion_id)
+        resultado.append(NotificacionResidente(
+            id=entrada_id, notificacion_id=notificacion_id, residente=residente,
+            leido=leido, fecha_lectura=fecha_lectura,
+        ))
+    return resultado
+
+
+def _fecha_lectura(marca: LecturaDifusiones, notificacion_id: int):
+    # Por debajo de la marca solo se sabe que están leídas, no cuándo
+    fecha = marca.leidas.get(str(notificacion_id))
+    return parse_datetime(fecha) if fecha else None
+
+
+def entrada_difusion(residente: Residentes, entrada_id) -> NotificacionResidente:
+    """Entrada de bandeja de una difusión por su id negativo (DoesNotExist si no hay tal difusión)"""
+    notificacion_id = -int(entrada_id)
+    marca = marca_de(residente)
+    if notificacion_id <= marca.visibles_desde or not difusiones().filter(id=notificacion_id).exists():
+        raise NotificacionResidente.DoesNotExist
+    leido = notificacion_id <= marca.leidas_hasta or str(notificacion_id) in marca.leidas
+    return NotificacionResidente(
+        id=-notificacion_id, notificacion_id=notificacion_id, residente=residente,
+        leido=leido, fecha_lectura=_fecha_lectura(marca, notificacion_id),
+    )
+
+
+def marcar_difusion_leida(residente: Residentes, notificacion_id: int, fecha=None) -> bool:
+    """Marca una difusión como leída; retorna False si ya lo estaba"""
+    return bool(marcar_difusiones_leidas(residente.pk, {notificacion_id: fecha or timezone.now()}))
+
+
+def marcar_difusiones_leidas(residente_id: int, lecturas: Dict[int, datetime]) -> int:
+    """Marca varias difusiones {notificacion_id: fecha} como leídas; retorna cuántas no lo estaban"""
+    with transaction.atomic():
+        LecturaDifusiones.objects.get_or_create(residente_id=residente_id)
+        marca = LecturaDifusiones.objects.select_for_update().get(residente_id=residente_id)
+        nuevas = 0
+        for notificacion_id, fecha in lecturas.items():
+            if notificacion_id <= marca.leidas_hasta or str(notificacion_id) in marca.leidas:
+                continue
+            marca.leidas[str(notificacion_id)] = fecha.isoformat()
+            nuevas += 1
+        if nuevas:
+            _compactar(marca)
+            marca.save(update_fields=['leidas_hasta', 'leidas', 'fecha_modificacion'])
+    return nuevas
+
+
+def _compactar(marca: LecturaDifusiones):
+    """Avanza la marca mientras la siguiente difusión ya esté leída"""
+    siguientes = (
+        difusiones().filter(id__gt=marca.leidas_hasta).order_by('id')
+        .values_list('id', flat=True)[:len(marca.leidas) + 1]
+    )
+    for notificacion_id in siguientes:
+        if str(notificacion_id) not in marca.leidas:
+            break
+        marca.leidas_hasta = notificacion_id
+        del marca.leidas[str(notificacion_id)]
+    # Difusiones borradas por debajo de la marca ya no hacen falta
+    marca.leidas = {
+        notificacion_id: fecha for notificacion_id, fecha in marca.leidas.items()
+        if int(notificacion_id) > marca.leidas_hasta
+    }
@@ -0,0 +1,92 @@
+"""
+Envío masivo de notificaciones - CU10
+Los destinatarios se resuelven con una sola consulta (ids de residente, sin
+instanciar modelos) y los NotificacionResidente se insertan con bulk_create en
+lotes de TAMANO_LOTE dentro de la misma transacción que crea la notificación:
+avisar a 10.000 residentes son una consulta y diez INSERT, no 10.000.
+"""
+
+import logging
+from itertools import islice
+from typing import Dict, Iterable, Optional, Union
+
+from django.db import transaction
+from django.db.models import QuerySet
+
+from comunidad.models import Notificacion, NotificacionResidente, ResidentesUnidad
+from comunidad.services import no_leidas
+from usuarios.models import Residentes
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 1000
+
+
+def residentes_de_unidades(unidades: Union[QuerySet, Iterable[int]]) -> QuerySet:
+    """Ids de los residentes activos de las unidades (acepta un queryset de ids como subconsulta)"""
+    return (
+        ResidentesUnidad.objects.filter(id_unidad__in=unidades, estado=True)
+        .values_list('id_residente_id', flat=True)
+        .distinct()
+        .order_by()
+    )
+
+
+def residentes_activos() -> QuerySet:
+    """Ids de los residentes con al menos una unidad activa"""
+    return (
+        Residentes.objects.filter(residentesunidad__estado=True)
+        .values_list('id', flat=True)
+        .distinct()
+        .order_by()
+    )
+
+
+def _sin_repetidos(ids: Iterable[int]):
+    vistos = set()
+    for residente_id in ids:
+        if residente_id not in vistos:
+            vistos.add(residente_id)
+            yield residente_id
+
+
+def difundir(notificacion: Notificacion, residentes_ids: Union[QuerySet, Iterable[int]],
+             tamano_lote: Optional[int] = None) -> Dict:
+    """
+    Asigna la notificación a los residentes. `residentes_ids` puede ser un
+    queryset de ids (se lee con .iterator()) o cualquier iterable de ids.
+    Los que ya la tenían se omiten y no cuentan como destinatarios ni suman
+    a los contadores de no leídas. Retorna {'destinatarios', 'lotes'}.
+    """
+    tamano_lote = tamano_lote or TAMANO_LOTE
+    if isinstance(residentes_ids, QuerySet):
+        residentes_ids = residentes_ids.iterator(chunk_size=tamano_lote)
+    ids = _sin_repetidos(residentes_ids)
+
+    resultado = {'destinatarios': 0, 'lotes': 0}
+    with transaction.atomic():
+        # Una notificación recién creada no tiene filas: solo si ya tiene se filtra cada lote
+        asignadas = NotificacionResidente.objects.filter(notificacion=notificacion)
+        reenvio = asignadas.exists()
+        while True:
+            lote = list(islice(ids, tamano_lote))
+            if not lote:
+                break
+            if reenvio:
+                existentes = set(asignadas.filter(residente_id__in=lote).values_list('residente_id', flat=True))
+                lote = [residente_id for residente_id in lote if residente_id not in existentes]
+                if not lote:
+                    continue
+            NotificacionResidente.objects.bulk_create(
+                [NotificacionResidente(notificacion=notificacion, residente_id=residente_id) for residente_id in lote],
+                ignore_conflicts=True,
+            )
+            no_leidas.al_difundir(lote)
+            resultado['destinatarios'] += len(lote)
+            resultado['lotes'] += 1
+
+    logger.info(
+        f"Notificación {notificacion.pk} ({notificacion.tipo}) enviada a {resultado['destinatarios']} residentes "
+        f"en {resultado['lotes']} lotes"
+    )
+    return resultado
@@ -0,0 +1,294 @@
+"""
+Confirmaciones de lectura en lote - CU12
+Confirmar la lectura no escribe en la base: cada llamada (con una o muchas
+notificaciones) deja un lote en la caché, numerado con un contador compartido
+entre procesos, y suma al contador de lecturas de cada notificación. Un
+guardado periódico (cada LECTURAS_GRUPO_CONFIRMACIONES llamadas o
+LECTURAS_GRUPO_SEGUNDOS segundos, o `manage.py guardar_lecturas`) pasa los
+lotes pendientes a LecturaComunicado con bulk_create, marca como leídas las
+notificaciones de los residentes (NotificacionResidente.fecha_lectura o la marca
+de difusiones) y suma Notificacion.total_lecturas, todo en unas pocas consultas.
+"""
+
+import logging
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from comunidad.models import LecturaComunicado, Notificacion, NotificacionResidente
+from comunidad.services import no_leidas
+from comunidad.services.bandeja import marcar_difusiones_leidas
+from usuarios.models import Empleado, Residentes
+
+logger = logging.getLogger(__name__)
+
+CLAVE_SECUENCIA = 'comunidad:lecturas:secuencia'
+CLAVE_GUARDADAS = 'comunidad:lecturas:guardadas'
+CLAVE_DESDE = 'comunidad:lecturas:desde'
+CLAVE_BLOQUEO = 'comunidad:lecturas:bloqueo'
+CLAVE_FALTANTE = 'comunidad:lecturas:faltante'
+# Una confirmación repetida dentro de este plazo no genera otro registro
+DURACION_CONFIRMACION = 30 * 24 * 3600
+# El contador en caché se vuelve a leer de la base pasado este plazo
+DURACION_TOTAL = 3600
+DURACION_ROL = 3600
+DURACION_LOTE = 7 * 24 * 3600
+SEGUNDOS_BLOQUEO = 300
+LOTES_POR_GUARDADO = 500
+MAXIMO_POR_LLAMADA = 500
+
+
+def _clave_lote(numero: int) -> str:
+    return f'comunidad:lecturas:lote:{numero}'
+
+
+def _clave_total(notificacion_id: int) -> str:
+    return f'comunidad:lecturas:total:{notificacion_id}'
+
+
+def _siguiente_lote() -> int:
+    cache.add(CLAVE_SECUENCIA, 0, timeout=None)
+    try:
+        return cache.incr(CLAVE_SECUENCIA)
+    except ValueError:
+        # La clave expiró o se borró entre add e incr
+        cache.set(CLAVE_SECUENCIA, 1, timeout=None)
+        return 1
+
+
+def rol_de(usuario) -> str:
+    """Rol con que se registra la lectura (en caché para no consultar Empleado/Residentes en cada una)"""
+    clave = f'comunidad:lecturas:rol:{usuario.pk}'
+    rol = cache.get(clave)
+    if rol is None:
+        rol = 'usuario'
+        if getattr(usuario, 'rol', None):
+            rol = usuario.rol.nombre.lower()
+        else:
+            empleado = Empleado.objects.filter(usuario=usuario).first()
+            if empleado:
+                rol = empleado.cargo.lower()
+            elif Residentes.objects.filter(usuario_asociado=usuario).exists():
+                rol = 'residente'
+        cache.set(clave, rol, DURACION_ROL)
+    return rol
+
+
+def confirmar_lecturas(usuario, notificacion_ids: Iterable[int], fecha=None) -> Dict:
+    """
+    Registra en la caché la lectura de las notificaciones por el usuario.
+    Retorna {'rol', 'fecha_lectura', 'confirmadas', 'repetidas'} (listas de ids).
+    """
+    fecha = fecha or timezone.now()
+    confirmadas, repetidas = [], []
+    for notificacion_id in dict.fromkeys(notificacion_ids):
+        if cache.add(f'comunidad:lectura:{notificacion_id}:{usuario.pk}', 1, DURACION_CONFIRMACION):
+            confirmadas.append(notificacion_id)
+        else:
+            repetidas.append(notificacion_id)
+
+    rol = rol_de(usuario)
+    if confirmadas:
+        numero = _siguiente_lote()
+        cache.set(_clave_lote(numero), (usuario.pk, rol, fecha.isoformat(), confirmadas), DURACION_LOTE)
+        cache.add(CLAVE_DESDE, time.time(), timeout=None)
+        for notificacion_id in confirmadas:
+            try:
+                cache.incr(_clave_total(notificacion_id))
+            except ValueError:
+                # Sin contador en caché: se carga de la base en la próxima consulta
+                pass
+        if _toca_guardar(numero):
+            transaction.on_commit(guardar_lecturas)
+
+    return {'rol': rol, 'fecha_lectura': fecha, 'confirmadas': confirmadas, 'repetidas': repetidas}
+
+
+def _toca_guardar(numero: int) -> bool:
+    pendientes = numero - cache.get(CLAVE_GUARDADAS, 0)
+    if pendientes >= getattr(settings, 'LECTURAS_GRUPO_CONFIRMACIONES', 100):
+        return True
+    desde = cache.get(CLAVE_DESDE)
+    return desde is not None and time.time() - desde >= getattr(settings, 'LECTURAS_GRUPO_SEGUNDOS', 30)
+
+
+def totales_lecturas(notificacion_ids: Iterable[int]) -> Dict[int, int]:
+    """Lecturas confirmadas por notificación, del contador en caché o de Notificacion.total_lecturas"""
+    notificacion_ids = list(notificacion_ids)
+    en_cache = cache.get_many([_clave_total(notificacion_id) for notificacion_id in notificacion_ids])
+    totales = {}
+    faltantes = []
+    for notificacion_id in notificacion_ids:
+        total = en_cache.get(_clave_total(notificacion_id))
+        if total is None:
+            faltantes.append(notificacion_id)
+        else:
+            totales[notificacion_id] = total
+    if faltantes:
+        for notificacion_id, total in Notificacion.objects.filter(id__in=faltantes).values_list('id', 'total_lecturas'):
+            cache.add(_clave_total(notificacion_id), total, DURACION_TOTAL)
+            totales[notificacion_id] = total
+    return totales
+
+
+def pendientes() -> int:
+    """Lotes de confirmaciones que todavía no pasaron a la base"""
+    return max(cache.get(CLAVE_SECUENCIA, 0) - cache.get(CLAVE_GUARDADAS, 0), 0)
+
+
+def guardar_lecturas() -> int:
+    """Pasa a la base los lotes pendientes; retorna cuántas lecturas nuevas se guardaron"""
+    if not cache.add(CLAVE_BLOQUEO, 1, SEGUNDOS_BLOQUEO):
+        # Otro proceso está guardando
+        return 0
+    try:
+        total = 0
+        while True:
+            procesados, nuevas, completo = _guardar_tramo()
+            total += nuevas
+            if not (procesados and completo):
+                return total
+    finally:
+        cache.delete(CLAVE_BLOQUEO)
+
+
+def _guardar_tramo() -> Tuple[int, int, bool]:
+    """
+    Hasta LOTES_POR_GUARDADO lotes; retorna (lotes procesados, lecturas nuevas,
+    si se llegó al último sin encontrar un lote que todavía no está en la caché)
+    """
+    desde = cache.get(CLAVE_GUARDADAS, 0)
+    ultimo = min(cache.get(CLAVE_SECUENCIA, 0), desde + LOTES_POR_GUARDADO)
+    if ultimo <= desde:
+        cache.delete(CLAVE_DESDE)
+        return 0, 0, True
+
+    claves = [_clave_lote(numero) for numero in range(desde + 1, ultimo + 1)]
+    lotes = cache.get_many(claves)
+    lecturas = {}
+    hasta = desde
+    for numero, clave in enumerate(claves, start=desde + 1):
+        lote = lotes.get(clave)
+        if lote is None:
+            if cache.get(CLAVE_FALTANTE) != numero:
+                # Puede estar escribiéndose todavía: se retoma en el próximo guardado
+                cache.set(CLAVE_FALTANTE, numero, timeout=None)
+                break
+            logger.warning(f"Lote de lecturas {numero} perdido en la caché, se omite")
+        else:
+            usuario_id, rol, fecha, notificacion_ids = lote
+            for notificacion_id in notificacion_ids:
+                lecturas.setdefault((notificacion_id, usuario_id), (rol, parse_datetime(fecha)))
+        hasta = numero
+
+    nuevas = _guardar(lecturas) if lecturas else 0
+    cache.set(CLAVE_GUARDADAS, hasta, timeout=None)
+    cache.delete_many(claves[:hasta - desde])
+    logger.info(f"Lecturas guardadas: lotes {desde + 1}-{hasta}, {nuevas} nuevas")
+    return hasta - desde, nuevas, hasta == ultimo
+
+
+def _guardar(lecturas: Dict[Tuple[int, int], Tuple[str, object]]) -> int:
+    """lecturas = {(notificacion_id, usuario_id): (rol, fecha)}; retorna cuántas no estaban registradas"""
+    difusion = dict(
+        Notificacion.objects.filter(id__in={notificacion_id for notificacion_id, _ in lecturas})
+        .values_list('id', 'enviar_a_todos')
+    )
+    usuarios = set(
+        get_user_model().objects.filter(id__in={usuario_id for _, usuario_id in lecturas}).values_list('id', flat=True)
+    )
+    lecturas = {
+        clave: valor for clave, valor in lecturas.items() if clave[0] in difusion and clave[1] in usuarios
+    }
+    if not lecturas:
+        return 0
+
+    existentes = set(
+        LecturaComunicado.objects.filter(notificacion_id__in=difusion, usuario_id__in=usuarios)
+        .values_list('notificacion_id', 'usuario_id')
+    )
+    nuevas = [clave for clave in lecturas if clave not in existentes]
+
+    with transaction.atomic():
+        LecturaComunicado.objects.bulk_create(
+            [
+                LecturaComunicado(
+                    notificacion_id=notificacion_id, usuario_id=usuario_id,
+                    rol=lecturas[(notificacion_id, usuario_id)][0], fecha_lectura=lecturas[(notificacion_id, usuario_id)][1],
+                )
+                for notificacion_id, usuario_id in nuevas
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        # Un UPDATE por cada cantidad distinta de lecturas nuevas, no uno por notificación
+        por_cantidad = defaultdict(list)
+        for notificacion_id, cantidad in Counter(notificacion_id for notificacion_id, _ in nuevas).items():
+            por_cantidad[cantidad].append(notificacion_id)
+        for cantidad, notificacion_ids in por_cantidad.items():
+            Notificacion.objects.filter(id__in=notificacion_ids).update(total_lecturas=F('total_lecturas') + cantidad)
+
+        _marcar_leidas(lecturas, difusion, usuarios)
+    return len(nuevas)
+
+
+def _marcar_leidas(lecturas: Dict, difusion: Dict[int, bool], usuarios: set):
+    """Deja leídas las notificaciones de los residentes asociados a los usuarios que confirmaron"""
+    residentes_por_usuario = defaultdict(set)
+    # Dueño de la bandeja de cada residente, para los contadores de no leídas
+    usuario_bandeja = {}
+    filas = Residentes.objects.filter(Q(usuario_id__in=usuarios) | Q(usuario_asociado_id__in=usuarios))
+    for residente_id, usuario_id, asociado_id in filas.values_list('id', 'usuario_id', 'usuario_asociado_id'):
+        usuario_bandeja[residente_id] = usuario_id
+        for id_usuario in (usuario_id, asociado_id):
+            if id_usuario in usuarios:
+                residentes_por_usuario[id_usuario].add(residente_id)
+
+    por_residente = {}
+    for (notificacion_id, usuario_id), (_, fecha) in lecturas.items():
+        for residente_id in residentes_por_usuario.get(usuario_id, ()):
+            por_residente.setdefault((notificacion_id, residente_id), fecha)
+    if not por_residente:
+        return
+
+    con_fila = set()
+    leidas: List[NotificacionResidente] = []
+    dirigidas_leidas = Counter()
+    for fila in NotificacionResidente.objects.filter(
+        notificacion_id__in={notificacion_id for notificacion_id, _ in por_residente},
+        residente_id__in={residente_id for _, residente_id in por_residente},
+    ):
+        clave = (fila.notificacion_id, fila.residente_id)
+        if clave not in por_residente:
+            continue
+        con_fila.add(clave)
+        if not fila.leido or fila.fecha_lectura is None:
+            if not fila.leido:
+                dirigidas_leidas[fila.residente_id] += 1
+            fila.leido = True
+            fila.fecha_lectura = fila.fecha_lectura or por_residente[clave]
+            leidas.append(fila)
+    NotificacionResidente.objects.bulk_update(leidas, ['leido', 'fecha_lectura'], batch_size=1000)
+
+    # Difusiones sin fila propia: marca de lectura del residente
+    difusiones = defaultdict(dict)
+    for (notificacion_id, residente_id), fecha in por_residente.items():
+        if difusion[notificacion_id] and (notificacion_id, residente_id) not in con_fila:
+            difusiones[residente_id][notificacion_id] = fecha
+    difusiones_leidas = Counter()
+    for residente_id, leidas_residente in difusiones.items():
+        difusiones_leidas[residente_id] = marcar_difusiones_leidas(residente_id, leidas_residente)
+
+    for residente_id in set(dirigidas_leidas) | set(difusiones_leidas):
+        no_leidas.al_leer(
+            usuario_bandeja.get(residente_id),
+            dirigidas=dirigidas_leidas[residente_id], difusiones_leidas=difusiones_leidas[residente_id],
+        )
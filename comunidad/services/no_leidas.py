@@ -0,0 +1,142 @@
+"""
+Contadores de notificaciones no leídas - CU10
+El número del badge sale de la caché con un solo get_many de tres claves:
+  - dirigidas no leídas del usuario (NotificacionResidente con leido=False),
+  - difusiones que el usuario ya no tiene pendientes (leídas o con fila propia),
+  - total de difusiones, compartido por todos (una difusión suma 1 a una sola clave).
+No leídas = dirigidas + total de difusiones - difusiones vistas. Los contadores
+se ajustan al difundir y al leer; si falta alguno (o vence DURACION_CONTADOR,
+lo que corrige cualquier desvío) se recalcula desde la base y se vuelve a cargar.
+Se guardan por usuario porque la bandeja es la del residente con ese usuario.
+"""
+
+import logging
+from typing import Dict, Iterable, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from comunidad.models import NotificacionResidente
+from comunidad.services.bandeja import condicion_leida, difusiones, marca_de
+from usuarios.models import Residentes
+
+logger = logging.getLogger(__name__)
+
+CLAVE_DIFUSIONES = 'comunidad:no_leidas:difusiones'
+DURACION_CONTADOR = 24 * 3600
+
+
+def _clave_dirigidas(usuario_id: int) -> str:
+    return f'comunidad:no_leidas:usuario:{usuario_id}'
+
+
+def _clave_vistas(usuario_id: int) -> str:
+    return f'comunidad:no_leidas:usuario:{usuario_id}:difusiones'
+
+
+def _sumar(clave: str, cantidad: int):
+    """Ajusta un contador que esté en caché; si no está, se recalcula en la próxima consulta"""
+    if not cantidad:
+        return
+    try:
+        if cantidad > 0:
+            cache.incr(clave, cantidad)
+        else:
+            cache.decr(clave, -cantidad)
+    except ValueError:
+        pass
+
+
+def no_leidas(usuario) -> int:
+    """No leídas de la bandeja del usuario: una lectura de caché (o el recálculo en la base)"""
+    return no_leidas_usuario(usuario.pk)
+
+
+def no_leidas_usuario(usuario_id: int) -> int:
+    claves = [_clave_dirigidas(usuario_id), _clave_vistas(usuario_id), CLAVE_DIFUSIONES]
+    valores = cache.get_many(claves)
+    if len(valores) < len(claves):
+        valores = _recalcular(usuario_id, faltantes=[clave for clave in claves if clave not in valores], valores=valores)
+    dirigidas, vistas, total = (valores[clave] for clave in claves)
+    return max(dirigidas, 0) + max(total - vistas, 0)
+
+
+def no_leidas_residente(residente: Residentes) -> int:
+    """No leídas de la bandeja de un residente"""
+    if residente.usuario_id:
+        return no_leidas_usuario(residente.usuario_id)
+    dirigidas, vistas = _contar(residente)
+    return dirigidas + max(_total_difusiones() - vistas, 0)
+
+
+def _total_difusiones() -> int:
+    total = cache.get(CLAVE_DIFUSIONES)
+    if total is None:
+        total = difusiones().count()
+        cache.add(CLAVE_DIFUSIONES, total, timeout=None)
+    return total
+
+
+def _contar(residente: Optional[Residentes]):
+    """(dirigidas no leídas, difusiones vistas) del residente, desde la base"""
+    if residente is None:
+        return 0, 0
+    filas = NotificacionResidente.objects.filter(residente=residente)
+    dirigidas = filas.filter(leido=False).count()
+    vistas = difusiones().filter(condicion_leida(marca_de(residente)) | Q(id__in=filas.values('notificacion_id'))).count()
+    return dirigidas, vistas
+
+
+def _recalcular(usuario_id: int, faltantes: Iterable[str], valores: Dict) -> Dict:
+    valores = dict(valores)
+    if CLAVE_DIFUSIONES in faltantes:
+        valores[CLAVE_DIFUSIONES] = _total_difusiones()
+    if _clave_dirigidas(usuario_id) in faltantes or _clave_vistas(usuario_id) in faltantes:
+        # Las dos juntas: salen de la misma foto de la base
+        residente = Residentes.objects.filter(usuario_id=usuario_id).first()
+        dirigidas, vistas = _contar(residente)
+        valores[_clave_dirigidas(usuario_id)] = dirigidas
+        valores[_clave_vistas(usuario_id)] = vistas
+        cache.set_many({_clave_dirigidas(usuario_id): dirigidas, _clave_vistas(usuario_id): vistas}, DURACION_CONTADOR)
+    return valores
+
+
+def al_difundir(residentes_ids: Iterable[int]):
+    """Una notificación dirigida más para cada uno de estos residentes"""
+    usuarios = list(
+        Residentes.objects.filter(id__in=list(residentes_ids), usuario__isnull=False)
+        .values_list('usuario_id', flat=True)
+    )
+
+    def sumar():
+        for usuario_id in usuarios:
+            _sumar(_clave_dirigidas(usuario_id), 1)
+    transaction.on_commit(sumar)
+
+
+def al_crear_difusion(cantidad: int = 1):
+    """Suma (o resta) difusiones al total compartido"""
+    transaction.on_commit(lambda: _sumar(CLAVE_DIFUSIONES, cantidad))
+
+
+def recontar_difusiones():
+    """El total compartido se vuelve a contar en la base en la próxima consulta"""
+    transaction.on_commit(lambda: cache.delete(CLAVE_DIFUSIONES))
+
+
+def recontar_usuario(usuario_id: Optional[int]):
+    """Los contadores del usuario se vuelven a calcular en la base en la próxima consulta"""
+    if usuario_id:
+        transaction.on_commit(lambda: cache.delete_many([_clave_dirigidas(usuario_id), _clave_vistas(usuario_id)]))
+
+
+def al_leer(usuario_id: Optional[int], dirigidas: int = 0, difusiones_leidas: int = 0):
+    """`dirigidas` notificaciones dirigidas pasaron a leídas (negativo: a no leídas) y `difusiones_leidas` difusiones"""
+    if not usuario_id:
+        return
+
+    def sumar():
+        _sumar(_clave_dirigidas(usuario_id), -dirigidas)
+        _sumar(_clave_vistas(usuario_id), difusiones_leidas)
+    transaction.on_commit(sumar)
@@ -1,7 +1,12 @@
+import logging
+
+from django.db.models import QuerySet
 from django.utils import timezone
 from django.db import transaction
-from .models import Notificacion, NotificacionResidente
-from usuarios.models import Residentes
+from comunidad.models import Notificacion
+from comunidad.services.difusion import difundir, residentes_activos, residentes_de_unidades
+
+logger = logging.getLogger(__name__)
 
 class NotificacionService:
     """Servicio para gestionar notificaciones automáticas"""
@@ -41,22 +46,18 @@ class NotificacionService:
                     enviar_a_todos=False
                 )
                 
-                # Enviar a residentes específicos
-                residentes_notificados = 0
-                for cuota_unidad in cuotas_unidad:
-                    if cuota_unidad.unidad.residentes.exists():
-                        residentes = cuota_unidad.unidad.residentes.filter(estado=True)
-                        for residente_unidad in residentes:
-                            NotificacionResidente.objects.create(
-                                notificacion=notificacion,
-                                residente=residente_unidad.id_residente
-                            )
-                            residentes_notificados += 1
+                # Residentes activos de las unidades con cuota, en una consulta y un INSERT por lote
+                if isinstance(cuotas_unidad, QuerySet):
+                    unidades = cuotas_unidad.values('unidad_id')
+                else:
+                    unidades = {cuota_unidad.unidad_id for cuota_unidad in cuotas_unidad}
+                envio = difundir(notificacion, residentes_de_unidades(unidades))
+                notificacion.destinatarios_notificados = envio['destinatarios']
                 
-                print(f"Notificación de cuota enviada a {residentes_notificados} residentes")
+                logger.info(f"Notificación de cuota enviada a {envio['destinatarios']} residentes")
                 return notificacion
         except Exception as e:
-            print(f"Error creando notificación de cuota: {e}")
+            logger.error(f"Error creando notificación de cuota: {e}")
             return None
     
     @staticmethod
@@ -84,15 +85,12 @@ class NotificacionService:
                     enviar_a_todos=False
                 )
                 
-                # Enviar solo al residente específico
-                NotificacionResidente.objects.create(
-                    notificacion=notificacion,
-                    residente=multa.residente
-                )
+                # Enviar solo al residente específico (difundir también ajusta su contador de no leídas)
+                difundir(notificacion, [multa.residente_id])
                 
                 return notificacion
         except Exception as e:
-            print(f"Error creando notificación de multa: {e}")
+            logger.error(f"Error creando notificación de multa: {e}")
             return None
     
     @staticmethod
@@ -106,26 +104,17 @@ class NotificacionService:
                     fecha=timezone.now(),
                     tipo=tipo,
                     prioridad=prioridad,
-                    enviar_a_todos=residentes_ids is None
+                    enviar_a_todos=not residentes_ids
                 )
                 
                 if residentes_ids:
-                    # Enviar a residentes específicos
-                    for residente_id in residentes_ids:
-                        NotificacionResidente.objects.create(
-                            notificacion=notificacion,
-                            residente_id=residente_id
-                        )
+                    envio = difundir(notificacion, residentes_ids)
+                    notificacion.destinatarios_notificados = envio['destinatarios']
                 else:
-                    # Enviar a todos los residentes
-                    residentes = Residentes.objects.filter(activo=True)
-                    for residente in residentes:
-                        NotificacionResidente.objects.create(
-                            notificacion=notificacion,
-                            residente=residente
-                        )
+                    # Para todos: una sola fila, las bandejas la incluyen al leer (ver bandeja.py)
+                    notificacion.destinatarios_notificados = residentes_activos().count()
                 
                 return notificacion
         except Exception as e:
-            print(f"Error creando notificación general: {e}")
+            logger.error(f"Error creando notificación general: {e}")
             return None
@@ -1,10 +1,13 @@
 from django.test import TestCase
 from .models import Unidad, Evento, Reserva, Notificacion
-from usuarios.models import Persona, Residentes, User
+from usuarios.models import Persona, Residentes
+from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
 
+User = get_user_model()
+
 class ComunidadModelTest(TestCase):
     """Tests para los modelos de comunidad"""
 
@@ -133,3 +136,428 @@ class ComunidadAPITest(APITestCase):
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class DifusionNotificacionesTest(APITestCase):
+    """Envío de notificaciones con destinatarios resueltos en una consulta e INSERT por lotes"""
+
+    def setUp(self):
+        from datetime import date
+        from comunidad.models import ResidentesUnidad
+
+        self.unidades = []
+        self.residentes = []
+        for numero in range(6):
+            unidad = Unidad.objects.create(numero_casa=f'C-{numero}', metros_cuadrados=80)
+            residente = Residentes.objects.create(persona=Persona.objects.create(nombre=f'Residente {numero}'))
+            # La última asignación está dada de baja
+            ResidentesUnidad.objects.create(
+                id_residente=residente, id_unidad=unidad, fecha_inicio=date(2024, 1, 1), estado=numero < 5
+            )
+            self.unidades.append(unidad)
+            self.residentes.append(residente)
+        # Un residente en dos unidades recibe una sola notificación
+        ResidentesUnidad.objects.create(
+            id_residente=self.residentes[0], id_unidad=self.unidades[1], fecha_inicio=date(2024, 1, 1)
+        )
+
+    def test_notificacion_de_cuota_en_lotes(self):
+        from datetime import date
+        from decimal import Decimal
+        from unittest import mock
+        from comunidad.models import NotificacionResidente
+        from comunidad.services import NotificacionService
+        from comunidad.services import difusion
+        from finanzas.models import CuotaMensual, CuotaUnidad
+
+        usuario = User.objects.create_user(username='admin_difusion', password='testpass123')
+        cuota = CuotaMensual.objects.create(
+            mes_año='2025-10', monto_total=Decimal('600'), fecha_limite=date(2025, 10, 31), creado_por=usuario
+        )
+        for unidad in self.unidades[:5] + [self.unidades[5]]:
+            CuotaUnidad.objects.create(cuota_mensual=cuota, unidad=unidad, monto=Decimal('100'), fecha_limite=cuota.fecha_limite)
+
+        # Monto por unidad (2), notificación, si ya tenía filas, destinatarios, dos lotes de INSERT
+        # con los usuarios de cada lote (contadores de no leídas), más 4 de savepoints
+        with self.assertNumQueries(13), mock.patch.object(difusion, 'TAMANO_LOTE', 3):
+            notificacion = NotificacionService.crear_notificacion_cuota(
+                cuota, CuotaUnidad.objects.filter(cuota_mensual=cuota)
+            )
+        self.assertEqual(notificacion.destinatarios_notificados, 5)
+        self.assertEqual(
+            set(NotificacionResidente.objects.filter(notificacion=notificacion).values_list('residente_id', flat=True)),
+            {residente.id for residente in self.residentes[:5]},
+        )
+
+    def test_notificacion_general_a_residentes_activos(self):
+        from comunidad.services import NotificacionService
+
+        notificacion = NotificacionService.crear_notificacion_general('Corte de agua', 'Mañana de 8 a 12')
+        self.assertTrue(notificacion.enviar_a_todos)
+        self.assertEqual(notificacion.destinatarios_notificados, 5)
+
+        notificacion = NotificacionService.crear_notificacion_general(
+            'Reunión', 'Bloque C', residentes_ids=[self.residentes[5].id, self.residentes[5].id]
+        )
+        self.assertEqual(notificacion.destinatarios_notificados, 1)
+
+    def test_reenvio_solo_cuenta_los_nuevos(self):
+        from unittest import mock
+        from django.utils import timezone
+        from comunidad.services import difusion
+
+        notificacion = Notificacion.objects.create(titulo='Aviso', contenido='...', fecha=timezone.now(), tipo='comunicado')
+        difusion.difundir(notificacion, [self.residentes[0].id])
+        with mock.patch.object(difusion.no_leidas, 'al_difundir') as al_difundir:
+            envio = difusion.difundir(notificacion, [residente.id for residente in self.residentes[:3]], tamano_lote=1)
+
+        self.assertEqual(envio['destinatarios'], 2)
+        self.assertEqual([llamada.args[0] for llamada in al_difundir.call_args_list], [[self.residentes[1].id], [self.residentes[2].id]])
+
+
+class BandejaNotificacionesTest(APITestCase):
+    """Notificaciones para todos guardadas una vez y unidas a la bandeja de cada residente al leer"""
+
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from comunidad.models import NotificacionResidente
+        from usuarios.models import Roles
+
+        self.usuario = User.objects.create_user(username='residente_bandeja', password='testpass123')
+        self.residente = Residentes.objects.create(persona=Persona.objects.create(nombre='Residente'), usuario=self.usuario)
+        self.otro = Residentes.objects.create(persona=Persona.objects.create(nombre='Vecino'))
+        self.admin = User.objects.create_user(
+            username='admin_bandeja', password='testpass123', rol=Roles.objects.create(nombre='Administrador')
+        )
+
+        inicio = timezone.now() - timedelta(days=10)
+        self.dirigida = Notificacion.objects.create(
+            titulo='Tu multa', contenido='...', fecha=inicio, tipo='multa'
+        )
+        NotificacionResidente.objects.create(notificacion=self.dirigida, residente=self.residente)
+        self.generales = [
+            Notificacion.objects.create(
+                titulo=f'General {dia}', contenido='...', fecha=inicio + timedelta(days=dia),
+                tipo='comunicado', enviar_a_todos=True
+            )
+            for dia in range(1, 4)
+        ]
+        self.url = reverse('notificacionresidente-list')
+
+    def _detalle(self, notificacion):
+        return reverse('notificacionresidente-detail', args=[-notificacion.id])
+
+    def test_bandeja_une_difusiones_y_marca_lecturas(self):
+        from comunidad.models import LecturaDifusiones, NotificacionResidente
+
+        self.client.force_authenticate(user=self.usuario)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(
+            [fila['notificacion'] for fila in response.data['results']],
+            [n.id for n in reversed(self.generales)] + [self.dirigida.id],
+        )
+        self.assertEqual(response.data['results'][0]['id'], -self.generales[2].id)
+        self.assertFalse(any(fila['leido'] for fila in response.data['results']))
+
+        # Leída fuera de orden: queda por encima de la marca
+        response = self.client.patch(self._detalle(self.generales[1]), {'leido': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertTrue(response.data['leido'])
+        self.assertIsNotNone(response.data['fecha_lectura'])
+        marca = LecturaDifusiones.objects.get(residente=self.residente)
+        self.assertEqual((marca.leidas_hasta, list(marca.leidas)), (0, [str(self.generales[1].id)]))
+
+        # Al leer la primera la marca avanza y se compacta
+        self.client.patch(self._detalle(self.generales[0]), {'leido': True}, format='json')
+        marca.refresh_from_db()
+        self.assertEqual((marca.leidas_hasta, marca.leidas), (self.generales[1].id, {}))
+
+        response = self.client.get(self.url)
+        leidas = {fila['notificacion']: fila['leido'] for fila in response.data['results']}
+        self.assertEqual(leidas, {
+            self.generales[2].id: False, self.generales[1].id: True, self.generales[0].id: True, self.dirigida.id: False
+        })
+        response = self.client.patch(self._detalle(self.generales[0]), {'leido': False}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self._detalle(self.generales[2])).data['leido'], False)
+        # Ninguna difusión generó filas por residente
+        self.assertEqual(NotificacionResidente.objects.count(), 1)
+
+    def test_broadcast_guarda_una_sola_notificacion(self):
+        from comunidad.models import NotificacionResidente
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(
+            reverse('notificacion-broadcast'), {'titulo': 'Corte de luz', 'contenido': 'Sábado'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['asignados'], 2)
+        self.assertTrue(Notificacion.objects.get(id=response.data['notificacion_id']).enviar_a_todos)
+        self.assertEqual(NotificacionResidente.objects.count(), 1)
+
+        self.client.force_authenticate(user=self.usuario)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['notificacion'], response.data['results'][0]['id'] * -1)
+        self.assertEqual(response.data['count'], 5)
+
+    def test_residente_nuevo_no_hereda_difusiones_anteriores(self):
+        from comunidad.services.no_leidas import no_leidas
+
+        usuario = User.objects.create_user(username='recien_llegado', password='testpass123')
+        with self.captureOnCommitCallbacks(execute=True):
+            Residentes.objects.create(persona=Persona.objects.create(nombre='Nuevo'), usuario=usuario)
+        self.client.force_authenticate(user=usuario)
+        self.assertEqual(self.client.get(self.url).data['count'], 0)
+        self.assertEqual(self.client.get(self._detalle(self.generales[0])).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(no_leidas(usuario), 0)
+
+        posterior = Notificacion.objects.create(
+            titulo='Nueva', contenido='...', fecha=self.generales[2].fecha, tipo='comunicado', enviar_a_todos=True
+        )
+        self.assertEqual([fila['notificacion'] for fila in self.client.get(self.url).data['results']], [posterior.id])
+
+
+class LecturasEnLoteTest(APITestCase):
+    """Confirmaciones de lectura en caché, guardadas en la base en lote"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from django.utils import timezone
+        from comunidad.models import NotificacionResidente
+
+        cache.clear()
+        self.usuario = User.objects.create_user(username='lector', password='testpass123')
+        self.residente = Residentes.objects.create(
+            persona=Persona.objects.create(nombre='Lector'), usuario=self.usuario, usuario_asociado=self.usuario
+        )
+        self.dirigida = Notificacion.objects.create(titulo='Tu cuota', contenido='...', fecha=timezone.now(), tipo='cuota')
+        NotificacionResidente.objects.create(notificacion=self.dirigida, residente=self.residente)
+        self.general = Notificacion.objects.create(
+            titulo='Asamblea', contenido='...', fecha=timezone.now(), tipo='comunicado', enviar_a_todos=True
+        )
+        self.otra = Notificacion.objects.create(titulo='Piscina', contenido='...', fecha=timezone.now(), tipo='evento')
+        self.client.force_authenticate(user=self.usuario)
+
+    def test_confirmar_varias_y_guardar_en_lote(self):
+        from comunidad.models import LecturaComunicado, LecturaDifusiones, NotificacionResidente
+        from comunidad.services.lecturas import guardar_lecturas
+
+        url = reverse('notificacion-confirmar-lecturas')
+        response = self.client.post(url, {'notificaciones': [self.dirigida.id, self.general.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['rol'], 'residente')
+        self.assertEqual(response.data['confirmadas'], [self.dirigida.id, self.general.id])
+
+        # Rol en caché: confirmar no toca la base
+        with self.assertNumQueries(0):
+            response = self.client.post(url, {'notificaciones': [self.general.id, self.otra.id]}, format='json')
+        self.assertEqual(response.data['repetidas'], [self.general.id])
+        self.assertFalse(LecturaComunicado.objects.exists())
+
+        self.assertEqual(guardar_lecturas(), 3)
+        self.assertEqual(
+            set(LecturaComunicado.objects.filter(usuario=self.usuario).values_list('notificacion_id', 'rol')),
+            {(self.dirigida.id, 'residente'), (self.general.id, 'residente'), (self.otra.id, 'residente')},
+        )
+        fila = NotificacionResidente.objects.get(notificacion=self.dirigida, residente=self.residente)
+        self.assertTrue(fila.leido)
+        self.assertIsNotNone(fila.fecha_lectura)
+        self.assertEqual(LecturaDifusiones.objects.get(residente=self.residente).leidas_hasta, self.general.id)
+        self.general.refresh_from_db()
+        self.assertEqual(self.general.total_lecturas, 1)
+        # Nada pendiente: un segundo guardado no escribe
+        self.assertEqual(guardar_lecturas(), 0)
+
+    def test_lecturas_confirmadas_desde_el_contador(self):
+        otro = User.objects.create_user(username='otro_lector', password='testpass123')
+        detalle = reverse('notificacion-lecturas-confirmadas', args=[self.general.id])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(detalle, {'resumen': 'true'})
+        self.assertEqual(response.data['total_lecturas'], 0)
+
+        response = self.client.post(reverse('notificacion-confirmar-lectura', args=[self.general.id]))
+        self.assertTrue(response.data['created'])
+        self.client.force_authenticate(user=otro)
+        self.client.post(reverse('notificacion-confirmar-lectura', args=[self.general.id]))
+        self.assertFalse(self.client.post(reverse('notificacion-confirmar-lectura', args=[self.general.id])).data['created'])
+
+        # El contador en caché ya cuenta las confirmaciones aunque no estén guardadas
+        with self.assertNumQueries(0):
+            response = self.client.get(detalle, {'resumen': 'true'})
+        self.assertEqual(response.data['total_lecturas'], 2)
+
+        # El detalle guarda lo pendiente antes de listar
+        response = self.client.get(detalle)
+        self.assertEqual(len(response.data), 2)
+        self.general.refresh_from_db()
+        self.assertEqual(self.general.total_lecturas, 2)
+
+
+class NoLeidasTest(APITestCase):
+    """Contadores de no leídas en caché, ajustados al difundir y al leer"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from django.utils import timezone
+
+        cache.clear()
+        self.usuario = User.objects.create_user(username='badge', password='testpass123')
+        self.residente = Residentes.objects.create(
+            persona=Persona.objects.create(nombre='Con badge'), usuario=self.usuario, usuario_asociado=self.usuario
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.generales = [
+                Notificacion.objects.create(
+                    titulo=f'General {numero}', contenido='...', fecha=timezone.now(), tipo='comunicado',
+                    enviar_a_todos=True
+                )
+                for numero in range(2)
+            ]
+        self.url = reverse('notificacion-unread-count')
+        self.client.force_authenticate(user=self.usuario)
+
+    def _no_leidas(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['no_leidas']
+
+    def _dirigida(self):
+        from comunidad.services import NotificacionService
+        with self.captureOnCommitCallbacks(execute=True):
+            return NotificacionService.crear_notificacion_general(
+                'Tu reserva', 'Confirmada', residentes_ids=[self.residente.id]
+            )
+
+    def test_contador_al_difundir_y_al_leer(self):
+        from django.core.cache import cache
+        from django.utils import timezone
+        from backend_condominio_a.utils import DatabaseQueryOptimizer
+        from comunidad.models import NotificacionResidente
+        from comunidad.services.lecturas import guardar_lecturas
+
+        dirigida = self._dirigida()
+        self.assertEqual(self._no_leidas(), 3)
+        # Con los contadores cargados, el badge no consulta la base
+        with self.assertNumQueries(0):
+            self.assertEqual(self._no_leidas(), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notificacion.objects.create(
+                titulo='General 3', contenido='...', fecha=timezone.now(), tipo='comunicado', enviar_a_todos=True
+            )
+        otra = self._dirigida()
+        with self.assertNumQueries(0):
+            self.assertEqual(self._no_leidas(), 5)
+
+        # Leer en la bandeja: una difusión y una dirigida
+        fila = NotificacionResidente.objects.get(notificacion=dirigida)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse('notificacionresidente-detail', args=[-self.generales[0].id]), {'leido': True}, format='json'
+            )
+            self.client.patch(reverse('notificacionresidente-detail', args=[fila.id]), {'leido': True}, format='json')
+        self.assertEqual(self._no_leidas(), 3)
+
+        # Confirmar la lectura (guardada en lote) también descuenta
+        self.client.post(
+            reverse('notificacion-confirmar-lecturas'), {'notificaciones': [otra.id, self.generales[1].id]}, format='json'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            guardar_lecturas()
+        self.assertEqual(self._no_leidas(), 1)
+
+        # Lo mismo recalculado desde la base
+        cache.clear()
+        self.assertEqual(self._no_leidas(), 1)
+        self.assertEqual(DatabaseQueryOptimizer.get_dashboard_data(self.usuario)['mis_notificaciones'], 1)
+
+    def test_notificacion_de_multa_suma_al_contador(self):
+        from datetime import date
+        from decimal import Decimal
+        from types import SimpleNamespace
+        from comunidad.services import NotificacionService
+
+        self.assertEqual(self._no_leidas(), 2)
+        multa = SimpleNamespace(
+            reglamento=None, motivo='Ruido', monto=Decimal('150'), fecha_emision=date(2025, 10, 1),
+            fecha_vencimiento=date(2025, 10, 31), observaciones='', residente_id=self.residente.id
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNotNone(NotificacionService.crear_notificacion_multa(multa))
+        with self.assertNumQueries(0):
+            self.assertEqual(self._no_leidas(), 3)
+
+
+class UnidadListadoTest(APITestCase):
+    """Listado de unidades con residentes, mascotas y vehículos cargados en lote"""
+
+    def setUp(self):
+        from usuarios.models import Roles
+
+        self.admin = User.objects.create_user(
+            username='admin_unidades', password='testpass123', rol=Roles.objects.create(nombre='Administrador')
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.rol_residente = Roles.objects.create(nombre='Residente')
+        self.url = reverse('unidad-list')
+
+    def _unidades(self, desde, cantidad):
+        from datetime import date
+        from comunidad.models import Mascota, ResidentesUnidad
+        from usuarios.models import PlacaVehiculo
+
+        for numero in range(desde, desde + cantidad):
+            unidad = Unidad.objects.create(numero_casa=f'U-{numero:03d}', metros_cuadrados=90)
+            usuario = User.objects.create_user(username=f'propietario{numero}', rol=self.rol_residente)
+            propietario = Residentes.objects.create(
+                persona=Persona.objects.create(nombre=f'Propietario {numero}'), usuario_asociado=usuario
+            )
+            inquilino = Residentes.objects.create(persona=Persona.objects.create(nombre=f'Inquilino {numero}'))
+            ResidentesUnidad.objects.create(
+                id_residente=propietario, id_unidad=unidad, rol_en_unidad='propietario', fecha_inicio=date(2024, 1, 1)
+            )
+            ResidentesUnidad.objects.create(id_residente=inquilino, id_unidad=unidad, fecha_inicio=date(2024, 1, 1))
+            # Relación dada de baja: ni el residente ni su vehículo cuentan
+            antiguo = Residentes.objects.create(persona=Persona.objects.create(nombre=f'Antiguo {numero}'))
+            ResidentesUnidad.objects.create(
+                id_residente=antiguo, id_unidad=unidad, fecha_inicio=date(2023, 1, 1), estado=False
+            )
+            PlacaVehiculo.objects.create(residente=antiguo, placa=f'OLD{numero:03d}', marca='A', modelo='B', color='C')
+            PlacaVehiculo.objects.create(residente=propietario, placa=f'PRO{numero:03d}', marca='A', modelo='B', color='C')
+            PlacaVehiculo.objects.create(
+                residente=inquilino, placa=f'INQ{numero:03d}', marca='A', modelo='B', color='C', activo=False
+            )
+            Mascota.objects.create(nombre='Firulais', tipo='perro', residente=inquilino, unidad=unidad)
+            Mascota.objects.create(nombre='Michi', tipo='gato', residente=inquilino, unidad=unidad, activo=False)
+
+    def test_listado_en_consultas_fijas_y_mismo_contenido(self):
+        from comunidad.serializers.comunidad_serializer import UnidadSerializer
+
+        self._unidades(0, 3)
+        # Conteo, unidades, relaciones activas (con residente, persona, usuario y rol), vehículos y mascotas
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self._unidades(3, 6)
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 9)
+
+        unidad = response.data['results'][0]
+        self.assertEqual(unidad['total_residentes_real'], 2)
+        self.assertEqual(unidad['total_mascotas_real'], 1)
+        self.assertEqual([v['placa'] for v in unidad['vehiculos_info']], ['PRO000'])
+        self.assertEqual(unidad['propietario_info']['username'], 'propietario0')
+        self.assertEqual(unidad['propietario_info']['rol'], 'Residente')
+
+        # Igual que serializando unidad por unidad sin la carga en lote
+        sueltas = UnidadSerializer(Unidad.objects.all(), many=True).data
+        self.assertEqual(response.data['results'], sueltas)
+
+        response = self.client.get(reverse('unidad-detalle-completo', args=[unidad['id']]))
+        self.assertEqual([v['placa'] for v in response.data['vehiculos']], ['PRO000'])
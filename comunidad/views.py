@@ -1,3 +1,4 @@
+from django.http import Http404
 from django.shortcuts import render
 from django.utils import timezone
 
@@ -12,6 +13,7 @@ from comunidad.serializers.comunidad_serializer import (
     NotificacionResidenteSerializer, LecturaComunicadoSerializer, ActaSerializer, MascotaSerializer, ReglamentoSerializer,
     ReservaSerializer
 )
+from comunidad.services import bandeja, lecturas, no_leidas
 from usuarios.models import Empleado
 from django.db.models import Q
 from usuarios.models import PlacaVehiculo
@@ -67,7 +69,7 @@ class NotificacionPermiso(permissions.BasePermission):
             return False
         
         # Para acciones específicas como confirmar_lectura, permitir a todos los usuarios autenticados
-        if hasattr(view, 'action') and view.action in ['confirmar_lectura', 'lecturas_confirmadas']:
+        if hasattr(view, 'action') and view.action in ['confirmar_lectura', 'confirmar_lecturas', 'lecturas_confirmadas', 'unread_count']:
             return True
         
         # Para operaciones CRUD normales, usar la lógica de RolPermiso
@@ -91,6 +93,13 @@ class UnidadViewSet(viewsets.ModelViewSet):
     queryset = Unidad.objects.all()
     serializer_class = UnidadSerializer
     permission_classes = [RolPermiso]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve', 'detalle_completo'):
+            # Residentes, mascotas y vehículos de toda la página en consultas por lote
+            return UnidadSerializer.preparar_queryset(queryset)
+        return queryset
     
     def perform_create(self, serializer):
         """Validaciones adicionales al crear una unidad"""
@@ -148,12 +157,8 @@ class UnidadViewSet(viewsets.ModelViewSet):
         unidad = self.get_object()
         data = UnidadSerializer(unidad).data
 
-        # Vehículos por unidad (residentes activos)
-        vehiculos = PlacaVehiculo.objects.filter(
-            residente__residentesunidad__id_unidad=unidad,
-            residente__residentesunidad__estado=True,
-            activo=True
-        ).distinct().order_by('-fecha_registro')
+        # Vehículos por unidad (residentes activos), ya cargados por el serializer
+        vehiculos = sorted(unidad.vehiculos_activos, key=lambda v: v.fecha_registro, reverse=True)
         data['vehiculos'] = [
             {
                 'id': v.id,
@@ -307,7 +312,7 @@ class NotificacionViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def broadcast(self, request):
-        """Crear un comunicado y asignarlo a todos los residentes."""
+        """Crear un comunicado para todos los residentes."""
         titulo = request.data.get('titulo')
         contenido = request.data.get('contenido')
         tipo = request.data.get('tipo') or 'Comunicado'
@@ -325,74 +330,79 @@ class NotificacionViewSet(viewsets.ModelViewSet):
             contenido=contenido,
             fecha=fecha,
             tipo=tipo,
+            enviar_a_todos=True,
             destinatarios=destinatarios
         )
 
-        # Crear NotificacionResidente para todos los residentes activos
+        # Sin una fila por residente: la bandeja de cada uno la incluye al leer (ver services/bandeja.py)
         from usuarios.models import Residentes
-        residentes = Residentes.objects.all()
-        created = 0
-        bulk = []
-        for r in residentes:
-            bulk.append(NotificacionResidente(notificacion=notif, residente=r, leido=False))
-        if bulk:
-            NotificacionResidente.objects.bulk_create(bulk)
-            created = len(bulk)
+        asignados = Residentes.objects.count()
 
-        return Response({'detail': 'Comunicado enviado', 'notificacion_id': notif.id, 'asignados': created}, status=201)
+        return Response({'detail': 'Comunicado enviado', 'notificacion_id': notif.id, 'asignados': asignados}, status=201)
+
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        """Notificaciones sin leer de la bandeja del usuario, para el badge (una lectura de caché)"""
+        return Response({'no_leidas': no_leidas.no_leidas(request.user)})
 
     @action(detail=True, methods=['post'])
     def confirmar_lectura(self, request, pk=None):
-        """Confirmar que un usuario ha leído un comunicado"""
+        """Confirmar que un usuario ha leído un comunicado (se guarda en lote, ver services/lecturas.py)"""
         notificacion = self.get_object()
         usuario = request.user
         
         if not usuario or not usuario.is_authenticated:
             return Response({'error': 'Usuario no autenticado'}, status=401)
         
-        # Obtener el rol del usuario
-        rol = 'usuario'  # Por defecto
-        if hasattr(usuario, 'rol') and usuario.rol:
-            rol = usuario.rol.nombre.lower()
-        else:
-            # Verificar si es empleado
-            empleado = Empleado.objects.filter(usuario=usuario).first()
-            if empleado:
-                rol = empleado.cargo.lower()
-            else:
-                # Verificar si es residente
-                from usuarios.models import Residentes
-                residente = Residentes.objects.filter(usuario_asociado=usuario).first()
-                if residente:
-                    rol = 'residente'
-        
-        # Crear o actualizar el registro de lectura
-        lectura, created = LecturaComunicado.objects.get_or_create(
-            notificacion=notificacion,
-            usuario=usuario,
-            defaults={'rol': rol}
-        )
-        
-        if not created:
-            # Si ya existe, actualizar la fecha de lectura
-            lectura.fecha_lectura = timezone.now()
-            lectura.rol = rol  # Actualizar rol por si cambió
-            lectura.save()
-        
+        resultado = lecturas.confirmar_lecturas(usuario, [notificacion.id])
         return Response({
             'detail': 'Lectura confirmada',
             'usuario': usuario.username,
-            'rol': rol,
-            'fecha_lectura': lectura.fecha_lectura,
-            'created': created
+            'rol': resultado['rol'],
+            'fecha_lectura': resultado['fecha_lectura'],
+            'created': bool(resultado['confirmadas'])
+        }, status=200)
+
+    @action(detail=False, methods=['post'])
+    def confirmar_lecturas(self, request):
+        """Confirmar la lectura de varios comunicados: {"notificaciones": [ids]}"""
+        ids = request.data.get('notificaciones')
+        if not isinstance(ids, list) or not ids:
+            return Response({'error': 'Se requiere la lista de notificaciones'}, status=400)
+        try:
+            ids = [int(notificacion_id) for notificacion_id in ids]
+        except (TypeError, ValueError):
+            return Response({'error': 'Los ids de notificación deben ser números'}, status=400)
+        if len(ids) > lecturas.MAXIMO_POR_LLAMADA:
+            return Response({'error': f'Máximo {lecturas.MAXIMO_POR_LLAMADA} notificaciones por llamada'}, status=400)
+
+        resultado = lecturas.confirmar_lecturas(request.user, ids)
+        return Response({
+            'detail': 'Lecturas confirmadas',
+            'usuario': request.user.username,
+            'rol': resultado['rol'],
+            'fecha_lectura': resultado['fecha_lectura'],
+            'confirmadas': resultado['confirmadas'],
+            'repetidas': resultado['repetidas'],
         }, status=200)
 
     @action(detail=True, methods=['get'])
     def lecturas_confirmadas(self, request, pk=None):
-        """Obtener lista de usuarios que han leído este comunicado"""
+        """Obtener lista de usuarios que han leído este comunicado (?resumen=true: solo el total)"""
+        if request.query_params.get('resumen', '').lower() in ('1', 'true', 'si'):
+            try:
+                notificacion_id = int(pk)
+            except ValueError:
+                raise Http404
+            total = lecturas.totales_lecturas([notificacion_id]).get(notificacion_id)
+            if total is None:
+                raise Http404
+            return Response({'notificacion': notificacion_id, 'total_lecturas': total})
         notificacion = self.get_object()
-        lecturas = LecturaComunicado.objects.filter(notificacion=notificacion)
-        serializer = LecturaComunicadoSerializer(lecturas, many=True)
+        # El detalle incluye las confirmaciones que todavía estaban en caché
+        lecturas.guardar_lecturas()
+        lecturas_notificacion = LecturaComunicado.objects.filter(notificacion=notificacion).select_related('usuario')
+        serializer = LecturaComunicadoSerializer(lecturas_notificacion, many=True)
         return Response(serializer.data)
 
 class NotificacionResidenteViewSet(viewsets.ModelViewSet):
@@ -400,19 +410,88 @@ class NotificacionResidenteViewSet(viewsets.ModelViewSet):
     serializer_class = NotificacionResidenteSerializer
     permission_classes = [permissions.IsAuthenticated]  # Todos los usuarios pueden ver sus notificaciones
     
+    def _residente(self):
+        """Residente cuya bandeja se consulta (None para administradores y otros usuarios)"""
+        if not hasattr(self, '_residente_bandeja'):
+            self._residente_bandeja = None
+            empleado = Empleado.objects.filter(usuario=self.request.user).first()
+            self._es_administrador = bool(empleado and empleado.cargo.lower() == "administrador")
+            if not self._es_administrador:
+                from usuarios.models import Residentes
+                self._residente_bandeja = Residentes.objects.filter(usuario=self.request.user).first()
+        return self._residente_bandeja
+
     def get_queryset(self):
         if not self.request.user or not self.request.user.is_authenticated:
             return NotificacionResidente.objects.none()
-        empleado = Empleado.objects.filter(usuario=self.request.user).first()
-        if empleado and empleado.cargo.lower() == "administrador":
-            return NotificacionResidente.objects.all()
         # Residentes solo ven sus propias notificaciones
-        from usuarios.models import Residentes
-        residente = Residentes.objects.filter(usuario=self.request.user).first()
+        residente = self._residente()
         if residente:
             return NotificacionResidente.objects.filter(residente=residente)
+        if self._es_administrador:
+            return NotificacionResidente.objects.all()
         return NotificacionResidente.objects.none()
 
+    def list(self, request, *args, **kwargs):
+        """La bandeja del residente incluye las notificaciones para todos (ids negativos)"""
+        residente = self._residente()
+        if residente is None:
+            return super().list(request, *args, **kwargs)
+        marca = bandeja.marca_de(residente)
+        filas = bandeja.bandeja(residente, marca)
+        pagina = self.paginate_queryset(filas)
+        serializer = self.get_serializer(bandeja.entradas(pagina if pagina is not None else filas, residente, marca), many=True)
+        if pagina is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+    def get_object(self):
+        pk = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        residente = self._residente()
+        if residente is None or not bandeja.es_difusion(pk):
+            return super().get_object()
+        try:
+            return bandeja.entrada_difusion(residente, pk)
+        except NotificacionResidente.DoesNotExist:
+            raise Http404
+
+    def _usuario_de(self, residente_id):
+        residente = self._residente()
+        if residente is not None and residente.pk == residente_id:
+            return self.request.user.pk
+        from usuarios.models import Residentes
+        return Residentes.objects.filter(pk=residente_id).values_list('usuario_id', flat=True).first()
+
+    def perform_update(self, serializer):
+        entrada = serializer.instance
+        if entrada.pk is None or entrada.pk >= 0:
+            antes = (entrada.residente_id, entrada.leido)
+            serializer.save()
+            despues = (serializer.instance.residente_id, serializer.instance.leido)
+            if antes != despues:
+                # Contadores de no leídas: la fila deja de contar para uno y empieza a contar para otro
+                if not antes[1]:
+                    no_leidas.al_leer(self._usuario_de(antes[0]), dirigidas=1)
+                if not despues[1]:
+                    no_leidas.al_leer(self._usuario_de(despues[0]), dirigidas=-1)
+            return
+        # Difusión: solo se puede marcar como leída, en la marca del residente
+        leido = serializer.validated_data.get('leido', entrada.leido)
+        if entrada.leido and not leido:
+            raise serializers.ValidationError({'leido': 'Una notificación general leída no se puede marcar como no leída'})
+        if leido and not entrada.leido:
+            fecha = serializer.validated_data.get('fecha_lectura') or timezone.now()
+            if bandeja.marcar_difusion_leida(entrada.residente, entrada.notificacion_id, fecha):
+                no_leidas.al_leer(self.request.user.pk, difusiones_leidas=1)
+            serializer.instance = bandeja.entrada_difusion(entrada.residente, entrada.pk)
+
+    def perform_destroy(self, instance):
+        if instance.pk is not None and instance.pk < 0:
+            raise serializers.ValidationError({'detail': 'Las notificaciones generales no se eliminan de la bandeja'})
+        if not instance.leido:
+            no_leidas.al_leer(self._usuario_de(instance.residente_id), dirigidas=1)
+        instance.delete()
+
 # CU17: Actas
 class ActaViewSet(viewsets.ModelViewSet):
     queryset = Acta.objects.all()
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from economia.models import ReporteFinanciero
+from economia.services.reportes import procesar_reporte, validar_formatos
+
+
+class Command(BaseCommand):
+    help = "Genera los reportes financieros que quedaron en 'generando' (por ejemplo, tras reiniciar el servidor)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--minutos', type=int, default=30,
+            help='Solo reportes sin cambios hace al menos estos minutos (por defecto 30)'
+        )
+        parser.add_argument('--formatos', default='pdf,excel', help='Archivos a generar (por defecto pdf,excel)')
+
+    def handle(self, *args, **options):
+        try:
+            formatos = validar_formatos(options['formatos'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        limite = timezone.now() - timedelta(minutes=options['minutos'])
+        pendientes = list(
+            ReporteFinanciero.objects.filter(estado='generando', fecha_modificacion__lte=limite)
+            .order_by('fecha_generacion').values_list('id', flat=True)
+        )
+        estados = [procesar_reporte(reporte_id, formatos) for reporte_id in pendientes]
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(pendientes)} reportes pendientes: {estados.count('completado')} completados, "
+            f"{estados.count('error')} con error"
+        ))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comunidad', '0014_add_vista_por_admin_to_reserva'),
+        ('economia', '0003_indicadorfinanciero_analisisfinanciero_and_more'),
+        ('usuarios', '0016_configuracionacceso_segundos_debounce_placa'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='gastos',
+            name='fecha_hora',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='multa',
+            index=models.Index(fields=['fecha_emision'], name='economia_multa_emision_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='multa',
+            index=models.Index(fields=['estado', 'fecha_vencimiento'], name='economia_multa_venc_idx'),
+        ),
+    ]
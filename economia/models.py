@@ -1,4 +1,9 @@
+from datetime import datetime, time, timedelta
+
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.db.models import Sum
 from django.conf import settings
 from django.utils import timezone
 from usuarios.models import Residentes
@@ -10,7 +15,7 @@ class Gastos(models.Model):
     id = models.AutoField(primary_key=True)
     monto = models.DecimalField(max_digits=12, decimal_places=2)
     descripcion = models.TextField()
-    fecha_hora = models.DateTimeField()
+    fecha_hora = models.DateTimeField(db_index=True)
 
 # CU9: Multas
 class Multa(models.Model):
@@ -37,6 +42,10 @@ class Multa(models.Model):
         ordering = ['-fecha_emision']
         verbose_name = 'Multa'
         verbose_name_plural = 'Multas'
+        indexes = [
+            models.Index(fields=['fecha_emision'], name='economia_multa_emision_idx'),
+            models.Index(fields=['estado', 'fecha_vencimiento'], name='economia_multa_venc_idx'),
+        ]
     
     def __str__(self):
         return f"Multa {self.id} - {self.residente.persona.nombre} - Bs. {self.monto}"
@@ -88,27 +97,33 @@ class ReporteFinanciero(models.Model):
     def __str__(self):
         return f"{self.nombre} - {self.get_tipo_reporte_display()}"
     
-    def calcular_totales(self):
-        """Calcula los totales del reporte basado en las fechas"""
-        # Ingresos
-        ingresos = Ingreso.objects.filter(
-            fecha_ingreso__range=[self.fecha_inicio, self.fecha_fin],
-            estado='confirmado'
-        )
-        self.total_ingresos = sum(ing.monto for ing in ingresos)
-        
-        # Gastos
-        gastos = Gastos.objects.filter(
-            fecha_hora__date__range=[self.fecha_inicio, self.fecha_fin]
-        )
-        self.total_gastos = sum(g.monto for g in gastos)
-        
-        # Multas
-        multas = Multa.objects.filter(
+    def ingresos(self):
+        """Ingresos confirmados del período"""
+        return Ingreso.objects.filter(fecha_ingreso__range=[self.fecha_inicio, self.fecha_fin], estado='confirmado')
+
+    def gastos(self):
+        """Gastos del período: rango sobre fecha_hora (no fecha_hora__date) para que use el índice"""
+        zona = timezone.get_current_timezone()
+        desde = timezone.make_aware(datetime.combine(self.fecha_inicio, time.min), zona)
+        hasta = timezone.make_aware(datetime.combine(self.fecha_fin + timedelta(days=1), time.min), zona)
+        return Gastos.objects.filter(fecha_hora__gte=desde, fecha_hora__lt=hasta)
+
+    def multas(self):
+        """Multas emitidas en el período que cuentan para el reporte"""
+        return Multa.objects.filter(
             fecha_emision__range=[self.fecha_inicio, self.fecha_fin],
             estado__in=['pagada', 'pendiente']
         )
-        self.total_multas = sum(m.monto for m in multas)
+
+    def calcular_totales(self):
+        """Calcula los totales del reporte con agregaciones en la base (sin cargar las filas)"""
+        from finanzas.services.libro_ingresos import total_confirmado
+
+        # Ingresos: meses completos desde el libro mensual, días sueltos desde Ingreso
+        self.total_ingresos = total_confirmado(self.fecha_inicio, self.fecha_fin)
+
+        self.total_gastos = self.gastos().aggregate(total=Sum('monto'))['total'] or 0
+        self.total_multas = self.multas().aggregate(total=Sum('monto'))['total'] or 0
         
         # Saldo neto
         self.saldo_neto = self.total_ingresos - self.total_gastos
@@ -202,3 +217,16 @@ class DashboardFinanciero(models.Model):
     
     def __str__(self):
         return self.nombre
+
+
+# Signals para descartar el resumen del dashboard financiero en caché
+@receiver(post_save, sender=Ingreso)
+@receiver(post_save, sender=Gastos)
+@receiver(post_save, sender=Multa)
+@receiver(post_delete, sender=Ingreso)
+@receiver(post_delete, sender=Gastos)
+@receiver(post_delete, sender=Multa)
+def invalidar_resumen_financiero(sender, instance, **kwargs):
+    """Cualquier alta, cambio o baja en las tablas del resumen lo invalida"""
+    from economia.services.resumen_financiero import invalidar_resumen
+    invalidar_resumen()
@@ -0,0 +1,3 @@
+"""
+Servicios de economía - CU19
+"""
@@ -0,0 +1,348 @@
+"""
+Exportación de reportes financieros a Excel (XLSX) y PDF - CU19
+Los detalles (ingresos, gastos, multas) se leen con .iterator() y se escriben
+fila por fila: el XLSX se comprime en el zip a medida que se genera la hoja y el
+PDF escribe cada página apenas se llena, así la memoria no depende del tamaño
+del período. Los dos formatos se arman con la biblioteca estándar (zipfile,
+zlib) para no sumar dependencias.
+"""
+
+import logging
+import os
+import re
+import tempfile
+import zipfile
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, Iterator, List, Tuple
+from xml.sax.saxutils import escape
+
+from django.core.files import File
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LECTURA = 2000
+
+# formato -> (campo del modelo, extensión)
+FORMATOS = {
+    'pdf': ('archivo_pdf', 'pdf'),
+    'excel': ('archivo_excel', 'xlsx'),
+}
+
+# (título, columnas, filas)
+Seccion = Tuple[str, List[str], Iterable[tuple]]
+
+
+def secciones_reporte(reporte) -> Iterator[Seccion]:
+    """Resumen y detalle del reporte; cada detalle es un iterador sobre la base"""
+    yield 'Resumen', ['Concepto', 'Monto'], [
+        ('Período', f'{reporte.fecha_inicio} a {reporte.fecha_fin}'),
+        ('Total ingresos', reporte.total_ingresos),
+        ('Total gastos', reporte.total_gastos),
+        ('Total multas', reporte.total_multas),
+        ('Saldo neto', reporte.saldo_neto),
+    ]
+    yield 'Ingresos', ['Fecha', 'Tipo', 'Concepto', 'Referencia', 'Monto'], (
+        reporte.ingresos().order_by('fecha_ingreso', 'id')
+        .values_list('fecha_ingreso', 'tipo_ingreso', 'concepto', 'numero_referencia', 'monto')
+        .iterator(chunk_size=TAMANO_LECTURA)
+    )
+    yield 'Gastos', ['Fecha', 'Descripción', 'Monto'], (
+        reporte.gastos().order_by('fecha_hora', 'id')
+        .values_list('fecha_hora', 'descripcion', 'monto')
+        .iterator(chunk_size=TAMANO_LECTURA)
+    )
+    yield 'Multas', ['Fecha', 'Residente', 'Motivo', 'Estado', 'Monto'], (
+        reporte.multas().order_by('fecha_emision', 'id')
+        .values_list('fecha_emision', 'residente__persona__nombre', 'motivo', 'estado', 'monto')
+        .iterator(chunk_size=TAMANO_LECTURA)
+    )
+
+
+# ---------------------------------------------------------------------------
+# XLSX (SpreadsheetML mínimo: una hoja por sección, textos en línea)
+# ---------------------------------------------------------------------------
+
+CARACTERES_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+EPOCA_EXCEL = date(1899, 12, 30)
+# Índices en cellXfs de ESTILOS_XLSX
+ESTILO_FECHA, ESTILO_FECHA_HORA, ESTILO_MONTO, ESTILO_TITULO = 1, 2, 3, 4
+
+ESTILOS_XLSX = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="1"><numFmt numFmtId="164" formatCode="#,##0.00"/></numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="5">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '</cellXfs></styleSheet>'
+)
+
+
+def _celda_xlsx(valor, estilo: int = 0) -> str:
+    if valor is None:
+        return '<c/>'
+    if isinstance(valor, datetime):
+        valor = timezone.localtime(valor) if timezone.is_aware(valor) else valor
+        dias = (valor.date() - EPOCA_EXCEL).days
+        segundos = valor.hour * 3600 + valor.minute * 60 + valor.second
+        return f'<c s="{ESTILO_FECHA_HORA}"><v>{dias + segundos / 86400:.6f}</v></c>'
+    if isinstance(valor, date):
+        return f'<c s="{ESTILO_FECHA}"><v>{(valor - EPOCA_EXCEL).days}</v></c>'
+    if isinstance(valor, Decimal):
+        return f'<c s="{ESTILO_MONTO}"><v>{valor}</v></c>'
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f'<c><v>{valor}</v></c>'
+    texto = escape(CARACTERES_INVALIDOS_XML.sub('', str(valor)))
+    atributo_estilo = f' s="{estilo}"' if estilo else ''
+    return f'<c t="inlineStr"{atributo_estilo}><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def escribir_xlsx(destino, secciones: Iterable[Seccion]) -> int:
+    """Escribe el libro en `destino` (ruta o archivo binario); retorna las filas de detalle escritas"""
+    hojas = []
+    filas_escritas = 0
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED) as libro:
+        for numero, (titulo, columnas, filas) in enumerate(secciones, start=1):
+            hojas.append(titulo)
+            with libro.open(f'xl/worksheets/sheet{numero}.xml', 'w', force_zip64=True) as hoja:
+                hoja.write(
+                    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                )
+                encabezado = ''.join(_celda_xlsx(columna, ESTILO_TITULO) for columna in columnas)
+                hoja.write(f'<row>{encabezado}</row>'.encode('utf-8'))
+                for fila in filas:
+                    hoja.write(f"<row>{''.join(_celda_xlsx(valor) for valor in fila)}</row>".encode('utf-8'))
+                    filas_escritas += 1
+                hoja.write(b'</sheetData></worksheet>')
+
+        nombres = ''.join(
+            f'<sheet name="{escape(titulo[:31])}" sheetId="{numero}" r:id="rId{numero}"/>'
+            for numero, titulo in enumerate(hojas, start=1)
+        )
+        libro.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets>{nombres}</sheets></workbook>'
+        ))
+        relaciones = ''.join(
+            f'<Relationship Id="rId{numero}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            f'Target="worksheets/sheet{numero}.xml"/>'
+            for numero in range(1, len(hojas) + 1)
+        )
+        libro.writestr('xl/_rels/workbook.xml.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{relaciones}'
+            f'<Relationship Id="rId{len(hojas) + 1}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+            '</Relationships>'
+        ))
+        libro.writestr('xl/styles.xml', ESTILOS_XLSX)
+        libro.writestr('_rels/.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/></Relationships>'
+        ))
+        tipos_hojas = ''.join(
+            f'<Override PartName="/xl/worksheets/sheet{numero}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for numero in range(1, len(hojas) + 1)
+        )
+        libro.writestr('[Content_Types].xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            f'{tipos_hojas}</Types>'
+        ))
+    return filas_escritas
+
+
+# ---------------------------------------------------------------------------
+# PDF (1.4, A4 vertical, Helvetica con WinAnsiEncoding; sin fuentes embebidas)
+# ---------------------------------------------------------------------------
+
+ANCHO_PAGINA, ALTO_PAGINA = 595, 842
+MARGEN = 40
+TAMANO_LETRA = 8
+ALTO_LINEA = 12
+# Objetos fijos: 1 catálogo, 2 árbol de páginas, 3 y 4 fuentes; las páginas siguen desde el 5
+OBJETO_CATALOGO, OBJETO_PAGINAS, OBJETO_FUENTE, OBJETO_FUENTE_NEGRITA = 1, 2, 3, 4
+
+
+def _texto_pdf(valor) -> str:
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        valor = timezone.localtime(valor) if timezone.is_aware(valor) else valor
+        return valor.strftime('%Y-%m-%d %H:%M')
+    if isinstance(valor, Decimal):
+        return f'{valor:,.2f}'
+    return ' '.join(str(valor).split())
+
+
+def _literal_pdf(texto: str) -> bytes:
+    codificado = texto.encode('cp1252', errors='replace')
+    return b'(' + codificado.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+class EscritorPdf:
+    """Escribe páginas de texto a medida que se llenan y arma la tabla xref al cerrar"""
+
+    def __init__(self, archivo, titulo: str):
+        self.archivo = archivo
+        self.titulo = titulo
+        self.desplazamientos = {}
+        self.paginas = []
+        self.siguiente_objeto = OBJETO_FUENTE_NEGRITA + 1
+        self.contenido = []
+        self.y = 0
+        self.archivo.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self._objeto(OBJETO_CATALOGO, f'<< /Type /Catalog /Pages {OBJETO_PAGINAS} 0 R >>'.encode())
+        self._objeto(OBJETO_FUENTE, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+        self._objeto(
+            OBJETO_FUENTE_NEGRITA,
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        )
+
+    def _objeto(self, numero: int, cuerpo: bytes):
+        self.desplazamientos[numero] = self.archivo.tell()
+        self.archivo.write(f'{numero} 0 obj\n'.encode() + cuerpo + b'\nendobj\n')
+
+    def _nuevo_numero(self) -> int:
+        numero = self.siguiente_objeto
+        self.siguiente_objeto += 1
+        return numero
+
+    def texto(self, x: float, valor: str, negrita: bool = False, tamano: int = TAMANO_LETRA):
+        fuente = 'F2' if negrita else 'F1'
+        self.contenido.append(
+            f'BT /{fuente} {tamano} Tf {x:.1f} {self.y:.1f} Td '.encode() + _literal_pdf(valor) + b' Tj ET'
+        )
+
+    def hay_lugar(self, lineas: int = 1) -> bool:
+        return bool(self.contenido) and self.y - lineas * ALTO_LINEA >= MARGEN
+
+    def nueva_pagina(self):
+        self.terminar_pagina()
+        self.y = ALTO_PAGINA - MARGEN
+        self.texto(MARGEN, self.titulo, negrita=True, tamano=10)
+        self.texto(ANCHO_PAGINA - MARGEN - 50, f'Página {len(self.paginas) + 1}')
+        self.y -= ALTO_LINEA * 2
+
+    def terminar_pagina(self):
+        if not self.contenido:
+            return
+        datos = zlib.compress(b'\n'.join(self.contenido))
+        self.contenido = []
+        numero_contenido = self._nuevo_numero()
+        self._objeto(
+            numero_contenido,
+            f'<< /Length {len(datos)} /Filter /FlateDecode >>\nstream\n'.encode() + datos + b'\nendstream',
+        )
+        numero_pagina = self._nuevo_numero()
+        self._objeto(numero_pagina, (
+            f'<< /Type /Page /Parent {OBJETO_PAGINAS} 0 R /MediaBox [0 0 {ANCHO_PAGINA} {ALTO_PAGINA}] '
+            f'/Resources << /Font << /F1 {OBJETO_FUENTE} 0 R /F2 {OBJETO_FUENTE_NEGRITA} 0 R >> >> '
+            f'/Contents {numero_contenido} 0 R >>'
+        ).encode())
+        self.paginas.append(numero_pagina)
+
+    def cerrar(self):
+        self.terminar_pagina()
+        hijos = ' '.join(f'{numero} 0 R' for numero in self.paginas)
+        self._objeto(OBJETO_PAGINAS, f'<< /Type /Pages /Kids [{hijos}] /Count {len(self.paginas)} >>'.encode())
+
+        inicio_xref = self.archivo.tell()
+        total = self.siguiente_objeto
+        self.archivo.write(f'xref\n0 {total}\n0000000000 65535 f \n'.encode())
+        for numero in range(1, total):
+            self.archivo.write(f'{self.desplazamientos[numero]:010d} 00000 n \n'.encode())
+        self.archivo.write(
+            f'trailer\n<< /Size {total} /Root {OBJETO_CATALOGO} 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n'.encode()
+        )
+
+
+def escribir_pdf(archivo, titulo: str, secciones: Iterable[Seccion]) -> int:
+    """Escribe las secciones como tablas en `archivo` (binario); retorna las filas de detalle escritas"""
+    pdf = EscritorPdf(archivo, titulo)
+    ancho_util = ANCHO_PAGINA - 2 * MARGEN
+    filas_escritas = 0
+    pdf.nueva_pagina()
+
+    for titulo_seccion, columnas, filas in secciones:
+        ancho_columna = ancho_util / len(columnas)
+        # Aproximación del ancho de Helvetica: ~0.5 del tamaño de letra por carácter
+        maximo_caracteres = max(int(ancho_columna / (TAMANO_LETRA * 0.5)) - 1, 4)
+
+        def encabezado(continuacion=False):
+            pdf.texto(MARGEN, f"{titulo_seccion}{' (continuación)' if continuacion else ''}", negrita=True, tamano=10)
+            pdf.y -= ALTO_LINEA
+            for indice, columna in enumerate(columnas):
+                pdf.texto(MARGEN + indice * ancho_columna, columna[:maximo_caracteres], negrita=True)
+            pdf.y -= ALTO_LINEA
+
+        if not pdf.hay_lugar(3):
+            pdf.nueva_pagina()
+        encabezado()
+        for fila in filas:
+            if not pdf.hay_lugar():
+                pdf.nueva_pagina()
+                encabezado(continuacion=True)
+            for indice, valor in enumerate(fila):
+                texto = _texto_pdf(valor)
+                if len(texto) > maximo_caracteres:
+                    texto = texto[:maximo_caracteres - 1] + '…'
+                pdf.texto(MARGEN + indice * ancho_columna, texto)
+            pdf.y -= ALTO_LINEA
+            filas_escritas += 1
+        pdf.y -= ALTO_LINEA
+
+    pdf.cerrar()
+    return filas_escritas
+
+
+def exportar_reporte(reporte, formato: str) -> int:
+    """Genera el archivo del formato pedido y lo guarda en el campo del reporte (sin guardar el modelo)"""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}. Opciones: {', '.join(FORMATOS)}")
+    campo, extension = FORMATOS[formato]
+
+    with tempfile.TemporaryFile(suffix=f'.{extension}') as temporal:
+        if formato == 'pdf':
+            filas = escribir_pdf(temporal, f'{reporte.nombre} ({reporte.fecha_inicio} a {reporte.fecha_fin})',
+                                 secciones_reporte(reporte))
+        else:
+            filas = escribir_xlsx(temporal, secciones_reporte(reporte))
+        temporal.seek(0)
+
+        archivo = getattr(reporte, campo)
+        if archivo:
+            # Al regenerar se reemplaza el archivo anterior
+            archivo.delete(save=False)
+        nombre = f'reporte_{reporte.pk}_{reporte.fecha_inicio}_{reporte.fecha_fin}.{extension}'
+        archivo.save(nombre, File(temporal, name=nombre), save=False)
+
+    logger.info(f"Reporte {reporte.pk}: {formato} generado con {filas} filas ({os.path.basename(archivo.name)})")
+    return filas
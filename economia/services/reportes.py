@@ -0,0 +1,130 @@
+"""
+Generación de reportes financieros en segundo plano - CU19
+El reporte se crea en estado 'generando' y la respuesta vuelve enseguida. Los
+totales (agregaciones en la base, ver ReporteFinanciero.calcular_totales) y los
+archivos PDF/Excel (ver exportacion.py) se generan en un pool de procesos local
+que deja el reporte en 'completado' o 'error'; el cliente consulta el estado del
+reporte hasta que cambie. Los procesos se inician con 'spawn' y su propio
+django.setup(), así no heredan las conexiones a la base del proceso web.
+Si el servidor se reinicia con trabajos en cola, `manage.py generar_reportes_pendientes`
+retoma los reportes que quedaron en 'generando'.
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable
+
+import django
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from economia.models import ReporteFinanciero
+from economia.services.exportacion import FORMATOS, exportar_reporte
+
+logger = logging.getLogger(__name__)
+
+FORMATOS_POR_DEFECTO = ('pdf', 'excel')
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _obtener_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'REPORTES_PROCESOS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+                # Va por referencia a django: este módulo importa modelos y no se puede cargar antes del setup
+                initializer=django.setup,
+            )
+        return _executor
+
+
+def _descartar_executor(executor):
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+
+
+def _al_terminar(reporte_id: int, executor, futuro):
+    error = futuro.exception()
+    if error is None:
+        return
+    logger.error(f"El proceso que generaba el reporte {reporte_id} falló: {error}")
+    if isinstance(error, BrokenProcessPool):
+        # Un proceso murió: el próximo envío crea un pool nuevo. El reporte queda en
+        # 'generando' para generar_reportes_pendientes
+        _descartar_executor(executor)
+
+
+def _enviar(reporte_id: int, formatos: tuple):
+    executor = _obtener_executor()
+    try:
+        futuro = executor.submit(procesar_reporte, reporte_id, formatos)
+    except BrokenProcessPool:
+        _descartar_executor(executor)
+        executor = _obtener_executor()
+        futuro = executor.submit(procesar_reporte, reporte_id, formatos)
+    futuro.add_done_callback(lambda f: _al_terminar(reporte_id, executor, f))
+
+
+def validar_formatos(formatos) -> tuple:
+    """'pdf,excel' o ['pdf', 'excel'] -> ('pdf', 'excel'); ValueError si alguno no existe"""
+    if isinstance(formatos, str):
+        formatos = formatos.split(',')
+    formatos = tuple(dict.fromkeys(formato.strip().lower() for formato in formatos or () if formato.strip()))
+    invalidos = [formato for formato in formatos if formato not in FORMATOS]
+    if invalidos:
+        raise ValueError(f"Formato no soportado: {', '.join(invalidos)}. Opciones: {', '.join(FORMATOS)}")
+    return formatos
+
+
+def procesar_reporte(reporte_id: int, formatos: Iterable[str] = ()) -> str:
+    """Calcula los totales, genera los archivos pedidos y retorna el estado en que queda el reporte"""
+    close_old_connections()
+    try:
+        reporte = ReporteFinanciero.objects.get(pk=reporte_id)
+    except ReporteFinanciero.DoesNotExist:
+        logger.warning(f"Reporte {reporte_id} eliminado antes de generarse")
+        return 'error'
+
+    try:
+        if not formatos:
+            reporte.estado = 'completado'
+        reporte.calcular_totales()
+        if formatos:
+            for formato in formatos:
+                exportar_reporte(reporte, formato)
+            reporte.estado = 'completado'
+            reporte.save(update_fields=['estado', 'archivo_pdf', 'archivo_excel', 'fecha_modificacion'])
+    except Exception as e:
+        logger.error(f"Error generando el reporte {reporte_id}: {e}")
+        # Solo estado y observaciones: los totales a medio calcular no se guardan
+        reporte.estado = 'error'
+        reporte.observaciones = f"{reporte.observaciones}\nError al generar: {e}".strip()
+        reporte.save(update_fields=['estado', 'observaciones', 'fecha_modificacion'])
+    finally:
+        close_old_connections()
+    return reporte.estado
+
+
+def encolar_reporte(reporte: ReporteFinanciero, formatos: Iterable[str] = ()):
+    """Marca el reporte como 'generando' y lo procesa al confirmarse la transacción en curso"""
+    formatos = validar_formatos(formatos)
+    if reporte.estado != 'generando':
+        reporte.estado = 'generando'
+        reporte.save(update_fields=['estado', 'fecha_modificacion'])
+
+    if not getattr(settings, 'REPORTES_EN_SEGUNDO_PLANO', True):
+        procesar_reporte(reporte.pk, formatos)
+        reporte.refresh_from_db()
+        return
+    reporte_id = reporte.pk
+    transaction.on_commit(lambda: _enviar(reporte_id, formatos))
+
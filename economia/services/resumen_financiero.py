@@ -0,0 +1,152 @@
+"""
+Resumen del dashboard financiero - CU19
+Una consulta agrupada por (mes, tipo) para Ingreso, una por mes para Gastos y
+una agregación para Multa cubren a la vez los totales del período y la
+tendencia de los últimos meses. El resultado se guarda en caché por (rol,
+período, rango de fechas) bajo una versión compartida entre procesos que se
+incrementa al confirmarse cualquier escritura en esas tablas.
+"""
+
+import logging
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from economia.models import Gastos, Multa
+from finanzas.models import Ingreso
+
+logger = logging.getLogger(__name__)
+
+# Versión compartida entre procesos: cambiarla deja sin efecto todas las entradas anteriores
+CLAVE_VERSION = 'economia:resumen_financiero:version'
+MESES_TENDENCIA = 6
+DURACION_CACHE = 300
+
+
+def _primer_dia_mes(fecha: date, meses_atras: int = 0) -> date:
+    indice = fecha.year * 12 + fecha.month - 1 - meses_atras
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def _inicio_del_dia(fecha: date) -> datetime:
+    return timezone.make_aware(datetime.combine(fecha, time.min), timezone.get_current_timezone())
+
+
+def rango_periodo(periodo: str, hoy: date) -> Tuple[date, date]:
+    """'mes' (desde el día 1), 'trimestre' (90 días), 'año' (365 días); otro valor = 30 días"""
+    if periodo == 'mes':
+        return hoy.replace(day=1), hoy
+    dias = {'trimestre': 90, 'año': 365}.get(periodo, 30)
+    return hoy - timedelta(days=dias), hoy
+
+
+def invalidar_resumen():
+    """Descartar los resúmenes en caché al confirmarse la transacción en curso"""
+    transaction.on_commit(_incrementar_version)
+
+
+def _incrementar_version():
+    cache.add(CLAVE_VERSION, 0, timeout=None)
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        # La clave expiró o se borró entre add e incr
+        cache.set(CLAVE_VERSION, 1, timeout=None)
+
+
+def _rol(usuario) -> str:
+    if usuario is None:
+        return 'anonimo'
+    if getattr(usuario, 'rol', None):
+        return usuario.rol.nombre.lower()
+    return 'superusuario' if getattr(usuario, 'is_superuser', False) else 'sin_rol'
+
+
+def resumen_financiero(periodo: str = 'mes', usuario=None, hoy: Optional[date] = None) -> Dict:
+    """Totales del período, ingresos por tipo y tendencia mensual (en caché hasta la próxima escritura)"""
+    hoy = hoy or timezone.now().date()
+    fecha_inicio, fecha_fin = rango_periodo(periodo, hoy)
+
+    clave = (
+        f"economia:resumen_financiero:{cache.get(CLAVE_VERSION, 0)}:"
+        f"{_rol(usuario)}:{periodo}:{fecha_inicio}:{fecha_fin}"
+    )
+    resumen = cache.get(clave)
+    if resumen is None:
+        resumen = _calcular(periodo, fecha_inicio, fecha_fin)
+        cache.set(clave, resumen, getattr(settings, 'RESUMEN_FINANCIERO_CACHE_SEGUNDOS', DURACION_CACHE))
+    return resumen
+
+
+def _calcular(periodo: str, fecha_inicio: date, fecha_fin: date) -> Dict:
+    # Del más antiguo al actual, el mismo orden que devolvía la vista antes de este servicio
+    # (armaba la lista desde fecha_fin hacia atrás y la invertía); el dashboard la grafica así
+    meses = [_primer_dia_mes(fecha_fin, atras) for atras in reversed(range(MESES_TENDENCIA))]
+    # Un solo rango cubre el período y los meses de la tendencia
+    desde = min(fecha_inicio, meses[0])
+
+    # Ingresos: (mes, tipo) con el total del mes y la parte que cae dentro del período
+    ingresos_por_mes = {mes: Decimal('0') for mes in meses}
+    ingresos_por_tipo = {tipo: Decimal('0') for tipo, _ in Ingreso.TIPO_INGRESO_CHOICES}
+    filas = (
+        Ingreso.objects.filter(estado='confirmado', fecha_ingreso__gte=desde, fecha_ingreso__lte=fecha_fin)
+        .annotate(mes=TruncMonth('fecha_ingreso'))
+        .values('mes', 'tipo_ingreso')
+        .annotate(total=Sum('monto'), en_periodo=Sum('monto', filter=Q(fecha_ingreso__gte=fecha_inicio)))
+        .order_by()
+    )
+    for fila in filas:
+        if fila['mes'] in ingresos_por_mes:
+            ingresos_por_mes[fila['mes']] += fila['total']
+        if fila['en_periodo']:
+            ingresos_por_tipo[fila['tipo_ingreso']] = ingresos_por_tipo.get(fila['tipo_ingreso'], 0) + fila['en_periodo']
+
+    # Gastos: por mes en la zona horaria local, con rango sobre fecha_hora para usar el índice
+    gastos_por_mes = {mes: Decimal('0') for mes in meses}
+    total_gastos = Decimal('0')
+    filas = (
+        Gastos.objects.filter(
+            fecha_hora__gte=_inicio_del_dia(desde), fecha_hora__lt=_inicio_del_dia(fecha_fin + timedelta(days=1))
+        )
+        .annotate(mes=TruncMonth('fecha_hora'))
+        .values('mes')
+        .annotate(total=Sum('monto'), en_periodo=Sum('monto', filter=Q(fecha_hora__gte=_inicio_del_dia(fecha_inicio))))
+        .order_by()
+    )
+    for fila in filas:
+        mes = fila['mes'].date() if isinstance(fila['mes'], datetime) else fila['mes']
+        if mes in gastos_por_mes:
+            gastos_por_mes[mes] += fila['total']
+        total_gastos += fila['en_periodo'] or 0
+
+    total_multas = Multa.objects.filter(
+        fecha_emision__range=[fecha_inicio, fecha_fin]
+    ).aggregate(total=Sum('monto'))['total'] or Decimal('0')
+
+    total_ingresos = sum(ingresos_por_tipo.values(), Decimal('0'))
+    saldo_neto = total_ingresos - total_gastos
+    margen_utilidad = (saldo_neto / total_ingresos * 100) if total_ingresos > 0 else 0
+
+    return {
+        'periodo': periodo,
+        'total_ingresos': float(total_ingresos),
+        'total_gastos': float(total_gastos),
+        'total_multas': float(total_multas),
+        'saldo_neto': float(saldo_neto),
+        'margen_utilidad': float(margen_utilidad),
+        'ingresos_por_tipo': {tipo: float(total) for tipo, total in ingresos_por_tipo.items()},
+        'gastos_por_categoria': {},  # Se puede implementar categorización de gastos
+        'tendencia_ingresos': [
+            {'mes': mes.strftime('%Y-%m'), 'total': float(total)} for mes, total in ingresos_por_mes.items()
+        ],
+        'tendencia_gastos': [
+            {'mes': mes.strftime('%Y-%m'), 'total': float(total)} for mes, total in gastos_por_mes.items()
+        ],
+    }
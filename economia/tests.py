@@ -1,3 +1,220 @@
-from django.test import TestCase
+import re
+import shutil
+import tempfile
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from finanzas.models import Ingreso
+from .models import Gastos, Multa, ReporteFinanciero
+
+User = get_user_model()
+
+
+class ReporteFinancieroTest(APITestCase):
+    """Totales del reporte por agregación y generación en segundo plano"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser(username='admin_reportes', password='testpass123')
+        self.client.force_authenticate(user=self.usuario)
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajuste = override_settings(MEDIA_ROOT=self.media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+    def _ingreso(self, monto, fecha, estado='confirmado'):
+        return Ingreso.objects.create(
+            tipo_ingreso='cuotas', concepto='Prueba', monto=Decimal(monto), fecha_ingreso=fecha,
+            estado=estado, registrado_por=self.usuario
+        )
+
+    def _gasto(self, monto, año, mes, dia, hora=12):
+        zona = timezone.get_current_timezone()
+        return Gastos.objects.create(
+            monto=Decimal(monto), descripcion='Prueba',
+            fecha_hora=timezone.make_aware(datetime(año, mes, dia, hora), zona)
+        )
+
+    def test_totales_combinan_libro_y_dias_sueltos(self):
+        # Dentro del rango: 15/01 (día suelto), febrero completo, 10/03 (día suelto)
+        self._ingreso('100', date(2024, 1, 15))
+        self._ingreso('200', date(2024, 2, 1))
+        self._ingreso('300', date(2024, 2, 29))
+        self._ingreso('50', date(2024, 3, 10))
+        # Fuera del rango o sin confirmar
+        self._ingreso('999', date(2024, 1, 14))
+        self._ingreso('999', date(2024, 3, 11))
+        self._ingreso('999', date(2024, 2, 10), estado='pendiente')
+        # Los extremos del rango se toman en la zona horaria local
+        self._gasto('80', 2024, 1, 15, hora=0)
+        self._gasto('20', 2024, 3, 10, hora=23)
+        self._gasto('999', 2024, 3, 11, hora=0)
+
+        reporte = ReporteFinanciero.objects.create(
+            nombre='Trimestre', tipo_reporte='personalizado', fecha_inicio=date(2024, 1, 15),
+            fecha_fin=date(2024, 3, 10), generado_por=self.usuario
+        )
+        reporte.calcular_totales()
+        reporte.refresh_from_db()
+
+        self.assertEqual(reporte.total_ingresos, Decimal('650'))
+        self.assertEqual(reporte.total_gastos, Decimal('100'))
+        self.assertEqual(reporte.saldo_neto, Decimal('550'))
+
+    @override_settings(REPORTES_EN_SEGUNDO_PLANO=True)
+    def test_generar_reporte_responde_generando_y_completa_en_segundo_plano(self):
+        self._ingreso('120', date(2023, 6, 1))
+        self._ingreso('80', date(2024, 6, 1))
+        url = reverse('reportefinanciero-generar-reporte')
+
+        with mock.patch('economia.services.reportes._obtener_executor') as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    url, {'tipo_reporte': 'anual', 'fecha_inicio': '2023-01-01', 'fecha_fin': '2024-12-31'}, format='json'
+                )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED, response.data)
+        self.assertEqual(response.data['estado'], 'generando')
+
+        # El trabajo encolado es procesar_reporte(id, formatos); se corre acá en vez de en el pool
+        funcion, reporte_id, formatos = executor.return_value.submit.call_args[0]
+        self.assertEqual(formatos, ('pdf', 'excel'))
+        self.assertEqual(funcion(reporte_id, formatos), 'completado')
+        reporte = ReporteFinanciero.objects.get(pk=reporte_id)
+        self.assertEqual(reporte.estado, 'completado')
+        self.assertEqual(reporte.total_ingresos, Decimal('200'))
+        self.assertTrue(reporte.archivo_pdf.name.endswith('.pdf'))
+        self.assertTrue(reporte.archivo_excel.name.endswith('.xlsx'))
+
+    @override_settings(REPORTES_EN_SEGUNDO_PLANO=False)
+    def test_error_al_generar_queda_registrado(self):
+        reporte = ReporteFinanciero.objects.create(
+            nombre='Con error', tipo_reporte='mensual', fecha_inicio=date(2024, 1, 1),
+            fecha_fin=date(2024, 1, 31), generado_por=self.usuario, estado='completado'
+        )
+        with mock.patch.object(ReporteFinanciero, 'calcular_totales', side_effect=RuntimeError('sin conexión')):
+            response = self.client.post(reverse('reportefinanciero-regenerar-totales', args=[reporte.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        reporte.refresh_from_db()
+        self.assertEqual(reporte.estado, 'error')
+        self.assertIn('sin conexión', reporte.observaciones)
+
+    @override_settings(REPORTES_EN_SEGUNDO_PLANO=False)
+    def test_exportar_excel_y_pdf_con_el_detalle(self):
+        for dia in range(1, 29):
+            self._ingreso('10.50', date(2024, 2, dia))
+        self._gasto('75', 2024, 2, 10)
+        reporte = ReporteFinanciero.objects.create(
+            nombre='Febrero', tipo_reporte='mensual', fecha_inicio=date(2024, 2, 1),
+            fecha_fin=date(2024, 2, 29), generado_por=self.usuario
+        )
+
+        response = self.client.post(
+            reverse('reportefinanciero-exportar', args=[reporte.id]), {'formatos': 'excel,pdf'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['estado'], 'completado')
+        reporte.refresh_from_db()
+        self.assertEqual(reporte.total_ingresos, Decimal('294.00'))
+
+        with zipfile.ZipFile(reporte.archivo_excel.path) as libro:
+            self.assertIn('<sheet name="Ingresos"', libro.read('xl/workbook.xml').decode())
+            hoja_ingresos = libro.read('xl/worksheets/sheet2.xml').decode()
+            hoja_gastos = libro.read('xl/worksheets/sheet3.xml').decode()
+        # Encabezado + 28 ingresos; los montos quedan como números
+        self.assertEqual(hoja_ingresos.count('<row>'), 29)
+        self.assertIn('<v>10.50</v>', hoja_ingresos)
+        self.assertIn('<v>75.00</v>', hoja_gastos)
+
+        with open(reporte.archivo_pdf.path, 'rb') as archivo:
+            pdf = archivo.read()
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertTrue(pdf.rstrip().endswith(b'%%EOF'))
+        # La tabla xref apunta al inicio de cada objeto
+        inicio_xref = int(re.search(rb'startxref\n(\d+)', pdf).group(1))
+        entradas = re.findall(rb'(\d{10}) 00000 n', pdf[inicio_xref:])
+        for numero, desplazamiento in enumerate(entradas, start=1):
+            self.assertTrue(pdf[int(desplazamiento):].startswith(f'{numero} 0 obj'.encode()))
+
+        response = self.client.post(
+            reverse('reportefinanciero-exportar', args=[reporte.id]), {'formatos': ['csv']}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ResumenFinancieroDashboardTest(APITestCase):
+    """Resumen del dashboard agrupado en la base y en caché hasta la próxima escritura"""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_superuser(username='admin_dashboard', password='testpass123')
+        self.client.force_authenticate(user=self.usuario)
+        self.url = reverse('dashboardfinanciero-resumen-financiero')
+        self.hoy = timezone.localdate()
+
+    def _mes_anterior(self, meses):
+        indice = self.hoy.year * 12 + self.hoy.month - 1 - meses
+        return date(indice // 12, indice % 12 + 1, 1)
+
+    def _ingreso(self, tipo, monto, fecha):
+        return Ingreso.objects.create(
+            tipo_ingreso=tipo, concepto='Prueba', monto=Decimal(monto), fecha_ingreso=fecha,
+            estado='confirmado', registrado_por=self.usuario
+        )
+
+    def _gasto(self, monto, fecha):
+        return Gastos.objects.create(
+            monto=Decimal(monto), descripcion='Prueba',
+            fecha_hora=timezone.make_aware(datetime.combine(fecha, datetime.min.time().replace(hour=10)))
+        )
+
+    def test_totales_tendencia_y_cache(self):
+        self._ingreso('cuotas', '100', self.hoy.replace(day=1))
+        self._ingreso('multas', '30', self.hoy)
+        self._ingreso('cuotas', '500', self._mes_anterior(2))
+        self._ingreso('cuotas', '999', self._mes_anterior(8))
+        self._gasto('40', self.hoy)
+        self._gasto('60', self._mes_anterior(1))
+
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'periodo': 'mes'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Decimal(response.data['total_ingresos']), Decimal('130'))
+        self.assertEqual(Decimal(response.data['total_gastos']), Decimal('40'))
+        self.assertEqual(Decimal(response.data['ingresos_por_tipo']['cuotas']), Decimal('100'))
+        tendencia = {fila['mes']: fila['total'] for fila in response.data['tendencia_ingresos']}
+        self.assertEqual(len(tendencia), 6)
+        # Del mes más antiguo al actual, en las dos tendencias
+        self.assertEqual(list(tendencia), [self._mes_anterior(atras).strftime('%Y-%m') for atras in range(5, -1, -1)])
+        self.assertEqual([fila['mes'] for fila in response.data['tendencia_gastos']], list(tendencia))
+        self.assertEqual(tendencia[self._mes_anterior(2).strftime('%Y-%m')], 500)
+        self.assertEqual(tendencia[self.hoy.strftime('%Y-%m')], 130)
+        gastos = {fila['mes']: fila['total'] for fila in response.data['tendencia_gastos']}
+        self.assertEqual(gastos[self._mes_anterior(1).strftime('%Y-%m')], 60)
+
+        # Segunda lectura desde la caché
+        with self.assertNumQueries(0):
+            self.client.get(self.url, {'periodo': 'mes'})
+
+        # Una escritura confirmada invalida el resumen
+        with self.captureOnCommitCallbacks(execute=True):
+            Multa.objects.create(
+                residente=self._residente(), motivo='Ruido', monto=Decimal('25'),
+                fecha_emision=self.hoy, fecha_vencimiento=self.hoy
+            )
+        response = self.client.get(self.url, {'periodo': 'mes'})
+        self.assertEqual(Decimal(response.data['total_multas']), Decimal('25'))
+
+    def _residente(self):
+        from usuarios.models import Persona, Residentes
+        persona = Persona.objects.create(nombre='Ana')
+        return Residentes.objects.create(persona=persona)
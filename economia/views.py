@@ -12,6 +12,9 @@ from economia.serializers.economia_serializer import (
     DashboardFinancieroSerializer, ResumenFinancieroSerializer,
     AnalisisMorosidadSerializer, ProyeccionFinancieraSerializer
 )
+from economia.services.exportacion import FORMATOS
+from economia.services.reportes import FORMATOS_POR_DEFECTO, encolar_reporte, validar_formatos
+from economia.services.resumen_financiero import resumen_financiero
 from usuarios.models import Empleado
 from django.db.models import Sum, Count
 
@@ -188,9 +191,10 @@ class ReporteFinancieroViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'])
     def generar_reporte(self, request):
-        """Generar un nuevo reporte financiero"""
+        """Generar un nuevo reporte financiero (totales y archivos en 'formatos': pdf, excel)"""
         try:
             data = request.data
+            formatos = validar_formatos(data.get('formatos', FORMATOS_POR_DEFECTO))
             reporte = ReporteFinanciero.objects.create(
                 nombre=data.get('nombre', f"Reporte {data.get('tipo_reporte', 'personalizado')}"),
                 tipo_reporte=data.get('tipo_reporte', 'personalizado'),
@@ -199,12 +203,15 @@ class ReporteFinancieroViewSet(viewsets.ModelViewSet):
                 generado_por=request.user,
                 observaciones=data.get('observaciones', '')
             )
+            # Las fechas llegan como texto; el serializer y el cálculo necesitan date
+            reporte.refresh_from_db()
             
-            # Calcular totales
-            reporte.calcular_totales()
+            # Totales y archivos se generan en segundo plano; el cliente consulta el estado del reporte
+            encolar_reporte(reporte, formatos)
             
             serializer = self.get_serializer(reporte)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            codigo = status.HTTP_202_ACCEPTED if reporte.estado == 'generando' else status.HTTP_201_CREATED
+            return Response(serializer.data, status=codigo)
             
         except Exception as e:
             return Response(
@@ -214,17 +221,35 @@ class ReporteFinancieroViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'])
     def regenerar_totales(self, request, pk=None):
-        """Regenerar totales de un reporte existente"""
+        """Regenerar totales de un reporte existente (y los archivos que ya tenía) en segundo plano"""
         try:
             reporte = self.get_object()
-            reporte.calcular_totales()
+            formatos = [formato for formato, (campo, _) in FORMATOS.items() if getattr(reporte, campo)]
+            encolar_reporte(reporte, formatos)
             serializer = self.get_serializer(reporte)
-            return Response(serializer.data)
+            codigo = status.HTTP_202_ACCEPTED if reporte.estado == 'generando' else status.HTTP_200_OK
+            return Response(serializer.data, status=codigo)
         except Exception as e:
             return Response(
                 {'error': f'Error regenerando totales: {str(e)}'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+    
+    @action(detail=True, methods=['post'])
+    def exportar(self, request, pk=None):
+        """Generar los archivos PDF/Excel de un reporte existente en segundo plano"""
+        reporte = self.get_object()
+        try:
+            formatos = validar_formatos(request.data.get('formatos', FORMATOS_POR_DEFECTO))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not formatos:
+            return Response({'error': 'Debe indicar al menos un formato'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        encolar_reporte(reporte, formatos)
+        serializer = self.get_serializer(reporte)
+        codigo = status.HTTP_202_ACCEPTED if reporte.estado == 'generando' else status.HTTP_200_OK
+        return Response(serializer.data, status=codigo)
 
 class AnalisisFinancieroViewSet(viewsets.ModelViewSet):
     """Gestión de Análisis Financieros - CU19"""
@@ -409,96 +434,10 @@ class DashboardFinancieroViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def resumen_financiero(self, request):
-        """Obtener resumen financiero completo"""
+        """Obtener resumen financiero completo (en caché hasta el próximo cambio en ingresos, gastos o multas)"""
         try:
-            from datetime import datetime, timedelta
-            from finanzas.models import Ingreso
-            
-            # Parámetros de fecha
             periodo = request.query_params.get('periodo', 'mes')
-            fecha_fin = datetime.now().date()
-            
-            if periodo == 'mes':
-                fecha_inicio = fecha_fin.replace(day=1)
-            elif periodo == 'trimestre':
-                fecha_inicio = fecha_fin - timedelta(days=90)
-            elif periodo == 'año':
-                fecha_inicio = fecha_fin - timedelta(days=365)
-            else:
-                fecha_inicio = fecha_fin - timedelta(days=30)
-            
-            # Obtener datos
-            ingresos = Ingreso.objects.filter(
-                fecha_ingreso__range=[fecha_inicio, fecha_fin],
-                estado='confirmado'
-            )
-            gastos = Gastos.objects.filter(
-                fecha_hora__date__range=[fecha_inicio, fecha_fin]
-            )
-            multas = Multa.objects.filter(
-                fecha_emision__range=[fecha_inicio, fecha_fin]
-            )
-            
-            # Calcular totales
-            total_ingresos = sum(ing.monto for ing in ingresos)
-            total_gastos = sum(g.monto for g in gastos)
-            total_multas = sum(m.monto for m in multas)
-            saldo_neto = total_ingresos - total_gastos
-            
-            # Margen de utilidad
-            margen_utilidad = (saldo_neto / total_ingresos * 100) if total_ingresos > 0 else 0
-            
-            # Ingresos por tipo
-            ingresos_por_tipo = {}
-            for tipo, _ in Ingreso.TIPO_INGRESO_CHOICES:
-                ingresos_por_tipo[tipo] = sum(
-                    ing.monto for ing in ingresos if ing.tipo_ingreso == tipo
-                )
-            
-            # Tendencia (últimos 6 meses)
-            tendencia_ingresos = []
-            tendencia_gastos = []
-            
-            for i in range(6):
-                fecha_mes = fecha_fin - timedelta(days=30*i)
-                mes_inicio = fecha_mes.replace(day=1)
-                mes_fin = fecha_mes.replace(day=28) + timedelta(days=4)
-                mes_fin = mes_fin - timedelta(days=mes_fin.day)
-                
-                ing_mes = sum(
-                    ing.monto for ing in ingresos 
-                    if mes_inicio <= ing.fecha_ingreso <= mes_fin
-                )
-                gas_mes = sum(
-                    g.monto for g in gastos 
-                    if mes_inicio <= g.fecha_hora.date() <= mes_fin
-                )
-                
-                tendencia_ingresos.append({
-                    'mes': fecha_mes.strftime('%Y-%m'),
-                    'total': float(ing_mes)
-                })
-                tendencia_gastos.append({
-                    'mes': fecha_mes.strftime('%Y-%m'),
-                    'total': float(gas_mes)
-                })
-            
-            tendencia_ingresos.reverse()
-            tendencia_gastos.reverse()
-            
-            resumen = {
-                'periodo': periodo,
-                'total_ingresos': float(total_ingresos),
-                'total_gastos': float(total_gastos),
-                'total_multas': float(total_multas),
-                'saldo_neto': float(saldo_neto),
-                'margen_utilidad': float(margen_utilidad),
-                'ingresos_por_tipo': {k: float(v) for k, v in ingresos_por_tipo.items()},
-                'gastos_por_categoria': {},  # Se puede implementar categorización de gastos
-                'tendencia_ingresos': tendencia_ingresos,
-                'tendencia_gastos': tendencia_gastos
-            }
-            
+            resumen = resumen_financiero(periodo, request.user)
             serializer = ResumenFinancieroSerializer(resumen)
             return Response(serializer.data)
             
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from .models import (
-    CuotaMensual, CuotaUnidad, PagoCuota
+    CuotaMensual, CuotaUnidad, PagoCuota, EjecucionVencimientos
 )
 
 @admin.register(CuotaMensual)
@@ -22,4 +22,10 @@ class PagoCuotaAdmin(admin.ModelAdmin):
     list_display = ['cuota_unidad', 'monto', 'fecha_pago', 'metodo_pago', 'registrado_por']
     list_filter = ['metodo_pago', 'fecha_pago']
     search_fields = ['cuota_unidad__unidad__numero_casa', 'numero_referencia']
-    readonly_fields = ['fecha_creacion']
\ No newline at end of file
+    readonly_fields = ['fecha_creacion']
+
+@admin.register(EjecucionVencimientos)
+class EjecucionVencimientosAdmin(admin.ModelAdmin):
+    list_display = ['fecha_inicio', 'fecha_corte', 'estado', 'cuotas_vencidas', 'multas_vencidas', 'notificaciones_enviadas']
+    list_filter = ['estado']
+    readonly_fields = ['fecha_inicio', 'fecha_fin']
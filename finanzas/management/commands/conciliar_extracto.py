@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from finanzas.services.conciliacion import FORMATOS, conciliar_extracto
+
+
+class Command(BaseCommand):
+    help = 'Concilia un extracto bancario (CSV u OFX) contra las cuotas pendientes y registra los pagos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ruta', help='Archivo del extracto')
+        parser.add_argument('--formato', choices=FORMATOS, help='Por defecto, la extensión del archivo')
+        parser.add_argument('--usuario', required=True, help='Usuario que registra los pagos')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = get_user_model().objects.get(username=options['usuario'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No existe el usuario {options['usuario']}")
+
+        formato = options['formato'] or options['ruta'].rsplit('.', 1)[-1].lower()
+        try:
+            with open(options['ruta'], 'rb') as archivo:
+                resultado = conciliar_extracto(archivo, formato, usuario)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['lineas']} líneas: {resultado['conciliadas']} conciliadas "
+            f"(${resultado['monto_conciliado']}), {resultado['duplicadas']} duplicadas, "
+            f"{resultado['total_por_confirmar']} por confirmar, {resultado['total_no_conciliadas']} sin conciliar, "
+            f"{resultado['ignoradas']} débitos ignorados"
+        ))
+        for pago in resultado['por_confirmar']:
+            self.stdout.write(
+                f"  línea {pago['fila']}: {pago['monto']} {pago['numero_referencia']} - "
+                f"solo coincide por monto con la cuota {pago['cuota_unidad']}, confirmar a mano"
+            )
+        for linea in resultado['no_conciliadas']:
+            self.stdout.write(f"  línea {linea['linea']}: {linea['monto']} {linea['referencia']} - {linea['motivo']}")
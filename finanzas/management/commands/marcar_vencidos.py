@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from finanzas.services.vencimientos import marcar_vencidos
+
+
+class Command(BaseCommand):
+    help = 'Pasa a vencida las cuotas por unidad y multas cuya fecha límite ya pasó (para ejecutar por cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Fecha de corte AAAA-MM-DD (por defecto hoy)')
+        parser.add_argument('--sin-notificar', action='store_true', help='No enviar notificaciones a los residentes')
+
+    def handle(self, *args, **options):
+        fecha_corte = None
+        if options['fecha']:
+            fecha_corte = parse_date(options['fecha'])
+            if fecha_corte is None:
+                raise CommandError('La fecha debe tener el formato AAAA-MM-DD')
+
+        ejecucion = marcar_vencidos(fecha_corte, notificar=not options['sin_notificar'])
+        if ejecucion.estado == 'fallida':
+            raise CommandError(f'La ejecución {ejecucion.id} falló: {ejecucion.error}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Corte {ejecucion.fecha_corte}: {ejecucion.cuotas_vencidas} cuotas y {ejecucion.multas_vencidas} multas "
+            f"vencidas, {ejecucion.notificaciones_enviadas} residentes notificados"
+        ))
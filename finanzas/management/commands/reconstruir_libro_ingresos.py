@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from finanzas.services.libro_ingresos import reconstruir
+from finanzas.services.resumen_cuotas import validar_mes
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el libro mensual de ingresos (LibroIngresos) desde los ingresos confirmados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mes', help='Solo este mes (AAAA-MM); por defecto todo el libro')
+
+    def handle(self, *args, **options):
+        try:
+            mes_año = validar_mes(options['mes'], 'mes')
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        filas = reconstruir(mes_año)
+        self.stdout.write(self.style.SUCCESS(f"Libro de ingresos reconstruido ({mes_año or 'completo'}): {filas} filas"))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0004_ingreso_resumeningresos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cuotamensual',
+            index=models.Index(fields=['mes_año'], name='finanzas_cuota_mes_idx'),
+        ),
+    ]
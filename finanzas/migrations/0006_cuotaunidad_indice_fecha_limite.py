@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comunidad', '0014_add_vista_por_admin_to_reserva'),
+        ('finanzas', '0005_cuotamensual_indice_mes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cuotaunidad',
+            index=models.Index(fields=['fecha_limite'], name='finanzas_cuota_limite_idx'),
+        ),
+    ]
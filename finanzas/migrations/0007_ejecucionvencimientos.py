@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0006_cuotaunidad_indice_fecha_limite'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EjecucionVencimientos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_inicio', models.DateTimeField(default=django.utils.timezone.now)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('fecha_corte', models.DateField(help_text='Vence todo lo que tenga fecha límite anterior a esta fecha')),
+                ('cuotas_vencidas', models.IntegerField(default=0)),
+                ('multas_vencidas', models.IntegerField(default=0)),
+                ('notificaciones_enviadas', models.IntegerField(default=0)),
+                ('estado', models.CharField(choices=[('en_curso', 'En curso'), ('completada', 'Completada'), ('fallida', 'Fallida')], default='en_curso', max_length=20)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Ejecución de Vencimientos',
+                'verbose_name_plural': 'Ejecuciones de Vencimientos',
+                'ordering': ['-fecha_inicio'],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:02
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def cargar_libro(apps, schema_editor):
+    """Llenar el libro con los ingresos confirmados existentes"""
+    Ingreso = apps.get_model('finanzas', 'Ingreso')
+    LibroIngresos = apps.get_model('finanzas', 'LibroIngresos')
+    filas = (
+        Ingreso.objects.filter(estado='confirmado')
+        .annotate(mes=TruncMonth('fecha_ingreso'))
+        .values('mes', 'tipo_ingreso')
+        .annotate(suma=Sum('monto'), n=Count('id'))
+        .order_by()
+    )
+    LibroIngresos.objects.bulk_create([
+        LibroIngresos(
+            mes_año=fila['mes'].strftime('%Y-%m'), tipo_ingreso=fila['tipo_ingreso'],
+            total=fila['suma'] or 0, cantidad=fila['n'],
+        )
+        for fila in filas
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0007_ejecucionvencimientos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibroIngresos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes_año', models.CharField(max_length=7)),
+                ('tipo_ingreso', models.CharField(choices=[('cuotas', 'Cuotas Mensuales'), ('multas', 'Multas'), ('servicios', 'Servicios Adicionales'), ('alquiler', 'Alquiler de Áreas Comunes'), ('eventos', 'Eventos'), ('donaciones', 'Donaciones'), ('otros', 'Otros Ingresos')], max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cantidad', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Libro de Ingresos',
+                'verbose_name_plural': 'Libro de Ingresos',
+                'ordering': ['-mes_año', 'tipo_ingreso'],
+                'unique_together': {('mes_año', 'tipo_ingreso')},
+            },
+        ),
+        migrations.RunPython(cargar_libro, migrations.RunPython.noop),
+    ]
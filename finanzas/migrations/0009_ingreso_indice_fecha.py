@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-17 00:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comunidad', '0014_add_vista_por_admin_to_reserva'),
+        ('finanzas', '0008_libroingresos'),
+        ('usuarios', '0016_configuracionacceso_segundos_debounce_placa'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingreso',
+            index=models.Index(fields=['estado', 'fecha_ingreso'], name='finanzas_ingreso_fecha_idx'),
+        ),
+    ]
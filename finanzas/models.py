@@ -1,6 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.db.models import Case, DecimalField, F, Value, When
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
 from django.conf import settings
 from django.utils import timezone
+from decimal import Decimal
 from comunidad.models import Unidad
 from usuarios.models import Persona
 
@@ -23,6 +28,8 @@ class CuotaMensual(models.Model):
         verbose_name = "Cuota Mensual"
         verbose_name_plural = "Cuotas Mensuales"
         ordering = ['-mes_año']
+        # Los resúmenes filtran por rango de meses
+        indexes = [models.Index(fields=['mes_año'], name='finanzas_cuota_mes_idx')]
 
     def __str__(self):
         return f"Cuota {self.mes_año}"
@@ -72,6 +79,8 @@ class CuotaUnidad(models.Model):
         verbose_name_plural = "Cuotas por Unidad"
         ordering = ['cuota_mensual', 'unidad']
         unique_together = ['cuota_mensual', 'unidad']
+        # Morosidad y vencimientos filtran por fecha límite
+        indexes = [models.Index(fields=['fecha_limite'], name='finanzas_cuota_limite_idx')]
 
     def __str__(self):
         return f"Cuota {self.cuota_mensual.mes_año} - {self.unidad.numero_casa}"
@@ -93,6 +102,39 @@ class CuotaUnidad(models.Model):
                 self.estado = 'pendiente'
         self.save()
 
+    @staticmethod
+    def estado_segun_pago(monto_pagado):
+        """Mismas reglas que actualizar_estado, como expresión SQL sobre el nuevo monto pagado"""
+        return Case(
+            When(GreaterThanOrEqual(monto_pagado, F('monto')), then=Value('pagada')),
+            When(GreaterThan(monto_pagado, 0), then=Value('parcial')),
+            When(fecha_limite__lt=timezone.now().date(), then=Value('vencida')),
+            default=Value('pendiente'),
+        )
+
+    @classmethod
+    def sumar_pagos(cls, deltas):
+        """
+        Suma a monto_pagado el delta de cada cuota ({cuota_unidad_id: delta}) y
+        recalcula su estado, todo en un único UPDATE. El UPDATE bloquea las filas
+        hasta el fin de la transacción y parte del valor actual de la base, así
+        dos pagos simultáneos a la misma cuota no se pisan.
+        """
+        deltas = {cuota_id: delta for cuota_id, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+        delta = Case(
+            *[When(pk=cuota_id, then=Value(monto)) for cuota_id, monto in deltas.items()],
+            default=Value(Decimal('0')),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+        nuevo_monto = F('monto_pagado') + delta
+        return cls.objects.filter(pk__in=list(deltas)).update(
+            monto_pagado=nuevo_monto,
+            estado=cls.estado_segun_pago(nuevo_monto),
+            fecha_modificacion=timezone.now(),
+        )
+
 class PagoCuota(models.Model):
     """Pagos realizados por los residentes - CU22"""
     cuota_unidad = models.ForeignKey(CuotaUnidad, on_delete=models.CASCADE, related_name='pagos')
@@ -120,22 +162,25 @@ class PagoCuota(models.Model):
         return f"Pago ${self.monto} - {self.fecha_pago}"
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Actualizar el monto pagado de la cuota
-        self.cuota_unidad.monto_pagado = sum(
-            pago.monto for pago in self.cuota_unidad.pagos.all()
-        )
-        self.cuota_unidad.actualizar_estado()
+        with transaction.atomic():
+            deltas = {self.cuota_unidad_id: self.monto}
+            if self.pk:
+                anterior = PagoCuota.objects.filter(pk=self.pk).values('cuota_unidad_id', 'monto').first()
+                if anterior:
+                    deltas[anterior['cuota_unidad_id']] = deltas.get(anterior['cuota_unidad_id'], 0) - anterior['monto']
+            super().save(*args, **kwargs)
+            # Actualizar el monto pagado de la cuota con el delta, sin volver a sumar los pagos
+            CuotaUnidad.sumar_pagos(deltas)
+        if PagoCuota.cuota_unidad.is_cached(self):
+            self.cuota_unidad.refresh_from_db(fields=['monto_pagado', 'estado', 'fecha_modificacion'])
 
     def delete(self, *args, **kwargs):
-        # Actualizar el monto pagado antes de eliminar
         cuota_unidad = self.cuota_unidad
-        super().delete(*args, **kwargs)
-        # Recalcular el monto pagado después de eliminar
-        cuota_unidad.monto_pagado = sum(
-            pago.monto for pago in cuota_unidad.pagos.all()
-        )
-        cuota_unidad.actualizar_estado()
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            CuotaUnidad.sumar_pagos({cuota_unidad.id: -self.monto})
+        cuota_unidad.refresh_from_db(fields=['monto_pagado', 'estado', 'fecha_modificacion'])
+        return resultado
 
 class Ingreso(models.Model):
     """Gestión de Ingresos del Condominio - CU18"""
@@ -182,6 +227,8 @@ class Ingreso(models.Model):
         verbose_name = "Ingreso"
         verbose_name_plural = "Ingresos"
         ordering = ['-fecha_ingreso', '-fecha_registro']
+        # Reportes y resúmenes por rango de fechas de ingresos confirmados
+        indexes = [models.Index(fields=['estado', 'fecha_ingreso'], name='finanzas_ingreso_fecha_idx')]
     
     def __str__(self):
         return f"{self.get_tipo_ingreso_display()} - ${self.monto} - {self.fecha_ingreso}"
@@ -224,23 +271,81 @@ class ResumenIngresos(models.Model):
         return f"Resumen Ingresos {self.mes_año}"
     
     def calcular_totales(self):
-        """Calcula los totales basado en los ingresos del mes"""
-        ingresos = Ingreso.objects.filter(
-            fecha_ingreso__year=self.fecha_ingreso.year,
-            fecha_ingreso__month=self.fecha_ingreso.month,
-            estado='confirmado'
+        """Calcula los totales del mes leyendo sus filas del libro de ingresos"""
+        totales = dict(
+            LibroIngresos.objects.filter(mes_año=self.mes_año).values_list('tipo_ingreso', 'total')
         )
-        
-        self.total_cuotas = sum(ing.monto for ing in ingresos if ing.tipo_ingreso == 'cuotas')
-        self.total_multas = sum(ing.monto for ing in ingresos if ing.tipo_ingreso == 'multas')
-        self.total_servicios = sum(ing.monto for ing in ingresos if ing.tipo_ingreso == 'servicios')
-        self.total_alquiler = sum(ing.monto for ing in ingresos if ing.tipo_ingreso == 'alquiler')
-        self.total_eventos = sum(ing.monto for ing in ingresos if ing.tipo_ingreso == 'eventos')
-        self.total_donaciones = sum(ing.monto for ing in ingresos if ing.tipo_ingreso == 'donaciones')
-        self.total_otros = sum(ing.monto for ing in ingresos if ing.tipo_ingreso == 'otros')
-        
+        for tipo, _ in Ingreso.TIPO_INGRESO_CHOICES:
+            setattr(self, f'total_{tipo}', totales.get(tipo, 0))
+
         self.total_general = (
             self.total_cuotas + self.total_multas + self.total_servicios +
             self.total_alquiler + self.total_eventos + self.total_donaciones + self.total_otros
         )
-        self.save()
\ No newline at end of file
+        self.save()
+
+
+class LibroIngresos(models.Model):
+    """Libro mensual de ingresos confirmados: un total por (mes, tipo), ajustado en cada cambio - CU18"""
+    mes_año = models.CharField(max_length=7)  # Formato: 2025-10
+    tipo_ingreso = models.CharField(max_length=20, choices=Ingreso.TIPO_INGRESO_CHOICES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cantidad = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Libro de Ingresos"
+        verbose_name_plural = "Libro de Ingresos"
+        ordering = ['-mes_año', 'tipo_ingreso']
+        unique_together = ['mes_año', 'tipo_ingreso']
+
+    def __str__(self):
+        return f"{self.mes_año} - {self.get_tipo_ingreso_display()}: ${self.total}"
+
+
+class EjecucionVencimientos(models.Model):
+    """Registro de cada corrida del cambio masivo a 'vencida' de cuotas y multas - CU22"""
+    fecha_inicio = models.DateTimeField(default=timezone.now)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    fecha_corte = models.DateField(help_text="Vence todo lo que tenga fecha límite anterior a esta fecha")
+    cuotas_vencidas = models.IntegerField(default=0)
+    multas_vencidas = models.IntegerField(default=0)
+    notificaciones_enviadas = models.IntegerField(default=0)
+    estado = models.CharField(max_length=20, choices=[
+        ('en_curso', 'En curso'),
+        ('completada', 'Completada'),
+        ('fallida', 'Fallida')
+    ], default='en_curso')
+    error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = "Ejecución de Vencimientos"
+        verbose_name_plural = "Ejecuciones de Vencimientos"
+        ordering = ['-fecha_inicio']
+
+    def __str__(self):
+        return f"Vencimientos {self.fecha_corte} - {self.get_estado_display()}"
+
+
+# Signals para mantener el libro mensual de ingresos
+@receiver(pre_save, sender=Ingreso)
+def recordar_ingreso_anterior(sender, instance, **kwargs):
+    """Guardar cómo estaba el ingreso para restar su aporte anterior al libro"""
+    instance._ingreso_anterior = None
+    if instance.pk and not instance._state.adding:
+        instance._ingreso_anterior = sender.objects.filter(pk=instance.pk).only(
+            'estado', 'monto', 'tipo_ingreso', 'fecha_ingreso'
+        ).first()
+
+@receiver(post_save, sender=Ingreso)
+def actualizar_libro_ingresos(sender, instance, created, **kwargs):
+    """Sumar, restar o mover el aporte del ingreso en LibroIngresos"""
+    from finanzas.services.libro_ingresos import acumular, mover
+    if created:
+        acumular([instance])
+    else:
+        mover(getattr(instance, '_ingreso_anterior', None), instance)
+
+@receiver(post_delete, sender=Ingreso)
+def descontar_libro_ingresos(sender, instance, **kwargs):
+    from finanzas.services.libro_ingresos import acumular
+    acumular([instance], signo=-1)
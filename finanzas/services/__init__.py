@@ -0,0 +1,14 @@
+"""
+Servicios de finanzas - CU18 / CU22
+La integración con la pasarela (pasarela.py) depende de `requests`; se importa
+recién cuando se usa, igual que antes, para no cargarla con el resto de la app.
+"""
+
+_PASARELA = ('PasarelaPagosService', 'NotificacionPagoService', 'pasarela_service')
+
+
+def __getattr__(nombre):
+    if nombre in _PASARELA:
+        from . import pasarela
+        return getattr(pasarela, nombre)
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
@@ -0,0 +1,285 @@
+"""
+Conciliación de extractos bancarios (CSV u OFX) - CU22
+El archivo se lee línea por línea y cada movimiento se busca en índices hash
+armados una sola vez con las cuotas con saldo pendiente:
+  1. referencia del movimiento = payment_reference / payment_id de la cuota
+  2. número de casa mencionado en la descripción + monto igual al saldo
+  3. monto igual al saldo de una única cuota pendiente
+Los movimientos conciliados por 1 y 2 se aplican en lotes con importar_pagos
+(PagoCuota e Ingreso con bulk_create). El monto solo no identifica al pagador:
+lo que coincide por 3 se informa en 'por_confirmar' con el pago ya armado, para
+que alguien lo confirme (acción confirmar_conciliacion) en vez de aplicarlo.
+La memoria depende de las cuotas pendientes, no del tamaño del archivo.
+"""
+
+import codecs
+import csv
+import logging
+import re
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, Iterator, Optional
+
+from django.db.models import F
+
+from finanzas.models import CuotaUnidad
+from finanzas.services.pagos import MAX_DETALLE, importar_pagos
+
+logger = logging.getLogger(__name__)
+
+FORMATOS = ('csv', 'ofx')
+
+# Criterios que no se aplican solos: el pago se propone y se confirma a mano
+CRITERIOS_A_CONFIRMAR = ('monto',)
+
+# Nombres de columna aceptados en el CSV (se comparan en minúsculas)
+COLUMNAS_CSV = {
+    'fecha': ('fecha', 'fecha_pago', 'date', 'fecha_valor'),
+    'monto': ('monto', 'importe', 'amount', 'credito', 'abono'),
+    'referencia': ('referencia', 'reference', 'numero_referencia', 'nro_referencia', 'id'),
+    'descripcion': ('descripcion', 'descripción', 'concepto', 'detalle', 'description', 'glosa'),
+}
+
+PALABRA = re.compile(r'[A-Z0-9]+(?:-[A-Z0-9]+)*')
+ETIQUETA_OFX = re.compile(r'<(/?)([A-Z0-9.]+)>([^<\r\n]*)', re.IGNORECASE)
+
+
+def _normalizar_referencia(valor) -> str:
+    return str(valor or '').strip().upper()
+
+
+def leer_monto(texto) -> Optional[Decimal]:
+    """'1.234,56', '1,234.56', '-50' -> Decimal; None si no es un número"""
+    texto = str(texto or '').strip().replace(' ', '').replace('$', '')
+    if not texto:
+        return None
+    if ',' in texto and '.' in texto:
+        # El último separador es el decimal
+        if texto.rfind(',') > texto.rfind('.'):
+            texto = texto.replace('.', '').replace(',', '.')
+        else:
+            texto = texto.replace(',', '')
+    elif ',' in texto:
+        texto = texto.replace(',', '.')
+    try:
+        return Decimal(texto).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+
+def leer_fecha(texto) -> Optional[date]:
+    texto = str(texto or '').strip()
+    for formato, largo in (('%Y%m%d', 8), ('%Y-%m-%d', 10), ('%d/%m/%Y', 10), ('%d-%m-%Y', 10)):
+        try:
+            return datetime.strptime(texto[:largo], formato).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _lineas_de_texto(archivo) -> Iterator[str]:
+    """Líneas de un archivo abierto en modo texto o binario, decodificadas de a poco"""
+    decodificador = None
+    for linea in archivo:
+        if isinstance(linea, bytes):
+            if decodificador is None:
+                decodificador = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+            linea = decodificador.decode(linea)
+        yield linea
+
+
+def leer_csv(archivo) -> Iterator[Dict]:
+    """Movimientos de un CSV con encabezado (separador ',' o ';')"""
+    lineas = _lineas_de_texto(archivo)
+    encabezado = next(lineas, '')
+    separador = ';' if encabezado.count(';') > encabezado.count(',') else ','
+    columnas = [columna.strip().lower() for columna in next(csv.reader([encabezado], delimiter=separador), [])]
+    indices = {
+        campo: next((columnas.index(nombre) for nombre in nombres if nombre in columnas), None)
+        for campo, nombres in COLUMNAS_CSV.items()
+    }
+    if indices['monto'] is None:
+        raise ValueError("El CSV no tiene una columna de monto (monto/importe/amount)")
+
+    def columna(valores, campo):
+        indice = indices[campo]
+        return valores[indice].strip() if indice is not None and indice < len(valores) else ''
+
+    for numero, valores in enumerate(csv.reader(lineas, delimiter=separador), start=2):
+        if not any(valor.strip() for valor in valores):
+            continue
+        yield {
+            'linea': numero,
+            'fecha': leer_fecha(columna(valores, 'fecha')),
+            'monto': leer_monto(columna(valores, 'monto')),
+            'referencia': columna(valores, 'referencia'),
+            'descripcion': columna(valores, 'descripcion'),
+        }
+
+
+def leer_ofx(archivo) -> Iterator[Dict]:
+    """Movimientos (<STMTTRN>) de un OFX 1.x (SGML) o 2.x (XML), sin cargar el archivo entero"""
+    movimiento = None
+    for numero_linea, linea in enumerate(_lineas_de_texto(archivo), start=1):
+        for cierre, etiqueta, valor in ETIQUETA_OFX.findall(linea):
+            etiqueta = etiqueta.upper()
+            if etiqueta == 'STMTTRN':
+                if cierre and movimiento is not None:
+                    yield movimiento
+                    movimiento = None
+                elif not cierre:
+                    movimiento = {'linea': numero_linea, 'fecha': None, 'monto': None, 'referencia': '', 'descripcion': ''}
+                continue
+            if movimiento is None or cierre:
+                continue
+            valor = valor.strip()
+            if etiqueta == 'TRNAMT':
+                movimiento['monto'] = leer_monto(valor)
+            elif etiqueta == 'DTPOSTED':
+                movimiento['fecha'] = leer_fecha(valor)
+            elif etiqueta in ('REFNUM', 'CHECKNUM') or (etiqueta == 'FITID' and not movimiento['referencia']):
+                movimiento['referencia'] = valor
+            elif etiqueta in ('NAME', 'MEMO'):
+                movimiento['descripcion'] = f"{movimiento['descripcion']} {valor}".strip()
+    if movimiento is not None:
+        yield movimiento
+
+
+class IndiceConciliacion:
+    """Cuotas con saldo pendiente indexadas por referencia, por (casa, saldo) y por saldo"""
+
+    def __init__(self):
+        self.por_referencia = {}
+        self.por_casa_monto = defaultdict(list)
+        self.por_monto = defaultdict(list)
+        self.casas = set()
+        self._saldos = {}
+
+        cuotas = (
+            CuotaUnidad.objects.filter(monto_pagado__lt=F('monto'))
+            .order_by('fecha_limite', 'id')
+            .values_list('id', 'monto', 'monto_pagado', 'payment_reference', 'payment_id', 'unidad__numero_casa')
+            .iterator(chunk_size=2000)
+        )
+        for cuota_id, monto, monto_pagado, payment_reference, payment_id, numero_casa in cuotas:
+            saldo = monto - monto_pagado
+            casa = _normalizar_referencia(numero_casa)
+            self._saldos[cuota_id] = saldo
+            self.casas.add(casa)
+            for referencia in (payment_reference, payment_id):
+                if referencia:
+                    self.por_referencia[_normalizar_referencia(referencia)] = cuota_id
+            self.por_casa_monto[(casa, saldo)].append(cuota_id)
+            self.por_monto[saldo].append(cuota_id)
+
+    def _tomar(self, candidatos, monto: Decimal) -> Optional[int]:
+        # La cuota más antigua que todavía tenga ese saldo
+        for cuota_id in candidatos:
+            if self._saldos.get(cuota_id) == monto:
+                return cuota_id
+        return None
+
+    def buscar(self, movimiento: Dict):
+        """(cuota_unidad_id, criterio) o (None, motivo)"""
+        monto = movimiento['monto']
+        referencia = _normalizar_referencia(movimiento['referencia'])
+        if referencia and referencia in self.por_referencia:
+            return self.por_referencia[referencia], 'referencia'
+
+        texto = _normalizar_referencia(f"{movimiento['referencia']} {movimiento['descripcion']}")
+        for palabra in PALABRA.findall(texto):
+            if palabra in self.casas:
+                cuota_id = self._tomar(self.por_casa_monto.get((palabra, monto), ()), monto)
+                if cuota_id:
+                    return cuota_id, 'unidad_y_monto'
+
+        candidatos = []
+        for cuota_id in self.por_monto.get(monto, ()):
+            if self._saldos.get(cuota_id) == monto:
+                candidatos.append(cuota_id)
+                if len(candidatos) > 1:
+                    return None, 'Varias cuotas pendientes con ese monto'
+        if candidatos:
+            return candidatos[0], 'monto'
+        return None, 'Sin cuota pendiente que coincida'
+
+    def aplicar(self, cuota_id: int, monto: Decimal):
+        """Descontar el monto asignado para que no se vuelva a conciliar contra la misma cuota"""
+        if cuota_id in self._saldos:
+            self._saldos[cuota_id] -= monto
+
+
+def conciliar_movimientos(movimientos: Iterable[Dict], resultado: Dict, indice: IndiceConciliacion = None) -> Iterator[Dict]:
+    """
+    Genera los pagos de los movimientos conciliados; los que solo coinciden por
+    monto y los que no coinciden se cuentan en `resultado`
+    """
+    indice = indice or IndiceConciliacion()
+    for movimiento in movimientos:
+        resultado['lineas'] += 1
+        monto = movimiento['monto']
+        if monto is None:
+            motivo = 'Monto inválido'
+        elif monto <= 0:
+            # Débitos y comisiones no son pagos de cuotas
+            resultado['ignoradas'] += 1
+            continue
+        else:
+            cuota_id, motivo = indice.buscar(movimiento)
+            if cuota_id:
+                pago = {
+                    'fila': movimiento['linea'],
+                    'cuota_unidad': cuota_id,
+                    'monto': monto,
+                    'fecha_pago': movimiento['fecha'],
+                    'metodo_pago': 'transferencia',
+                    'numero_referencia': movimiento['referencia'],
+                    'observaciones': f"Extracto bancario línea {movimiento['linea']}: {movimiento['descripcion']}"[:500],
+                }
+                if motivo in CRITERIOS_A_CONFIRMAR:
+                    # Sin reservar el saldo: el pago todavía no se aplicó
+                    resultado['total_por_confirmar'] += 1
+                    if len(resultado['por_confirmar']) < MAX_DETALLE:
+                        resultado['por_confirmar'].append(pago)
+                    continue
+                indice.aplicar(cuota_id, monto)
+                resultado['por_criterio'][motivo] = resultado['por_criterio'].get(motivo, 0) + 1
+                yield pago
+                continue
+
+        resultado['total_no_conciliadas'] += 1
+        if len(resultado['no_conciliadas']) < MAX_DETALLE:
+            resultado['no_conciliadas'].append({
+                'linea': movimiento['linea'],
+                'fecha': movimiento['fecha'],
+                'monto': monto,
+                'referencia': movimiento['referencia'],
+                'descripcion': movimiento['descripcion'],
+                'motivo': motivo,
+            })
+
+
+def conciliar_extracto(archivo, formato: str, usuario) -> Dict:
+    """Lee el extracto, concilia los movimientos y registra pagos e ingresos en lote"""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}. Opciones: {', '.join(FORMATOS)}")
+    movimientos = leer_ofx(archivo) if formato == 'ofx' else leer_csv(archivo)
+
+    resultado = {
+        'lineas': 0, 'ignoradas': 0, 'total_no_conciliadas': 0, 'no_conciliadas': [],
+        'total_por_confirmar': 0, 'por_confirmar': [], 'por_criterio': {},
+    }
+    pagos = importar_pagos(conciliar_movimientos(movimientos, resultado), usuario, registrar_ingresos=True)
+    resultado.update(
+        conciliadas=pagos['aplicados'],
+        duplicadas=pagos['duplicados'],
+        monto_conciliado=pagos['monto_aplicado'],
+        total_rechazadas=pagos['total_rechazados'],
+        rechazadas=pagos['rechazados'],
+    )
+    logger.info(
+        f"Extracto {formato}: {resultado['lineas']} líneas, {resultado['conciliadas']} conciliadas, "
+        f"{resultado['total_por_confirmar']} por confirmar, {resultado['total_no_conciliadas']} sin conciliar"
+    )
+    return resultado
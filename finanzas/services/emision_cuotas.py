@@ -0,0 +1,114 @@
+"""
+Emisión de cuotas por unidad - CU22
+Genera todas las CuotaUnidad de una cuota mensual con un solo bulk_create.
+Las unidades que ya tienen su cuota se ignoran por la restricción única
+(cuota_mensual, unidad), así que volver a emitir no duplica ni falla.
+"""
+
+import logging
+from decimal import ROUND_DOWN, Decimal
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+
+from comunidad.models import Unidad
+from finanzas.models import CuotaMensual, CuotaUnidad
+
+logger = logging.getLogger(__name__)
+
+CENTAVO = Decimal('0.01')
+
+# Reglas de reparto del monto total entre las unidades
+REPARTO_IGUAL = 'igual'
+REPARTO_METROS = 'metros_cuadrados'
+REGLAS_REPARTO = [REPARTO_IGUAL, REPARTO_METROS]
+
+
+class ErrorEmision(Exception):
+    """La cuota mensual no se puede emitir con los datos recibidos"""
+
+
+def repartir_monto(monto_total: Decimal, pesos: List[Decimal]) -> List[Decimal]:
+    """
+    Reparte el monto en proporción a los pesos, redondeado a centavos.
+    Los centavos que sobran del redondeo van a las partes con mayor residuo,
+    así la suma de las cuotas coincide exactamente con el monto total.
+    """
+    total_pesos = sum(pesos)
+    if not pesos or total_pesos <= 0:
+        raise ErrorEmision('No hay base para repartir el monto (total de pesos en cero)')
+
+    exactos = [monto_total * peso / total_pesos for peso in pesos]
+    montos = [exacto.quantize(CENTAVO, rounding=ROUND_DOWN) for exacto in exactos]
+    sobrantes = int((monto_total - sum(montos)) / CENTAVO)
+    por_residuo = sorted(range(len(pesos)), key=lambda i: exactos[i] - montos[i], reverse=True)
+    for i in por_residuo[:sobrantes]:
+        montos[i] += CENTAVO
+    return montos
+
+
+def unidades_a_emitir(enviar_a_todos: bool = True, unidades_seleccionadas: Optional[Iterable[int]] = None):
+    """Unidades activas destinatarias: todas o solo las seleccionadas"""
+    unidades = Unidad.objects.filter(activa=True)
+    if not enviar_a_todos:
+        unidades = unidades.filter(id__in=list(unidades_seleccionadas or []))
+    return unidades
+
+
+def emitir_cuotas(cuota_mensual: CuotaMensual, unidades=None, regla: str = REPARTO_IGUAL) -> Dict:
+    """
+    Crea las cuotas por unidad de `cuota_mensual` en una sola transacción y
+    deja la cuota mensual en estado 'activa'.
+    Retorna cuántas se crearon, cuántas ya existían y el monto por unidad.
+    """
+    if regla not in REGLAS_REPARTO:
+        raise ErrorEmision(f"Regla de reparto inválida: {regla}. Opciones: {', '.join(REGLAS_REPARTO)}")
+    if unidades is None:
+        unidades = unidades_a_emitir()
+
+    with transaction.atomic():
+        # Bloquea la cuota mensual: dos emisiones simultáneas se ejecutan una tras otra
+        cuota_mensual = CuotaMensual.objects.select_for_update().get(pk=cuota_mensual.pk)
+
+        filas = list(unidades.order_by('id').values_list('id', 'metros_cuadrados'))
+        if not filas:
+            raise ErrorEmision('No hay unidades activas para generar cuotas')
+
+        if regla == REPARTO_METROS:
+            pesos = [metros or Decimal('0') for _, metros in filas]
+        else:
+            pesos = [Decimal('1')] * len(filas)
+        montos = repartir_monto(cuota_mensual.monto_total, pesos)
+
+        existentes = CuotaUnidad.objects.filter(cuota_mensual=cuota_mensual).count()
+        CuotaUnidad.objects.bulk_create(
+            [
+                CuotaUnidad(
+                    cuota_mensual=cuota_mensual,
+                    unidad_id=unidad_id,
+                    monto=monto,
+                    fecha_limite=cuota_mensual.fecha_limite,
+                    estado='pendiente',
+                )
+                for (unidad_id, _), monto in zip(filas, montos)
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        creadas = CuotaUnidad.objects.filter(cuota_mensual=cuota_mensual).count() - existentes
+
+        if cuota_mensual.estado != 'activa':
+            cuota_mensual.estado = 'activa'
+            cuota_mensual.save(update_fields=['estado', 'fecha_modificacion'])
+
+    logger.info(f"Cuota {cuota_mensual.mes_año}: {creadas} cuotas por unidad emitidas ({regla})")
+    return {
+        'cuota_mensual': cuota_mensual,
+        'regla': regla,
+        'total_unidades': len(filas),
+        'creadas': creadas,
+        'omitidas': len(filas) - creadas,
+        'monto_por_unidad': montos[0] if regla == REPARTO_IGUAL else None,
+        'monto_minimo': min(montos),
+        'monto_maximo': max(montos),
+    }
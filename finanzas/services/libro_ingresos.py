@@ -0,0 +1,156 @@
+"""
+Libro mensual de ingresos - CU18
+LibroIngresos guarda el total y la cantidad de ingresos confirmados por
+(mes_año, tipo_ingreso). Cada alta, confirmación, cancelación, edición o baja de
+un Ingreso suma o resta su aporte con un INSERT ... ON CONFLICT DO UPDATE, así
+el resumen de un mes es leer a lo sumo siete filas por clave única.
+`reconstruir` lo recalcula desde Ingreso (comando reconstruir_libro_ingresos).
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_CLAVE = ['mes_año', 'tipo_ingreso']
+CAMPOS_CONTADOR = ['total', 'cantidad']
+
+
+def aporte(ingreso) -> Optional[Tuple[Tuple[str, str], Decimal]]:
+    """((mes_año, tipo), monto) con que el ingreso cuenta en el libro, o None si no está confirmado"""
+    if ingreso is None or ingreso.estado != 'confirmado':
+        return None
+    return (ingreso.fecha_ingreso.strftime('%Y-%m'), ingreso.tipo_ingreso), Decimal(str(ingreso.monto))
+
+
+def _incrementar(contadores: Dict):
+    """INSERT ... ON CONFLICT DO UPDATE sumando total y cantidad (PostgreSQL y SQLite)"""
+    from finanzas.models import LibroIngresos
+
+    contadores = {clave: valores for clave, valores in contadores.items() if any(valores)}
+    if not contadores:
+        return
+
+    tabla = LibroIngresos._meta.db_table
+    ops = connection.ops
+    filas = []
+    parametros = []
+    for (mes_año, tipo_ingreso), (total, cantidad) in contadores.items():
+        filas.append('(%s, %s, %s, %s)')
+        parametros.extend([mes_año, tipo_ingreso, ops.adapt_decimalfield_value(total, 14, 2), cantidad])
+
+    columnas = ', '.join(connection.ops.quote_name(campo) for campo in CAMPOS_CLAVE + CAMPOS_CONTADOR)
+    clave = ', '.join(connection.ops.quote_name(campo) for campo in CAMPOS_CLAVE)
+    actualizaciones = ', '.join(f'{campo} = {tabla}.{campo} + excluded.{campo}' for campo in CAMPOS_CONTADOR)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''INSERT INTO {tabla} ({columnas})
+                VALUES {', '.join(filas)}
+                ON CONFLICT ({clave}) DO UPDATE SET {actualizaciones}''',
+            parametros
+        )
+
+
+def acumular(ingresos: Iterable, signo: int = 1):
+    """Sumar (o restar con signo=-1) los ingresos confirmados a su fila del libro"""
+    contadores = defaultdict(lambda: [Decimal('0'), 0])
+    for ingreso in ingresos:
+        valor = aporte(ingreso)
+        if valor:
+            clave, monto = valor
+            contadores[clave][0] += signo * monto
+            contadores[clave][1] += signo
+
+    with transaction.atomic():
+        _incrementar(contadores)
+
+
+def mover(anterior, actual):
+    """Ajustar el libro cuando un ingreso cambia (estado, monto, tipo o fecha)"""
+    if aporte(anterior) == aporte(actual):
+        return
+    with transaction.atomic():
+        acumular([anterior], signo=-1)
+        acumular([actual])
+
+
+def totales_mes(mes_año: str) -> Dict:
+    """{tipo_ingreso: total} del mes; los tipos sin ingresos valen 0"""
+    from finanzas.models import Ingreso, LibroIngresos
+
+    totales = {tipo: Decimal('0') for tipo, _ in Ingreso.TIPO_INGRESO_CHOICES}
+    totales.update(LibroIngresos.objects.filter(mes_año=mes_año).values_list('tipo_ingreso', 'total'))
+    return totales
+
+
+def total_confirmado(desde: date, hasta: date) -> Decimal:
+    """
+    Total de ingresos confirmados entre dos fechas (inclusive). Los meses completos
+    del rango salen del libro; solo los días sueltos de los extremos se suman en Ingreso.
+    """
+    from finanzas.models import Ingreso, LibroIngresos
+
+    if desde > hasta:
+        return Decimal('0')
+    primer_mes = desde if desde.day == 1 else _mes_siguiente(desde)
+    fin_ultimo_mes = _mes_siguiente(hasta) - timedelta(days=1)
+    ultimo_mes = hasta.replace(day=1) if hasta == fin_ultimo_mes else _mes_siguiente(hasta.replace(day=1), -1)
+
+    ingresos = Ingreso.objects.filter(estado='confirmado')
+    if primer_mes > ultimo_mes:
+        # El rango no cubre ningún mes completo
+        tramos = Q(fecha_ingreso__range=[desde, hasta])
+        total_libro = Decimal('0')
+    else:
+        tramos = Q(fecha_ingreso__gte=desde, fecha_ingreso__lt=primer_mes) | Q(
+            fecha_ingreso__gte=_mes_siguiente(ultimo_mes), fecha_ingreso__lte=hasta
+        )
+        total_libro = LibroIngresos.objects.filter(
+            mes_año__gte=primer_mes.strftime('%Y-%m'), mes_año__lte=ultimo_mes.strftime('%Y-%m')
+        ).aggregate(total=Sum('total'))['total'] or Decimal('0')
+    total_dias = ingresos.filter(tramos).aggregate(total=Sum('monto'))['total'] or Decimal('0')
+    return total_libro + total_dias
+
+
+def _mes_siguiente(fecha: date, meses: int = 1) -> date:
+    """Primer día del mes `meses` después (o antes) del mes de la fecha"""
+    indice = fecha.year * 12 + fecha.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def reconstruir(mes_año: Optional[str] = None) -> int:
+    """Recalcular el libro desde los ingresos confirmados (de un mes, o todo)"""
+    from finanzas.models import Ingreso, LibroIngresos
+
+    ingresos = Ingreso.objects.filter(estado='confirmado')
+    libro = LibroIngresos.objects.all()
+    if mes_año:
+        año, mes = mes_año.split('-')
+        ingresos = ingresos.filter(fecha_ingreso__year=año, fecha_ingreso__month=mes)
+        libro = libro.filter(mes_año=mes_año)
+
+    filas = (
+        ingresos.annotate(mes=TruncMonth('fecha_ingreso'))
+        .values('mes', 'tipo_ingreso')
+        .annotate(suma=Sum('monto'), n=Count('id'))
+        .order_by()
+    )
+
+    with transaction.atomic():
+        libro.delete()
+        creadas = LibroIngresos.objects.bulk_create([
+            LibroIngresos(
+                mes_año=fila['mes'].strftime('%Y-%m'), tipo_ingreso=fila['tipo_ingreso'],
+                total=fila['suma'] or 0, cantidad=fila['n'],
+            )
+            for fila in filas
+        ])
+    logger.info(f"Libro de ingresos reconstruido ({mes_año or 'completo'}): {len(creadas)} filas")
+    return len(creadas)
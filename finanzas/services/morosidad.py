@@ -0,0 +1,149 @@
+"""
+Reporte de morosidad - CU22
+Una sola consulta: las cuotas vencidas con saldo, el residente de la unidad
+(subconsulta correlacionada) y, con funciones de ventana, los totales por
+unidad, por residente, por tramo de antigüedad y el total de filas para paginar.
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Optional
+
+from django.db.models import (
+    Case, CharField, Count, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value, When, Window,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from comunidad.models import ResidentesUnidad
+from finanzas.models import CuotaUnidad
+
+# (clave, días mínimos, días máximos) de atraso; None = sin límite
+TRAMOS = [
+    ('0-30', 1, 30),
+    ('31-60', 31, 60),
+    ('61-90', 61, 90),
+    ('90+', 91, None),
+]
+TAMANO_PAGINA = 50
+TAMANO_PAGINA_MAXIMO = 500
+
+MONTO = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _condicion_tramo(hoy: date, minimo: int, maximo: Optional[int]) -> Dict:
+    # Los días de atraso se traducen a un rango de fecha_limite (sirve el índice y es igual en cualquier base)
+    condicion = {'fecha_limite__lte': hoy - timedelta(days=minimo)}
+    if maximo is not None:
+        condicion['fecha_limite__gte'] = hoy - timedelta(days=maximo)
+    return condicion
+
+
+def _residente_de_unidad(campo: str):
+    """Residente activo de la unidad: el propietario si hay, si no el más antiguo"""
+    return Subquery(
+        ResidentesUnidad.objects.filter(id_unidad=OuterRef('unidad_id'), estado=True)
+        .order_by(Case(When(rol_en_unidad='propietario', then=Value(0)), default=Value(1)), 'id')
+        .values(campo)[:1]
+    )
+
+
+def reporte_morosos(hoy: Optional[date] = None, tramo: Optional[str] = None,
+                    pagina: int = 1, tamano_pagina: int = TAMANO_PAGINA) -> Dict:
+    """Página del reporte de cuotas vencidas con saldo, con totales generales y por tramo"""
+    hoy = hoy or timezone.now().date()
+    tamano_pagina = max(1, min(tamano_pagina, TAMANO_PAGINA_MAXIMO))
+    pagina = max(1, pagina)
+
+    cuotas = CuotaUnidad.objects.filter(fecha_limite__lt=hoy, monto_pagado__lt=F('monto')).exclude(estado='pagada')
+    if tramo:
+        limites = {clave: (minimo, maximo) for clave, minimo, maximo in TRAMOS}
+        if tramo not in limites:
+            raise ValueError(f"Tramo inválido: {tramo}. Opciones: {', '.join(limites)}")
+        minimo, maximo = limites[tramo]
+        cuotas = cuotas.filter(**_condicion_tramo(hoy, minimo, maximo))
+
+    saldo = ExpressionWrapper(F('monto') - F('monto_pagado'), output_field=MONTO)
+    clave_tramo = Case(
+        *[When(then=Value(clave), **_condicion_tramo(hoy, minimo, maximo)) for clave, minimo, maximo in TRAMOS],
+        output_field=CharField(),
+    )
+    totales_tramo = {
+        f'total_{clave}': Window(Sum(Case(
+            When(then=saldo, **_condicion_tramo(hoy, minimo, maximo)), default=Value(Decimal('0')), output_field=MONTO,
+        )))
+        for clave, minimo, maximo in TRAMOS
+    }
+
+    filas = (
+        cuotas.annotate(
+            saldo=saldo,
+            tramo=clave_tramo,
+            residente_id=_residente_de_unidad('id_residente_id'),
+            residente=_residente_de_unidad('id_residente__persona__nombre'),
+            total_filas=Window(Count('id')),
+            total_adeudado=Window(Sum(saldo)),
+            total_unidad=Window(Sum(saldo), partition_by=[F('unidad_id')]),
+            cuotas_unidad=Window(Count('id'), partition_by=[F('unidad_id')]),
+            total_residente=Window(Sum(saldo), partition_by=[F('residente_id')]),
+            **totales_tramo,
+        )
+        .order_by('fecha_limite', 'unidad__numero_casa', 'id')
+        .values(
+            'id', 'unidad_id', 'unidad__numero_casa', 'cuota_mensual__mes_año', 'fecha_limite', 'saldo', 'tramo',
+            'residente_id', 'residente', 'total_filas', 'total_adeudado', 'total_unidad', 'cuotas_unidad',
+            'total_residente', *totales_tramo,
+        )
+    )
+    inicio = (pagina - 1) * tamano_pagina
+    filas = list(filas[inicio:inicio + tamano_pagina])
+
+    if filas:
+        primera = filas[0]
+        resumen = {
+            'total_adeudado': primera['total_adeudado'],
+            'antiguedad': {clave: primera[f'total_{clave}'] for clave, _, _ in TRAMOS},
+        }
+        total_filas = primera['total_filas']
+    else:
+        # Página fuera de rango: los totales salen de una agregación aparte
+        agregado = cuotas.aggregate(
+            total_filas=Count('id'),
+            total_adeudado=Coalesce(Sum(saldo), Value(Decimal('0')), output_field=MONTO),
+            **{
+                f'total_{clave}': Coalesce(
+                    Sum(saldo, filter=Q(**_condicion_tramo(hoy, minimo, maximo))), Value(Decimal('0')), output_field=MONTO
+                )
+                for clave, minimo, maximo in TRAMOS
+            },
+        )
+        resumen = {
+            'total_adeudado': agregado['total_adeudado'],
+            'antiguedad': {clave: agregado[f'total_{clave}'] for clave, _, _ in TRAMOS},
+        }
+        total_filas = agregado['total_filas']
+
+    return {
+        'count': total_filas,
+        'page': pagina,
+        'page_size': tamano_pagina,
+        'resumen': resumen,
+        'results': [
+            {
+                'cuota_id': fila['id'],
+                'unidad_id': fila['unidad_id'],
+                'unidad': fila['unidad__numero_casa'],
+                'residente_id': fila['residente_id'],
+                'residente': fila['residente'] or 'Sin residente',
+                'mes_año': fila['cuota_mensual__mes_año'],
+                'monto_adeudado': fila['saldo'],
+                'dias_vencido': (hoy - fila['fecha_limite']).days,
+                'tramo': fila['tramo'],
+                'fecha_vencimiento': fila['fecha_limite'],
+                'total_unidad': fila['total_unidad'],
+                'cuotas_unidad': fila['cuotas_unidad'],
+                'total_residente': fila['total_residente'] if fila['residente_id'] else None,
+            }
+            for fila in filas
+        ],
+    }
@@ -0,0 +1,180 @@
+"""
+Aplicación de pagos en lote - CU22
+Importa miles de pagos con un número fijo de consultas por lote: bloquea las
+cuotas del lote, descarta referencias ya registradas, inserta los PagoCuota (y
+opcionalmente sus Ingreso) con bulk_create y actualiza monto_pagado/estado de
+todas las cuotas en un UPDATE.
+"""
+
+import logging
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, List
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from economia.services.resumen_financiero import invalidar_resumen
+from finanzas.models import CuotaUnidad, Ingreso, PagoCuota
+from finanzas.services import libro_ingresos
+
+logger = logging.getLogger(__name__)
+
+METODOS_PAGO = {metodo for metodo, _ in PagoCuota._meta.get_field('metodo_pago').choices}
+TAMANO_LOTE = 1000
+# Máximo de filas rechazadas que se detallan en el resultado (el total se cuenta siempre)
+MAX_DETALLE = 500
+
+
+class PagoInvalido(ValueError):
+    """Fila de la importación que no se puede aplicar"""
+
+
+def _normalizar(fila: Dict) -> Dict:
+    if not isinstance(fila, dict):
+        raise PagoInvalido('Cada pago debe ser un objeto')
+    try:
+        cuota_unidad_id = int(fila.get('cuota_unidad') or fila.get('cuota_unidad_id'))
+    except (TypeError, ValueError):
+        raise PagoInvalido('cuota_unidad inválida')
+    try:
+        monto = Decimal(str(fila.get('monto'))).quantize(Decimal('0.01'))
+        # quantize deja pasar NaN, que luego no se puede comparar
+        if not monto.is_finite():
+            raise InvalidOperation
+    except (InvalidOperation, ValueError):
+        raise PagoInvalido('monto inválido')
+    if monto <= 0:
+        raise PagoInvalido('El monto del pago debe ser mayor a 0')
+
+    fecha_pago = fila.get('fecha_pago') or timezone.now().date()
+    if not isinstance(fecha_pago, date):
+        fecha_pago = parse_date(str(fecha_pago))
+        if fecha_pago is None:
+            raise PagoInvalido('fecha_pago debe tener el formato AAAA-MM-DD')
+
+    metodo_pago = fila.get('metodo_pago') or 'transferencia'
+    if metodo_pago not in METODOS_PAGO:
+        raise PagoInvalido(f'metodo_pago inválido: {metodo_pago}')
+
+    return {
+        'cuota_unidad_id': cuota_unidad_id,
+        'monto': monto,
+        'fecha_pago': fecha_pago,
+        'metodo_pago': metodo_pago,
+        'numero_referencia': str(fila.get('numero_referencia') or '')[:100],
+        'observaciones': fila.get('observaciones') or '',
+    }
+
+
+def _rechazar(resultado: Dict, numero: int, error: str):
+    resultado['total_rechazados'] += 1
+    if len(resultado['rechazados']) < MAX_DETALLE:
+        resultado['rechazados'].append({'fila': numero, 'error': error})
+
+
+def _aplicar_lote(filas: List, usuario, resultado: Dict, registrar_ingresos: bool = False):
+    """filas: [(número de fila, pago normalizado)]"""
+    ids = {pago['cuota_unidad_id'] for _, pago in filas}
+    referencias = {pago['numero_referencia'] for _, pago in filas if pago['numero_referencia']}
+
+    with transaction.atomic():
+        cuotas = {
+            cuota['id']: cuota
+            for cuota in CuotaUnidad.objects.select_for_update(of=('self',)).filter(id__in=ids).values(
+                'id', 'monto', 'monto_pagado', 'unidad_id', 'unidad__numero_casa', 'cuota_mensual__mes_año'
+            )
+        }
+        saldos = {cuota_id: cuota['monto'] - cuota['monto_pagado'] for cuota_id, cuota in cuotas.items()}
+        registradas = set()
+        if referencias:
+            registradas = set(
+                PagoCuota.objects.filter(cuota_unidad_id__in=ids, numero_referencia__in=referencias)
+                .values_list('cuota_unidad_id', 'numero_referencia')
+            )
+
+        nuevos, ingresos, deltas = [], [], {}
+        for numero, pago in filas:
+            cuota_id = pago['cuota_unidad_id']
+            if cuota_id not in saldos:
+                _rechazar(resultado, numero, f'La cuota {cuota_id} no existe')
+                continue
+            clave = (cuota_id, pago['numero_referencia'])
+            if pago['numero_referencia'] and clave in registradas:
+                resultado['duplicados'] += 1
+                continue
+            if pago['monto'] > saldos[cuota_id]:
+                _rechazar(
+                    resultado, numero,
+                    f"El monto del pago ({pago['monto']}) supera el saldo pendiente ({saldos[cuota_id]})",
+                )
+                continue
+            registradas.add(clave)
+            saldos[cuota_id] -= pago['monto']
+            deltas[cuota_id] = deltas.get(cuota_id, Decimal('0')) + pago['monto']
+            nuevos.append(PagoCuota(registrado_por=usuario, **pago))
+            if registrar_ingresos:
+                cuota = cuotas[cuota_id]
+                ingresos.append(Ingreso(
+                    tipo_ingreso='cuotas',
+                    concepto=f"Cuota {cuota['cuota_mensual__mes_año']} - Unidad {cuota['unidad__numero_casa']}",
+                    monto=pago['monto'],
+                    fecha_ingreso=pago['fecha_pago'],
+                    estado='confirmado',
+                    unidad_relacionada_id=cuota['unidad_id'],
+                    cuota_relacionada_id=cuota_id,
+                    numero_referencia=pago['numero_referencia'],
+                    observaciones=pago['observaciones'],
+                    registrado_por=usuario,
+                ))
+
+        # bulk_create no llama a PagoCuota.save(): los saldos se actualizan juntos abajo
+        PagoCuota.objects.bulk_create(nuevos)
+        if ingresos:
+            # bulk_create no dispara las señales: el libro mensual y el resumen del dashboard se ajustan aparte
+            Ingreso.objects.bulk_create(ingresos)
+            libro_ingresos.acumular(ingresos)
+            invalidar_resumen()
+        CuotaUnidad.sumar_pagos(deltas)
+
+    resultado['aplicados'] += len(nuevos)
+    resultado['monto_aplicado'] += sum(deltas.values(), Decimal('0'))
+    resultado['cuotas_actualizadas'] += len(deltas)
+
+
+def importar_pagos(filas: Iterable[Dict], usuario, tamano_lote: int = TAMANO_LOTE,
+                   registrar_ingresos: bool = False) -> Dict:
+    """
+    Aplica pagos ({cuota_unidad, monto, fecha_pago, metodo_pago, numero_referencia,
+    observaciones}). Cada lote es una transacción; las filas inválidas, las que
+    superan el saldo y las referencias ya registradas para la cuota se informan
+    sin frenar al resto. `filas` se consume de a un lote, así que puede ser un generador.
+    """
+    resultado = {
+        'aplicados': 0, 'duplicados': 0, 'rechazados': [], 'total_rechazados': 0,
+        'monto_aplicado': Decimal('0'), 'cuotas_actualizadas': 0, 'lotes': 0,
+    }
+    lote = []
+    for numero, fila in enumerate(filas, start=1):
+        if isinstance(fila, dict):
+            # Quien genera las filas puede indicar su propio número (por ejemplo, la línea del archivo)
+            numero = fila.get('fila', numero)
+        try:
+            lote.append((numero, _normalizar(fila)))
+        except PagoInvalido as e:
+            _rechazar(resultado, numero, str(e))
+            continue
+        if len(lote) >= tamano_lote:
+            _aplicar_lote(lote, usuario, resultado, registrar_ingresos)
+            resultado['lotes'] += 1
+            lote = []
+    if lote:
+        _aplicar_lote(lote, usuario, resultado, registrar_ingresos)
+        resultado['lotes'] += 1
+
+    logger.info(
+        f"Importación de pagos: {resultado['aplicados']} aplicados, {resultado['duplicados']} duplicados, "
+        f"{resultado['total_rechazados']} rechazados"
+    )
+    return resultado
@@ -0,0 +1,73 @@
+"""
+Resumen de cobranza de cuotas - CU22
+Todo se calcula con agregaciones en SQL (una consulta por tabla, más una
+agrupada por mes si se pide el detalle), sin recorrer cuotas en Python.
+"""
+
+import re
+from decimal import Decimal
+from typing import Dict, Optional
+
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from finanzas.models import CuotaMensual, CuotaUnidad
+
+FORMATO_MES = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+CERO = Value(Decimal('0'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def validar_mes(valor: Optional[str], nombre: str) -> Optional[str]:
+    """'2025-10' o None; cualquier otro formato lanza ValueError"""
+    if not valor:
+        return None
+    if not FORMATO_MES.match(valor):
+        raise ValueError(f"El parámetro {nombre} debe tener el formato AAAA-MM")
+    return valor
+
+
+def _filtro_meses(prefijo: str, desde: Optional[str], hasta: Optional[str]) -> Q:
+    # mes_año es 'AAAA-MM': la comparación de texto respeta el orden cronológico
+    filtro = Q()
+    if desde:
+        filtro &= Q(**{f'{prefijo}mes_año__gte': desde})
+    if hasta:
+        filtro &= Q(**{f'{prefijo}mes_año__lte': hasta})
+    return filtro
+
+
+def _montos_unidades():
+    return {
+        'monto_cobrado': Coalesce(Sum('monto_pagado'), CERO),
+        'monto_pendiente': Coalesce(Sum(F('monto') - F('monto_pagado')), CERO),
+    }
+
+
+def _porcentaje(cobrado, total) -> float:
+    return round(float(cobrado / total * 100), 2) if total else 0
+
+
+def resumen_cuotas(desde: Optional[str] = None, hasta: Optional[str] = None, por_mes: bool = False) -> Dict:
+    """Totales de cuotas mensuales y de su cobranza, opcionalmente entre dos meses (inclusive)"""
+    resumen = CuotaMensual.objects.filter(_filtro_meses('', desde, hasta)).aggregate(
+        total_cuotas=Count('id'),
+        cuotas_activas=Count('id', filter=Q(estado='activa')),
+        cuotas_cerradas=Count('id', filter=Q(estado='cerrada')),
+        monto_total=Coalesce(Sum('monto_total'), CERO),
+    )
+    unidades = CuotaUnidad.objects.filter(_filtro_meses('cuota_mensual__', desde, hasta))
+    resumen.update(unidades.aggregate(**_montos_unidades()))
+    resumen['porcentaje_cobranza'] = _porcentaje(resumen['monto_cobrado'], resumen['monto_total'])
+
+    if por_mes:
+        meses = (
+            unidades.values(mes=F('cuota_mensual__mes_año'))
+            .annotate(cuotas_unidad=Count('id'), monto_emitido=Coalesce(Sum('monto'), CERO), **_montos_unidades())
+            .order_by('mes')
+        )
+        resumen['por_mes'] = [
+            {**mes, 'porcentaje_cobranza': _porcentaje(mes['monto_cobrado'], mes['monto_emitido'])}
+            for mes in meses
+        ]
+    return resumen
@@ -0,0 +1,87 @@
+"""
+Cambio masivo a 'vencida' de cuotas y multas - CU22 / CU9
+Un UPDATE por tabla pasa a 'vencida' todo lo pendiente con fecha límite anterior
+a la fecha de corte. Las filas tocadas se reconocen por la fecha_modificacion de
+la corrida, y desde ahí se arma una notificación por tipo cuyos
+NotificacionResidente se insertan en lotes (comunidad.services.difusion). Cada
+corrida queda registrada en EjecucionVencimientos. Pensado para correr por cron
+con `manage.py marcar_vencidos`.
+"""
+
+import logging
+from datetime import date
+from typing import Iterable, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from comunidad.models import Notificacion, ResidentesUnidad
+from comunidad.services.difusion import difundir
+from economia.models import Multa
+from finanzas.models import CuotaUnidad, EjecucionVencimientos
+
+logger = logging.getLogger(__name__)
+
+# Sin pagos registrados; 'parcial' y 'procesando' conservan su estado como en actualizar_estado
+ESTADOS_CUOTA_A_VENCER = ['pendiente', 'fallido']
+
+
+def _notificar(titulo: str, contenido: str, tipo: str, residentes_ids: Iterable[int]) -> int:
+    """Una notificación y sus destinatarios en lotes de bulk_create; retorna cuántos residentes la reciben"""
+    residentes_ids = sorted(set(residentes_ids))
+    if not residentes_ids:
+        return 0
+    notificacion = Notificacion.objects.create(
+        titulo=titulo, contenido=contenido, fecha=timezone.now(), tipo=tipo, prioridad='alta', enviar_a_todos=False
+    )
+    return difundir(notificacion, residentes_ids)['destinatarios']
+
+
+def marcar_vencidos(fecha_corte: Optional[date] = None, notificar: bool = True) -> EjecucionVencimientos:
+    """Pasa a 'vencida' las cuotas y multas vencidas y notifica a los residentes afectados"""
+    fecha_corte = fecha_corte or timezone.now().date()
+    ejecucion = EjecucionVencimientos.objects.create(fecha_corte=fecha_corte)
+    marca = ejecucion.fecha_inicio
+
+    try:
+        with transaction.atomic():
+            ejecucion.cuotas_vencidas = CuotaUnidad.objects.filter(
+                estado__in=ESTADOS_CUOTA_A_VENCER, fecha_limite__lt=fecha_corte, monto_pagado__lte=0
+            ).update(estado='vencida', fecha_modificacion=marca)
+            ejecucion.multas_vencidas = Multa.objects.filter(
+                estado='pendiente', fecha_vencimiento__lt=fecha_corte
+            ).update(estado='vencida', fecha_modificacion=marca)
+
+            if notificar and ejecucion.cuotas_vencidas:
+                unidades = CuotaUnidad.objects.filter(estado='vencida', fecha_modificacion=marca).values('unidad_id')
+                ejecucion.notificaciones_enviadas += _notificar(
+                    'Cuota vencida',
+                    'Tiene una o más cuotas con la fecha límite de pago vencida. '
+                    'Regularice su situación en la administración para evitar recargos.',
+                    'cuota',
+                    ResidentesUnidad.objects.filter(id_unidad__in=unidades, estado=True)
+                    .values_list('id_residente_id', flat=True),
+                )
+            if notificar and ejecucion.multas_vencidas:
+                ejecucion.notificaciones_enviadas += _notificar(
+                    'Multa vencida',
+                    'Tiene una o más multas con la fecha límite de pago vencida. '
+                    'Acérquese a la administración para regularizar su situación.',
+                    'multa',
+                    Multa.objects.filter(estado='vencida', fecha_modificacion=marca).values_list('residente_id', flat=True),
+                )
+    except Exception as e:
+        logger.error(f"Error marcando vencimientos al {fecha_corte}: {e}")
+        ejecucion.estado = 'fallida'
+        ejecucion.error = str(e)
+        ejecucion.cuotas_vencidas = ejecucion.multas_vencidas = ejecucion.notificaciones_enviadas = 0
+    else:
+        ejecucion.estado = 'completada'
+
+    ejecucion.fecha_fin = timezone.now()
+    ejecucion.save()
+    logger.info(
+        f"Vencimientos al {fecha_corte}: {ejecucion.cuotas_vencidas} cuotas, {ejecucion.multas_vencidas} multas, "
+        f"{ejecucion.notificaciones_enviadas} notificaciones"
+    )
+    return ejecucion
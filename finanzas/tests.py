@@ -1,3 +1,433 @@
-from django.test import TestCase
+from datetime import date
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from comunidad.models import Unidad
+from .models import CuotaMensual, CuotaUnidad, Ingreso, LibroIngresos, PagoCuota
+
+User = get_user_model()
+
+
+class EmisionCuotasTest(APITestCase):
+    """Generación de cuotas por unidad en lote"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='admin_cuotas', password='testpass123')
+        self.client.force_authenticate(user=self.usuario)
+        for numero, metros in [('A-1', '50'), ('A-2', '100'), ('A-3', '150')]:
+            Unidad.objects.create(numero_casa=numero, metros_cuadrados=Decimal(metros))
+        Unidad.objects.create(numero_casa='B-1', metros_cuadrados=Decimal('80'), activa=False)
+
+    def _cuota(self, monto='100.00'):
+        return CuotaMensual.objects.create(
+            mes_año='2025-10', monto_total=Decimal(monto), fecha_limite=date(2025, 10, 31), creado_por=self.usuario
+        )
+
+    def test_reparto_igual_suma_el_total(self):
+        """Los centavos del redondeo se reparten sin perder ni sumar dinero"""
+        from .services.emision_cuotas import emitir_cuotas
+        cuota = self._cuota('100.00')
+        emision = emitir_cuotas(cuota)
+
+        self.assertEqual(emision['creadas'], 3)
+        montos = list(CuotaUnidad.objects.filter(cuota_mensual=cuota).values_list('monto', flat=True))
+        self.assertEqual(sum(montos), Decimal('100.00'))
+        self.assertEqual(sorted(montos), [Decimal('33.33'), Decimal('33.33'), Decimal('33.34')])
+        cuota.refresh_from_db()
+        self.assertEqual(cuota.estado, 'activa')
+
+    def test_reparto_por_metros_y_reemision_sin_duplicados(self):
+        from .services.emision_cuotas import REPARTO_METROS, emitir_cuotas
+        cuota = self._cuota('600.00')
+        emitir_cuotas(cuota, regla=REPARTO_METROS)
+        montos = dict(CuotaUnidad.objects.filter(cuota_mensual=cuota).values_list('unidad__numero_casa', 'monto'))
+        self.assertEqual(montos, {'A-1': Decimal('100.00'), 'A-2': Decimal('200.00'), 'A-3': Decimal('300.00')})
+
+        # Una unidad nueva: solo se crea su cuota, las existentes se ignoran
+        Unidad.objects.create(numero_casa='A-4', metros_cuadrados=Decimal('60'))
+        emision = emitir_cuotas(cuota, regla=REPARTO_METROS)
+        self.assertEqual((emision['creadas'], emision['omitidas']), (1, 3))
+        self.assertEqual(CuotaUnidad.objects.filter(cuota_mensual=cuota).count(), 4)
+
+    def test_generar_cuotas_unidades_endpoint(self):
+        cuota = self._cuota('300.00')
+        url = reverse('cuotamensual-generar-cuotas-unidades', args=[cuota.id])
+        response = self.client.post(url, {'regla_reparto': 'metros_cuadrados'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['cuotas_creadas'], 3)
+        self.assertEqual(response.data['total_unidades'], 3)
+
+        otra = self._cuota('300.00')
+        url = reverse('cuotamensual-generar-cuotas-unidades', args=[otra.id])
+        response = self.client.post(url, {'regla_reparto': 'otra'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(CuotaUnidad.objects.filter(cuota_mensual=otra).exists())
+
+    def test_crear_cuota_mensual_emite_cuotas(self):
+        response = self.client.post(reverse('cuotamensual-list'), {
+            'mes_año': '2025-11', 'monto_total': '90.00', 'fecha_limite': '2025-11-30',
+            'enviar_a_todos': False, 'unidades_seleccionadas': list(
+                Unidad.objects.filter(numero_casa__in=['A-1', 'A-2']).values_list('id', flat=True)
+            ),
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['cuotas_generadas'], 2)
+        self.assertEqual(response.data['estado'], 'activa')
+
+
+class ResumenCuotasTest(APITestCase):
+    """Resumen de cobranza calculado con agregaciones"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='admin_resumen', password='testpass123')
+        self.client.force_authenticate(user=self.usuario)
+        unidad = Unidad.objects.create(numero_casa='R-1', metros_cuadrados=Decimal('70'))
+        for mes, monto, pagado in [('2025-08', '100', '100'), ('2025-09', '200', '50'), ('2025-10', '300', '0')]:
+            cuota = CuotaMensual.objects.create(
+                mes_año=mes, monto_total=Decimal(monto), fecha_limite=date(2025, 12, 31),
+                estado='activa', creado_por=self.usuario
+            )
+            CuotaUnidad.objects.create(
+                cuota_mensual=cuota, unidad=unidad, monto=Decimal(monto),
+                monto_pagado=Decimal(pagado), fecha_limite=cuota.fecha_limite
+            )
+
+    def test_resumen_con_rango_de_meses(self):
+        url = reverse('cuotamensual-resumen')
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'desde': '2025-09', 'hasta': '2025-10', 'por_mes': 'true'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_cuotas'], 2)
+        self.assertEqual(response.data['monto_total'], Decimal('500'))
+        self.assertEqual(response.data['monto_cobrado'], Decimal('50'))
+        self.assertEqual(response.data['monto_pendiente'], Decimal('450'))
+        self.assertEqual(response.data['porcentaje_cobranza'], 10.0)
+        self.assertEqual([mes['mes'] for mes in response.data['por_mes']], ['2025-09', '2025-10'])
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['total_cuotas'], 3)
+        self.assertEqual(response.data['monto_cobrado'], Decimal('150'))
+
+        response = self.client.get(url, {'desde': '2025-13'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SaldoIncrementalPagosTest(APITestCase):
+    """monto_pagado y estado se actualizan con un delta en SQL"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='admin_pagos', password='testpass123')
+        self.client.force_authenticate(user=self.usuario)
+        self.cuota_mensual = CuotaMensual.objects.create(
+            mes_año='2025-10', monto_total=Decimal('300'), fecha_limite=date(2099, 10, 31), creado_por=self.usuario
+        )
+        self.cuotas = [
+            CuotaUnidad.objects.create(
+                cuota_mensual=self.cuota_mensual, fecha_limite=self.cuota_mensual.fecha_limite, monto=Decimal('100'),
+                unidad=Unidad.objects.create(numero_casa=f'P-{i}', metros_cuadrados=Decimal('50')),
+            )
+            for i in range(3)
+        ]
+
+    def _pago(self, cuota, monto):
+        return PagoCuota.objects.create(
+            cuota_unidad=cuota, monto=Decimal(monto), fecha_pago=date(2025, 10, 5),
+            metodo_pago='efectivo', registrado_por=self.usuario
+        )
+
+    def test_guardar_editar_y_eliminar_pago(self):
+        cuota = self.cuotas[0]
+        pago = self._pago(cuota, '40')
+        self.assertEqual((cuota.monto_pagado, cuota.estado), (Decimal('40'), 'parcial'))
+
+        pago.monto = Decimal('100')
+        pago.save()
+        cuota.refresh_from_db()
+        self.assertEqual((cuota.monto_pagado, cuota.estado), (Decimal('100'), 'pagada'))
+
+        pago.delete()
+        cuota.refresh_from_db()
+        self.assertEqual((cuota.monto_pagado, cuota.estado), (Decimal('0'), 'pendiente'))
+
+    def test_importar_pagos_en_lote(self):
+        from .services.pagos import importar_pagos
+        filas = [
+            {'cuota_unidad': self.cuotas[0].id, 'monto': '60', 'numero_referencia': 'T-1'},
+            {'cuota_unidad': self.cuotas[0].id, 'monto': '40', 'numero_referencia': 'T-2'},
+            {'cuota_unidad': self.cuotas[1].id, 'monto': '30', 'numero_referencia': 'T-3'},
+            {'cuota_unidad': self.cuotas[2].id, 'monto': '500', 'numero_referencia': 'T-4'},
+            {'cuota_unidad': self.cuotas[2].id, 'monto': 'x'},
+        ]
+        # Bloqueo, referencias existentes, INSERT y UPDATE, dentro de la transacción del lote
+        with self.assertNumQueries(6):
+            resultado = importar_pagos(filas, self.usuario)
+
+        self.assertEqual(resultado['aplicados'], 3)
+        self.assertEqual(resultado['monto_aplicado'], Decimal('130'))
+        self.assertEqual([r['fila'] for r in resultado['rechazados']], [5, 4])
+        estados = dict(CuotaUnidad.objects.values_list('id', 'estado'))
+        self.assertEqual(
+            [estados[c.id] for c in self.cuotas], ['pagada', 'parcial', 'pendiente']
+        )
+
+        # Reimportar las mismas referencias no duplica pagos
+        resultado = importar_pagos(filas[2:3], self.usuario)
+        self.assertEqual((resultado['aplicados'], resultado['duplicados']), (0, 1))
+        self.assertEqual(PagoCuota.objects.count(), 3)
+
+    def test_importar_pagos_rechaza_montos_no_finitos(self):
+        from .services.pagos import importar_pagos
+        filas = [
+            {'cuota_unidad': self.cuotas[0].id, 'monto': monto, 'numero_referencia': f'N-{i}'}
+            for i, monto in enumerate(['NaN', 'sNaN', 'Infinity', '-Infinity'])
+        ]
+        filas.append({'cuota_unidad': self.cuotas[1].id, 'monto': '30', 'numero_referencia': 'N-ok'})
+
+        resultado = importar_pagos(filas, self.usuario)
+
+        self.assertEqual(resultado['aplicados'], 1)
+        self.assertEqual(
+            [(r['fila'], r['error']) for r in resultado['rechazados']],
+            [(i, 'monto inválido') for i in range(1, 5)]
+        )
+
+
+class ConciliacionExtractoTest(APITestCase):
+    """Conciliación de extractos bancarios CSV y OFX"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='admin_extracto', password='testpass123')
+        self.client.force_authenticate(user=self.usuario)
+        cuota_mensual = CuotaMensual.objects.create(
+            mes_año='2025-10', monto_total=Decimal('450'), fecha_limite=date(2099, 10, 31), creado_por=self.usuario
+        )
+        self.cuotas = {}
+        for numero, monto in [('C-101', '100'), ('C-102', '100'), ('C-103', '250')]:
+            self.cuotas[numero] = CuotaUnidad.objects.create(
+                cuota_mensual=cuota_mensual, fecha_limite=cuota_mensual.fecha_limite, monto=Decimal(monto),
+                unidad=Unidad.objects.create(numero_casa=numero, metros_cuadrados=Decimal('50')),
+            )
+        self.cuotas['C-102'].payment_reference = 'PAY-777'
+        self.cuotas['C-102'].save()
+
+    def test_conciliar_csv(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        csv_extracto = (
+            'Fecha;Descripción;Referencia;Importe\n'
+            '03/10/2025;Transferencia casa C-101;TR-1;100,00\n'
+            '04/10/2025;Pago online;pay-777;100,00\n'
+            '05/10/2025;Depósito;TR-3;250.00\n'
+            '05/10/2025;Comisión bancaria;;-15,00\n'
+            '06/10/2025;Sin datos;TR-5;99,00\n'
+        ).encode('utf-8')
+        archivo = SimpleUploadedFile('extracto.csv', csv_extracto, content_type='text/csv')
+        response = self.client.post(reverse('pagocuota-conciliar-extracto'), {'archivo': archivo}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['conciliadas'], 2)
+        self.assertEqual(response.data['ignoradas'], 1)
+        self.assertEqual(response.data['por_criterio'], {'unidad_y_monto': 1, 'referencia': 1})
+        self.assertEqual([linea['linea'] for linea in response.data['no_conciliadas']], [6])
+        self.assertEqual(PagoCuota.objects.get(numero_referencia='TR-1').cuota_unidad, self.cuotas['C-101'])
+
+        # La línea que solo coincide por monto se propone, no se aplica
+        self.assertEqual(response.data['total_por_confirmar'], 1)
+        propuesta = response.data['por_confirmar'][0]
+        self.assertEqual((propuesta['fila'], propuesta['cuota_unidad']), (4, self.cuotas['C-103'].id))
+        self.assertFalse(PagoCuota.objects.filter(numero_referencia='TR-3').exists())
+        self.assertEqual(list(CuotaUnidad.objects.exclude(estado='pagada')), [self.cuotas['C-103']])
+
+        response = self.client.post(
+            reverse('pagocuota-confirmar-conciliacion'), {'pagos': [propuesta]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(CuotaUnidad.objects.exclude(estado='pagada').exists())
+        self.assertEqual(Ingreso.objects.filter(tipo_ingreso='cuotas', estado='confirmado').count(), 3)
+
+    def test_conciliar_ofx(self):
+        import io
+        from .services.conciliacion import conciliar_extracto
+        ofx = (
+            'OFXHEADER:100\nDATA:OFXSGML\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n'
+            '<STMTTRN>\n<TRNTYPE>CREDIT\n<DTPOSTED>20251003\n<TRNAMT>100.00\n<FITID>F1\n<MEMO>Expensas C-102\n</STMTTRN>\n'
+            '<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20251004<TRNAMT>100.00<FITID>F2<MEMO>Sin unidad</STMTTRN>\n'
+            '</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n'
+        )
+        resultado = conciliar_extracto(io.BytesIO(ofx.encode()), 'ofx', self.usuario)
+
+        self.assertEqual(resultado['lineas'], 2)
+        self.assertEqual(resultado['conciliadas'], 1)
+        self.assertEqual(PagoCuota.objects.get(numero_referencia='F1').cuota_unidad, self.cuotas['C-102'])
+        # La segunda línea solo coincide por monto con la única cuota de 100 que quedaba: queda por confirmar
+        self.assertEqual(resultado['total_por_confirmar'], 1)
+        self.assertEqual(resultado['por_confirmar'][0]['cuota_unidad'], self.cuotas['C-101'].id)
+        self.assertEqual(resultado['por_confirmar'][0]['fecha_pago'], date(2025, 10, 4))
+        self.assertFalse(PagoCuota.objects.filter(numero_referencia='F2').exists())
+
+
+class ReporteMorososTest(APITestCase):
+    """Reporte de morosidad con tramos de antigüedad calculado en una consulta"""
+
+    def setUp(self):
+        from comunidad.models import ResidentesUnidad
+        from usuarios.models import Persona, Residentes
+        self.usuario = User.objects.create_user(username='admin_morosos', password='testpass123')
+        self.client.force_authenticate(user=self.usuario)
+        from datetime import timedelta
+        from django.utils import timezone
+        self.hoy = timezone.now().date()
+
+        def hace(dias):
+            return self.hoy - timedelta(days=dias)
+
+
+        unidad_a = Unidad.objects.create(numero_casa='M-1', metros_cuadrados=Decimal('50'))
+        unidad_b = Unidad.objects.create(numero_casa='M-2', metros_cuadrados=Decimal('50'))
+        residente = Residentes.objects.create(persona=Persona.objects.create(nombre='Ana Rojas'))
+        ResidentesUnidad.objects.create(
+            id_residente=residente, id_unidad=unidad_a, rol_en_unidad='propietario', fecha_inicio=date(2020, 1, 1)
+        )
+        # (unidad, fecha límite, monto, pagado): 10, 45, 120 días de atraso, una al día y una pagada
+        for i, (unidad, limite, monto, pagado) in enumerate([
+            (unidad_a, hace(10), '100', '40'),
+            (unidad_a, hace(45), '100', '0'),
+            (unidad_b, hace(120), '80', '0'),
+            (unidad_b, hace(-30), '80', '0'),
+            (unidad_b, hace(200), '80', '80'),
+        ]):
+            cuota_mensual = CuotaMensual.objects.create(
+                mes_año=f'2025-{i + 1:02d}', monto_total=Decimal(monto), fecha_limite=limite, creado_por=self.usuario
+            )
+            CuotaUnidad.objects.create(
+                cuota_mensual=cuota_mensual, unidad=unidad, fecha_limite=limite, monto=Decimal(monto),
+                monto_pagado=Decimal(pagado), estado='pagada' if pagado == monto else 'vencida',
+            )
+
+    def test_reporte_en_una_consulta(self):
+        from .services.morosidad import reporte_morosos
+        with self.assertNumQueries(1):
+            reporte = reporte_morosos(hoy=self.hoy, pagina=1, tamano_pagina=2)
+
+        self.assertEqual(reporte['count'], 3)
+        self.assertEqual(reporte['resumen']['total_adeudado'], Decimal('240'))
+        self.assertEqual(
+            reporte['resumen']['antiguedad'],
+            {'0-30': Decimal('60'), '31-60': Decimal('100'), '61-90': Decimal('0'), '90+': Decimal('80')},
+        )
+        primera, segunda = reporte['results']
+        self.assertEqual((primera['unidad'], primera['tramo'], primera['dias_vencido']), ('M-2', '90+', 120))
+        self.assertEqual(primera['residente'], 'Sin residente')
+        self.assertEqual((segunda['residente'], segunda['total_unidad'], segunda['cuotas_unidad']), ('Ana Rojas', Decimal('160'), 2))
+        self.assertEqual(segunda['total_residente'], Decimal('160'))
+
+        # Página fuera de rango: mismos totales
+        reporte = reporte_morosos(hoy=self.hoy, pagina=5, tamano_pagina=2)
+        self.assertEqual((reporte['count'], reporte['results']), (3, []))
+        self.assertEqual(reporte['resumen']['total_adeudado'], Decimal('240'))
+
+    def test_endpoint_filtra_por_tramo(self):
+        response = self.client.get(reverse('cuotaunidad-morosos'), {'tramo': '31-60'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['tramo'], '31-60')
+
+        response = self.client.get(reverse('cuotaunidad-morosos'), {'tramo': '5-10'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MarcarVencidosTest(APITestCase):
+    """Cambio masivo de cuotas y multas a vencida"""
+
+    def test_marcar_vencidos_actualiza_y_notifica(self):
+        from comunidad.models import NotificacionResidente, ResidentesUnidad
+        from economia.models import Multa
+        from usuarios.models import Persona, Residentes
+        from .models import EjecucionVencimientos
+        from .services.vencimientos import marcar_vencidos
+
+        usuario = User.objects.create_user(username='admin_vencidos', password='testpass123')
+        unidad = Unidad.objects.create(numero_casa='V-1', metros_cuadrados=Decimal('50'))
+        residente = Residentes.objects.create(persona=Persona.objects.create(nombre='Luis Vaca'))
+        ResidentesUnidad.objects.create(id_residente=residente, id_unidad=unidad, fecha_inicio=date(2020, 1, 1))
+        corte = date(2025, 10, 15)
+        cuotas = {}
+        for mes, limite, pagado in [('2025-08', date(2025, 8, 31), '0'), ('2025-09', date(2025, 9, 30), '10'),
+                                    ('2025-10', date(2025, 10, 31), '0')]:
+            cuota_mensual = CuotaMensual.objects.create(
+                mes_año=mes, monto_total=Decimal('100'), fecha_limite=limite, creado_por=usuario
+            )
+            cuotas[mes] = CuotaUnidad.objects.create(
+                cuota_mensual=cuota_mensual, unidad=unidad, monto=Decimal('100'), fecha_limite=limite,
+                monto_pagado=Decimal(pagado), estado='parcial' if pagado != '0' else 'pendiente',
+            )
+        multa = Multa.objects.create(
+            residente=residente, motivo='Ruido', monto=Decimal('50'),
+            fecha_emision=date(2025, 9, 1), fecha_vencimiento=date(2025, 9, 15),
+        )
+
+        ejecucion = marcar_vencidos(corte)
+
+        self.assertEqual(ejecucion.estado, 'completada')
+        self.assertEqual((ejecucion.cuotas_vencidas, ejecucion.multas_vencidas), (1, 1))
+        estados = {mes: CuotaUnidad.objects.get(pk=cuota.pk).estado for mes, cuota in cuotas.items()}
+        self.assertEqual(estados, {'2025-08': 'vencida', '2025-09': 'parcial', '2025-10': 'pendiente'})
+        multa.refresh_from_db()
+        self.assertEqual(multa.estado, 'vencida')
+        self.assertEqual(NotificacionResidente.objects.filter(residente=residente).count(), 2)
+
+        # Una segunda corrida no encuentra nada nuevo
+        ejecucion = marcar_vencidos(corte)
+        self.assertEqual((ejecucion.cuotas_vencidas, ejecucion.multas_vencidas, ejecucion.notificaciones_enviadas), (0, 0, 0))
+        self.assertEqual(EjecucionVencimientos.objects.count(), 2)
+
+
+class LibroIngresosTest(APITestCase):
+    """Libro mensual de ingresos ajustado en cada cambio"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='admin_libro', password='testpass123')
+        self.client.force_authenticate(user=self.usuario)
+
+    def _ingreso(self, tipo, monto, fecha, estado='pendiente'):
+        return Ingreso.objects.create(
+            tipo_ingreso=tipo, concepto='Prueba', monto=Decimal(monto), fecha_ingreso=fecha,
+            estado=estado, registrado_por=self.usuario
+        )
+
+    def test_libro_sigue_confirmaciones_y_cancelaciones(self):
+        from .services.libro_ingresos import reconstruir, totales_mes
+        cuota = self._ingreso('cuotas', '100', date(2025, 10, 3), estado='confirmado')
+        multa = self._ingreso('multas', '40', date(2025, 10, 8))
+        self._ingreso('eventos', '70', date(2025, 9, 20), estado='confirmado')
+
+        response = self.client.post(reverse('ingreso-confirmar-ingreso'), {'ingreso_id': multa.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(totales_mes('2025-10')['multas'], Decimal('40'))
+
+        # Cambiar la fecha mueve el aporte de mes; cancelar lo descuenta
+        cuota.fecha_ingreso = date(2025, 9, 30)
+        cuota.save()
+        self.client.post(reverse('ingreso-cancelar-ingreso'), {'ingreso_id': multa.id}, format='json')
+        self.assertEqual(totales_mes('2025-10')['multas'], Decimal('0'))
+        self.assertEqual(totales_mes('2025-09')['cuotas'], Decimal('100'))
+
+        self.client.get(reverse('ingreso-resumen-mensual'), {'mes_año': '2025-09'})
+        # Con el resumen ya creado: leerlo, leer el libro del mes y guardar, sin tocar Ingreso
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('ingreso-resumen-mensual'), {'mes_año': '2025-09'})
+        self.assertEqual(Decimal(response.data['total_general']), Decimal('170'))
+
+        cuota.delete()
+        self.assertEqual(totales_mes('2025-09')['cuotas'], Decimal('0'))
+        reconstruir()
+        self.assertEqual(
+            set(LibroIngresos.objects.exclude(total=0).values_list('mes_año', 'tipo_ingreso', 'total')),
+            {('2025-09', 'eventos', Decimal('70'))},
+        )
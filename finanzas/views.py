@@ -2,6 +2,8 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from django.db import transaction
 from django.db.models import Sum, Count, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
@@ -14,6 +16,13 @@ from .serializers.finanzas_serializer import (
     CuotaMensualSerializer, CuotaUnidadSerializer, CuotaUnidadUpdateSerializer, PagoCuotaSerializer,
     ResumenCuotasSerializer, MorososSerializer, IngresoSerializer, ResumenIngresosSerializer
 )
+from .services.emision_cuotas import (
+    REGLAS_REPARTO, REPARTO_IGUAL, ErrorEmision, emitir_cuotas, unidades_a_emitir
+)
+from .services.conciliacion import conciliar_extracto
+from .services.morosidad import TAMANO_PAGINA, reporte_morosos
+from .services.pagos import importar_pagos
+from .services.resumen_cuotas import resumen_cuotas, validar_mes
 from comunidad.models import Unidad
 from comunidad.services import NotificacionService
 
@@ -26,48 +35,39 @@ class CuotaMensualViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
-        cuota_mensual = serializer.save(creado_por=self.request.user)
-        
-        # Obtener unidades según la selección
-        enviar_a_todos = self.request.data.get('enviar_a_todos', True)
-        unidades_seleccionadas = self.request.data.get('unidades_seleccionadas', [])
-        
-        if enviar_a_todos:
-            unidades = Unidad.objects.filter(activa=True)
-        else:
-            unidades = Unidad.objects.filter(id__in=unidades_seleccionadas, activa=True)
-        
-        cuotas_creadas = []
-        if unidades.exists():
-            # Calcular monto por unidad
-            monto_por_unidad = cuota_mensual.monto_total / unidades.count()
-            
-            # Crear cuotas para cada unidad
-            for unidad in unidades:
-                cuota_unidad = CuotaUnidad.objects.create(
-                    cuota_mensual=cuota_mensual,
-                    unidad=unidad,
-                    monto=monto_por_unidad,
-                    fecha_limite=cuota_mensual.fecha_limite,
-                    estado='pendiente'
-                )
-                cuotas_creadas.append(cuota_unidad)
-            
-            # Cambiar estado a activa
-            cuota_mensual.estado = 'activa'
-            cuota_mensual.save()
-            
+        regla = self.request.data.get('regla_reparto', REPARTO_IGUAL)
+        if regla not in REGLAS_REPARTO:
+            raise ValidationError({'regla_reparto': f"Opciones válidas: {', '.join(REGLAS_REPARTO)}"})
+
+        with transaction.atomic():
+            cuota_mensual = serializer.save(creado_por=self.request.user)
+
+            # Obtener unidades según la selección
+            unidades = unidades_a_emitir(
+                self.request.data.get('enviar_a_todos', True),
+                self.request.data.get('unidades_seleccionadas', []),
+            )
+            try:
+                emision = emitir_cuotas(cuota_mensual, unidades, regla)
+            except ErrorEmision:
+                # Sin unidades activas la cuota queda en borrador
+                emision = None
+
+        if emision:
+            cuota_mensual.refresh_from_db(fields=['estado'])
+        if emision and emision['creadas']:
             # Crear notificación automática
             try:
                 from comunidad.services import NotificacionService
+                cuotas_creadas = cuota_mensual.cuotas_unidad.select_related('unidad')
                 notificacion = NotificacionService.crear_notificacion_cuota(cuota_mensual, cuotas_creadas)
                 if notificacion:
-                    print(f"Notificación de cuota creada: {notificacion.id}")
+                    print(f"Notificación de cuota creada: {notificacion.id} ({notificacion.destinatarios_notificados} residentes)")
             except Exception as e:
                 print(f"Error creando notificación de cuota: {e}")
-        
+
         # Agregar información de respuesta
-        self._cuotas_generadas = len(cuotas_creadas)
+        self._cuotas_generadas = emision['creadas'] if emision else 0
 
     def perform_update(self, serializer):
         serializer.save()
@@ -108,82 +108,40 @@ class CuotaMensualViewSet(viewsets.ModelViewSet):
         # Obtener unidades según la selección
         enviar_a_todos = request.data.get('enviar_a_todos', True)
         unidades_seleccionadas = request.data.get('unidades_seleccionadas', [])
-        
-        if enviar_a_todos:
-            unidades = Unidad.objects.filter(activa=True)
-        else:
-            if not unidades_seleccionadas:
-                return Response(
-                    {'error': 'Debe seleccionar al menos una unidad'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            unidades = Unidad.objects.filter(id__in=unidades_seleccionadas, activa=True)
-        
-        if not unidades.exists():
+        if not enviar_a_todos and not unidades_seleccionadas:
             return Response(
-                {'error': 'No hay unidades activas para generar cuotas'}, 
+                {'error': 'Debe seleccionar al menos una unidad'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        # Calcular monto por unidad
-        monto_por_unidad = cuota_mensual.monto_total / unidades.count()
-        
-        cuotas_creadas = 0
-        for unidad in unidades:
-            # Crear cuota para la unidad
-            cuota_unidad, created = CuotaUnidad.objects.get_or_create(
-                cuota_mensual=cuota_mensual,
-                unidad=unidad,
-                defaults={
-                    'monto': monto_por_unidad,
-                    'fecha_limite': cuota_mensual.fecha_limite,
-                    'estado': 'pendiente'
-                }
-            )
-            
-            if created:
-                cuotas_creadas += 1
-        
-        # Cambiar estado a activa
-        cuota_mensual.estado = 'activa'
-        cuota_mensual.save()
-        
+        unidades = unidades_a_emitir(enviar_a_todos, unidades_seleccionadas)
+
+        try:
+            emision = emitir_cuotas(cuota_mensual, unidades, request.data.get('regla_reparto', REPARTO_IGUAL))
+        except ErrorEmision as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         return Response({
-            'message': f'Se generaron {cuotas_creadas} cuotas para {unidades.count()} unidades',
-            'monto_por_unidad': monto_por_unidad,
-            'total_unidades': unidades.count()
+            'message': f"Se generaron {emision['creadas']} cuotas para {emision['total_unidades']} unidades",
+            'regla_reparto': emision['regla'],
+            'monto_por_unidad': emision['monto_por_unidad'],
+            'monto_minimo': emision['monto_minimo'],
+            'monto_maximo': emision['monto_maximo'],
+            'total_unidades': emision['total_unidades'],
+            'cuotas_creadas': emision['creadas'],
+            'cuotas_existentes': emision['omitidas'],
         })
 
     @action(detail=False, methods=['get'])
     def resumen(self, request):
-        """Obtener resumen general de cuotas"""
-        cuotas = self.get_queryset()
-        
-        total_cuotas = cuotas.count()
-        cuotas_activas = cuotas.filter(estado='activa').count()
-        cuotas_cerradas = cuotas.filter(estado='cerrada').count()
-        
-        # Calcular montos totales
-        monto_total = sum(cuota.monto_total for cuota in cuotas)
-        monto_cobrado = 0
-        monto_pendiente = 0
-        
-        for cuota in cuotas:
-            for cuota_unidad in cuota.cuotas_unidad.all():
-                monto_cobrado += cuota_unidad.monto_pagado
-                monto_pendiente += cuota_unidad.calcular_saldo_pendiente()
-        
-        porcentaje_cobranza = (monto_cobrado / monto_total * 100) if monto_total > 0 else 0
-        
-        return Response({
-            'total_cuotas': total_cuotas,
-            'cuotas_activas': cuotas_activas,
-            'cuotas_cerradas': cuotas_cerradas,
-            'monto_total': monto_total,
-            'monto_cobrado': monto_cobrado,
-            'monto_pendiente': monto_pendiente,
-            'porcentaje_cobranza': round(porcentaje_cobranza, 2)
-        })
+        """Obtener resumen general de cuotas (opcional: ?desde=AAAA-MM&hasta=AAAA-MM&por_mes=true)"""
+        try:
+            desde = validar_mes(request.query_params.get('desde'), 'desde')
+            hasta = validar_mes(request.query_params.get('hasta'), 'hasta')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        por_mes = request.query_params.get('por_mes', '').lower() in ('1', 'true', 'si')
+        return Response(resumen_cuotas(desde, hasta, por_mes=por_mes))
 
     @action(detail=True, methods=['delete'])
     def eliminar_cuota_mensual(self, request, pk=None):
@@ -268,28 +226,16 @@ class CuotaUnidadViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def morosos(self, request):
-        """Obtener lista de residentes morosos"""
-        cuotas_vencidas = self.get_queryset().filter(estado='vencida')
-        
-        morosos = []
-        for cuota in cuotas_vencidas:
-            # Obtener residente principal
-            residente = cuota.unidad.residentes.filter(rol_en_unidad='propietario').first()
-            residente_nombre = "Sin residente"
-            if residente:
-                residente_nombre = f"{residente.persona.nombre} {residente.persona.apellido}"
-            
-            morosos.append({
-                'cuota_id': cuota.id,
-                'unidad': cuota.unidad.numero_casa,
-                'residente': residente_nombre,
-                'mes_año': cuota.cuota_mensual.mes_año,
-                'monto_adeudado': cuota.calcular_saldo_pendiente(),
-                'dias_vencido': (timezone.now().date() - cuota.fecha_limite).days,
-                'fecha_vencimiento': cuota.fecha_limite
-            })
-        
-        return Response(morosos)
+        """Obtener reporte de morosos (?tramo=0-30|31-60|61-90|90+&page=&page_size=)"""
+        try:
+            pagina = int(request.query_params.get('page', 1))
+            tamano_pagina = int(request.query_params.get('page_size', TAMANO_PAGINA))
+            reporte = reporte_morosos(
+                tramo=request.query_params.get('tramo'), pagina=pagina, tamano_pagina=tamano_pagina
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(reporte)
 
     @action(detail=False, methods=['get'])
     def pendientes(self, request):
@@ -584,6 +530,46 @@ class PagoCuotaViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(registrado_por=self.request.user)
 
+    @action(detail=False, methods=['post'])
+    def importar(self, request):
+        """Aplicar pagos en lote: lista de {cuota_unidad, monto, fecha_pago, metodo_pago, numero_referencia}"""
+        pagos = request.data.get('pagos') if isinstance(request.data, dict) else request.data
+        if not isinstance(pagos, list) or not pagos:
+            return Response(
+                {'error': 'Debe enviar una lista de pagos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        resultado = importar_pagos(pagos, request.user)
+        return Response(resultado, status=status.HTTP_200_OK if resultado['aplicados'] else status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'])
+    def conciliar_extracto(self, request):
+        """Conciliar un extracto bancario (archivo CSV u OFX) contra las cuotas pendientes"""
+        archivo = request.FILES.get('archivo')
+        if not archivo:
+            return Response({'error': "Falta el archivo 'archivo'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        formato = (request.data.get('formato') or archivo.name.rsplit('.', 1)[-1]).lower()
+        try:
+            resultado = conciliar_extracto(archivo, formato, request.user)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(resultado)
+
+    @action(detail=False, methods=['post'])
+    def confirmar_conciliacion(self, request):
+        """Aplicar pagos 'por_confirmar' de una conciliación (registra también el Ingreso)"""
+        pagos = request.data.get('pagos') if isinstance(request.data, dict) else request.data
+        if not isinstance(pagos, list) or not pagos:
+            return Response(
+                {'error': 'Debe enviar una lista de pagos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        resultado = importar_pagos(pagos, request.user, registrar_ingresos=True)
+        return Response(resultado, status=status.HTTP_200_OK if resultado['aplicados'] else status.HTTP_400_BAD_REQUEST)
+
 
 class CuotasResidenteViewSet(viewsets.ReadOnlyModelViewSet):
     """Vista para residentes - ver sus cuotas pendientes"""
@@ -774,20 +760,13 @@ class IngresoViewSet(viewsets.ModelViewSet):
         if not mes_año:
             mes_año = datetime.now().strftime('%Y-%m')
         
-        year, month = mes_año.split('-')
-        ingresos = self.get_queryset().filter(
-            fecha_ingreso__year=year,
-            fecha_ingreso__month=month,
-            estado='confirmado'
-        )
-        
         # Crear o obtener resumen
         resumen, created = ResumenIngresos.objects.get_or_create(
             mes_año=mes_año,
             defaults={'creado_por': request.user}
         )
         
-        # Recalcular totales
+        # Totales desde el libro mensual (sin recorrer los ingresos del mes)
         resumen.calcular_totales()
         
         serializer = ResumenIngresosSerializer(resumen)
@@ -1,6 +1,19 @@
+import os
+import sys
+
 from django.apps import AppConfig
 
 
 class UsuariosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'usuarios'
+
+    def ready(self):
+        from django.conf import settings
+        # Reenviar lo que quedó en el spool de registros de acceso sin esperar al próximo
+        # evento de la barrera. Los demás comandos de manage.py (migrate, test...) no lo
+        # arrancan: para ellos está `manage.py enviar_registros_pendientes`.
+        comando = os.path.basename(sys.argv[0]) in ('manage.py', 'django-admin') and sys.argv[1:2] != ['runserver']
+        if getattr(settings, 'ACCESO_ESCRITURA_DIFERIDA', False) and not comando:
+            from usuarios.services.escritor_registros import escritor_registros
+            escritor_registros.iniciar_si_hay_pendientes()
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from usuarios.services.particiones_registros import crear_particiones, esta_particionada
+
+
+class Command(BaseCommand):
+    help = 'Crea las particiones mensuales futuras de los registros de acceso (ejecutar mensualmente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=3, help='Meses hacia adelante a crear (default 3)')
+
+    def handle(self, *args, **options):
+        if not esta_particionada():
+            self.stdout.write('La tabla de registros de acceso no está particionada (solo PostgreSQL), nada que hacer')
+            return
+
+        creadas = crear_particiones(options['meses'])
+        if creadas:
+            self.stdout.write(self.style.SUCCESS(f"Particiones creadas: {', '.join(creadas)}"))
+        else:
+            self.stdout.write('Las particiones ya existían')
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from usuarios.models import ConfiguracionAcceso
+from usuarios.services.particiones_registros import depurar_registros
+
+
+class Command(BaseCommand):
+    help = 'Elimina los registros de acceso más antiguos que ConfiguracionAcceso.dias_retencion_registros'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, help='Días a retener (por defecto los de la configuración)')
+
+    def handle(self, *args, **options):
+        dias = options['dias']
+        if dias is None:
+            config = ConfiguracionAcceso.objects.first() or ConfiguracionAcceso()
+            dias = config.dias_retencion_registros
+
+        resultado = depurar_registros(timezone.now() - timedelta(days=dias))
+        self.stdout.write(self.style.SUCCESS(
+            f"Retención de {dias} días: {len(resultado['particiones_eliminadas'])} particiones eliminadas "
+            f"(~{resultado['filas_estimadas_particiones']} registros) y {resultado['registros_eliminados']} registros borrados"
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from usuarios.services.escritor_registros import escritor_registros
+
+
+class Command(BaseCommand):
+    help = 'Envía a la base de datos los registros de acceso que quedaron en el spool local'
+
+    def handle(self, *args, **options):
+        pendientes = escritor_registros.pendientes
+        if not pendientes:
+            self.stdout.write('No hay registros de acceso pendientes en el spool')
+            return
+
+        escritos = escritor_registros.vaciar()
+        self.stdout.write(self.style.SUCCESS(
+            f'Se enviaron {escritos} de {pendientes} registros de acceso pendientes'
+        ))
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from usuarios.services.estadisticas_acceso import reconstruir
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores por hora de EstadisticaAcceso desde los registros de acceso'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int,
+            help='Solo los últimos N días (por defecto, desde el registro más antiguo que conserva la retención)'
+        )
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['dias'] is not None:
+            desde = timezone.now() - timedelta(days=options['dias'])
+
+        filas = reconstruir(desde)
+        self.stdout.write(self.style.SUCCESS(f'Estadísticas de acceso reconstruidas: {filas} filas'))
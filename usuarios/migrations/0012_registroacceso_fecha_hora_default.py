@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0011_alter_invitado_fecha_inicio_alter_invitado_tipo_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='registroacceso',
+            name='fecha_hora',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,117 @@
+"""
+Convierte usuarios_registroacceso en una tabla particionada por mes (fecha_hora).
+Solo aplica en PostgreSQL; en otros motores la tabla queda igual.
+La clave primaria física pasa a ser (id, fecha_hora) porque PostgreSQL exige que
+incluya la columna de partición; para Django el pk sigue siendo id.
+"""
+
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import migrations
+
+TABLA = 'usuarios_registroacceso'
+LEGADO = f'{TABLA}_legado'
+MESES_ADELANTE = 3
+
+FOREIGN_KEYS = [
+    ('autorizado_por_id', 'usuarios_usuario'),
+    ('placa_vehiculo_id', 'usuarios_placavehiculo'),
+    ('placa_invitado_id', 'usuarios_placainvitado'),
+]
+
+
+def _sumar_meses(inicio, meses):
+    total = inicio.year * 12 + inicio.month - 1 + meses
+    return datetime(total // 12, total % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _indices_y_claves(cursor, tabla):
+    cursor.execute(f'CREATE INDEX {tabla}_fecha_hora_idx ON {tabla} (fecha_hora)')
+    for columna, referencia in FOREIGN_KEYS:
+        cursor.execute(f'CREATE INDEX {tabla}_{columna}_idx ON {tabla} ({columna})')
+        cursor.execute(
+            f'ALTER TABLE {tabla} ADD CONSTRAINT {tabla}_{columna}_fk '
+            f'FOREIGN KEY ({columna}) REFERENCES {referencia} (id) DEFERRABLE INITIALLY DEFERRED'
+        )
+
+
+def _renombrar_a_legado(cursor):
+    """
+    Renombra la tabla, su secuencia de id y sus índices {TABLA}_*: conservan el
+    nombre al renombrar la tabla y ocuparían los de la tabla nueva. Se eliminan
+    junto con la tabla legado.
+    """
+    cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [TABLA, 'id'])
+    secuencia = cursor.fetchone()[0]
+    cursor.execute(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s",
+        [TABLA]
+    )
+    indices = [fila[0] for fila in cursor.fetchall() if fila[0].startswith(f'{TABLA}_')]
+
+    cursor.execute(f'ALTER TABLE {TABLA} RENAME TO {LEGADO}')
+    if secuencia:
+        cursor.execute(f'ALTER SEQUENCE {secuencia} RENAME TO {LEGADO}_id_seq')
+    for indice in indices:
+        cursor.execute(f'ALTER INDEX {indice} RENAME TO {LEGADO}{indice[len(TABLA):]}')
+
+
+def particionar(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        _renombrar_a_legado(cursor)
+        cursor.execute(f'CREATE TABLE {TABLA} (LIKE {LEGADO}) PARTITION BY RANGE (fecha_hora)')
+        cursor.execute(f'ALTER TABLE {TABLA} ADD PRIMARY KEY (id, fecha_hora)')
+        cursor.execute(f'CREATE SEQUENCE {TABLA}_id_seq OWNED BY {TABLA}.id')
+        cursor.execute(f"ALTER TABLE {TABLA} ALTER COLUMN id SET DEFAULT nextval('{TABLA}_id_seq')")
+        _indices_y_claves(cursor, TABLA)
+
+        # Particiones desde el mes más antiguo con datos hasta unos meses adelante
+        cursor.execute(f'SELECT MIN(fecha_hora) FROM {LEGADO}')
+        ahora = datetime.now(dt_timezone.utc)
+        mas_antigua = cursor.fetchone()[0] or ahora
+        mes = datetime(mas_antigua.astimezone(dt_timezone.utc).year,
+                       mas_antigua.astimezone(dt_timezone.utc).month, 1, tzinfo=dt_timezone.utc)
+        hasta = _sumar_meses(datetime(ahora.year, ahora.month, 1, tzinfo=dt_timezone.utc), MESES_ADELANTE + 1)
+        while mes < hasta:
+            cursor.execute(
+                f'CREATE TABLE {TABLA}_p{mes:%Y_%m} PARTITION OF {TABLA} FOR VALUES FROM (%s) TO (%s)',
+                [mes, _sumar_meses(mes, 1)]
+            )
+            mes = _sumar_meses(mes, 1)
+        cursor.execute(f'CREATE TABLE {TABLA}_default PARTITION OF {TABLA} DEFAULT')
+
+        cursor.execute(f'INSERT INTO {TABLA} SELECT * FROM {LEGADO}')
+        cursor.execute(f"SELECT setval('{TABLA}_id_seq', COALESCE((SELECT MAX(id) FROM {TABLA}), 0) + 1, false)")
+        cursor.execute(f'DROP TABLE {LEGADO}')
+
+
+def desparticionar(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        _renombrar_a_legado(cursor)
+        cursor.execute(f'CREATE TABLE {TABLA} (LIKE {LEGADO})')
+        cursor.execute(f'ALTER TABLE {TABLA} ADD PRIMARY KEY (id)')
+        cursor.execute(f'ALTER TABLE {TABLA} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+        cursor.execute(f'INSERT INTO {TABLA} SELECT * FROM {LEGADO}')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{TABLA}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {TABLA}), 0) + 1, false)"
+        )
+        cursor.execute(f'DROP TABLE {LEGADO}')
+        _indices_y_claves(cursor, TABLA)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0012_registroacceso_fecha_hora_default'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar, desparticionar),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:41
+
+from datetime import timezone as dt_timezone
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncHour
+
+
+def cargar_estadisticas(apps, schema_editor):
+    """Calcular los contadores por hora de los registros de acceso existentes"""
+    RegistroAcceso = apps.get_model('usuarios', 'RegistroAcceso')
+    EstadisticaAcceso = apps.get_model('usuarios', 'EstadisticaAcceso')
+
+    filas = (
+        RegistroAcceso.objects
+        .annotate(hora=TruncHour('fecha_hora', tzinfo=dt_timezone.utc), camara=Coalesce('camara_id', Value('')))
+        .values('hora', 'camara', 'estado_acceso', 'tipo_acceso')
+        .annotate(
+            n=Count('id'),
+            confianza=Sum('ia_confidence'),
+            placas=Count('id', filter=Q(ia_placa_reconocida=True)),
+            vehiculos=Count('id', filter=Q(ia_vehiculo_reconocido=True)),
+        )
+        .order_by()
+    )
+    EstadisticaAcceso.objects.bulk_create([
+        EstadisticaAcceso(
+            bucket=fila['hora'], camara_id=fila['camara'], estado_acceso=fila['estado_acceso'],
+            tipo_acceso=fila['tipo_acceso'], total=fila['n'], suma_confianza=fila['confianza'] or 0,
+            placas_reconocidas=fila['placas'], vehiculos_reconocidos=fila['vehiculos'],
+        )
+        for fila in filas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0013_particionar_registroacceso'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaAcceso',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('bucket', models.DateTimeField(help_text='Inicio de la hora (UTC)')),
+                ('camara_id', models.CharField(blank=True, default='', max_length=50)),
+                ('estado_acceso', models.CharField(choices=[('autorizado', 'Autorizado'), ('denegado', 'Denegado'), ('pendiente', 'Pendiente de Autorización'), ('error_ia', 'Error en IA')], max_length=20)),
+                ('tipo_acceso', models.CharField(choices=[('entrada', 'Entrada'), ('salida', 'Salida')], max_length=10)),
+                ('total', models.IntegerField(default=0)),
+                ('suma_confianza', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('placas_reconocidas', models.IntegerField(default=0)),
+                ('vehiculos_reconocidos', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-bucket'],
+                'unique_together': {('bucket', 'camara_id', 'estado_acceso', 'tipo_acceso')},
+            },
+        ),
+        migrations.RunPython(cargar_estadisticas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0014_estadisticaacceso'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoAcceso',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('registro_id', models.IntegerField(db_index=True)),
+                ('tipo', models.CharField(choices=[('autorizacion', 'Autorización manual'), ('denegacion', 'Denegación manual')], max_length=20)),
+                ('estado_anterior', models.CharField(choices=[('autorizado', 'Autorizado'), ('denegado', 'Denegado'), ('pendiente', 'Pendiente de Autorización'), ('error_ia', 'Error en IA')], max_length=20)),
+                ('estado_nuevo', models.CharField(choices=[('autorizado', 'Autorizado'), ('denegado', 'Denegado'), ('pendiente', 'Pendiente de Autorización'), ('error_ia', 'Error en IA')], max_length=20)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0015_eventoacceso'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='configuracionacceso',
+            name='segundos_debounce_placa',
+            field=models.IntegerField(default=10, help_text='Segundos en que detecciones repetidas de la misma placa y cámara se agrupan en un solo registro (0 = desactivado)'),
+        ),
+    ]
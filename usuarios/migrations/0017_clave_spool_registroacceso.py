@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0016_configuracionacceso_segundos_debounce_placa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='registroacceso',
+            name='clave_spool',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='registroacceso',
+            constraint=models.UniqueConstraint(fields=('clave_spool', 'fecha_hora'), name='registroacceso_clave_spool_unica'),
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 
@@ -125,6 +127,23 @@ class Empleado(models.Model):
     def __str__(self):
         return f"{self.persona} - {self.cargo}"
 
+class IndicePlacasQuerySet(models.QuerySet):
+    """update() y bulk_create() no envían signals: invalidan el índice de placas completo"""
+
+    def update(self, **kwargs):
+        from usuarios.services.indice_placas import indice_placas
+        filas = super().update(**kwargs)
+        if filas:
+            indice_placas.invalidar_todos()
+        return filas
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from usuarios.services.indice_placas import indice_placas
+        creados = super().bulk_create(objs, *args, **kwargs)
+        if creados:
+            indice_placas.invalidar_todos()
+        return creados
+
 # Modelos adicionales para casos de uso faltantes
 class Vehiculo(models.Model):
     placa = models.CharField(max_length=10, primary_key=True)
@@ -132,6 +151,8 @@ class Vehiculo(models.Model):
     modelo = models.CharField(max_length=50)
     color = models.CharField(max_length=30)
 
+    objects = IndicePlacasQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.marca} {self.modelo} - {self.placa}"
 
@@ -182,6 +203,8 @@ class Invitado(models.Model):
     creado_en = models.DateTimeField(default=timezone.now)
     actualizado_en = models.DateTimeField(default=timezone.now)
 
+    objects = IndicePlacasQuerySet.as_manager()
+
     def __str__(self):
         return f"Invitado: {self.nombre} ({self.get_tipo_display()})"
 
@@ -208,6 +231,8 @@ class PlacaVehiculo(models.Model):
     activo = models.BooleanField(default=True)
     fecha_registro = models.DateTimeField(auto_now_add=True)
 
+    objects = IndicePlacasQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.placa} - {self.residente.persona.nombre}"
 
@@ -226,6 +251,8 @@ class PlacaInvitado(models.Model):
     activo = models.BooleanField(default=True)
     fecha_registro = models.DateTimeField(auto_now_add=True)
 
+    objects = IndicePlacasQuerySet.as_manager()
+
     def __str__(self):
         return f"Invitado: {self.placa} - {self.residente.persona.nombre}"
 
@@ -266,7 +293,8 @@ class RegistroAcceso(models.Model):
     camara_id = models.CharField(max_length=50, null=True, blank=True, help_text='ID de la cámara que capturó')
 
     # Información de tiempo
-    fecha_hora = models.DateTimeField(auto_now_add=True)
+    # default en vez de auto_now_add: los registros escritos en diferido conservan la hora del evento
+    fecha_hora = models.DateTimeField(default=timezone.now, editable=False)
     tiempo_procesamiento = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True, help_text='Tiempo en segundos que tomó procesar')
 
     # Información adicional
@@ -277,11 +305,59 @@ class RegistroAcceso(models.Model):
     placa_vehiculo = models.ForeignKey(PlacaVehiculo, on_delete=models.SET_NULL, null=True, blank=True)
     placa_invitado = models.ForeignKey(PlacaInvitado, on_delete=models.SET_NULL, null=True, blank=True)
 
+    # Clave del registro en el spool del escritor diferido: un reenvío no lo duplica
+    clave_spool = models.UUIDField(null=True, blank=True, editable=False)
+
     def __str__(self):
         return f"{self.placa_detectada} - {self.fecha_hora} - {self.estado_acceso}"
 
     class Meta:
+        # En PostgreSQL la tabla está particionada por mes sobre fecha_hora (ver services/particiones_registros.py)
         ordering = ['-fecha_hora']
+        constraints = [
+            # Con fecha_hora: en una tabla particionada la restricción debe incluir la columna de partición
+            models.UniqueConstraint(fields=['clave_spool', 'fecha_hora'], name='registroacceso_clave_spool_unica'),
+        ]
+
+class EventoAcceso(models.Model):
+    """Autorizaciones y denegaciones manuales de registros de acceso (alimentan el feed en vivo)"""
+    TIPO_CHOICES = [
+        ('autorizacion', 'Autorización manual'),
+        ('denegacion', 'Denegación manual'),
+    ]
+    id = models.AutoField(primary_key=True)
+    # Sin ForeignKey: en PostgreSQL la tabla de registros está particionada y su pk física es (id, fecha_hora)
+    registro_id = models.IntegerField(db_index=True)
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    estado_anterior = models.CharField(max_length=20, choices=RegistroAcceso.ESTADO_ACCESO_CHOICES)
+    estado_nuevo = models.CharField(max_length=20, choices=RegistroAcceso.ESTADO_ACCESO_CHOICES)
+    usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} del registro {self.registro_id}"
+
+    class Meta:
+        ordering = ['id']
+
+class EstadisticaAcceso(models.Model):
+    """Conteo de registros de acceso por hora, cámara, estado y tipo (se actualiza al registrar)"""
+    id = models.AutoField(primary_key=True)
+    bucket = models.DateTimeField(help_text='Inicio de la hora (UTC)')
+    camara_id = models.CharField(max_length=50, blank=True, default='')
+    estado_acceso = models.CharField(max_length=20, choices=RegistroAcceso.ESTADO_ACCESO_CHOICES)
+    tipo_acceso = models.CharField(max_length=10, choices=RegistroAcceso.TIPO_ACCESO_CHOICES)
+    total = models.IntegerField(default=0)
+    suma_confianza = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    placas_reconocidas = models.IntegerField(default=0)
+    vehiculos_reconocidos = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.bucket} - {self.camara_id or 'sin cámara'} - {self.estado_acceso}: {self.total}"
+
+    class Meta:
+        unique_together = ['bucket', 'camara_id', 'estado_acceso', 'tipo_acceso']
+        ordering = ['-bucket']
 
 class ConfiguracionAcceso(models.Model):
     """Configuración general del sistema de acceso"""
@@ -304,6 +380,7 @@ class ConfiguracionAcceso(models.Model):
     # Configuración de cámaras
     camaras_activas = models.IntegerField(default=1, help_text='Número de cámaras activas')
     fps_captura = models.IntegerField(default=15, help_text='Frames por segundo para captura')
+    segundos_debounce_placa = models.IntegerField(default=10, help_text='Segundos en que detecciones repetidas de la misma placa y cámara se agrupan en un solo registro (0 = desactivado)')
 
     # Configuración de retención
     dias_retencion_imagenes = models.IntegerField(default=30, help_text='Días para retener imágenes')
@@ -312,6 +389,80 @@ class ConfiguracionAcceso(models.Model):
     def __str__(self):
         return "Configuración del Sistema de Acceso"
 
+
+# Signals para mantener el índice en memoria de placas autorizadas
+@receiver(post_save, sender=PlacaVehiculo)
+@receiver(post_save, sender=PlacaInvitado)
+@receiver(post_save, sender=Vehiculo)
+@receiver(post_save, sender=Invitado)
+def actualizar_indice_placas(sender, instance, **kwargs):
+    """Actualizar la entrada de la placa en el índice al crear o modificar"""
+    from usuarios.services.indice_placas import indice_placas
+    indice_placas.actualizar(sender.__name__, instance.pk)
+
+@receiver(post_delete, sender=PlacaVehiculo)
+@receiver(post_delete, sender=PlacaInvitado)
+@receiver(post_delete, sender=Vehiculo)
+@receiver(post_delete, sender=Invitado)
+def quitar_de_indice_placas(sender, instance, **kwargs):
+    """Quitar la placa del índice al eliminar la fuente"""
+    from usuarios.services.indice_placas import indice_placas
+    indice_placas.actualizar(sender.__name__, instance.pk, eliminado=True)
+
+@receiver(post_save, sender=Persona)
+def refrescar_persona_en_indice_placas(sender, instance, created, update_fields=None, **kwargs):
+    """El índice guarda el nombre del propietario: refrescar sus placas si puede haber cambiado"""
+    if created or (update_fields is not None and 'nombre' not in update_fields):
+        return
+    from usuarios.services.indice_placas import indice_placas
+    indice_placas.actualizar_persona(instance.pk)
+
+# Signals para mantener las estadísticas de acceso por hora
+@receiver(pre_save, sender=RegistroAcceso)
+def recordar_estado_registro_acceso(sender, instance, update_fields=None, **kwargs):
+    """
+    Guardar el estado anterior para mover el conteo si cambia (autorización manual, etc.).
+    Sin consulta si el save no toca estado_acceso (update_fields) o el estado ya se conoce
+    (un save anterior de la instancia, o quien la modifica lo dejó en _estado_anterior).
+    """
+    if not instance.pk or instance._state.adding:
+        return
+    if update_fields is not None and 'estado_acceso' not in update_fields:
+        return
+    if not hasattr(instance, '_estado_anterior'):
+        instance._estado_anterior = sender.objects.filter(pk=instance.pk).values_list(
+            'estado_acceso', flat=True
+        ).first()
+
+@receiver(post_save, sender=RegistroAcceso)
+def acumular_estadistica_acceso(sender, instance, created, update_fields=None, **kwargs):
+    """Sumar el registro a su hora en EstadisticaAcceso"""
+    from usuarios.services.estadisticas_acceso import acumular, cambiar_estado
+    if created:
+        acumular([instance])
+    elif update_fields is None or 'estado_acceso' in update_fields:
+        estado_anterior = getattr(instance, '_estado_anterior', None)
+        if estado_anterior and estado_anterior != instance.estado_acceso:
+            cambiar_estado(instance, estado_anterior)
+    else:
+        return
+    instance._estado_anterior = instance.estado_acceso
+
+@receiver(post_delete, sender=RegistroAcceso)
+def descontar_estadistica_acceso(sender, instance, **kwargs):
+    """Restar el registro eliminado de su hora en EstadisticaAcceso (la retención no pasa por aquí)"""
+    from usuarios.services.estadisticas_acceso import acumular
+    transaction.on_commit(lambda: acumular([instance], signo=-1))
+
+# Signal para despertar el feed en vivo de accesos cuando se confirma la transacción
+@receiver(post_save, sender=RegistroAcceso)
+@receiver(post_save, sender=EventoAcceso)
+def notificar_feed_accesos(sender, instance, created, **kwargs):
+    """Avisar al feed SSE que hay registros o decisiones manuales nuevos"""
+    if created:
+        from usuarios.services.feed_accesos import feed_accesos
+        transaction.on_commit(feed_accesos.notificar)
+
 # CU23: Asignación de Tareas para Empleados - Modelos adicionales
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
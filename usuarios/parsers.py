@@ -0,0 +1,26 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parser para flujos NDJSON (un objeto JSON por línea), usado por las cámaras
+    para enviar eventos en lote. Retorna la lista de objetos.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        eventos = []
+        for numero, linea in enumerate(stream, 1):
+            linea = linea.decode(encoding).strip()
+            if not linea:
+                continue
+            try:
+                eventos.append(json.loads(linea))
+            except ValueError as exc:
+                raise ParseError(f'Línea {numero} no es JSON válido: {exc}')
+        return eventos
@@ -0,0 +1,36 @@
+"""
+Autenticación por token para las vistas asíncronas (ASGI)
+Las vistas async no pasan por la autenticación de DRF: aquí se valida el header
+'Authorization: Token <key>' contra rest_framework.authtoken sin bloquear el
+event loop, y el token ya validado se reutiliza en memoria TTL_TOKEN segundos.
+"""
+
+import time
+
+from rest_framework.authtoken.models import Token
+
+# Segundos que se reutiliza un token ya validado
+TTL_TOKEN = 60
+
+_tokens = {}
+
+
+async def usuario_del_token(request, key=None):
+    """Valida el header 'Authorization: Token <key>' (o la key recibida) y retorna el id del usuario, o None"""
+    if key is None:
+        partes = request.headers.get('Authorization', '').split()
+        if len(partes) != 2 or partes[0].lower() != 'token':
+            return None
+        key = partes[1]
+
+    ahora = time.monotonic()
+    en_memoria = _tokens.get(key)
+    if en_memoria and en_memoria[1] > ahora:
+        return en_memoria[0]
+
+    token = await Token.objects.select_related('user').filter(key=key, user__is_active=True).afirst()
+    if not token:
+        _tokens.pop(key, None)
+        return None
+    _tokens[key] = (token.user_id, ahora + TTL_TOKEN)
+    return token.user_id
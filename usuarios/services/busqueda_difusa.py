@@ -0,0 +1,100 @@
+"""
+Búsqueda difusa de placas tolerante a errores de OCR
+Usa un índice de vecindario por borrado (estilo SymSpell) sobre la forma
+canónica de la placa, donde los caracteres que el OCR suele confundir
+(0/O, 1/I, 8/B...) se tratan como uno solo. Los candidatos se verifican con
+una distancia de edición ponderada.
+"""
+
+import heapq
+from typing import Dict, List, Optional, Set, Tuple
+
+# Grupos de caracteres que el OCR confunde entre sí
+GRUPOS_CONFUSION_OCR = ['0ODQ', '1IL', '8B', '5S', '2Z', '6G']
+
+# Costo de sustituir dos caracteres del mismo grupo (una sustitución normal cuesta 1)
+COSTO_CONFUSION_OCR = 0.5
+
+_CANONICO = {c: grupo[1] if grupo[0].isdigit() else grupo[0] for grupo in GRUPOS_CONFUSION_OCR for c in grupo}
+
+
+def canonizar_placa(placa: str) -> str:
+    """Reemplaza cada carácter confundible por el representante de su grupo"""
+    return ''.join(_CANONICO.get(c, c) for c in placa)
+
+
+def costo_sustitucion(a: str, b: str) -> float:
+    if a == b:
+        return 0.0
+    if _CANONICO.get(a, a) == _CANONICO.get(b, b):
+        return COSTO_CONFUSION_OCR
+    return 1.0
+
+
+def distancia_ocr(placa1: str, placa2: str) -> float:
+    """Distancia de edición con sustituciones más baratas entre caracteres confundibles"""
+    if placa1 == placa2:
+        return 0.0
+
+    anterior = [float(j) for j in range(len(placa2) + 1)]
+    for i, c1 in enumerate(placa1, 1):
+        actual = [float(i)]
+        for j, c2 in enumerate(placa2, 1):
+            actual.append(min(
+                anterior[j] + 1,
+                actual[j - 1] + 1,
+                anterior[j - 1] + costo_sustitucion(c1, c2)
+            ))
+        anterior = actual
+    return anterior[-1]
+
+
+def _borrados(clave: str) -> Set[str]:
+    """La clave y todas sus variantes con un carácter menos"""
+    return {clave} | {clave[:i] + clave[i + 1:] for i in range(len(clave))}
+
+
+class IndiceDifusoPlacas:
+    """
+    Índice de placas para consultas "top-k dentro de distancia d".
+    Es completo para distancias menores a 2: toda placa a distancia ponderada
+    < 2 está a distancia canónica <= 1, que es lo que cubre el índice.
+    """
+
+    MAX_DISTANCIA = 1.5
+
+    def __init__(self):
+        self._por_borrado: Dict[str, Set[str]] = {}
+
+    def limpiar(self):
+        self._por_borrado = {}
+
+    def agregar(self, placa: str):
+        for clave in _borrados(canonizar_placa(placa)):
+            self._por_borrado.setdefault(clave, set()).add(placa)
+
+    def quitar(self, placa: str):
+        for clave in _borrados(canonizar_placa(placa)):
+            placas = self._por_borrado.get(clave)
+            if placas:
+                placas.discard(placa)
+                if not placas:
+                    del self._por_borrado[clave]
+
+    def buscar(self, placa: str, max_distancia: float = 1.0, k: Optional[int] = 5) -> List[Tuple[str, float]]:
+        """Las k placas más cercanas (todas si k es None) con distancia <= max_distancia, de menor a mayor"""
+        max_distancia = min(max_distancia, self.MAX_DISTANCIA)
+
+        candidatos = set()
+        for clave in _borrados(canonizar_placa(placa)):
+            candidatos |= self._por_borrado.get(clave, set())
+
+        resultados = []
+        for candidata in candidatos:
+            distancia = distancia_ocr(placa, candidata)
+            if distancia <= max_distancia:
+                resultados.append((candidata, distancia))
+
+        if k is None:
+            return sorted(resultados, key=lambda r: (r[1], r[0]))
+        return heapq.nsmallest(k, resultados, key=lambda r: (r[1], r[0]))
@@ -0,0 +1,135 @@
+"""
+Deduplicación de detecciones repetidas de la cámara
+Un auto detenido en la barrera genera decenas de cuadros casi iguales por segundo.
+- CacheFrames: cuadros con hash perceptual parecido (misma cámara, pocos segundos)
+  reutilizan el resultado del reconocimiento en vez de procesarse otra vez.
+- Debounce de placas: la misma placa en la misma cámara dentro de
+  ConfiguracionAcceso.segundos_debounce_placa se agrupa en un solo RegistroAcceso.
+  Usa la cache de Django, así que se comparte entre procesos.
+"""
+
+import io
+import threading
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from PIL import Image
+
+from usuarios.services.indice_placas import limpiar_placa
+
+PREFIJO_DEBOUNCE = 'usuarios:debounce_placa'
+
+
+def hash_perceptual(datos: bytes) -> int:
+    """dHash de 64 bits: compara el brillo de píxeles vecinos en una miniatura de 9x8"""
+    imagen = Image.open(io.BytesIO(datos))
+    # En JPEG decodifica directo a escala reducida, mucho más rápido que la imagen completa
+    imagen.draft('L', (64, 64))
+    pixeles = list(imagen.convert('L').resize((9, 8), Image.BILINEAR).getdata())
+    huella = 0
+    for fila in range(8):
+        for columna in range(8):
+            huella = (huella << 1) | (pixeles[fila * 9 + columna] > pixeles[fila * 9 + columna + 1])
+    return huella
+
+
+def distancia_hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class CacheFrames:
+    """Resultados recientes del reconocimiento por cámara, buscados por cercanía del hash"""
+
+    def __init__(self, ttl_segundos: float = None, max_distancia: int = None, max_por_camara: int = 32):
+        self._ttl_segundos = ttl_segundos
+        self._max_distancia = max_distancia
+        self.max_por_camara = max_por_camara
+        self._lock = threading.Lock()
+        self._por_camara = {}
+        self.aciertos = 0
+        self.fallos = 0
+
+    @property
+    def ttl_segundos(self) -> float:
+        return self._ttl_segundos or getattr(settings, 'IA_TTL_FRAMES', 2.0)
+
+    @property
+    def max_distancia(self) -> int:
+        return self._max_distancia if self._max_distancia is not None else getattr(settings, 'IA_DISTANCIA_FRAMES', 6)
+
+    def buscar(self, camara_id: str, huella: int) -> Optional[Dict]:
+        """Resultado de un cuadro parecido de la misma cámara que todavía no venció"""
+        ahora = time.monotonic()
+        with self._lock:
+            recientes = [
+                (vence, h, resultado) for vence, h, resultado in self._por_camara.get(camara_id, [])
+                if vence > ahora
+            ]
+            self._por_camara[camara_id] = recientes
+            for _, h, resultado in reversed(recientes):
+                if distancia_hamming(h, huella) <= self.max_distancia:
+                    self.aciertos += 1
+                    return resultado
+            self.fallos += 1
+        return None
+
+    def guardar(self, camara_id: str, huella: int, resultado: Dict):
+        with self._lock:
+            recientes = self._por_camara.setdefault(camara_id, [])
+            recientes.append((time.monotonic() + self.ttl_segundos, huella, resultado))
+            del recientes[:-self.max_por_camara]
+
+    def metricas(self) -> Dict:
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / consultas * 100, 2) if consultas else 0,
+            }
+
+
+# Instancia única por proceso
+cache_frames = CacheFrames()
+
+
+def clave_debounce(camara_id: str, placa: str, tipo_acceso: str) -> str:
+    # La placa exacta (solo sin espacios ni guiones): agrupar por forma canónica de OCR
+    # repetiría la decisión de una placa para otra distinta (1234ABD / 1234ABQ)
+    return f'{PREFIJO_DEBOUNCE}:{camara_id or ""}:{tipo_acceso}:{limpiar_placa(placa.upper())}'
+
+
+def registrar_deteccion(camara_id: str, placa: str, tipo_acceso: str, decision: Dict, segundos: int) -> Optional[Dict]:
+    """
+    Registra la primera detección de la placa en la ventana y retorna None,
+    o retorna la decisión ya tomada si la placa se detectó hace menos de `segundos`.
+    """
+    if segundos <= 0:
+        return None
+    clave = clave_debounce(camara_id, placa, tipo_acceso)
+    if cache.add(clave, decision, segundos):
+        return None
+    return cache.get(clave)
+
+
+async def aregistrar_deteccion(camara_id: str, placa: str, tipo_acceso: str, decision: Dict, segundos: int) -> Optional[Dict]:
+    """Versión asíncrona de registrar_deteccion"""
+    if segundos <= 0:
+        return None
+    clave = clave_debounce(camara_id, placa, tipo_acceso)
+    if await cache.aadd(clave, decision, segundos):
+        return None
+    return await cache.aget(clave)
+
+
+def actualizar_deteccion(camara_id: str, placa: str, tipo_acceso: str, decision: Dict, segundos: int):
+    """Completar la decisión guardada (por ejemplo con el id del registro ya creado)"""
+    if segundos > 0:
+        cache.set(clave_debounce(camara_id, placa, tipo_acceso), decision, segundos)
+
+
+def olvidar_deteccion(camara_id: str, placa: str, tipo_acceso: str):
+    """Liberar la ventana si el registro no se pudo guardar o seguridad ya decidió sobre él"""
+    cache.delete(clave_debounce(camara_id, placa, tipo_acceso))
@@ -0,0 +1,323 @@
+"""
+Escritor diferido (write-behind) de registros de acceso
+Las decisiones de la barrera no esperan al INSERT en la base principal:
+cada registro se guarda primero en un spool local SQLite (modo WAL) y un hilo
+los pasa a la base principal en commits agrupados de N filas o T milisegundos.
+Lo que quede en el spool al reiniciar se vuelve a enviar apenas arranca el
+servidor (UsuariosConfig.ready) o con `manage.py enviar_registros_pendientes`.
+Si un grupo falla por una fila inválida se reintenta de a una fila, y las que
+fallan por sí mismas pasan a la tabla registros_fallidos del spool. Una fila que
+apunta a una placa o usuario borrados mientras esperaba se guarda sin esa relación.
+La entrega es al menos una vez (un commit lento cuyo reclamo vence y lo toma otro
+proceso, una caída entre el commit y el borrado del spool): cada registro lleva
+una clave_spool única y las que ya están en la base no se vuelven a insertar.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+
+class _CodificadorSpool(DjangoJSONEncoder):
+    """Como DjangoJSONEncoder pero sin recortar los microsegundos de las fechas"""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+# Un reclamo de filas más viejo que esto se considera de un proceso caído
+SEGUNDOS_RECLAMO_VENCIDO = 60
+
+# Relaciones que pueden haberse borrado mientras la fila esperaba en el spool (campo, modelo)
+RELACIONES = (
+    ('placa_vehiculo_id', 'PlacaVehiculo'),
+    ('placa_invitado_id', 'PlacaInvitado'),
+    ('autorizado_por_id', 'Usuario'),
+)
+
+# Errores de la fila misma: reintentarla no sirve. Los demás (conexión, base caída) se reintentan
+ERRORES_PERMANENTES = (DataError, IntegrityError, ValidationError, TypeError, ValueError)
+
+
+class EscritorRegistros:
+    """Spool durable de RegistroAcceso pendientes y el hilo que hace los commits agrupados"""
+
+    def __init__(self, ruta_spool=None, filas_por_grupo=None, milisegundos_por_grupo=None,
+                 reintento_segundos: float = 1.0):
+        self._ruta_spool = ruta_spool
+        self._filas_por_grupo = filas_por_grupo
+        self._milisegundos_por_grupo = milisegundos_por_grupo
+        self.reintento_segundos = reintento_segundos
+        self._hilo = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._hay_trabajo = threading.Event()
+        self._nuevos = 0
+        self.escritos = 0
+        self.fallos = 0
+        self.descartados = 0
+
+    # ------------------------------------------------------------------
+    # Configuración (se resuelve tarde para que los tests puedan cambiar settings)
+    # ------------------------------------------------------------------
+
+    @property
+    def ruta_spool(self) -> str:
+        return str(self._ruta_spool or getattr(
+            settings, 'ACCESO_SPOOL_PATH', settings.BASE_DIR / 'spool' / 'registros_acceso.sqlite3'
+        ))
+
+    @property
+    def filas_por_grupo(self) -> int:
+        return self._filas_por_grupo or getattr(settings, 'ACCESO_GRUPO_FILAS', 200)
+
+    @property
+    def milisegundos_por_grupo(self) -> int:
+        return self._milisegundos_por_grupo or getattr(settings, 'ACCESO_GRUPO_MS', 250)
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def encolar(self, campos: Dict):
+        """Guarda el registro (campos de RegistroAcceso) en el spool y avisa al hilo escritor"""
+        campos = {**campos, 'clave_spool': str(uuid.uuid4())}
+        conexion = self._conexion()
+        with conexion:
+            conexion.execute(
+                'INSERT INTO registros (datos) VALUES (?)',
+                (json.dumps(campos, cls=_CodificadorSpool),)
+            )
+
+        self._iniciar()
+        with self._lock:
+            self._nuevos += 1
+            if self._nuevos >= self.filas_por_grupo:
+                self._hay_trabajo.set()
+
+    @property
+    def pendientes(self) -> int:
+        return self._conexion().execute('SELECT COUNT(*) FROM registros').fetchone()[0]
+
+    @property
+    def fallidos(self) -> int:
+        """Registros que no se pudieron guardar y quedaron en registros_fallidos para revisión"""
+        return self._conexion().execute('SELECT COUNT(*) FROM registros_fallidos').fetchone()[0]
+
+    def iniciar_si_hay_pendientes(self):
+        """Arranca el hilo escritor si quedó algo en el spool (por ejemplo, de antes de un reinicio)"""
+        if self.pendientes:
+            self._iniciar()
+            self._hay_trabajo.set()
+
+    def vaciar(self) -> int:
+        """Envía a la base principal todo lo que haya en el spool; retorna las filas escritas"""
+        total = 0
+        while True:
+            escritas = self._enviar_grupo()
+            if not escritas:
+                return total
+            total += escritas
+
+    # ------------------------------------------------------------------
+    # Hilo escritor
+    # ------------------------------------------------------------------
+
+    def _iniciar(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._ejecutar, name='escritor-registros-acceso', daemon=True)
+                self._hilo.start()
+
+    def _ejecutar(self):
+        while True:
+            self._hay_trabajo.wait(self.milisegundos_por_grupo / 1000)
+            self._hay_trabajo.clear()
+            with self._lock:
+                self._nuevos = 0
+
+            # Solo en el hilo propio: en quien llama a vaciar() cerraría su conexión (o la de su transacción)
+            close_old_connections()
+            try:
+                # Seguir mientras salgan grupos completos
+                while self._enviar_grupo() >= self.filas_por_grupo:
+                    pass
+            except Exception as e:
+                self.fallos += 1
+                logger.error(f"Error guardando registros de acceso, se reintentará: {e}")
+                time.sleep(self.reintento_segundos)
+
+    def _enviar_grupo(self) -> int:
+        """Reclama hasta N filas del spool, las guarda en un solo commit y las borra del spool"""
+        filas = self._reclamar()
+        if not filas:
+            return 0
+
+        try:
+            self._guardar(filas)
+        except ERRORES_PERMANENTES as e:
+            # Una fila inválida no puede trabar al resto: de a una, las que fallan se descartan
+            logger.warning(f"Grupo de {len(filas)} registros de acceso rechazado ({e}), se envían de a uno")
+            for fila in filas:
+                self._enviar_fila(fila)
+            return len(filas)
+
+        self._borrar(filas)
+        self.escritos += len(filas)
+        return len(filas)
+
+    def _enviar_fila(self, fila: Tuple[int, Dict]):
+        try:
+            self._guardar([fila])
+        except IntegrityError as e:
+            # Una placa o usuario borrados mientras esperaba: se guarda sin esa relación
+            sin_relaciones = self._sin_relaciones_borradas(fila)
+            if sin_relaciones is None:
+                self._descartar(fila, e)
+                return
+            try:
+                self._guardar([sin_relaciones])
+            except ERRORES_PERMANENTES as e:
+                self._descartar(fila, e)
+                return
+        except ERRORES_PERMANENTES as e:
+            self._descartar(fila, e)
+            return
+        self._borrar([fila])
+        self.escritos += 1
+
+    def _guardar(self, filas: List[Tuple[int, Dict]]):
+        from usuarios.models import RegistroAcceso
+        from usuarios.services.estadisticas_acceso import acumular
+        from usuarios.services.feed_accesos import feed_accesos
+
+        registros = [self._a_registro(RegistroAcceso, datos) for _, datos in filas]
+        with transaction.atomic():
+            # Reenvíos de filas ya guardadas. Si otro proceso las guarda a la vez, la restricción
+            # única hace fallar el grupo y el reintento de a una fila las encuentra aquí
+            claves = [registro.clave_spool for registro in registros if registro.clave_spool]
+            guardadas = set(
+                RegistroAcceso.objects.filter(clave_spool__in=claves).values_list('clave_spool', flat=True)
+            ) if claves else set()
+            if guardadas:
+                logger.warning(f"{len(guardadas)} registros de acceso del spool ya estaban guardados, no se repiten")
+                registros = [registro for registro in registros if registro.clave_spool not in guardadas]
+            if not registros:
+                return
+            creados = RegistroAcceso.objects.bulk_create(registros)
+            acumular(creados)
+            transaction.on_commit(feed_accesos.notificar)
+
+    @staticmethod
+    def _sin_relaciones_borradas(fila: Tuple[int, Dict]):
+        """La fila sin las relaciones cuyo destino ya no existe, o None si no había ninguna"""
+        from django.apps import apps
+        id_spool, datos = fila
+        datos = dict(datos)
+        cambio = False
+        for campo, modelo in RELACIONES:
+            if datos.get(campo) is None:
+                continue
+            if not apps.get_model('usuarios', modelo).objects.filter(pk=datos[campo]).exists():
+                logger.warning(f"Registro de acceso {id_spool} del spool: {modelo} {datos[campo]} ya no existe, se guarda sin él")
+                datos[campo] = None
+                cambio = True
+        return (id_spool, datos) if cambio else None
+
+    def _borrar(self, filas: List[Tuple[int, Dict]]):
+        conexion = self._conexion()
+        with conexion:
+            conexion.executemany('DELETE FROM registros WHERE id = ?', [(id_spool,) for id_spool, _ in filas])
+
+    def _descartar(self, fila: Tuple[int, Dict], error: Exception):
+        """Pasa la fila a registros_fallidos (con el error) para que no se reintente más"""
+        id_spool, datos = fila
+        conexion = self._conexion()
+        with conexion:
+            conexion.execute('BEGIN IMMEDIATE')
+            conexion.execute(
+                'INSERT INTO registros_fallidos (id_spool, datos, error, fecha) VALUES (?, ?, ?, ?)',
+                (id_spool, json.dumps(datos, cls=_CodificadorSpool), str(error), time.time())
+            )
+            conexion.execute('DELETE FROM registros WHERE id = ?', (id_spool,))
+        self.descartados += 1
+        logger.error(f"Registro de acceso {id_spool} del spool descartado: {error}")
+
+    @staticmethod
+    def _a_registro(modelo, datos: Dict):
+        """Instancia del registro con la fecha ya convertida desde el JSON del spool"""
+        registro = modelo(**datos)
+        if isinstance(registro.fecha_hora, str):
+            registro.fecha_hora = parse_datetime(registro.fecha_hora)
+        if isinstance(registro.clave_spool, str):
+            registro.clave_spool = uuid.UUID(registro.clave_spool)
+        return registro
+
+    def _reclamar(self) -> List[Tuple[int, Dict]]:
+        """Marca filas libres (o de un proceso caído) como propias; el spool puede ser compartido"""
+        conexion = self._conexion()
+        ahora = time.time()
+        dueno = f'{os.getpid()}:{threading.get_ident()}'
+        with conexion:
+            conexion.execute('BEGIN IMMEDIATE')
+            conexion.execute(
+                '''UPDATE registros SET reclamado_por = ?, reclamado_en = ?
+                   WHERE id IN (
+                       SELECT id FROM registros
+                       WHERE reclamado_por IS NULL OR reclamado_por = ? OR reclamado_en < ?
+                       ORDER BY id LIMIT ?
+                   )''',
+                (dueno, ahora, dueno, ahora - SEGUNDOS_RECLAMO_VENCIDO, self.filas_por_grupo)
+            )
+            filas = conexion.execute(
+                'SELECT id, datos FROM registros WHERE reclamado_por = ? ORDER BY id', (dueno,)
+            ).fetchall()
+        return [(id_spool, json.loads(datos)) for id_spool, datos in filas]
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Una conexión al spool por hilo"""
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            os.makedirs(os.path.dirname(self.ruta_spool), exist_ok=True)
+            conexion = sqlite3.connect(self.ruta_spool, timeout=5, isolation_level=None)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            conexion.execute(
+                '''CREATE TABLE IF NOT EXISTS registros (
+                       id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       datos TEXT NOT NULL,
+                       reclamado_por TEXT,
+                       reclamado_en REAL
+                   )'''
+            )
+            conexion.execute(
+                '''CREATE TABLE IF NOT EXISTS registros_fallidos (
+                       id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       id_spool INTEGER NOT NULL,
+                       datos TEXT NOT NULL,
+                       error TEXT NOT NULL,
+                       fecha REAL NOT NULL
+                   )'''
+            )
+            self._local.conexion = conexion
+        return conexion
+
+
+# Instancia única por proceso
+escritor_registros = EscritorRegistros()
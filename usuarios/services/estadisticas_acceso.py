@@ -0,0 +1,177 @@
+"""
+Estadísticas de acceso pre-agregadas
+EstadisticaAcceso guarda un contador por (hora, cámara, estado, tipo) que se
+incrementa cada vez que se escriben registros de acceso. El dashboard y el
+diagnóstico de IA leen unas pocas filas de esta tabla en vez de recorrer
+RegistroAcceso completo. Los contadores sobreviven a la retención de registros.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncHour
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_CLAVE = ['bucket', 'camara_id', 'estado_acceso', 'tipo_acceso']
+CAMPOS_CONTADOR = ['total', 'suma_confianza', 'placas_reconocidas', 'vehiculos_reconocidos']
+
+
+def bucket_de(fecha: datetime) -> datetime:
+    """Inicio de la hora (UTC) a la que pertenece la fecha"""
+    return fecha.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _clave(registro, estado_acceso: str = None):
+    return (
+        bucket_de(registro.fecha_hora),
+        registro.camara_id or '',
+        estado_acceso or registro.estado_acceso,
+        registro.tipo_acceso,
+    )
+
+
+def _incrementar(contadores: Dict):
+    """INSERT ... ON CONFLICT DO UPDATE sumando los contadores (PostgreSQL y SQLite)"""
+    from usuarios.models import EstadisticaAcceso
+
+    if not contadores:
+        return
+
+    tabla = EstadisticaAcceso._meta.db_table
+    ops = connection.ops
+    filas = []
+    parametros = []
+    for (bucket, camara_id, estado_acceso, tipo_acceso), valores in contadores.items():
+        filas.append('(%s, %s, %s, %s, %s, %s, %s, %s)')
+        parametros.extend([
+            ops.adapt_datetimefield_value(bucket), camara_id, estado_acceso, tipo_acceso,
+            valores[0], ops.adapt_decimalfield_value(valores[1], 14, 2), valores[2], valores[3],
+        ])
+
+    actualizaciones = ', '.join(f'{campo} = {tabla}.{campo} + excluded.{campo}' for campo in CAMPOS_CONTADOR)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''INSERT INTO {tabla} ({', '.join(CAMPOS_CLAVE + CAMPOS_CONTADOR)})
+                VALUES {', '.join(filas)}
+                ON CONFLICT ({', '.join(CAMPOS_CLAVE)}) DO UPDATE SET {actualizaciones}''',
+            parametros
+        )
+
+
+def acumular(registros: Iterable, signo: int = 1, estado_acceso: str = None):
+    """
+    Sumar (o restar con signo=-1) registros de acceso a sus contadores por hora.
+    `estado_acceso` reemplaza el estado de los registros (para restar un estado anterior).
+    """
+    contadores = defaultdict(lambda: [0, Decimal('0'), 0, 0])
+    for registro in registros:
+        valores = contadores[_clave(registro, estado_acceso)]
+        valores[0] += signo
+        valores[1] += signo * Decimal(str(registro.ia_confidence or 0))
+        valores[2] += signo * int(bool(registro.ia_placa_reconocida))
+        valores[3] += signo * int(bool(registro.ia_vehiculo_reconocido))
+
+    with transaction.atomic():
+        _incrementar(contadores)
+
+
+def cambiar_estado(registro, estado_anterior: str):
+    """Mover un registro del contador de su estado anterior al actual"""
+    with transaction.atomic():
+        acumular([registro], signo=-1, estado_acceso=estado_anterior)
+        acumular([registro])
+
+
+def primera_hora_completa() -> Optional[datetime]:
+    """
+    Primera hora cuyos registros siguen todos en RegistroAcceso. Las anteriores pueden
+    haber perdido filas por la retención: sus contadores son lo único que queda.
+    """
+    from usuarios.models import RegistroAcceso
+
+    mas_antiguo = RegistroAcceso.objects.order_by('fecha_hora').values_list('fecha_hora', flat=True).first()
+    if mas_antiguo is None:
+        return None
+    hora = bucket_de(mas_antiguo)
+    # La retención pudo cortar a mitad de esa hora
+    return hora if hora == mas_antiguo else hora + timedelta(hours=1)
+
+
+def reconstruir(desde: Optional[datetime] = None) -> int:
+    """
+    Recalcular los contadores desde RegistroAcceso a partir de `desde` (por defecto, todo lo
+    posible). Nunca antes de primera_hora_completa(): esos contadores se conservan.
+    """
+    from usuarios.models import EstadisticaAcceso, RegistroAcceso
+
+    piso = primera_hora_completa()
+    if piso is None:
+        logger.info("Estadísticas de acceso: no hay registros para reconstruir")
+        return 0
+    desde = max(bucket_de(desde), piso) if desde is not None else piso
+    registros = RegistroAcceso.objects.filter(fecha_hora__gte=desde)
+    estadisticas = EstadisticaAcceso.objects.filter(bucket__gte=desde)
+
+    filas = (
+        registros
+        .annotate(hora=TruncHour('fecha_hora', tzinfo=dt_timezone.utc), camara=Coalesce('camara_id', Value('')))
+        .values('hora', 'camara', 'estado_acceso', 'tipo_acceso')
+        .annotate(
+            n=Count('id'),
+            confianza=Sum('ia_confidence'),
+            placas=Count('id', filter=Q(ia_placa_reconocida=True)),
+            vehiculos=Count('id', filter=Q(ia_vehiculo_reconocido=True)),
+        )
+        .order_by()
+    )
+
+    with transaction.atomic():
+        estadisticas.delete()
+        creadas = EstadisticaAcceso.objects.bulk_create([
+            EstadisticaAcceso(
+                bucket=fila['hora'], camara_id=fila['camara'], estado_acceso=fila['estado_acceso'],
+                tipo_acceso=fila['tipo_acceso'], total=fila['n'], suma_confianza=fila['confianza'] or 0,
+                placas_reconocidas=fila['placas'], vehiculos_reconocidos=fila['vehiculos'],
+            )
+            for fila in filas
+        ], batch_size=1000)
+
+    logger.info(f"Estadísticas de acceso reconstruidas: {len(creadas)} filas")
+    return len(creadas)
+
+
+def totales(desde: Optional[datetime] = None, **periodos: datetime) -> Dict:
+    """
+    Totales de registros en una sola consulta sobre EstadisticaAcceso.
+    `periodos` agrega conteos extra desde otras fechas, ej. totales(hoy=inicio_dia).
+    """
+    from usuarios.models import EstadisticaAcceso, RegistroAcceso
+
+    estadisticas = EstadisticaAcceso.objects.all()
+    if desde is not None:
+        estadisticas = estadisticas.filter(bucket__gte=bucket_de(desde))
+
+    agregados = {
+        'total': Sum('total'),
+        'suma_confianza': Sum('suma_confianza'),
+        'placas_reconocidas': Sum('placas_reconocidas'),
+        'vehiculos_reconocidos': Sum('vehiculos_reconocidos'),
+    }
+    for estado, _ in RegistroAcceso.ESTADO_ACCESO_CHOICES:
+        agregados[estado] = Sum('total', filter=Q(estado_acceso=estado))
+    for nombre, fecha in periodos.items():
+        agregados[nombre] = Sum('total', filter=Q(bucket__gte=bucket_de(fecha)))
+
+    # Los alias no pueden coincidir con los nombres de los campos sumados
+    agregados = {f'n_{clave}': agregado for clave, agregado in agregados.items()}
+    resultado = {clave[2:]: valor or 0 for clave, valor in estadisticas.aggregate(**agregados).items()}
+    total = resultado['total']
+    resultado['tasa_exito'] = round(resultado['autorizado'] / total * 100, 2) if total else 0
+    resultado['confianza_promedio'] = round(float(resultado['suma_confianza']) / total, 2) if total else 0
+    return resultado
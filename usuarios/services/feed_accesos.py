@@ -0,0 +1,243 @@
+"""
+Feed en vivo de actividad de la barrera (Server-Sent Events)
+Un único hilo por proceso lee los registros de acceso y las decisiones manuales
+nuevos (id > cursor) y los reparte a todas las conexiones abiertas. Las señales
+de guardado lo despiertan en el momento, así que lo escrito en este proceso sale
+enseguida y lo escrito por otros procesos llega en el siguiente ciclo.
+El cursor 'registro:evento' (últimos ids enviados) permite reanudar una conexión.
+Los ids se asignan antes del commit y las escrituras se confirman en paralelo
+(spool, lotes, varios procesos): una fila con id menor puede aparecer después
+de otra con id mayor. Por eso cada lectura vuelve a revisar los últimos
+VENTANA_REVISION ids por debajo del cursor y descarta por id lo ya enviado.
+Al reanudar con un cursor no se sabe qué se envió de esa ventana, así que se
+reenvía: el cliente descarta los repetidos por el id de los datos.
+La conexión se abre con un ticket firmado de vida corta (emitir_ticket) en vez
+del token, que en la URL quedaría en los logs de proxies y accesos.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.db.models import Max
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_REGISTRO = [
+    'id', 'placa_detectada', 'marca_detectada', 'modelo_detectado', 'color_detectado',
+    'ia_confidence', 'tipo_acceso', 'estado_acceso', 'camara_id', 'imagen_url',
+    'fecha_hora', 'placa_vehiculo_id', 'placa_invitado_id', 'observaciones',
+]
+
+# Máximo de filas que se leen por ciclo de cada tabla
+LIMITE_POR_CICLO = 500
+
+# Ids por debajo del cursor que se vuelven a revisar en cada lectura
+VENTANA_REVISION = 1000
+
+SAL_TICKET = 'usuarios.feed_accesos.ticket'
+SEGUNDOS_TICKET = 60
+
+
+def emitir_ticket(usuario_id: int) -> str:
+    """Ticket firmado para abrir el feed (?ticket=), válido por SEGUNDOS_TICKET"""
+    return signing.dumps({'usuario': usuario_id}, salt=SAL_TICKET)
+
+
+def leer_ticket(ticket: Optional[str]) -> Optional[int]:
+    """Id del usuario del ticket, o None si es inválido o ya venció"""
+    if not ticket:
+        return None
+    try:
+        return signing.loads(ticket, salt=SAL_TICKET, max_age=SEGUNDOS_TICKET)['usuario']
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+
+
+def formatear_cursor(cursor: Tuple[int, int]) -> str:
+    return f'{cursor[0]}:{cursor[1]}'
+
+
+def leer_cursor(texto: Optional[str]) -> Optional[Tuple[int, int]]:
+    """'123:45' -> (123, 45); un número solo se toma como id de registro"""
+    if not texto:
+        return None
+    try:
+        partes = [int(parte) for parte in str(texto).split(':')]
+    except ValueError:
+        return None
+    if len(partes) == 1:
+        return partes[0], 0
+    if len(partes) == 2:
+        return partes[0], partes[1]
+    return None
+
+
+def cursor_actual(enviados: Optional[Dict[str, Set[int]]] = None) -> Tuple[int, int]:
+    """Cursor que apunta al final del feed (solo eventos nuevos); lo que ya hay en la ventana queda en `enviados`"""
+    from usuarios.models import EventoAcceso, RegistroAcceso
+    cursor = (
+        RegistroAcceso.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0,
+        EventoAcceso.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0,
+    )
+    if enviados is not None:
+        for clave, modelo, ultimo in [('registro', RegistroAcceso, cursor[0]), ('evento', EventoAcceso, cursor[1])]:
+            enviados[clave].update(
+                modelo.objects.filter(id__gt=ultimo - VENTANA_REVISION, id__lte=ultimo).values_list('id', flat=True)
+            )
+    return cursor
+
+
+def nuevos_enviados() -> Dict[str, Set[int]]:
+    """Ids ya enviados por una conexión dentro de la ventana de revisión"""
+    return {'registro': set(), 'evento': set()}
+
+
+def _sin_enviar(modelo, ultimo: int, enviados: Set[int], limite: int) -> List[int]:
+    """Ids posteriores al cursor o dentro de la ventana de revisión que todavía no se enviaron"""
+    desde = max(ultimo - VENTANA_REVISION, 0)
+    ids = modelo.objects.filter(id__gt=desde).order_by('id').values_list('id', flat=True)[:VENTANA_REVISION + limite]
+    return [id_fila for id_fila in ids if id_fila > ultimo or id_fila not in enviados][:limite]
+
+
+def eventos_desde(cursor: Tuple[int, int], enviados: Optional[Dict[str, Set[int]]] = None,
+                  limite: int = LIMITE_POR_CICLO) -> List[Dict]:
+    """Registros y decisiones manuales que no están en `enviados` (posteriores al cursor o dentro de la ventana)"""
+    from usuarios.models import EventoAcceso, RegistroAcceso
+
+    enviados = enviados or nuevos_enviados()
+    ultimo_registro, ultimo_evento = cursor
+    eventos = []
+
+    ids = _sin_enviar(RegistroAcceso, ultimo_registro, enviados['registro'], limite)
+    if ids:
+        for registro in RegistroAcceso.objects.filter(id__in=ids).order_by('id').values(*CAMPOS_REGISTRO):
+            eventos.append({'tipo': 'registro', 'datos': registro})
+
+    ids = _sin_enviar(EventoAcceso, ultimo_evento, enviados['evento'], limite)
+    if ids:
+        decisiones = (
+            EventoAcceso.objects.filter(id__in=ids).order_by('id')
+            .values('id', 'registro_id', 'tipo', 'estado_anterior', 'estado_nuevo', 'fecha', 'usuario__username')
+        )
+        for decision in decisiones:
+            decision['usuario'] = decision.pop('usuario__username')
+            eventos.append({'tipo': decision['tipo'], 'datos': decision})
+
+    return eventos
+
+
+def formatear_evento(evento: Dict, cursor: Tuple[int, int]) -> str:
+    """Evento en formato text/event-stream con el cursor de la conexión como id"""
+    datos = json.dumps(evento['datos'], cls=DjangoJSONEncoder)
+    return f"id: {formatear_cursor(cursor)}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+
+
+def avanzar_cursor(cursor: Tuple[int, int], evento: Dict, enviados: Dict[str, Set[int]]) -> Optional[Tuple[int, int]]:
+    """
+    Marca el evento como enviado y retorna el cursor de la conexión tras él,
+    o None si ya se envió (o es más viejo que la ventana de revisión)
+    """
+    clave, posicion = ('registro', 0) if evento['tipo'] == 'registro' else ('evento', 1)
+    id_fila = evento['datos']['id']
+    if id_fila in enviados[clave] or id_fila <= cursor[posicion] - VENTANA_REVISION:
+        return None
+
+    ultimo = max(cursor[posicion], id_fila)
+    enviados[clave].add(id_fila)
+    if len(enviados[clave]) > 2 * VENTANA_REVISION:
+        enviados[clave] = {i for i in enviados[clave] if i > ultimo - VENTANA_REVISION}
+    return (ultimo, cursor[1]) if posicion == 0 else (cursor[0], ultimo)
+
+
+class FeedAccesos:
+    """Reparte los eventos nuevos a las conexiones SSE abiertas en este proceso"""
+
+    def __init__(self, intervalo_segundos: float = 2.0):
+        self.intervalo_segundos = intervalo_segundos
+        self._suscriptores = {}
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._hilo = None
+        self._cursor = None
+        self._enviados = nuevos_enviados()
+        self._listo = threading.Event()
+
+    def suscribir(self) -> asyncio.Queue:
+        """Cola asíncrona que recibe los eventos nuevos; llamar desde el event loop"""
+        cola = asyncio.Queue()
+        with self._lock:
+            self._suscriptores[cola] = asyncio.get_running_loop()
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._ejecutar, name='feed-accesos', daemon=True)
+                self._hilo.start()
+        return cola
+
+    def desuscribir(self, cola: asyncio.Queue):
+        with self._lock:
+            self._suscriptores.pop(cola, None)
+
+    def esperar_listo(self, timeout: float = 5.0) -> bool:
+        """Esperar a que el hilo fije su cursor; recién entonces la conexión lee lo atrasado"""
+        return self._listo.wait(timeout)
+
+    def notificar(self):
+        """Avisar que hay registros nuevos (señales y escrituras en lote)"""
+        if self._suscriptores:
+            self._despertar.set()
+
+    def _ejecutar(self):
+        try:
+            close_old_connections()
+            self._cursor = cursor_actual(self._enviados)
+        except Exception as e:
+            logger.error(f"Error leyendo el cursor inicial del feed de accesos: {e}")
+        self._listo.set()
+
+        while True:
+            self._despertar.wait(self.intervalo_segundos)
+            self._despertar.clear()
+            with self._lock:
+                if not self._suscriptores:
+                    # Sin conexiones el hilo termina; el próximo suscriptor lo vuelve a iniciar
+                    self._hilo = None
+                    self._cursor = None
+                    self._enviados = nuevos_enviados()
+                    self._listo.clear()
+                    return
+
+            try:
+                close_old_connections()
+                if self._cursor is None:
+                    self._cursor = cursor_actual(self._enviados)
+                eventos = eventos_desde(self._cursor, self._enviados)
+            except Exception as e:
+                logger.error(f"Error leyendo eventos de acceso para el feed: {e}")
+                continue
+
+            if not eventos:
+                continue
+            for evento in eventos:
+                self._cursor = avanzar_cursor(self._cursor, evento, self._enviados) or self._cursor
+            if len(eventos) >= LIMITE_POR_CICLO:
+                self._despertar.set()
+
+            with self._lock:
+                suscriptores = list(self._suscriptores.items())
+            for cola, loop in suscriptores:
+                for evento in eventos:
+                    try:
+                        loop.call_soon_threadsafe(cola.put_nowait, evento)
+                    except RuntimeError:
+                        # El event loop de la conexión ya se cerró
+                        self.desuscribir(cola)
+                        break
+
+
+# Instancia única por proceso
+feed_accesos = FeedAccesos()
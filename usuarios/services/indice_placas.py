@@ -0,0 +1,425 @@
+"""
+Índice en memoria de placas autorizadas
+Se construye una sola vez por proceso y se mantiene actualizado con las señales
+post_save/post_delete de PlacaVehiculo, PlacaInvitado, Vehiculo e Invitado, el
+post_save de Persona (nombre del propietario) y los update()/bulk_create() de sus
+querysets, que invalidan el índice completo.
+La búsqueda de una placa no ejecuta consultas a la base de datos; la versión
+compartida se revisa como mucho cada INDICE_PLACAS_SEGUNDOS_VERSION segundos.
+Los cambios hechos en otro proceso solo se ven si la caché es compartida (Redis):
+con LocMemCache cada proceso ve únicamente sus propios cambios.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from usuarios.services.busqueda_difusa import IndiceDifusoPlacas
+
+logger = logging.getLogger(__name__)
+
+# Versión compartida entre procesos (gunicorn/uvicorn workers)
+CLAVE_VERSION = 'usuarios:indice_placas:version'
+
+# Prioridad de cada fuente cuando una misma placa aparece en varias
+PRIORIDAD_TIPOS = {
+    'residente': 0,
+    'invitado': 1,
+    'vehiculo_original': 2,
+    'invitado_original': 3,
+}
+
+
+def limpiar_placa(placa: str) -> str:
+    """Deja solo los caracteres alfanuméricos de la placa"""
+    return ''.join(c for c in placa if c.isalnum())
+
+
+class IndicePlacas:
+    """Índice de placas activas de todas las fuentes del sistema"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._construido = False
+        self._version = 0
+        # time.monotonic() de la última lectura de la versión compartida
+        self._revisado_en = 0.0
+        # placa -> {(tipo, pk): entrada}
+        self._por_placa: Dict[str, Dict[Tuple[str, object], Dict]] = {}
+        # placa sin espacios ni guiones -> placas registradas
+        self._por_placa_limpia: Dict[str, set] = {}
+        # (tipo, pk) -> placa, para poder mover o quitar una fuente
+        self._fuentes: Dict[Tuple[str, object], str] = {}
+        # (vencimiento, tipo, pk) ordenado por fecha de vencimiento
+        self._vencimientos = []
+        # Búsqueda aproximada tolerante a errores de OCR
+        self._difuso = IndiceDifusoPlacas()
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def buscar(self, placa_detectada: str) -> Optional[Dict]:
+        """
+        Busca una placa activa. Primero de forma exacta y luego ignorando
+        espacios y guiones (con 5 puntos menos de confianza)
+        """
+        placa = (placa_detectada or '').upper().strip()
+        if not placa:
+            return None
+
+        with self._lock:
+            self._asegurar_vigente()
+
+            entrada = self._resolver(placa)
+            if entrada:
+                return dict(entrada)
+
+            for placa_registrada in self._por_placa_limpia.get(limpiar_placa(placa), ()):
+                entrada = self._resolver(placa_registrada)
+                if entrada:
+                    resultado = dict(entrada)
+                    resultado['confianza_busqueda'] = entrada['confianza_busqueda'] - 5
+                    return resultado
+
+        return None
+
+    def similares(self, placa_detectada: str, max_distancia: float = 1.0, k: int = 5,
+                  tipos: Optional[Tuple[str, ...]] = None) -> List[Tuple[Dict, float]]:
+        """
+        Las k placas activas más cercanas a la detectada (distancia de edición
+        ponderada por confusiones de OCR), opcionalmente filtrando por tipo
+        """
+        placa = (placa_detectada or '').upper().strip()
+        if not placa:
+            return []
+
+        with self._lock:
+            self._asegurar_vigente()
+            # Sin límite aquí: el filtro por tipo se aplica después
+            cercanas = self._difuso.buscar(placa, max_distancia, k=None)
+
+            resultados = []
+            for placa_registrada, distancia in cercanas:
+                entrada = self._resolver(placa_registrada)
+                if entrada and (not tipos or entrada['tipo'] in tipos):
+                    resultados.append((dict(entrada), distancia))
+            return resultados[:k]
+
+    def placas_activas(self) -> Dict[str, Dict]:
+        """Copia de todas las placas activas con la fuente de mayor prioridad"""
+        with self._lock:
+            self._asegurar_vigente()
+            return {placa: dict(self._resolver(placa)) for placa in self._por_placa}
+
+    @contextmanager
+    def instantanea(self):
+        """
+        Bloquea el índice mientras dure el bloque, para resolver varias placas
+        contra la misma versión (las signals esperan a que termine)
+        """
+        with self._lock:
+            self._asegurar_vigente()
+            yield self
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def segundos_version(self) -> float:
+        return getattr(settings, 'INDICE_PLACAS_SEGUNDOS_VERSION', 1.0)
+
+    # ------------------------------------------------------------------
+    # Mantenimiento del índice
+    # ------------------------------------------------------------------
+
+    def invalidar(self):
+        """Descarta el índice local; se reconstruirá en la próxima búsqueda"""
+        with self._lock:
+            self._construido = False
+
+    def construir(self):
+        """Carga todas las fuentes de placas activas desde la base de datos"""
+        from django.db.models import Prefetch
+        from comunidad.models import ResidentesUnidad
+        from usuarios.models import PlacaVehiculo, PlacaInvitado, Vehiculo, Invitado
+
+        with self._lock:
+            # Leer la versión antes de cargar: un cambio concurrente forzará otra reconstrucción
+            version = cache.get(CLAVE_VERSION, 0)
+            ahora = timezone.now()
+
+            self._por_placa = {}
+            self._por_placa_limpia = {}
+            self._fuentes = {}
+            self._vencimientos = []
+            self._difuso.limpiar()
+
+            unidades_activas = Prefetch(
+                'residente__residentesunidad_set',
+                queryset=ResidentesUnidad.objects.filter(estado=True).select_related('id_unidad'),
+                to_attr='unidades_activas'
+            )
+            for placa in PlacaVehiculo.objects.filter(activo=True).select_related(
+                'residente__persona'
+            ).prefetch_related(unidades_activas):
+                unidades = placa.residente.unidades_activas
+                self._agregar(self._entrada_placa_vehiculo(placa, unidades[0] if unidades else None))
+
+            for placa in PlacaInvitado.objects.filter(
+                activo=True,
+                fecha_vencimiento__gte=ahora
+            ).select_related('residente__persona'):
+                self._agregar(self._entrada_placa_invitado(placa))
+
+            for vehiculo in Vehiculo.objects.all():
+                self._agregar(self._entrada_vehiculo(vehiculo))
+
+            for invitado in Invitado.objects.filter(
+                activo=True,
+                vehiculo_placa__isnull=False
+            ).exclude(vehiculo_placa='').select_related('residente__persona'):
+                if invitado.fecha_fin and invitado.fecha_fin < ahora:
+                    continue
+                self._agregar(self._entrada_invitado(invitado))
+
+            self._version = version
+            self._revisado_en = time.monotonic()
+            self._construido = True
+            logger.info(f"Índice de placas construido: {len(self._por_placa)} placas (versión {version})")
+
+    def actualizar(self, modelo: str, pk, eliminado: bool = False):
+        """
+        Programa la actualización de una fuente para cuando la transacción se confirme.
+        modelo: 'PlacaVehiculo', 'PlacaInvitado', 'Vehiculo' o 'Invitado'
+        """
+        transaction.on_commit(lambda: self._aplicar(modelo, pk, eliminado))
+
+    def actualizar_residente(self, residente_id):
+        """Refresca las placas de un residente (por ejemplo, al cambiar su unidad)"""
+        def aplicar():
+            from usuarios.models import PlacaVehiculo
+            for pk in PlacaVehiculo.objects.filter(residente_id=residente_id).values_list('pk', flat=True):
+                self._aplicar('PlacaVehiculo', pk, False)
+
+        transaction.on_commit(aplicar)
+
+    def actualizar_persona(self, persona_id):
+        """Refresca las placas de los residentes de una persona (por ejemplo, al cambiar su nombre)"""
+        def aplicar():
+            from usuarios.models import PlacaVehiculo, PlacaInvitado, Invitado
+            for modelo in (PlacaVehiculo, PlacaInvitado, Invitado):
+                pks = modelo.objects.filter(residente__persona_id=persona_id).values_list('pk', flat=True)
+                for pk in pks:
+                    self._aplicar(modelo.__name__, pk, False)
+
+        transaction.on_commit(aplicar)
+
+    def invalidar_todos(self):
+        """
+        Programa la reconstrucción del índice en todos los procesos, para cambios
+        que no pasan por las signals (update() o bulk_create() de un queryset)
+        """
+        def aplicar():
+            with self._lock:
+                self._construido = False
+                self._publicar_cambio()
+
+        transaction.on_commit(aplicar)
+
+    def _aplicar(self, modelo: str, pk, eliminado: bool):
+        with self._lock:
+            if not self._construido:
+                # Sin índice en memoria no hay nada que actualizar; solo avisar a otros procesos
+                self._publicar_cambio()
+                return
+
+            tipo = {
+                'PlacaVehiculo': 'residente',
+                'PlacaInvitado': 'invitado',
+                'Vehiculo': 'vehiculo_original',
+                'Invitado': 'invitado_original',
+            }[modelo]
+            self._quitar((tipo, pk))
+
+            if not eliminado:
+                entrada = self._cargar_entrada(modelo, pk)
+                if entrada:
+                    self._agregar(entrada)
+
+            self._publicar_cambio()
+
+    def _cargar_entrada(self, modelo: str, pk) -> Optional[Dict]:
+        """Lee una sola fuente de la base de datos y construye su entrada si sigue activa"""
+        from usuarios.models import PlacaVehiculo, PlacaInvitado, Vehiculo, Invitado
+
+        ahora = timezone.now()
+
+        if modelo == 'PlacaVehiculo':
+            placa = PlacaVehiculo.objects.filter(pk=pk, activo=True).select_related('residente__persona').first()
+            if not placa:
+                return None
+            unidad = placa.residente.residentesunidad_set.filter(estado=True).select_related('id_unidad').first()
+            return self._entrada_placa_vehiculo(placa, unidad)
+
+        if modelo == 'PlacaInvitado':
+            placa = PlacaInvitado.objects.filter(
+                pk=pk, activo=True, fecha_vencimiento__gte=ahora
+            ).select_related('residente__persona').first()
+            return self._entrada_placa_invitado(placa) if placa else None
+
+        if modelo == 'Vehiculo':
+            vehiculo = Vehiculo.objects.filter(pk=pk).first()
+            return self._entrada_vehiculo(vehiculo) if vehiculo else None
+
+        invitado = Invitado.objects.filter(
+            pk=pk, activo=True, vehiculo_placa__isnull=False
+        ).exclude(vehiculo_placa='').select_related('residente__persona').first()
+        if not invitado or (invitado.fecha_fin and invitado.fecha_fin < ahora):
+            return None
+        return self._entrada_invitado(invitado)
+
+    def _publicar_cambio(self):
+        """Incrementa la versión compartida; si otro proceso cambió algo entretanto, reconstruir"""
+        cache.add(CLAVE_VERSION, 0, timeout=None)
+        try:
+            nueva_version = cache.incr(CLAVE_VERSION)
+        except ValueError:
+            nueva_version = 1
+            cache.set(CLAVE_VERSION, nueva_version, timeout=None)
+
+        if self._construido and nueva_version == self._version + 1:
+            self._version = nueva_version
+        else:
+            self._construido = False
+
+    def _asegurar_vigente(self):
+        if not self._construido:
+            self.construir()
+        elif time.monotonic() - self._revisado_en >= self.segundos_version:
+            self._revisado_en = time.monotonic()
+            if cache.get(CLAVE_VERSION, 0) != self._version:
+                self.construir()
+        self._purgar_vencidos(timezone.now())
+
+    def _purgar_vencidos(self, ahora):
+        while self._vencimientos and self._vencimientos[0][0] < ahora:
+            vencimiento, tipo, pk = heapq.heappop(self._vencimientos)
+            clave = (tipo, pk)
+            placa = self._fuentes.get(clave)
+            # Solo quitar si la fuente no fue renovada con otra fecha
+            if placa and self._por_placa[placa][clave].get('_vence') == vencimiento:
+                self._quitar(clave)
+
+    def _resolver(self, placa: str) -> Optional[Dict]:
+        fuentes = self._por_placa.get(placa)
+        if not fuentes:
+            return None
+        return min(fuentes.values(), key=lambda e: PRIORIDAD_TIPOS[e['tipo']])
+
+    def _agregar(self, entrada: Dict):
+        placa = entrada['placa']
+        clave = (entrada['tipo'], entrada['objeto'].pk)
+        if placa not in self._por_placa:
+            self._difuso.agregar(placa)
+        self._por_placa.setdefault(placa, {})[clave] = entrada
+        self._por_placa_limpia.setdefault(limpiar_placa(placa), set()).add(placa)
+        self._fuentes[clave] = placa
+        if entrada.get('_vence'):
+            heapq.heappush(self._vencimientos, (entrada['_vence'], clave[0], clave[1]))
+
+    def _quitar(self, clave: Tuple[str, object]):
+        placa = self._fuentes.pop(clave, None)
+        if placa is None:
+            return
+        fuentes = self._por_placa.get(placa, {})
+        fuentes.pop(clave, None)
+        if not fuentes:
+            self._por_placa.pop(placa, None)
+            self._difuso.quitar(placa)
+            limpias = self._por_placa_limpia.get(limpiar_placa(placa))
+            if limpias:
+                limpias.discard(placa)
+                if not limpias:
+                    del self._por_placa_limpia[limpiar_placa(placa)]
+
+    # ------------------------------------------------------------------
+    # Construcción de entradas
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _entrada_placa_vehiculo(placa, residente_unidad) -> Dict:
+        placa_upper = placa.placa.upper()
+        unidad = None
+        if residente_unidad:
+            unidad = {
+                'id': residente_unidad.id_unidad.id,
+                'numero_casa': residente_unidad.id_unidad.numero_casa,
+            }
+        return {
+            'tipo': 'residente',
+            'objeto': placa,
+            'placa': placa_upper,
+            'propietario_nombre': placa.residente.persona.nombre,
+            'vehiculo_info': f"{placa.marca} {placa.modelo} ({placa.color})",
+            'unidad': unidad,
+            'fecha_registro': placa.fecha_registro,
+            'mensaje_ia': f"🤖 IA VERIFICA: ✅ VEHÍCULO DE RESIDENTE REGISTRADO - {placa.residente.persona.nombre}",
+            'confianza_busqueda': 100
+        }
+
+    @staticmethod
+    def _entrada_placa_invitado(placa) -> Dict:
+        return {
+            'tipo': 'invitado',
+            'objeto': placa,
+            'placa': placa.placa.upper(),
+            'visitante_nombre': placa.nombre_visitante,
+            'propietario_nombre': placa.residente.persona.nombre,
+            'vehiculo_info': f"{placa.marca or 'N/A'} {placa.modelo or 'N/A'} ({placa.color or 'N/A'})",
+            'fecha_vencimiento': placa.fecha_vencimiento,
+            'ci_visitante': placa.ci_visitante,
+            'mensaje_ia': f"🤖 IA VERIFICA: ✅ VEHÍCULO DE INVITADO REGISTRADO - {placa.nombre_visitante}",
+            'confianza_busqueda': 100,
+            '_vence': placa.fecha_vencimiento
+        }
+
+    @staticmethod
+    def _entrada_vehiculo(vehiculo) -> Dict:
+        return {
+            'tipo': 'vehiculo_original',
+            'objeto': vehiculo,
+            'placa': vehiculo.placa.upper(),
+            'vehiculo_info': f"{vehiculo.marca} {vehiculo.modelo} ({vehiculo.color})",
+            'propietario_nombre': 'Sistema Original',
+            'mensaje_ia': f"🤖 IA VERIFICA: ✅ VEHÍCULO REGISTRADO EN SISTEMA ORIGINAL - {vehiculo.marca} {vehiculo.modelo}",
+            'confianza_busqueda': 95
+        }
+
+    @staticmethod
+    def _entrada_invitado(invitado) -> Dict:
+        return {
+            'tipo': 'invitado_original',
+            'objeto': invitado,
+            'placa': invitado.vehiculo_placa.upper(),
+            'visitante_nombre': invitado.nombre,
+            'propietario_nombre': invitado.residente.persona.nombre if invitado.residente else 'Sin residente',
+            'fecha_fin': invitado.fecha_fin,
+            'vehiculo_info': f"Vehículo de {invitado.nombre}",
+            'mensaje_ia': f"🤖 IA VERIFICA: ✅ INVITADO REGISTRADO EN SISTEMA ORIGINAL - {invitado.nombre}",
+            'confianza_busqueda': 90,
+            '_vence': invitado.fecha_fin
+        }
+
+
+# Instancia única por proceso
+indice_placas = IndicePlacas()
@@ -0,0 +1,335 @@
+"""
+Motores de reconocimiento de placas
+Cada motor recibe los bytes de una imagen y retorna la placa, el color del vehículo,
+la confianza y el tiempo de cada etapa. Se ejecutan dentro de los procesos del
+PoolReconocimiento, por eso este módulo no depende de Django (solo Pillow).
+El motor se elige con settings.IA_MOTOR_RECONOCIMIENTO (ruta 'modulo.Clase').
+"""
+
+import io
+import random
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageFont, ImageOps, ImageStat
+
+CARACTERES_PLACA = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
+PATRONES_PLACAS = [
+    r'^[A-Z]{3}\d{3}$',  # ABC123
+    r'^[A-Z]{2}\d{3}[A-Z]$',  # AB123C
+    r'^\d{3}[A-Z]{3}$',  # 123ABC
+    r'^[A-Z]\d{3}[A-Z]{2}$',  # A123BC
+    r'^\d{4}[A-Z]{3}$',  # 1234ABC
+]
+
+COLORES = {
+    'Blanco': (235, 235, 235),
+    'Negro': (25, 25, 25),
+    'Gris': (128, 128, 128),
+    'Plata': (185, 185, 190),
+    'Rojo': (180, 30, 30),
+    'Azul': (30, 60, 170),
+    'Verde': (30, 130, 50),
+    'Amarillo': (220, 200, 40),
+    'Naranja': (230, 120, 30),
+    'Café': (110, 70, 40),
+}
+
+
+class MotorReconocimiento:
+    """Interfaz de los motores: reconocer(bytes) -> dict con placa, confianza y tiempos"""
+
+    nombre = 'base'
+
+    def reconocer(self, datos: bytes) -> Dict:
+        raise NotImplementedError
+
+
+class _Cronometro:
+    """Mide el tiempo de cada etapa en milisegundos"""
+
+    def __init__(self):
+        self.tiempos = {}
+        self._inicio = self._ultimo = time.perf_counter()
+
+    def etapa(self, nombre: str):
+        ahora = time.perf_counter()
+        self.tiempos[nombre] = round((ahora - self._ultimo) * 1000, 2)
+        self._ultimo = ahora
+
+    def total(self) -> Dict:
+        self.tiempos['total'] = round((time.perf_counter() - self._inicio) * 1000, 2)
+        return self.tiempos
+
+
+class MotorClasico(MotorReconocimiento):
+    """
+    Reconocimiento por procesamiento clásico de imagen, sin modelos ni GPU:
+    1. localizar: la placa es la franja con más bordes verticales
+    2. segmentar: umbral de Otsu y proyección vertical para separar caracteres
+    3. clasificar: comparación con plantillas de cada carácter
+    """
+
+    nombre = 'clasico:v1'
+
+    ANCHO_ANALISIS = 320
+    ALTO_PLACA = 48
+    TAMANO_PLANTILLA = (16, 24)
+
+    def __init__(self, ruta_fuente: Optional[str] = None):
+        self._plantillas = self._crear_plantillas(ruta_fuente)
+
+    def reconocer(self, datos: bytes) -> Dict:
+        cronometro = _Cronometro()
+
+        imagen = ImageOps.exif_transpose(Image.open(io.BytesIO(datos))).convert('RGB')
+        gris = imagen.convert('L')
+        cronometro.etapa('decodificar')
+
+        caja = self._localizar_placa(gris)
+        cronometro.etapa('localizar')
+
+        caracteres = self._segmentar(gris.crop(caja)) if caja else []
+        cronometro.etapa('segmentar')
+
+        placa, puntajes = self._clasificar(caracteres)
+        cronometro.etapa('clasificar')
+
+        color = self._color_vehiculo(imagen, caja)
+        cronometro.etapa('color')
+
+        confianza = 0.0
+        if puntajes:
+            confianza = sum(puntajes) / len(puntajes) * 100
+            if not any(re.match(patron, placa) for patron in PATRONES_PLACAS):
+                confianza *= 0.7
+
+        return {
+            'placa': placa,
+            'marca': None,
+            'modelo': None,
+            'color': color,
+            'confidence': round(confianza, 2),
+            'placa_reconocida': len(placa) >= 5,
+            'vehiculo_reconocido': caja is not None,
+            'region_placa': list(caja) if caja else None,
+            'tiempos_ms': cronometro.total(),
+        }
+
+    # ------------------------------------------------------------------
+    # Etapas
+    # ------------------------------------------------------------------
+
+    def _localizar_placa(self, gris: Image.Image) -> Optional[Tuple[int, int, int, int]]:
+        """Caja (izq, arriba, der, abajo) de la franja con mayor densidad de bordes verticales"""
+        escala = min(1.0, self.ANCHO_ANALISIS / gris.width)
+        pequena = gris.resize((max(1, int(gris.width * escala)), max(1, int(gris.height * escala))))
+        bordes = pequena.filter(ImageFilter.Kernel((3, 3), [-1, 0, 1, -2, 0, 2, -1, 0, 1], 1, 128))
+        bordes = ImageChops.difference(bordes, Image.new('L', bordes.size, 128)).point(lambda v: 255 if v > 40 else 0)
+        ancho, alto = bordes.size
+
+        # Densidad por fila: reducir a una columna promedia cada fila (en C)
+        filas = list(bordes.resize((1, alto), Image.BOX).getdata())
+        alto_banda = max(3, alto // 12)
+        mejor, inicio_banda = -1.0, 0
+        suma = sum(filas[:alto_banda])
+        for y in range(alto - alto_banda + 1):
+            if y:
+                suma += filas[y + alto_banda - 1] - filas[y - 1]
+            if suma > mejor:
+                mejor, inicio_banda = suma, y
+        if mejor / alto_banda < 20:
+            return None
+
+        # Extender la banda mientras las filas sigan teniendo bordes
+        umbral_fila = mejor / alto_banda * 0.4
+        arriba, abajo = inicio_banda, inicio_banda + alto_banda
+        while arriba > 0 and filas[arriba - 1] >= umbral_fila:
+            arriba -= 1
+        while abajo < alto and filas[abajo] >= umbral_fila:
+            abajo += 1
+
+        # Dentro de la banda, el tramo horizontal continuo más largo con bordes
+        columnas = list(bordes.crop((0, arriba, ancho, abajo)).resize((ancho, 1), Image.BOX).getdata())
+        hueco_max = max(2, ancho // 25)
+        tramos, inicio, ultimo = [], None, None
+        for x, valor in enumerate(columnas):
+            if valor > 25:
+                if inicio is None:
+                    inicio = x
+                elif x - ultimo > hueco_max:
+                    tramos.append((inicio, ultimo + 1))
+                    inicio = x
+                ultimo = x
+        if inicio is not None:
+            tramos.append((inicio, ultimo + 1))
+        if not tramos:
+            return None
+        izquierda, derecha = max(tramos, key=lambda t: t[1] - t[0])
+        if derecha - izquierda < (abajo - arriba) * 1.5:
+            return None
+
+        margen_x = max(1, (derecha - izquierda) // 20)
+        margen_y = max(1, (abajo - arriba) // 6)
+        return (
+            max(0, int((izquierda - margen_x) / escala)),
+            max(0, int((arriba - margen_y) / escala)),
+            min(gris.width, int((derecha + margen_x) / escala)),
+            min(gris.height, int((abajo + margen_y) / escala)),
+        )
+
+    def _segmentar(self, placa: Image.Image) -> List[Image.Image]:
+        """Imágenes binarias (tinta en blanco) de cada carácter, de izquierda a derecha"""
+        alto = self.ALTO_PLACA
+        placa = ImageOps.autocontrast(placa.resize((max(1, int(placa.width * alto / placa.height)), alto)))
+        umbral = _umbral_otsu(placa.histogram())
+        binaria = placa.point(lambda v: 255 if v > umbral else 0)
+        # Los caracteres son la minoría de los píxeles: si lo claro domina, la tinta es oscura
+        if ImageStat.Stat(binaria).mean[0] > 127:
+            binaria = ImageOps.invert(binaria)
+
+        columnas = list(binaria.resize((binaria.width, 1), Image.BOX).getdata())
+        caracteres, inicio = [], None
+        for x, valor in enumerate(columnas + [0]):
+            if valor > 12 and inicio is None:
+                inicio = x
+            elif valor <= 12 and inicio is not None:
+                recorte = binaria.crop((inicio, 0, x, alto))
+                caja = recorte.getbbox()
+                if caja:
+                    ancho_c, alto_c = caja[2] - caja[0], caja[3] - caja[1]
+                    # Descartar marcos (tocan arriba y abajo), tornillos y ruido
+                    marco = caja[1] == 0 and caja[3] == alto
+                    if not marco and alto_c >= alto * 0.45 and ancho_c <= alto_c * 1.2:
+                        caracteres.append(recorte.crop(caja))
+                inicio = None
+        return caracteres
+
+    def _clasificar(self, caracteres: List[Image.Image]) -> Tuple[str, List[float]]:
+        placa, puntajes = [], []
+        for caracter in caracteres[:8]:
+            muestra = caracter.resize(self.TAMANO_PLANTILLA)
+            mejor, puntaje = '', -1.0
+            for letra, plantilla in self._plantillas.items():
+                parecido = 1 - ImageStat.Stat(ImageChops.difference(muestra, plantilla)).mean[0] / 255
+                if parecido > puntaje:
+                    mejor, puntaje = letra, parecido
+            placa.append(mejor)
+            puntajes.append(puntaje)
+        return ''.join(placa), puntajes
+
+    def _color_vehiculo(self, imagen: Image.Image, caja) -> Optional[str]:
+        """Color con nombre más cercano al promedio de la carrocería (sobre la placa o al centro)"""
+        if caja:
+            alto = caja[3] - caja[1]
+            region = (caja[0], max(0, caja[1] - alto * 3), caja[2], max(1, caja[1] - alto))
+        else:
+            region = (imagen.width // 4, imagen.height // 4, imagen.width * 3 // 4, imagen.height * 3 // 4)
+        if region[3] <= region[1] or region[2] <= region[0]:
+            return None
+        promedio = ImageStat.Stat(imagen.crop(region)).mean
+        return min(COLORES, key=lambda nombre: sum((a - b) ** 2 for a, b in zip(COLORES[nombre], promedio)))
+
+    # ------------------------------------------------------------------
+    # Plantillas
+    # ------------------------------------------------------------------
+
+    def _crear_plantillas(self, ruta_fuente: Optional[str]) -> Dict[str, Image.Image]:
+        fuente = ImageFont.truetype(ruta_fuente, 64) if ruta_fuente else ImageFont.load_default(64)
+        plantillas = {}
+        for letra in CARACTERES_PLACA:
+            lienzo = Image.new('L', (96, 96), 0)
+            ImageDraw.Draw(lienzo).text((16, 8), letra, fill=255, font=fuente)
+            lienzo = lienzo.point(lambda v: 255 if v > 127 else 0)
+            plantillas[letra] = lienzo.crop(lienzo.getbbox()).resize(self.TAMANO_PLANTILLA)
+        return plantillas
+
+
+class MotorSimulado(MotorReconocimiento):
+    """Resultados aleatorios para pruebas sin cámara (el comportamiento anterior del servicio)"""
+
+    nombre = 'simulado:v1'
+
+    VEHICULOS = [
+        ('ABC123', 'Toyota', 'Corolla', 'Blanco'),
+        ('XYZ789', 'Honda', 'Civic', 'Gris'),
+        ('DEF456', 'Ford', 'Focus', 'Azul'),
+        ('GHI012', 'Chevrolet', 'Spark', 'Rojo'),
+        ('JKL345', 'Nissan', 'Sentra', 'Negro'),
+        ('MNO678', 'Hyundai', 'Elantra', 'Plata'),
+    ]
+
+    def reconocer(self, datos: bytes) -> Dict:
+        cronometro = _Cronometro()
+        confianza = random.uniform(60, 95)
+        placa, marca, modelo, color = random.choice(self.VEHICULOS)
+        placa_reconocida = confianza >= 80
+
+        # Simular errores ocasionales (10%)
+        if random.random() < 0.1:
+            placa = self._generar_placa_erronea(placa)
+            placa_reconocida = False
+            confianza = max(30, confianza - 40)
+        cronometro.etapa('simular')
+
+        return {
+            'placa': placa,
+            'marca': marca,
+            'modelo': modelo,
+            'color': color,
+            'confidence': round(confianza, 2),
+            'placa_reconocida': placa_reconocida,
+            'vehiculo_reconocido': confianza >= 70,
+            'region_placa': None,
+            'tiempos_ms': cronometro.total(),
+        }
+
+    def _generar_placa_erronea(self, placa_original: str) -> str:
+        """Placa con 1-2 caracteres cambiados para simular fallos de lectura"""
+        placa = list(placa_original)
+        for _ in range(random.randint(1, 2)):
+            posicion = random.randint(0, len(placa) - 1)
+            if placa[posicion].isalpha():
+                placa[posicion] = random.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+            else:
+                placa[posicion] = str(random.randint(0, 9))
+        return ''.join(placa)
+
+
+def _umbral_otsu(histograma: List[int]) -> int:
+    total = sum(histograma)
+    suma_total = sum(i * h for i, h in enumerate(histograma))
+    suma_fondo, peso_fondo, mejor_varianza, umbral = 0, 0, 0.0, 127
+    for i, h in enumerate(histograma):
+        peso_fondo += h
+        if not peso_fondo:
+            continue
+        peso_frente = total - peso_fondo
+        if not peso_frente:
+            break
+        suma_fondo += i * h
+        media_fondo = suma_fondo / peso_fondo
+        media_frente = (suma_total - suma_fondo) / peso_frente
+        varianza = peso_fondo * peso_frente * (media_fondo - media_frente) ** 2
+        if varianza > mejor_varianza:
+            mejor_varianza, umbral = varianza, i
+    return umbral
+
+
+# Un motor por proceso del pool (las plantillas se crean una sola vez)
+_motores = {}
+
+
+def obtener_motor(ruta: str) -> MotorReconocimiento:
+    """Instancia del motor 'modulo.Clase', reutilizada dentro del proceso"""
+    if ruta not in _motores:
+        modulo, _, clase = ruta.rpartition('.')
+        _motores[ruta] = getattr(__import__(modulo, fromlist=[clase]), clase)()
+    return _motores[ruta]
+
+
+def reconocer_en_proceso(ruta_motor: str, datos: bytes) -> Dict:
+    """Punto de entrada en los procesos del pool"""
+    return obtener_motor(ruta_motor).reconocer(datos)
@@ -0,0 +1,155 @@
+"""
+Particiones mensuales de RegistroAcceso (PostgreSQL)
+La tabla usuarios_registroacceso está particionada por rango de fecha_hora,
+una partición por mes (UTC) más una partición DEFAULT para lo que caiga fuera.
+La retención elimina particiones completas en lugar de borrar fila por fila.
+En otros motores (SQLite en desarrollo/tests) se usa el DELETE de siempre.
+"""
+
+import logging
+import re
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, List, Tuple
+
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+TABLA = 'usuarios_registroacceso'
+PARTICION_DEFAULT = f'{TABLA}_default'
+_PATRON_PARTICION = re.compile(rf'^{TABLA}_p(\d{{4}})_(\d{{2}})$')
+
+
+def inicio_de_mes(fecha: datetime) -> datetime:
+    fecha = fecha.astimezone(dt_timezone.utc)
+    return datetime(fecha.year, fecha.month, 1, tzinfo=dt_timezone.utc)
+
+
+def sumar_meses(inicio: datetime, meses: int) -> datetime:
+    total = inicio.year * 12 + inicio.month - 1 + meses
+    return datetime(total // 12, total % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def nombre_particion(inicio: datetime) -> str:
+    return f'{TABLA}_p{inicio:%Y_%m}'
+
+
+def esta_particionada() -> bool:
+    """True si la base es PostgreSQL y la tabla ya fue convertida a particionada"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            '''SELECT 1 FROM pg_partitioned_table pt
+               JOIN pg_class c ON c.oid = pt.partrelid
+               WHERE c.relname = %s''',
+            [TABLA]
+        )
+        return cursor.fetchone() is not None
+
+
+def particiones() -> List[Tuple[str, datetime, datetime]]:
+    """Particiones mensuales existentes como (nombre, desde, hasta), ordenadas por fecha"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            '''SELECT c.relname FROM pg_inherits i
+               JOIN pg_class c ON c.oid = i.inhrelid
+               JOIN pg_class p ON p.oid = i.inhparent
+               WHERE p.relname = %s''',
+            [TABLA]
+        )
+        nombres = [fila[0] for fila in cursor.fetchall()]
+
+    resultado = []
+    for nombre in nombres:
+        coincidencia = _PATRON_PARTICION.match(nombre)
+        if coincidencia:
+            desde = datetime(int(coincidencia.group(1)), int(coincidencia.group(2)), 1, tzinfo=dt_timezone.utc)
+            resultado.append((nombre, desde, sumar_meses(desde, 1)))
+    return sorted(resultado, key=lambda p: p[1])
+
+
+def crear_particiones(meses_adelante: int = 3, desde: datetime = None) -> List[str]:
+    """
+    Crea las particiones mensuales que falten desde `desde` (por defecto el mes actual)
+    hasta `meses_adelante` meses en el futuro. Si la partición DEFAULT tiene filas
+    de un mes nuevo, se mueven a su partición.
+    """
+    inicio = inicio_de_mes(desde or datetime.now(dt_timezone.utc))
+    existentes = {nombre for nombre, _, _ in particiones()}
+    creadas = []
+
+    for i in range(meses_adelante + 1):
+        mes = sumar_meses(inicio, i)
+        nombre = nombre_particion(mes)
+        if nombre in existentes:
+            continue
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT EXISTS (SELECT 1 FROM {PARTICION_DEFAULT} WHERE fecha_hora >= %s AND fecha_hora < %s)',
+                [mes, sumar_meses(mes, 1)]
+            )
+            hay_filas_en_default = cursor.fetchone()[0]
+
+            if hay_filas_en_default:
+                cursor.execute(f'ALTER TABLE {TABLA} DETACH PARTITION {PARTICION_DEFAULT}')
+
+            cursor.execute(
+                f'CREATE TABLE {nombre} PARTITION OF {TABLA} FOR VALUES FROM (%s) TO (%s)',
+                [mes, sumar_meses(mes, 1)]
+            )
+
+            if hay_filas_en_default:
+                cursor.execute(
+                    f'''WITH movidas AS (
+                            DELETE FROM {PARTICION_DEFAULT} WHERE fecha_hora >= %s AND fecha_hora < %s RETURNING *
+                        )
+                        INSERT INTO {TABLA} SELECT * FROM movidas''',
+                    [mes, sumar_meses(mes, 1)]
+                )
+                cursor.execute(f'ALTER TABLE {TABLA} ATTACH PARTITION {PARTICION_DEFAULT} DEFAULT')
+
+        creadas.append(nombre)
+        logger.info(f"Partición creada: {nombre}")
+
+    return creadas
+
+
+def depurar_registros(fecha_limite: datetime) -> Dict:
+    """
+    Elimina los registros con fecha_hora < fecha_limite.
+    Con particiones: los meses completos se desconectan y se eliminan (sin recorrer filas)
+    y solo el mes límite y la partición DEFAULT se depuran con DELETE.
+    """
+    if not esta_particionada():
+        # DELETE directo, como con particiones: sin cargar las filas ni pasar por post_delete,
+        # así los contadores por hora (EstadisticaAcceso) conservan lo histórico
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLA} WHERE fecha_hora < %s', [fecha_limite])
+            borrados = cursor.rowcount
+        return {'particiones_eliminadas': [], 'filas_estimadas_particiones': 0, 'registros_eliminados': borrados}
+
+    eliminadas = []
+    filas_estimadas = 0
+    for nombre, _, hasta in particiones():
+        if hasta > fecha_limite:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [nombre])
+            filas_estimadas += max(cursor.fetchone()[0], 0)
+            cursor.execute(f'ALTER TABLE {TABLA} DETACH PARTITION {nombre}')
+            cursor.execute(f'DROP TABLE {nombre}')
+        eliminadas.append(nombre)
+        logger.info(f"Partición eliminada por retención: {nombre}")
+
+    # Resto del mes límite y la partición DEFAULT (la poda de particiones limita el recorrido)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLA} WHERE fecha_hora < %s', [fecha_limite])
+        borrados = cursor.rowcount
+
+    return {
+        'particiones_eliminadas': eliminadas,
+        'filas_estimadas_particiones': filas_estimadas,
+        'registros_eliminados': borrados
+    }
@@ -0,0 +1,143 @@
+"""
+Pool de procesos para el reconocimiento de placas
+Las imágenes se procesan en un ProcessPoolExecutor (un proceso por núcleo) con
+una cola acotada: si ya hay demasiadas imágenes esperando se rechaza la nueva
+en vez de acumular trabajo que llegaría tarde a la barrera.
+Expone la profundidad de la cola y los tiempos promedio de cada etapa.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict
+
+from django.conf import settings
+
+from usuarios.services.motores_reconocimiento import reconocer_en_proceso
+
+logger = logging.getLogger(__name__)
+
+MOTOR_POR_DEFECTO = 'usuarios.services.motores_reconocimiento.MotorClasico'
+
+
+class ColaLlena(Exception):
+    """La cola de reconocimiento alcanzó su máximo"""
+
+
+class PoolReconocimiento:
+    """ProcessPoolExecutor con cola acotada y métricas por etapa"""
+
+    def __init__(self, procesos=None, max_cola=None, motor=None):
+        self._procesos = procesos
+        self._max_cola = max_cola
+        self._motor = motor
+        self._executor = None
+        self._lock = threading.Lock()
+        self._en_curso = 0
+        self.procesadas = 0
+        self.rechazadas = 0
+        self.fallidas = 0
+        self._etapas = {}
+
+    @property
+    def procesos(self) -> int:
+        return self._procesos or getattr(settings, 'IA_PROCESOS_RECONOCIMIENTO', None) or os.cpu_count() or 1
+
+    @property
+    def max_cola(self) -> int:
+        return self._max_cola or getattr(settings, 'IA_MAX_COLA_RECONOCIMIENTO', self.procesos * 4)
+
+    @property
+    def motor(self) -> str:
+        return self._motor or getattr(settings, 'IA_MOTOR_RECONOCIMIENTO', MOTOR_POR_DEFECTO)
+
+    def enviar(self, datos: bytes) -> Future:
+        """
+        Encola una imagen y retorna un Future con el resultado del motor
+        (incluye 'tiempos_ms' con 'cola' y cada etapa). Lanza ColaLlena si no hay lugar.
+        """
+        with self._lock:
+            if self._en_curso >= self.max_cola:
+                self.rechazadas += 1
+                raise ColaLlena(f'Hay {self._en_curso} imágenes en cola (máximo {self.max_cola})')
+            self._en_curso += 1
+            if self._executor is None:
+                # spawn como en reportes: hacer fork de un proceso con hilos (escritor, feed,
+                # índice de placas) puede heredar un lock tomado y colgar al proceso hijo
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.procesos, mp_context=multiprocessing.get_context('spawn')
+                )
+
+        encolado = time.perf_counter()
+        resultado = Future()
+        try:
+            futuro = self._executor.submit(reconocer_en_proceso, self.motor, datos)
+        except Exception as e:
+            with self._lock:
+                self._en_curso -= 1
+                if isinstance(e, BrokenProcessPool):
+                    # Un proceso murió: el próximo envío crea un pool nuevo
+                    self._executor = None
+            raise
+        futuro.add_done_callback(lambda f: self._terminar(f, resultado, encolado))
+        return resultado
+
+    def reconocer(self, datos: bytes, timeout: float = None) -> Dict:
+        """Versión bloqueante de enviar()"""
+        return self.enviar(datos).result(timeout=timeout)
+
+    def _terminar(self, futuro: Future, resultado: Future, encolado: float):
+        total_ms = (time.perf_counter() - encolado) * 1000
+        with self._lock:
+            self._en_curso -= 1
+            error = futuro.exception()
+            if error is not None:
+                self.fallidas += 1
+            else:
+                self.procesadas += 1
+                datos = futuro.result()
+                tiempos = datos.setdefault('tiempos_ms', {})
+                # Lo que no pasó dentro del motor es espera en la cola y transferencia entre procesos
+                tiempos['cola'] = round(max(total_ms - tiempos.get('total', 0), 0), 2)
+                for etapa, ms in tiempos.items():
+                    acumulado = self._etapas.setdefault(etapa, [0, 0.0, 0.0])
+                    acumulado[0] += 1
+                    acumulado[1] += ms
+                    acumulado[2] = max(acumulado[2], ms)
+
+        if error is not None:
+            logger.error(f"Error en el motor de reconocimiento: {error}")
+            resultado.set_exception(error)
+        else:
+            resultado.set_result(datos)
+
+    def metricas(self) -> Dict:
+        """Profundidad de la cola, contadores y tiempos por etapa (de este proceso de Django)"""
+        with self._lock:
+            return {
+                'motor': self.motor,
+                'procesos': self.procesos,
+                'en_cola': self._en_curso,
+                'max_cola': self.max_cola,
+                'procesadas': self.procesadas,
+                'rechazadas': self.rechazadas,
+                'fallidas': self.fallidas,
+                'etapas_ms': {
+                    etapa: {'promedio': round(suma / cantidad, 2), 'maximo': round(maximo, 2)}
+                    for etapa, (cantidad, suma, maximo) in self._etapas.items()
+                },
+            }
+
+    def cerrar(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Instancia única por proceso de Django
+pool_reconocimiento = PoolReconocimiento()
@@ -1,16 +1,20 @@
 """
 Servicio de Reconocimiento de Placas con IA
-Simula el funcionamiento de un sistema de IA para reconocimiento de placas
-Preparado para integrar con servicios reales como OpenCV, TensorFlow, etc.
+El reconocimiento de imágenes lo hacen los motores de motores_reconocimiento.py
+dentro del pool de procesos; aquí quedan la validación, la búsqueda de placas
+similares y el diagnóstico.
 """
 
 import re
-import random
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from django.utils import timezone
 
+from usuarios.services.busqueda_difusa import distancia_ocr
+from usuarios.services.estadisticas_acceso import totales
+from usuarios.services.pool_reconocimiento import pool_reconocimiento
+
 logger = logging.getLogger(__name__)
 
 class ReconocimientoPlacasService:
@@ -33,17 +37,14 @@ class ReconocimientoPlacasService:
     def procesar_imagen(self, imagen_path: str, camara_id: str = "CAM01") -> Dict:
         """
         Procesa una imagen para reconocer placa vehicular
-        En una implementación real, aquí iría:
-        - OpenCV para procesamiento de imagen
-        - TensorFlow/PyTorch para reconocimiento
-        - OCR para lectura de texto
+        El reconocimiento corre en el pool de procesos con el motor configurado
+        en settings.IA_MOTOR_RECONOCIMIENTO (por defecto el motor clásico local)
         """
         try:
-            # Simular tiempo de procesamiento
             tiempo_inicio = datetime.now()
 
-            # Simular reconocimiento de placa
-            resultado = self._simular_reconocimiento_placa(imagen_path)
+            with open(imagen_path, 'rb') as archivo:
+                resultado = pool_reconocimiento.reconocer(archivo.read(), timeout=self.tiempo_max_procesamiento)
 
             tiempo_procesamiento = (datetime.now() - tiempo_inicio).total_seconds()
 
@@ -57,6 +58,7 @@ class ReconocimientoPlacasService:
                 'ia_placa_reconocida': resultado['placa_reconocida'],
                 'ia_vehiculo_reconocido': resultado['vehiculo_reconocido'],
                 'tiempo_procesamiento': tiempo_procesamiento,
+                'tiempos_ms': resultado['tiempos_ms'],
                 'camara_id': camara_id,
                 'timestamp': timezone.now().isoformat()
             }
@@ -71,62 +73,6 @@ class ReconocimientoPlacasService:
                 'timestamp': timezone.now().isoformat()
             }
 
-    def _simular_reconocimiento_placa(self, imagen_path: str) -> Dict:
-        """
-        Simula el reconocimiento de placa
-        En producción, esto sería reemplazado por IA real
-        """
-        # Simular diferentes niveles de confianza
-        confidence = random.uniform(60, 95)
-
-        # Simular diferentes tipos de placas
-        tipos_placa = [
-            ('ABC123', 'Toyota', 'Corolla', 'Blanco'),
-            ('XYZ789', 'Honda', 'Civic', 'Gris'),
-            ('DEF456', 'Ford', 'Focus', 'Azul'),
-            ('GHI012', 'Chevrolet', 'Spark', 'Rojo'),
-            ('JKL345', 'Nissan', 'Sentra', 'Negro'),
-            ('MNO678', 'Hyundai', 'Elantra', 'Plata'),
-        ]
-
-        # Elegir una placa aleatoria
-        placa, marca, modelo, color = random.choice(tipos_placa)
-
-        # Simular si la IA reconoce la placa correctamente
-        placa_reconocida = confidence >= self.umbral_confianza_placa
-        vehiculo_reconocido = confidence >= self.umbral_confianza_vehiculo
-
-        # Simular errores ocasionales
-        if random.random() < 0.1:  # 10% de error
-            placa = self._generar_placa_erronea(placa)
-            placa_reconocida = False
-            confidence = max(30, confidence - 40)
-
-        return {
-            'placa': placa,
-            'marca': marca,
-            'modelo': modelo,
-            'color': color,
-            'confidence': round(confidence, 2),
-            'placa_reconocida': placa_reconocida,
-            'vehiculo_reconocido': vehiculo_reconocido
-        }
-
-    def _generar_placa_erronea(self, placa_original: str) -> str:
-        """Genera una placa con errores para simular fallos de IA"""
-        placa = list(placa_original)
-
-        # Introducir 1-2 errores
-        num_errores = random.randint(1, 2)
-        for _ in range(num_errores):
-            posicion = random.randint(0, len(placa) - 1)
-            if placa[posicion].isalpha():
-                placa[posicion] = random.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
-            else:
-                placa[posicion] = str(random.randint(0, 9))
-
-        return ''.join(placa)
-
     def validar_formato_placa(self, placa: str) -> bool:
         """Valida si una placa tiene formato correcto"""
         placa = placa.upper().replace(' ', '').replace('-', '')
@@ -144,7 +90,8 @@ class ReconocimientoPlacasService:
     def calcular_similaridad(self, placa1: str, placa2: str) -> float:
         """
         Calcula el porcentaje de similaridad entre dos placas
-        Útil para encontrar placas similares cuando hay errores de OCR
+        Útil para encontrar placas similares cuando hay errores de OCR.
+        Usa distancia de edición, con confusiones típicas de OCR (0/O, 1/I, 8/B) a mitad de costo
         """
         placa1 = self.normalizar_placa(placa1)
         placa2 = self.normalizar_placa(placa2)
@@ -152,72 +99,60 @@ class ReconocimientoPlacasService:
         if placa1 == placa2:
             return 100.0
 
-        # Calcular similaridad carácter por carácter
-        if len(placa1) != len(placa2):
-            return 0.0
+        return self._similaridad_desde_distancia(distancia_ocr(placa1, placa2), placa1, placa2)
 
-        coincidencias = sum(c1 == c2 for c1, c2 in zip(placa1, placa2))
-        return (coincidencias / len(placa1)) * 100
+    def _similaridad_desde_distancia(self, distancia: float, placa1: str, placa2: str) -> float:
+        longitud = max(len(placa1), len(placa2))
+        if not longitud:
+            return 0.0
+        return round(max(0.0, 1 - distancia / longitud) * 100, 2)
 
-    def buscar_placas_similares(self, placa_detectada: str, umbral: float = 80.0) -> List[Dict]:
+    def buscar_placas_similares(self, placa_detectada: str, umbral: float = 80.0, limite: int = 10) -> List[Dict]:
         """
-        Busca placas similares en la base de datos
+        Busca placas similares usando el índice en memoria de placas activas
         Útil cuando la IA no reconoce perfectamente la placa
         """
-        from usuarios.models import PlacaVehiculo, PlacaInvitado
+        from usuarios.services.indice_placas import indice_placas
 
         placa_detectada = self.normalizar_placa(placa_detectada)
+        if not placa_detectada:
+            return []
+
+        # Distancia máxima que todavía cumple el umbral para una placa de este largo
+        max_distancia = len(placa_detectada) * (1 - umbral / 100)
         similares = []
 
-        # Buscar en placas de residentes
-        placas_residentes = PlacaVehiculo.objects.filter(activo=True)
-        for placa_obj in placas_residentes:
-            similaridad = self.calcular_similaridad(placa_detectada, placa_obj.placa)
-            if similaridad >= umbral:
-                similares.append({
-                    'tipo': 'residente',
-                    'placa': placa_obj.placa,
-                    'similaridad': similaridad,
-                    'residente': {
-                        'id': placa_obj.residente.id,
-                        'nombre': placa_obj.residente.persona.nombre,
-                        'email': placa_obj.residente.persona.email
-                    },
-                    'vehiculo': {
-                        'marca': placa_obj.marca,
-                        'modelo': placa_obj.modelo,
-                        'color': placa_obj.color
-                    }
-                })
-
-        # Buscar en placas de invitados
-        placas_invitados = PlacaInvitado.objects.filter(
-            activo=True,
-            fecha_vencimiento__gte=timezone.now()
-        )
-        for placa_obj in placas_invitados:
-            similaridad = self.calcular_similaridad(placa_detectada, placa_obj.placa)
-            if similaridad >= umbral:
-                similares.append({
-                    'tipo': 'invitado',
-                    'placa': placa_obj.placa,
-                    'similaridad': similaridad,
-                    'residente': {
-                        'id': placa_obj.residente.id,
-                        'nombre': placa_obj.residente.persona.nombre,
-                        'email': placa_obj.residente.persona.email
-                    },
-                    'invitado': {
-                        'nombre': placa_obj.nombre_visitante,
-                        'ci': placa_obj.ci_visitante,
-                        'fecha_vencimiento': placa_obj.fecha_vencimiento
-                    },
-                    'vehiculo': {
-                        'marca': placa_obj.marca,
-                        'modelo': placa_obj.modelo,
-                        'color': placa_obj.color
-                    }
-                })
+        for entrada, distancia in indice_placas.similares(
+            placa_detectada, max_distancia=max_distancia, k=limite, tipos=('residente', 'invitado')
+        ):
+            similaridad = self._similaridad_desde_distancia(distancia, placa_detectada, entrada['placa'])
+            if similaridad < umbral:
+                continue
+
+            placa_obj = entrada['objeto']
+            resultado = {
+                'tipo': entrada['tipo'],
+                'placa': placa_obj.placa,
+                'similaridad': similaridad,
+                'distancia': distancia,
+                'residente': {
+                    'id': placa_obj.residente.id,
+                    'nombre': placa_obj.residente.persona.nombre,
+                    'email': placa_obj.residente.persona.email
+                },
+                'vehiculo': {
+                    'marca': placa_obj.marca,
+                    'modelo': placa_obj.modelo,
+                    'color': placa_obj.color
+                }
+            }
+            if entrada['tipo'] == 'invitado':
+                resultado['invitado'] = {
+                    'nombre': placa_obj.nombre_visitante,
+                    'ci': placa_obj.ci_visitante,
+                    'fecha_vencimiento': placa_obj.fecha_vencimiento
+                }
+            similares.append(resultado)
 
         # Ordenar por similaridad descendente
         similares.sort(key=lambda x: x['similaridad'], reverse=True)
@@ -226,17 +161,16 @@ class ReconocimientoPlacasService:
 
     def generar_reporte_diagnostico(self) -> Dict:
         """Genera un reporte de diagnóstico del sistema de IA"""
-        from usuarios.models import RegistroAcceso, ConfiguracionAcceso
+        from usuarios.models import ConfiguracionAcceso
 
         config = ConfiguracionAcceso.objects.first()
         if not config:
             config = ConfiguracionAcceso.objects.create()
 
-        # Estadísticas de los últimos 30 días
-        fecha_desde = timezone.now() - timedelta(days=30)
-        registros = RegistroAcceso.objects.filter(fecha_hora__gte=fecha_desde)
+        # Estadísticas de los últimos 30 días (contadores por hora, sin recorrer RegistroAcceso)
+        estadisticas = totales(desde=timezone.now() - timedelta(days=30))
 
-        total_registros = registros.count()
+        total_registros = estadisticas['total']
         if total_registros == 0:
             return {
                 'status': 'sin_datos',
@@ -244,17 +178,15 @@ class ReconocimientoPlacasService:
             }
 
         # Calcular métricas
-        registros_autorizados = registros.filter(estado_acceso='autorizado').count()
-        registros_denegados = registros.filter(estado_acceso='denegado').count()
-        registros_pendientes = registros.filter(estado_acceso='pendiente').count()
+        registros_autorizados = estadisticas['autorizado']
+        registros_denegados = estadisticas['denegado']
+        registros_pendientes = estadisticas['pendiente']
 
         # Métricas de IA
-        avg_confidence = registros.aggregate(
-            avg_confidence=models.Avg('ia_confidence')
-        )['avg_confidence'] or 0
+        avg_confidence = estadisticas['confianza_promedio']
 
-        placas_reconocidas = registros.filter(ia_placa_reconocida=True).count()
-        vehiculos_reconocidos = registros.filter(ia_vehiculo_reconocido=True).count()
+        placas_reconocidas = estadisticas['placas_reconocidas']
+        vehiculos_reconocidos = estadisticas['vehiculos_reconocidos']
 
         return {
             'status': 'success',
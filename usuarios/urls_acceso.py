@@ -3,8 +3,9 @@ from rest_framework.routers import DefaultRouter
 from usuarios.views_acceso import (
     PlacaVehiculoViewSet, PlacaInvitadoViewSet,
     RegistroAccesoViewSet, ConfiguracionAccesoViewSet,
-    DashboardAccesoView
+    DashboardAccesoView, TicketFeedAccesosView
 )
+from usuarios.views_acceso_async import decision_acceso, feed_accesos_sse
 
 # Crear router para los ViewSets
 router = DefaultRouter()
@@ -19,6 +20,9 @@ urlpatterns = [
 
     # Rutas adicionales
     path('dashboard/', DashboardAccesoView.as_view(), name='dashboard-acceso'),
+    path('accesos/decision/', decision_acceso, name='decision-acceso'),
+    path('accesos/feed/', feed_accesos_sse, name='feed-accesos'),
+    path('accesos/feed/ticket/', TicketFeedAccesosView.as_view(), name='ticket-feed-accesos'),
     path('registros-acceso/registrar/', RegistroAccesoViewSet.as_view({'post': 'registrar_acceso'}), name='registrar-acceso'),
     path('registros-acceso/<int:pk>/autorizar/', RegistroAccesoViewSet.as_view({'post': 'autorizar_manual'}), name='autorizar-manual'),
     path('registros-acceso/<int:pk>/denegar/', RegistroAccesoViewSet.as_view({'post': 'denegar_manual'}), name='denegar-manual'),
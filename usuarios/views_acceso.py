@@ -3,13 +3,19 @@ from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.decorators import action
 from rest_framework.viewsets import ModelViewSet
+from rest_framework.parsers import JSONParser
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.db import transaction
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
 from datetime import datetime, timedelta
 import json
+import logging
 
 from usuarios.models import (
-    PlacaVehiculo, PlacaInvitado, RegistroAcceso, ConfiguracionAcceso,
+    PlacaVehiculo, PlacaInvitado, RegistroAcceso, ConfiguracionAcceso, EventoAcceso,
     Residentes, Usuario, Empleado, Vehiculo, Invitado
 )
 from django.db.models import F
@@ -17,6 +23,38 @@ from usuarios.serializers.usuarios_serializer import (
     PlacaVehiculoSerializer, PlacaInvitadoSerializer,
     RegistroAccesoSerializer, ConfiguracionAccesoSerializer
 )
+from usuarios.parsers import NDJSONParser
+from usuarios.services.escritor_registros import escritor_registros
+from usuarios.services.particiones_registros import depurar_registros
+from usuarios.services.feed_accesos import SEGUNDOS_TICKET, emitir_ticket, feed_accesos
+from usuarios.services.deduplicacion import (
+    actualizar_deteccion, clave_debounce, olvidar_deteccion, registrar_deteccion
+)
+from usuarios.services.estadisticas_acceso import acumular as acumular_estadisticas, totales as totales_acceso
+from usuarios.services.indice_placas import indice_placas, limpiar_placa
+from usuarios.services.busqueda_difusa import canonizar_placa
+
+logger = logging.getLogger(__name__)
+
+_validar_url = URLValidator(schemes=['http', 'https'])
+
+
+def validar_registro(registro):
+    """
+    Errores de validación de un RegistroAcceso sin guardar ({campo: [mensajes]}), sin
+    consultar la BD. Los valores válidos quedan convertidos al tipo del campo.
+    """
+    errores = {}
+    try:
+        registro.full_clean(exclude=['placa_vehiculo', 'placa_invitado', 'autorizado_por'], validate_unique=False)
+    except ValidationError as e:
+        errores.update(e.message_dict)
+    if registro.imagen_url and 'imagen_url' not in errores:
+        try:
+            _validar_url(registro.imagen_url)
+        except ValidationError as e:
+            errores['imagen_url'] = e.messages
+    return errores
 
 class PlacaVehiculoViewSet(ModelViewSet):
     """Gestión de placas de vehículos de residentes"""
@@ -158,104 +196,21 @@ class RegistroAccesoViewSet(ModelViewSet):
     queryset = RegistroAcceso.objects.all()
     serializer_class = RegistroAccesoSerializer
     permission_classes = [permissions.IsAuthenticated]
+
+    # Máximo de eventos aceptados por llamada a registrar_accesos_lote
+    MAX_EVENTOS_LOTE = 1000
     
     def obtener_placas_activas(self):
         """
         Obtiene todas las placas activas del sistema unificando todas las fuentes
-        Retorna un diccionario con todas las placas activas organizadas por tipo
+        Retorna un diccionario con todas las placas activas organizadas por tipo.
+        Se sirve desde el índice en memoria, que se mantiene con signals.
         """
-        placas_activas = {}
-        
-        # 1. Placas de vehículos de residentes (PlacaVehiculo)
-        placas_residentes = PlacaVehiculo.objects.filter(activo=True).select_related('residente__persona')
-        print(f"📋 Cargando placas de residentes: {placas_residentes.count()} encontradas")
-        
-        for placa in placas_residentes:
-            placa_upper = placa.placa.upper()
-            placas_activas[placa_upper] = {
-                'tipo': 'residente',
-                'objeto': placa,
-                'placa': placa_upper,
-                'propietario_nombre': placa.residente.persona.nombre,
-                'vehiculo_info': f"{placa.marca} {placa.modelo} ({placa.color})",
-                'unidad': placa.residente.residentesunidad_set.filter(estado=True).first(),
-                'fecha_registro': placa.fecha_registro,
-                'mensaje_ia': f"🤖 IA VERIFICA: ✅ VEHÍCULO DE RESIDENTE REGISTRADO - {placa.residente.persona.nombre}",
-                'confianza_busqueda': 100
-            }
-            print(f"  ✅ Placa residente agregada: {placa_upper} - {placa.residente.persona.nombre}")
-        
-        # 2. Placas de invitados activos y no vencidos (PlacaInvitado)
-        placas_invitados = PlacaInvitado.objects.filter(
-            activo=True,
-            fecha_vencimiento__gte=timezone.now()
-        ).select_related('residente__persona')
-        print(f"📋 Cargando placas de invitados: {placas_invitados.count()} encontradas")
-        
-        for placa in placas_invitados:
-            placa_upper = placa.placa.upper()
-            placas_activas[placa_upper] = {
-                'tipo': 'invitado',
-                'objeto': placa,
-                'placa': placa_upper,
-                'visitante_nombre': placa.nombre_visitante,
-                'propietario_nombre': placa.residente.persona.nombre,
-                'vehiculo_info': f"{placa.marca or 'N/A'} {placa.modelo or 'N/A'} ({placa.color or 'N/A'})",
-                'fecha_vencimiento': placa.fecha_vencimiento,
-                'ci_visitante': placa.ci_visitante,
-                'mensaje_ia': f"🤖 IA VERIFICA: ✅ VEHÍCULO DE INVITADO REGISTRADO - {placa.nombre_visitante}",
-                'confianza_busqueda': 100
-            }
-            print(f"  ✅ Placa invitado agregada: {placa_upper} - {placa.nombre_visitante}")
-        
-        # 3. Vehículos del sistema original (Vehiculo) - Solo si existen y no están duplicados
-        try:
-            vehiculos_originales = Vehiculo.objects.all()
-            for vehiculo in vehiculos_originales:
-                placa_upper = vehiculo.placa.upper()
-                if placa_upper not in placas_activas:  # Evitar duplicados
-                    placas_activas[placa_upper] = {
-                        'tipo': 'vehiculo_original',
-                        'objeto': vehiculo,
-                        'placa': placa_upper,
-                        'vehiculo_info': f"{vehiculo.marca} {vehiculo.modelo} ({vehiculo.color})",
-                        'propietario_nombre': 'Sistema Original',
-                        'mensaje_ia': f"🤖 IA VERIFICA: ✅ VEHÍCULO REGISTRADO EN SISTEMA ORIGINAL - {vehiculo.marca} {vehiculo.modelo}",
-                        'confianza_busqueda': 95
-                    }
-        except Exception as e:
-            print(f"⚠️ Error al cargar vehículos originales: {e}")
-        
-        # 4. Invitados con vehículos del sistema original (Invitado)
-        invitados_con_vehiculo = Invitado.objects.filter(
-            activo=True,
-            vehiculo_placa__isnull=False
-        ).exclude(vehiculo_placa='').select_related('residente__persona')
-        
-        for invitado in invitados_con_vehiculo:
-            # Verificar si no está vencido
-            if invitado.fecha_fin and invitado.fecha_fin < timezone.now():
-                continue
-                
-            placa_upper = invitado.vehiculo_placa.upper()
-            if placa_upper not in placas_activas:  # Evitar duplicados
-                placas_activas[placa_upper] = {
-                    'tipo': 'invitado_original',
-                    'objeto': invitado,
-                    'placa': placa_upper,
-                    'visitante_nombre': invitado.nombre,
-                    'propietario_nombre': invitado.residente.persona.nombre if invitado.residente else 'Sin residente',
-                    'fecha_fin': invitado.fecha_fin,
-                    'vehiculo_info': f"Vehículo de {invitado.nombre}",
-                    'mensaje_ia': f"🤖 IA VERIFICA: ✅ INVITADO REGISTRADO EN SISTEMA ORIGINAL - {invitado.nombre}",
-                    'confianza_busqueda': 90
-                }
-        
-        return placas_activas
+        return indice_placas.placas_activas()
 
     def buscar_placa_inteligente(self, placa_detectada):
         """
-        Búsqueda inteligente de placas usando el sistema unificado de placas activas
+        Búsqueda inteligente de placas usando el índice unificado de placas activas
         Retorna un diccionario con la información encontrada
         """
         resultado = {
@@ -264,7 +219,9 @@ class RegistroAccesoViewSet(ModelViewSet):
             'objeto': None,
             'info_detallada': {},
             'mensaje_ia': '',
-            'confianza_busqueda': 0
+            'confianza_busqueda': 0,
+            'sugerencias': [],
+            'coincidencia_ocr': False
         }
         
         if not placa_detectada or len(placa_detectada) < 4:
@@ -272,47 +229,46 @@ class RegistroAccesoViewSet(ModelViewSet):
             
         placa_limpia = placa_detectada.upper().strip()
         
-        print(f"🔍 Buscando placa: '{placa_limpia}'")
+        logger.debug(f"Buscando placa '{placa_limpia}' (índice v{indice_placas.version})")
         
-        # Obtener todas las placas activas del sistema
-        placas_activas = self.obtener_placas_activas()
-        
-        print(f"📋 Total de placas activas en el sistema: {len(placas_activas)}")
-        print(f"📋 Placas disponibles: {list(placas_activas.keys())[:10]}...")  # Mostrar primeras 10
-        
-        # Búsqueda exacta
-        if placa_limpia in placas_activas:
-            placa_info = placas_activas[placa_limpia]
+        # Búsqueda exacta y aproximada (sin espacios ni guiones) sin consultas a la BD
+        placa_info = indice_placas.buscar(placa_limpia)
+        confianza = placa_info['confianza_busqueda'] if placa_info else 0
+
+        # Búsqueda difusa: una placa parecida nunca autoriza, solo se sugiere. Si difiere
+        # únicamente por confusiones de OCR (0/O, 1/I, 8/B...) el acceso queda pendiente
+        # para que seguridad lo confirme: dos placas reales distintas pueden coincidir así
+        if not placa_info:
+            similares = indice_placas.similares(placa_limpia, max_distancia=1.0, k=3)
+            resultado['coincidencia_ocr'] = bool(similares) and (
+                canonizar_placa(limpiar_placa(similares[0][0]['placa'])) == canonizar_placa(limpiar_placa(placa_limpia))
+            )
+            resultado['sugerencias'] = [
+                {
+                    'placa': entrada['placa'],
+                    'tipo': entrada['tipo'],
+                    'propietario_nombre': entrada.get('propietario_nombre'),
+                    'distancia': distancia
+                }
+                for entrada, distancia in similares
+            ]
+
+        if placa_info:
             resultado.update({
                 'encontrada': True,
                 'tipo': placa_info['tipo'],
                 'objeto': placa_info['objeto'],
-                'info_detallada': {k: v for k, v in placa_info.items() if k not in ['tipo', 'objeto', 'mensaje_ia', 'confianza_busqueda']},
+                'info_detallada': {
+                    k: v for k, v in placa_info.items()
+                    if k not in ['tipo', 'objeto', 'mensaje_ia', 'confianza_busqueda'] and not k.startswith('_')
+                },
                 'mensaje_ia': placa_info['mensaje_ia'],
-                'confianza_busqueda': placa_info['confianza_busqueda']
+                'confianza_busqueda': confianza
             })
-            print(f"✅ PLACA ENCONTRADA: {placa_limpia} - Tipo: {placa_info['tipo']}")
+            logger.debug(f"Placa encontrada: {placa_limpia} -> {placa_info['placa']} ({placa_info['tipo']})")
             return resultado
         
-        # Búsqueda aproximada (por si hay diferencias menores)
-        for placa_registrada, info in placas_activas.items():
-            # Comparar sin espacios y caracteres especiales
-            placa_reg_clean = ''.join(c for c in placa_registrada if c.isalnum())
-            placa_det_clean = ''.join(c for c in placa_limpia if c.isalnum())
-            
-            if placa_reg_clean == placa_det_clean:
-                resultado.update({
-                    'encontrada': True,
-                    'tipo': info['tipo'],
-                    'objeto': info['objeto'],
-                    'info_detallada': {k: v for k, v in info.items() if k not in ['tipo', 'objeto', 'mensaje_ia', 'confianza_busqueda']},
-                    'mensaje_ia': info['mensaje_ia'],
-                    'confianza_busqueda': info['confianza_busqueda'] - 5  # Reducir confianza por búsqueda aproximada
-                })
-                print(f"✅ PLACA ENCONTRADA (aproximada): {placa_limpia} -> {placa_registrada}")
-                return resultado
-        
-        print(f"❌ PLACA NO ENCONTRADA: '{placa_limpia}'")
+        logger.debug(f"Placa no encontrada: '{placa_limpia}'")
         return resultado
 
     def get_queryset(self):
@@ -336,19 +292,17 @@ class RegistroAccesoViewSet(ModelViewSet):
     @action(detail=False, methods=['post'])
     def registrar_acceso(self, request):
         """Registrar un nuevo acceso vehicular con IA mejorada"""
+        registro = None
+        reservada = False
         try:
             data = request.data.copy()
 
             # Obtener configuración actual
-            config = ConfiguracionAcceso.objects.first()
-            if not config:
-                config = ConfiguracionAcceso.objects.create()
+            config = self._obtener_configuracion()
 
             # Obtener placa detectada
             placa_detectada = data.get('placa_detectada', '').upper().strip()
             
-            print(f"\n🔍 INICIANDO BÚSQUEDA INTELIGENTE DE PLACA: '{placa_detectada}'")
-            
             # Usar búsqueda inteligente
             resultado_busqueda = self.buscar_placa_inteligente(placa_detectada)
             
@@ -357,30 +311,27 @@ class RegistroAccesoViewSet(ModelViewSet):
             ia_placa_reconocida = data.get('ia_placa_reconocida', False)
             ia_vehiculo_reconocido = data.get('ia_vehiculo_reconocido', False)
 
-            print(f"📊 RESULTADO DE BÚSQUEDA:")
-            print(f"   - Encontrada: {resultado_busqueda['encontrada']}")
-            print(f"   - Tipo: {resultado_busqueda['tipo']}")
-            print(f"   - Confianza: {resultado_busqueda['confianza_busqueda']}%")
-            print(f"   - Mensaje IA: {resultado_busqueda['mensaje_ia']}")
-
             # LÓGICA DE AUTORIZACIÓN MEJORADA
-            if resultado_busqueda['encontrada']:
-                # ✅ PLACA ENCONTRADA -> AUTORIZADO AUTOMÁTICO
-                estado_acceso = 'autorizado'
-                ia_autentico = True
-                ia_placa_reconocida = True
-                ia_vehiculo_reconocido = True
-                print(f"🎉 ACCESO AUTORIZADO AUTOMÁTICAMENTE")
-            elif ia_confidence >= config.umbral_confianza_placa and ia_placa_reconocida:
-                # ⏳ PLACA NO REGISTRADA PERO IA CONFÍA -> PENDIENTE
-                estado_acceso = 'pendiente'
-                ia_autentico = False
-                print(f"⏳ ACCESO PENDIENTE - Requiere autorización manual")
-            else:
-                # ❌ PLACA NO RECONOCIDA O BAJA CONFIANZA -> DENEGADO
-                estado_acceso = 'denegado'
-                ia_autentico = False
-                print(f"❌ ACCESO DENEGADO - Placa no registrada y baja confianza")
+            estado_acceso, ia_autentico, ia_placa_reconocida, ia_vehiculo_reconocido = self._decidir_acceso(
+                resultado_busqueda, ia_confidence, ia_placa_reconocida, ia_vehiculo_reconocido, config
+            )
+
+            # Detecciones repetidas del mismo auto en la misma cámara: un solo registro
+            tipo_acceso = data.get('tipo_acceso', 'entrada')
+            camara_id = data.get('camara_id', '')
+            anterior = registrar_deteccion(
+                camara_id, placa_detectada, tipo_acceso,
+                {'id': None, 'estado_acceso': estado_acceso}, config.segundos_debounce_placa
+            )
+            reservada = anterior is None
+            if anterior:
+                return Response({
+                    'duplicado': True,
+                    'registro_id': anterior['id'],
+                    'placa_detectada': placa_detectada,
+                    'estado_acceso': anterior['estado_acceso'],
+                    'mensaje': f"Placa '{placa_detectada}' ya registrada en esta cámara hace menos de {config.segundos_debounce_placa}s"
+                }, status=status.HTTP_200_OK)
 
             # Crear registro de acceso
             registro_data = {
@@ -392,23 +343,36 @@ class RegistroAccesoViewSet(ModelViewSet):
                 'ia_autentico': ia_autentico,
                 'ia_placa_reconocida': ia_placa_reconocida,
                 'ia_vehiculo_reconocido': ia_vehiculo_reconocido,
-                'tipo_acceso': data.get('tipo_acceso', 'entrada'),
+                'tipo_acceso': tipo_acceso,
                 'estado_acceso': estado_acceso,
                 'imagen_url': data.get('imagen_url', ''),
                 'imagen_path': data.get('imagen_path', ''),
-                'camara_id': data.get('camara_id', ''),
+                'camara_id': camara_id,
                 'tiempo_procesamiento': data.get('tiempo_procesamiento', 0),
                 'observaciones': data.get('observaciones', ''),
-                'placa_vehiculo': resultado_busqueda['objeto'] if resultado_busqueda['tipo'] == 'residente' else None,
-                'placa_invitado': resultado_busqueda['objeto'] if resultado_busqueda['tipo'] == 'invitado' else None,
+                'placa_vehiculo': resultado_busqueda['objeto'].pk if resultado_busqueda['tipo'] == 'residente' else None,
+                'placa_invitado': resultado_busqueda['objeto'].pk if resultado_busqueda['tipo'] == 'invitado' else None,
             }
 
-            serializer = self.get_serializer(data=registro_data)
-            serializer.is_valid(raise_exception=True)
-            registro = serializer.save()
+            if settings.ACCESO_ESCRITURA_DIFERIDA and estado_acceso == 'autorizado':
+                # Escritura diferida solo para los autorizados: un pendiente o denegado se guarda
+                # al instante porque seguridad necesita su id para autorizarlo o denegarlo a mano
+                registro = self._registrar_diferido(registro_data, resultado_busqueda)
+                response_data = self.get_serializer(registro).data.copy()
+                response_data['registro_diferido'] = True
+            else:
+                serializer = self.get_serializer(data=registro_data)
+                serializer.is_valid(raise_exception=True)
+                registro = serializer.save()
+
+                # Preparar respuesta detallada con información de la búsqueda inteligente
+                response_data = serializer.data.copy()
 
-            # Preparar respuesta detallada con información de la búsqueda inteligente
-            response_data = serializer.data.copy()
+            if registro.id:
+                actualizar_deteccion(
+                    camara_id, placa_detectada, tipo_acceso,
+                    {'id': registro.id, 'estado_acceso': estado_acceso}, config.segundos_debounce_placa
+                )
             
             # Agregar información detallada del resultado de búsqueda
             response_data['mensaje'] = resultado_busqueda['mensaje_ia']
@@ -422,32 +386,238 @@ class RegistroAccesoViewSet(ModelViewSet):
                 if resultado_busqueda['tipo'] == 'residente':
                     unidad = resultado_busqueda['info_detallada'].get('unidad')
                     if unidad:
-                        response_data['unidad_numero'] = unidad.id_unidad.numero
-                        response_data['unidad_tipo'] = unidad.id_unidad.tipo
+                        response_data['unidad_numero'] = unidad['numero_casa']
                         
                 elif resultado_busqueda['tipo'] == 'invitado':
                     response_data['fecha_vencimiento'] = resultado_busqueda['info_detallada'].get('fecha_vencimiento')
                     
             else:
                 # Placa no encontrada
-                if estado_acceso == 'pendiente':
-                    response_data['mensaje'] = f"🤖 IA VERIFICA: ⏳ PLACA '{placa_detectada}' NO REGISTRADA - Requiere verificación manual del administrador o seguridad"
-                else:
-                    response_data['mensaje'] = f"🤖 IA VERIFICA: ❌ PLACA '{placa_detectada}' NO RECONOCIDA - Acceso denegado por baja confianza de IA"
+                response_data['mensaje'] = self._mensaje_no_encontrada(placa_detectada, estado_acceso)
+                if resultado_busqueda['sugerencias']:
+                    response_data['placas_similares'] = resultado_busqueda['sugerencias']
 
-            print(f"\n✅ REGISTRO CREADO EXITOSAMENTE:")
-            print(f"   - ID: {registro.id}")
-            print(f"   - Estado: {estado_acceso.upper()}")
-            print(f"   - Mensaje: {response_data['mensaje']}")
+            logger.info(f"Acceso {estado_acceso} para placa {placa_detectada} (registro {registro.id or 'diferido'})")
             
             return Response(response_data, status=status.HTTP_201_CREATED)
 
         except Exception as e:
+            if reservada and registro is None:
+                olvidar_deteccion(camara_id, placa_detectada, tipo_acceso)
             return Response(
                 {'error': f'Error al registrar acceso: {str(e)}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    def _registrar_diferido(self, registro_data, resultado_busqueda):
+        """
+        Valida el registro sin tocar la base de datos y lo deja en el spool del escritor diferido.
+        Retorna la instancia sin guardar (id=None) para armar la respuesta.
+        """
+        datos = dict(registro_data)
+        placa_vehiculo_id = datos.pop('placa_vehiculo')
+        placa_invitado_id = datos.pop('placa_invitado')
+        registro = RegistroAcceso(
+            **datos,
+            placa_vehiculo_id=placa_vehiculo_id,
+            placa_invitado_id=placa_invitado_id,
+            fecha_hora=timezone.now()
+        )
+        registro.full_clean(exclude=['placa_vehiculo', 'placa_invitado', 'autorizado_por'], validate_unique=False)
+
+        escritor_registros.encolar({
+            campo.attname: getattr(registro, campo.attname)
+            for campo in RegistroAcceso._meta.concrete_fields if not campo.primary_key
+        })
+
+        # Reusar los objetos del índice para que el serializer no consulte la BD
+        if resultado_busqueda['tipo'] == 'residente':
+            registro.placa_vehiculo = resultado_busqueda['objeto']
+        elif resultado_busqueda['tipo'] == 'invitado':
+            registro.placa_invitado = resultado_busqueda['objeto']
+        return registro
+
+    def _obtener_configuracion(self):
+        config = ConfiguracionAcceso.objects.first()
+        if not config:
+            config = ConfiguracionAcceso.objects.create()
+        return config
+
+    def _decidir_acceso(self, resultado_busqueda, ia_confidence, ia_placa_reconocida, ia_vehiculo_reconocido, config):
+        """
+        Decide el estado del acceso a partir de la búsqueda de la placa y la confianza de la IA
+        Retorna (estado_acceso, ia_autentico, ia_placa_reconocida, ia_vehiculo_reconocido)
+        """
+        if resultado_busqueda['encontrada']:
+            # ✅ PLACA ENCONTRADA -> AUTORIZADO AUTOMÁTICO
+            return 'autorizado', True, True, True
+        if resultado_busqueda.get('coincidencia_ocr'):
+            # 🔎 PLACA REGISTRADA PARECIDA (posible error de OCR) -> PENDIENTE, nunca automático
+            return 'pendiente', False, ia_placa_reconocida, ia_vehiculo_reconocido
+        if ia_confidence >= config.umbral_confianza_placa and ia_placa_reconocida:
+            # ⏳ PLACA NO REGISTRADA PERO IA CONFÍA -> PENDIENTE
+            return 'pendiente', False, ia_placa_reconocida, ia_vehiculo_reconocido
+        # ❌ PLACA NO RECONOCIDA O BAJA CONFIANZA -> DENEGADO
+        return 'denegado', False, ia_placa_reconocida, ia_vehiculo_reconocido
+
+    def _mensaje_no_encontrada(self, placa_detectada, estado_acceso):
+        if estado_acceso == 'pendiente':
+            return f"🤖 IA VERIFICA: ⏳ PLACA '{placa_detectada}' NO REGISTRADA - Requiere verificación manual del administrador o seguridad"
+        return f"🤖 IA VERIFICA: ❌ PLACA '{placa_detectada}' NO RECONOCIDA - Acceso denegado por baja confianza de IA"
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def registrar_accesos_lote(self, request):
+        """
+        Registrar en lote eventos de una o varias cámaras.
+        Acepta una lista JSON, {"eventos": [...]} o NDJSON (application/x-ndjson).
+        Todos los eventos se resuelven contra la misma versión del índice de placas
+        y se guardan con un único bulk_create.
+        """
+        eventos = request.data
+        if isinstance(eventos, dict):
+            eventos = eventos.get('eventos')
+        if not isinstance(eventos, list) or not eventos:
+            return Response(
+                {'error': 'Debe enviar una lista de eventos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(eventos) > self.MAX_EVENTOS_LOTE:
+            return Response(
+                {'error': f'El lote no puede tener más de {self.MAX_EVENTOS_LOTE} eventos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        config = self._obtener_configuracion()
+        tipos_validos = dict(RegistroAcceso.TIPO_ACCESO_CHOICES)
+
+        registros = []
+        decisiones = []
+        tipos_por_indice = {}
+        with indice_placas.instantanea():
+            for indice, evento in enumerate(eventos):
+                if not isinstance(evento, dict):
+                    decisiones.append({'indice': indice, 'error': 'El evento debe ser un objeto'})
+                    continue
+
+                placa_detectada = str(evento.get('placa_detectada') or '').upper().strip()
+                tipo_acceso = evento.get('tipo_acceso', 'entrada')
+                try:
+                    ia_confidence = float(evento.get('ia_confidence', 0))
+                except (TypeError, ValueError):
+                    ia_confidence = -1
+                if not 0 <= ia_confidence <= 100:
+                    decisiones.append({'indice': indice, 'error': 'ia_confidence debe ser un número entre 0 y 100'})
+                    continue
+                if not placa_detectada or len(placa_detectada) > 10:
+                    decisiones.append({'indice': indice, 'error': 'placa_detectada inválida'})
+                    continue
+                if tipo_acceso not in tipos_validos:
+                    decisiones.append({'indice': indice, 'error': f'tipo_acceso inválido: {tipo_acceso}'})
+                    continue
+
+                resultado_busqueda = self.buscar_placa_inteligente(placa_detectada)
+                estado_acceso, ia_autentico, ia_placa_reconocida, ia_vehiculo_reconocido = self._decidir_acceso(
+                    resultado_busqueda, ia_confidence,
+                    bool(evento.get('ia_placa_reconocida', False)),
+                    bool(evento.get('ia_vehiculo_reconocido', False)),
+                    config
+                )
+
+                registro = RegistroAcceso(
+                    placa_detectada=placa_detectada,
+                    marca_detectada=evento.get('marca_detectada', ''),
+                    modelo_detectado=evento.get('modelo_detectado', ''),
+                    color_detectado=evento.get('color_detectado', ''),
+                    ia_confidence=round(ia_confidence, 2),
+                    ia_autentico=ia_autentico,
+                    ia_placa_reconocida=ia_placa_reconocida,
+                    ia_vehiculo_reconocido=ia_vehiculo_reconocido,
+                    tipo_acceso=tipo_acceso,
+                    estado_acceso=estado_acceso,
+                    imagen_url=evento.get('imagen_url', ''),
+                    imagen_path=evento.get('imagen_path', ''),
+                    camara_id=evento.get('camara_id', ''),
+                    tiempo_procesamiento=evento.get('tiempo_procesamiento', 0),
+                    observaciones=evento.get('observaciones', ''),
+                    placa_vehiculo_id=resultado_busqueda['objeto'].pk if resultado_busqueda['tipo'] == 'residente' else None,
+                    placa_invitado_id=resultado_busqueda['objeto'].pk if resultado_busqueda['tipo'] == 'invitado' else None,
+                )
+                # Un valor inválido (largo, tipo) haría fallar el bulk_create de todo el lote
+                errores = validar_registro(registro)
+                if errores:
+                    decisiones.append({'indice': indice, 'error': 'Datos del evento inválidos', 'detalle': errores})
+                    continue
+
+                anterior = registrar_deteccion(
+                    registro.camara_id, placa_detectada, tipo_acceso,
+                    {'id': None, 'estado_acceso': estado_acceso}, config.segundos_debounce_placa
+                )
+                tipos_por_indice[indice] = tipo_acceso
+                if anterior:
+                    decisiones.append({
+                        'indice': indice,
+                        'camara_id': registro.camara_id,
+                        'placa_detectada': placa_detectada,
+                        'estado_acceso': anterior['estado_acceso'],
+                        'duplicado': True,
+                        'id': anterior['id'],
+                    })
+                    continue
+
+                registros.append(registro)
+                decisiones.append({
+                    'indice': indice,
+                    'camara_id': evento.get('camara_id', ''),
+                    'placa_detectada': placa_detectada,
+                    'estado_acceso': estado_acceso,
+                    'tipo_propietario': resultado_busqueda['tipo'],
+                    'confianza_busqueda': resultado_busqueda['confianza_busqueda'],
+                    'mensaje': resultado_busqueda['mensaje_ia'] or self._mensaje_no_encontrada(placa_detectada, estado_acceso),
+                })
+            version_indice = indice_placas.version
+
+        # bulk_create no dispara post_save: las estadísticas se acumulan aparte
+        try:
+            with transaction.atomic():
+                creados = RegistroAcceso.objects.bulk_create(registros)
+                acumular_estadisticas(creados)
+                transaction.on_commit(feed_accesos.notificar)
+        except Exception:
+            for registro in registros:
+                olvidar_deteccion(registro.camara_id, registro.placa_detectada, registro.tipo_acceso)
+            raise
+
+        # Asignar el id de cada registro creado a su decisión (en el mismo orden)
+        ids = iter(registro.id for registro in creados)
+        for decision in decisiones:
+            if 'error' not in decision and not decision.get('duplicado'):
+                decision['id'] = next(ids)
+                actualizar_deteccion(
+                    decision['camara_id'], decision['placa_detectada'], tipos_por_indice[decision['indice']],
+                    {'id': decision['id'], 'estado_acceso': decision['estado_acceso']}, config.segundos_debounce_placa
+                )
+
+        # Repeticiones dentro del mismo lote: apuntar al registro recién creado
+        ids_en_lote = {
+            clave_debounce(d['camara_id'], d['placa_detectada'], tipos_por_indice[d['indice']]): d['id']
+            for d in decisiones if 'error' not in d and not d.get('duplicado')
+        }
+        for decision in decisiones:
+            if decision.get('duplicado') and decision['id'] is None:
+                decision['id'] = ids_en_lote.get(clave_debounce(
+                    decision['camara_id'], decision['placa_detectada'], tipos_por_indice[decision['indice']]
+                ))
+
+        duplicados = sum(1 for decision in decisiones if decision.get('duplicado'))
+        return Response({
+            'total': len(eventos),
+            'registrados': len(creados),
+            'duplicados': duplicados,
+            'errores': len(eventos) - len(creados) - duplicados,
+            'version_indice': version_indice,
+            'decisiones': decisiones
+        }, status=status.HTTP_201_CREATED)
+
     @action(detail=True, methods=['post'])
     def autorizar_manual(self, request, pk=None):
         """Autorizar manualmente un acceso pendiente o denegado"""
@@ -468,15 +638,23 @@ class RegistroAccesoViewSet(ModelViewSet):
             )
 
         estado_anterior = registro.estado_acceso
+        # Ya se conoce: la signal de estadísticas no vuelve a leerlo de la base
+        registro._estado_anterior = estado_anterior
         registro.estado_acceso = 'autorizado'
         registro.observaciones = f"Autorizado manualmente por {usuario.username} (era: {estado_anterior})"
-        registro.save()
+        with transaction.atomic():
+            registro.save(update_fields=['estado_acceso', 'observaciones'])
+            EventoAcceso.objects.create(
+                registro_id=registro.id, tipo='autorizacion', estado_anterior=estado_anterior,
+                estado_nuevo='autorizado', usuario=usuario
+            )
+            # Las detecciones repetidas ya no deben repetir la decisión anterior
+            transaction.on_commit(lambda: olvidar_deteccion(registro.camara_id, registro.placa_detectada, registro.tipo_acceso))
 
-        print(f"🔓 AUTORIZACIÓN MANUAL:")
-        print(f"   - Registro ID: {registro.id}")
-        print(f"   - Placa: {registro.placa_detectada}")
-        print(f"   - Autorizado por: {usuario.username}")
-        print(f"   - Estado anterior: {estado_anterior}")
+        logger.info(
+            f"Autorización manual del registro {registro.id} ({registro.placa_detectada}) "
+            f"por {usuario.username}, estado anterior: {estado_anterior}"
+        )
 
         serializer = self.get_serializer(registro)
         response_data = serializer.data.copy()
@@ -505,15 +683,23 @@ class RegistroAccesoViewSet(ModelViewSet):
             )
 
         estado_anterior = registro.estado_acceso
+        # Ya se conoce: la signal de estadísticas no vuelve a leerlo de la base
+        registro._estado_anterior = estado_anterior
         registro.estado_acceso = 'denegado'
         registro.observaciones = f"Denegado manualmente por {usuario.username} (era: {estado_anterior})"
-        registro.save()
+        with transaction.atomic():
+            registro.save(update_fields=['estado_acceso', 'observaciones'])
+            EventoAcceso.objects.create(
+                registro_id=registro.id, tipo='denegacion', estado_anterior=estado_anterior,
+                estado_nuevo='denegado', usuario=usuario
+            )
+            # Las detecciones repetidas ya no deben repetir la decisión anterior
+            transaction.on_commit(lambda: olvidar_deteccion(registro.camara_id, registro.placa_detectada, registro.tipo_acceso))
 
-        print(f"🔒 DENEGACIÓN MANUAL:")
-        print(f"   - Registro ID: {registro.id}")
-        print(f"   - Placa: {registro.placa_detectada}")
-        print(f"   - Denegado por: {usuario.username}")
-        print(f"   - Estado anterior: {estado_anterior}")
+        logger.info(
+            f"Denegación manual del registro {registro.id} ({registro.placa_detectada}) "
+            f"por {usuario.username}, estado anterior: {estado_anterior}"
+        )
 
         serializer = self.get_serializer(registro)
         response_data = serializer.data.copy()
@@ -556,7 +742,7 @@ class RegistroAccesoViewSet(ModelViewSet):
 
     @action(detail=False, methods=['delete'])
     def limpiar_registros_antiguos(self, request):
-        """Limpiar registros antiguos (más de 90 días)"""
+        """Limpiar registros más antiguos que ConfiguracionAcceso.dias_retencion_registros"""
         usuario = request.user
         
         # Verificar permisos de administrador
@@ -567,17 +753,17 @@ class RegistroAccesoViewSet(ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        from datetime import timedelta
-        fecha_limite = timezone.now() - timedelta(days=90)
-        
-        registros_antiguos = RegistroAcceso.objects.filter(
-            fecha_hora__lt=fecha_limite
-        )
-        cantidad = registros_antiguos.count()
-        registros_antiguos.delete()
+        dias = self._obtener_configuracion().dias_retencion_registros
+        fecha_limite = timezone.now() - timedelta(days=dias)
+
+        # En PostgreSQL se eliminan particiones mensuales completas, sin DELETE fila por fila
+        resultado = depurar_registros(fecha_limite)
+        cantidad = resultado['filas_estimadas_particiones'] + resultado['registros_eliminados']
         
         return Response({
-            'message': f'Se eliminaron {cantidad} registros antiguos'
+            'message': f'Se eliminaron {cantidad} registros antiguos',
+            'dias_retencion': dias,
+            'particiones_eliminadas': resultado['particiones_eliminadas']
         })
 
     @action(detail=False, methods=['get'])
@@ -752,28 +938,12 @@ class DashboardAccesoView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        hoy = timezone.now().date()
-        inicio_mes = hoy.replace(day=1)
+        ahora = timezone.localtime()
+        inicio_dia = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
+        inicio_mes = inicio_dia.replace(day=1)
 
-        # Estadísticas generales
-        total_registros = RegistroAcceso.objects.count()
-        registros_hoy = RegistroAcceso.objects.filter(
-            fecha_hora__date=hoy
-        ).count()
-        registros_mes = RegistroAcceso.objects.filter(
-            fecha_hora__date__gte=inicio_mes
-        ).count()
-
-        # Estadísticas por estado
-        autorizados = RegistroAcceso.objects.filter(
-            estado_acceso='autorizado'
-        ).count()
-        denegados = RegistroAcceso.objects.filter(
-            estado_acceso='denegado'
-        ).count()
-        pendientes = RegistroAcceso.objects.filter(
-            estado_acceso='pendiente'
-        ).count()
+        # Estadísticas generales y por estado: una consulta sobre los contadores por hora
+        estadisticas = totales_acceso(hoy=inicio_dia, mes=inicio_mes)
 
         # Placas activas de residentes
         placas_residentes = PlacaVehiculo.objects.filter(activo=True).count()
@@ -789,13 +959,13 @@ class DashboardAccesoView(APIView):
 
         return Response({
             'estadisticas': {
-                'total_registros': total_registros,
-                'registros_hoy': registros_hoy,
-                'registros_mes': registros_mes,
-                'autorizados': autorizados,
-                'denegados': denegados,
-                'pendientes': pendientes,
-                'tasa_exito': round((autorizados / total_registros * 100), 2) if total_registros > 0 else 0
+                'total_registros': estadisticas['total'],
+                'registros_hoy': estadisticas['hoy'],
+                'registros_mes': estadisticas['mes'],
+                'autorizados': estadisticas['autorizado'],
+                'denegados': estadisticas['denegado'],
+                'pendientes': estadisticas['pendiente'],
+                'tasa_exito': estadisticas['tasa_exito']
             },
             'placas': {
                 'residentes_activas': placas_residentes,
@@ -1093,3 +1263,11 @@ class DashboardAccesoView(APIView):
                 {'error': f'Error al obtener lista de placas autorizadas: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+class TicketFeedAccesosView(APIView):
+    """Ticket de vida corta para abrir el feed en vivo (EventSource no permite mandar el token en un header)"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        return Response({'ticket': emitir_ticket(request.user.pk), 'vence_en_segundos': SEGUNDOS_TICKET})
@@ -0,0 +1,255 @@
+"""
+Vistas asíncronas del sistema de acceso (ASGI)
+- decision_acceso: responde autorizado/denegado/pendiente desde el índice de placas
+  en memoria dentro del tiempo máximo configurado en ConfiguracionAcceso.tiempo_max_procesamiento.
+  El RegistroAcceso autorizado se guarda con el escritor diferido, así una base de
+  datos lenta nunca deja la barrera esperando; el pendiente o denegado se guarda al
+  instante para que seguridad tenga su id.
+- feed_accesos_sse: feed en vivo (Server-Sent Events) de registros y decisiones manuales.
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from usuarios.models import ConfiguracionAcceso, RegistroAcceso
+from usuarios.services.autenticacion_token import usuario_del_token
+from usuarios.services.deduplicacion import actualizar_deteccion, aregistrar_deteccion
+from usuarios.services.escritor_registros import escritor_registros
+from usuarios.services.feed_accesos import (
+    avanzar_cursor, cursor_actual, eventos_desde, feed_accesos, formatear_evento, leer_cursor, leer_ticket,
+    nuevos_enviados
+)
+from usuarios.views_acceso import RegistroAccesoViewSet, validar_registro
+
+logger = logging.getLogger(__name__)
+
+# Segundos que se reutiliza la configuración
+TTL_CONFIGURACION = 60
+
+# Segundos sin eventos tras los que se envía un comentario para mantener viva la conexión SSE
+SEGUNDOS_KEEPALIVE = 15
+
+_configuracion = {'objeto': None, 'expira': 0.0}
+
+# Reutiliza la búsqueda de placas y las reglas de autorización del ViewSet
+_vista = RegistroAccesoViewSet()
+
+
+async def _obtener_configuracion():
+    """Configuración en memoria, se vuelve a leer cada TTL_CONFIGURACION segundos"""
+    ahora = time.monotonic()
+    if _configuracion['objeto'] is None or _configuracion['expira'] < ahora:
+        config = await ConfiguracionAcceso.objects.afirst()
+        _configuracion['objeto'] = config or ConfiguracionAcceso()
+        _configuracion['expira'] = ahora + TTL_CONFIGURACION
+    return _configuracion['objeto']
+
+
+def _guardar_al_instante(campos, segundos):
+    """Guarda el registro en la base (no en el spool) y deja su id en el debounce; retorna el id"""
+    registro = RegistroAcceso.objects.create(**campos)
+    actualizar_deteccion(
+        registro.camara_id, registro.placa_detectada, registro.tipo_acceso,
+        {'id': registro.id, 'estado_acceso': registro.estado_acceso}, segundos
+    )
+    return registro.id
+
+
+@csrf_exempt
+@require_POST
+async def decision_acceso(request):
+    """
+    Decidir si se abre la barrera para una placa detectada.
+    Si no hay respuesta dentro del presupuesto de tiempo, el acceso queda pendiente.
+    """
+    inicio = time.monotonic()
+
+    try:
+        data = json.loads(request.body or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError('Se esperaba un objeto JSON')
+        placa_detectada = str(data.get('placa_detectada') or '').upper().strip()
+        ia_confidence = float(data.get('ia_confidence', 0))
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'Cuerpo JSON inválido'}, status=400)
+
+    if not placa_detectada or len(placa_detectada) > 10:
+        return JsonResponse({'error': 'placa_detectada inválida'}, status=400)
+    tipo_acceso = data.get('tipo_acceso', 'entrada')
+    if tipo_acceso not in dict(RegistroAcceso.TIPO_ACCESO_CHOICES):
+        return JsonResponse({'error': f'tipo_acceso inválido: {tipo_acceso}'}, status=400)
+
+    presupuesto = float(ConfiguracionAcceso._meta.get_field('tiempo_max_procesamiento').default)
+    if _configuracion['objeto'] is not None:
+        presupuesto = float(_configuracion['objeto'].tiempo_max_procesamiento)
+
+    try:
+        usuario_id = await asyncio.wait_for(usuario_del_token(request), timeout=presupuesto)
+    except asyncio.TimeoutError:
+        return JsonResponse({'error': 'No se pudo validar el token a tiempo'}, status=503)
+    if not usuario_id:
+        return JsonResponse({'detail': 'Las credenciales de autenticación no se proveyeron.'}, status=401)
+
+    async def decidir():
+        config = await _obtener_configuracion()
+        resultado = await sync_to_async(_vista.buscar_placa_inteligente, thread_sensitive=False)(placa_detectada)
+        return config, resultado
+
+    try:
+        restante = max(presupuesto - (time.monotonic() - inicio), 0)
+        config, resultado_busqueda = await asyncio.wait_for(decidir(), timeout=restante)
+        fuera_de_tiempo = False
+    except asyncio.TimeoutError:
+        logger.warning(f"Decisión de acceso para {placa_detectada} superó {presupuesto}s, queda pendiente")
+        fuera_de_tiempo = True
+
+    if fuera_de_tiempo:
+        # Sin respuesta a tiempo: no abrir la barrera, queda para verificación manual
+        estado_acceso, ia_autentico = 'pendiente', False
+        ia_placa_reconocida = bool(data.get('ia_placa_reconocida', False))
+        ia_vehiculo_reconocido = bool(data.get('ia_vehiculo_reconocido', False))
+        mensaje = f"🤖 IA VERIFICA: ⏳ PLACA '{placa_detectada}' SIN RESPUESTA A TIEMPO - Requiere verificación manual"
+        tipo, objeto, confianza = None, None, 0
+    else:
+        estado_acceso, ia_autentico, ia_placa_reconocida, ia_vehiculo_reconocido = _vista._decidir_acceso(
+            resultado_busqueda, ia_confidence,
+            bool(data.get('ia_placa_reconocida', False)),
+            bool(data.get('ia_vehiculo_reconocido', False)),
+            config
+        )
+        mensaje = resultado_busqueda['mensaje_ia'] or _vista._mensaje_no_encontrada(placa_detectada, estado_acceso)
+        tipo, objeto, confianza = resultado_busqueda['tipo'], resultado_busqueda['objeto'], resultado_busqueda['confianza_busqueda']
+
+    campos = {
+        'fecha_hora': timezone.now(),
+        'placa_detectada': placa_detectada,
+        'marca_detectada': data.get('marca_detectada', ''),
+        'modelo_detectado': data.get('modelo_detectado', ''),
+        'color_detectado': data.get('color_detectado', ''),
+        'ia_confidence': round(ia_confidence, 2),
+        'ia_autentico': ia_autentico,
+        'ia_placa_reconocida': ia_placa_reconocida,
+        'ia_vehiculo_reconocido': ia_vehiculo_reconocido,
+        'tipo_acceso': tipo_acceso,
+        'estado_acceso': estado_acceso,
+        'imagen_url': data.get('imagen_url', ''),
+        'imagen_path': data.get('imagen_path', ''),
+        'camara_id': data.get('camara_id', ''),
+        'tiempo_procesamiento': 0,
+        'observaciones': data.get('observaciones', ''),
+        'placa_vehiculo_id': objeto.pk if tipo == 'residente' else None,
+        'placa_invitado_id': objeto.pk if tipo == 'invitado' else None,
+    }
+    # Validar antes de encolar: un valor inválido fallaría recién al escribir el spool en la base
+    errores = validar_registro(RegistroAcceso(**campos))
+    if errores:
+        return JsonResponse({'error': 'Datos del evento inválidos', 'detalle': errores}, status=400)
+
+    # Detecciones repetidas del mismo auto en la misma cámara: un solo registro
+    config_actual = _configuracion['objeto']
+    anterior = await aregistrar_deteccion(
+        data.get('camara_id', ''), placa_detectada, tipo_acceso,
+        {'id': None, 'estado_acceso': estado_acceso},
+        config_actual.segundos_debounce_placa if config_actual else 0
+    )
+    if anterior:
+        return JsonResponse({
+            'placa_detectada': placa_detectada,
+            'estado_acceso': anterior['estado_acceso'],
+            'abrir_barrera': anterior['estado_acceso'] == 'autorizado',
+            'duplicado': True,
+            'registro_id': anterior['id'],
+            'tiempo_ms': round((time.monotonic() - inicio) * 1000, 2),
+        })
+
+    tiempo_procesamiento = time.monotonic() - inicio
+    campos['tiempo_procesamiento'] = round(tiempo_procesamiento, 2)
+
+    registro_id = None
+    if estado_acceso != 'autorizado' and not fuera_de_tiempo:
+        # La barrera queda cerrada igual: se guarda al instante porque seguridad
+        # necesita el id para autorizarlo o denegarlo a mano
+        segundos = config_actual.segundos_debounce_placa if config_actual else 0
+        try:
+            registro_id = await sync_to_async(_guardar_al_instante)(campos, segundos)
+        except Exception as e:
+            logger.error(f"No se pudo guardar el acceso de {placa_detectada}, se deja en el spool: {e}")
+    if registro_id is None:
+        # El registro se guarda en segundo plano
+        escritor_registros.encolar(campos)
+
+    return JsonResponse({
+        'placa_detectada': placa_detectada,
+        'estado_acceso': estado_acceso,
+        'abrir_barrera': estado_acceso == 'autorizado',
+        'registro_id': registro_id,
+        'tipo_propietario': tipo,
+        'confianza_busqueda': confianza,
+        'mensaje': mensaje,
+        'fuera_de_tiempo': fuera_de_tiempo,
+        'presupuesto_segundos': presupuesto,
+        'tiempo_ms': round(tiempo_procesamiento * 1000, 2),
+    })
+
+
+@require_GET
+async def feed_accesos_sse(request):
+    """
+    Feed en vivo de la barrera: eventos 'registro' (nuevos RegistroAcceso) y
+    'autorizacion'/'denegacion' (decisiones manuales).
+    Cada evento lleva como id el cursor 'registro:evento'; al reconectar, EventSource
+    lo manda en Last-Event-ID (o se puede pasar ?ultimo_id=) y se reenvía lo perdido.
+    EventSource no permite headers: se autentica con ?ticket= (POST accesos/feed/ticket/,
+    vence en un minuto, para reconectar más tarde se pide otro) o con el header Authorization.
+    """
+    usuario_id = leer_ticket(request.GET.get('ticket'))
+    if not usuario_id and 'Authorization' in request.headers:
+        usuario_id = await usuario_del_token(request)
+    if not usuario_id:
+        return JsonResponse({'detail': 'Las credenciales de autenticación no se proveyeron.'}, status=401)
+
+    cursor_inicial = leer_cursor(request.headers.get('Last-Event-ID') or request.GET.get('ultimo_id'))
+
+    async def eventos():
+        # Suscribirse antes de leer lo atrasado para no perder nada entre ambos pasos
+        cola = feed_accesos.suscribir()
+        try:
+            await sync_to_async(feed_accesos.esperar_listo, thread_sensitive=False)()
+            enviados = nuevos_enviados()
+            cursor = cursor_inicial or await sync_to_async(cursor_actual)(enviados)
+            yield 'retry: 3000\n\n'
+
+            while True:
+                atrasados = await sync_to_async(eventos_desde)(cursor, enviados)
+                for evento in atrasados:
+                    cursor = avanzar_cursor(cursor, evento, enviados) or cursor
+                    yield formatear_evento(evento, cursor)
+                if not atrasados:
+                    break
+
+            while True:
+                try:
+                    evento = await asyncio.wait_for(cola.get(), timeout=SEGUNDOS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                nuevo_cursor = avanzar_cursor(cursor, evento, enviados)
+                if nuevo_cursor:
+                    cursor = nuevo_cursor
+                    yield formatear_evento(evento, cursor)
+        finally:
+            feed_accesos.desuscribir(cola)
+
+    response = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Evitar que nginx acumule la respuesta
+    response['X-Accel-Buffering'] = 'no'
+    return response